@@ -0,0 +1,93 @@
+"""Times the bytecode VM and the Python back end against the JSON -> C++ interpreter path.
+
+For each program, the C++ path is the parser writing build/ast_output.json
+followed by `komu --frames` reading it; the VM path is
+`python3 -m src.parser.src.vm.run`. Both are timed as separate processes,
+end to end, and the VM is also timed in-process (compile and run, output
+discarded), which is what a Python service embedding it pays per program.
+The Python back end is timed in-process too, transpiling every time
+("Python cold") and reusing the code object compiled for the same source
+("Python cached").
+
+Usage: python3 scripts/benchmark_vm.py [--komu build/komu] [--runs 5] [file.komu ...]
+With no files, the examples/ programs are timed.
+"""
+import argparse
+import glob
+import io
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.parser.src.vm import transpiler
+from src.parser.src.vm.run import compile_file, transpile_file
+from src.parser.src.vm.machine import Machine
+from src.parser.src.vm.runtime import Runtime
+
+def timed(function, runs):
+    """Returns the median time of `runs` calls of `function`, in seconds."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def run_process(command, cwd):
+    result = subprocess.run(command, cwd=cwd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed: {(result.stdout + result.stderr).strip()}")
+    return result.stdout
+
+def main(files, komu, runs):
+    build_dir = os.path.join(PROJECT_ROOT, "build")
+    print(f"{'program':<24}{'JSON -> C++':>14}{'VM process':>14}{'VM in-process':>16}{'Python cold':>14}"
+          f"{'Python cached':>16}")
+    for path in files:
+        name = os.path.basename(path)
+        parse = [sys.executable, "-m", "src.parser.src.main", "--no-cache", path]
+        try:
+            run_process(parse, PROJECT_ROOT)
+        except RuntimeError as e:
+            print(f"{name:<24}skipped, it does not compile: {str(e).splitlines()[-1]}")
+            continue
+
+        def cpp():
+            run_process(parse, PROJECT_ROOT)
+            run_process([komu, "--frames"], build_dir)
+
+        def vm_process():
+            run_process([sys.executable, "-m", "src.parser.src.vm.run", path], PROJECT_ROOT)
+
+        def vm_in_process():
+            with open(path) as source_file:
+                program = compile_file(source_file)
+            Machine(output=io.StringIO(), errors=io.StringIO(), input=io.StringIO()).run(program)
+
+        def python(cold):
+            if cold:
+                transpiler._compiled.clear()
+            with open(path) as source_file:
+                program = transpile_file(source_file)
+            Runtime(output=io.StringIO(), errors=io.StringIO(), input=io.StringIO()).run(program)
+
+        print(f"{name:<24}{timed(cpp, runs) * 1000:>11.1f} ms{timed(vm_process, runs) * 1000:>11.1f} ms"
+              f"{timed(vm_in_process, runs) * 1000:>13.2f} ms{timed(lambda: python(True), runs) * 1000:>11.2f} ms"
+              f"{timed(lambda: python(False), runs) * 1000:>13.2f} ms")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(prog="python3 scripts/benchmark_vm.py")
+    arg_parser.add_argument("files", nargs="*", help="the .komu programs to time (default: examples/*.komu)")
+    arg_parser.add_argument("--komu", default=os.path.join(PROJECT_ROOT, "build", "komu"),
+                            help="the interpreter binary (default: build/komu)")
+    arg_parser.add_argument("--runs", type=int, default=5, help="the number of timed runs per program (default: 5)")
+    args = arg_parser.parse_args()
+    files = [os.path.abspath(path) for path in args.files] or sorted(glob.glob(os.path.join(PROJECT_ROOT,
+                                                                                            "examples", "*.komu")))
+    main(files, os.path.abspath(args.komu), args.runs)
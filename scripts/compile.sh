@@ -30,9 +30,11 @@ cmake --build "$BUILD_DIR" > /dev/null
 
 
 # --- Run the parser with the new, correct full path ---
+# The client hands the file to the resident compile server, which it starts
+# in the background the first time, so the front end is imported only once.
 echo "Running parser..."
 cd "$PROJECT_ROOT"
-python3 -m src.parser.src.main "$FULL_FILE_PATH"
+python3 -m src.parser.src.client compile "$FULL_FILE_PATH"
 
 # --- Run the interpreter ---
 echo "Running interpreter..."
@@ -3,8 +3,14 @@
 
 #include "KomuValue.hpp"
 #include "json.hpp"
+#include <cstddef>
+#include <list>
 #include <map>
+#include <memory>
+#include <optional>
+#include <ostream>
 #include <string>
+#include <utility>
 #include <vector>
 
 using json = nlohmann::json;
@@ -20,22 +26,107 @@ class ReturnException : public std::exception
     const char* what() const noexcept override { return "A 'return' statement was executed."; }
 };
 
+struct KomuFrame;
+
+/**
+ * @brief Orders argument lists for memo tables.
+ *
+ * Numbers compare by their bits, so -0 and 0 are different keys and NaN is
+ * a key like any other.
+ */
+struct ArgumentsLess
+{
+    bool operator()(const std::vector<KomuValue>& left, const std::vector<KomuValue>& right) const;
+};
+
+/**
+ * @brief The results of a pure mission's calls, by argument list.
+ *
+ * The table holds at most `capacity` results; adding one to a full table
+ * evicts the least recently used.
+ */
+class MemoTable
+{
+  public:
+    const KomuValue* find(const std::vector<KomuValue>& args);
+    void insert(const std::vector<KomuValue>& args, const KomuValue& result, std::size_t capacity);
+
+  private:
+    using Entry = std::pair<std::vector<KomuValue>, KomuValue>;
+    std::list<Entry> entries; // most recently used first
+    std::map<std::vector<KomuValue>, std::list<Entry>::iterator, ArgumentsLess> index;
+};
+
+struct MemoStats
+{
+    std::size_t hits = 0;
+    std::size_t misses = 0;
+};
+
 struct KomuMission
 {
     std::string name;
     std::vector<std::string> parameters;
     json body;
+
+    // Frame mode: the layout the resolver recorded for the mission. A frame
+    // holds `frame_size` slots for parameters and locals, followed by one
+    // slot per captured outer variable.
+    int frame_size = 0;
+    std::vector<std::pair<int, int>> captures;               // (depth, slot) of each capture
+    std::map<std::pair<int, int>, int> capture_slots;        // (depth, slot) -> frame slot
+    std::shared_ptr<KomuFrame> definition_frame;             // the frame the mission was defined in
+
+    // Set by the parser's purity analysis: the result depends only on the
+    // arguments, so calls are remembered in `memo`.
+    bool pure = false;
+    MemoTable memo;
+};
+
+/**
+ * @brief The variables of one mission call, or of the top level, in frame mode.
+ *
+ * Slots are indexed by the resolver's lexical addresses. An empty slot is a
+ * variable that has not been assigned yet.
+ */
+struct KomuFrame
+{
+    std::vector<std::optional<KomuValue>> slots;
+    std::shared_ptr<const KomuMission> mission; // null for the top-level frame
 };
 
 class Interpreter
 {
   public:
-    Interpreter() = default;
+    static constexpr std::size_t DEFAULT_MEMO_SIZE = 1024;
+
+    /**
+     * @param use_frames Run on array-indexed frames using the lexical
+     *        addresses in the AST instead of a map of variables by name.
+     * @param memo_size The number of results remembered for each pure
+     *        mission; 0 turns memoization off.
+     */
+    explicit Interpreter(bool use_frames = false, std::size_t memo_size = DEFAULT_MEMO_SIZE);
     void interpret(const json& ast_data);
 
+    // Memo table hits and misses so far, by mission name.
+    const std::map<std::string, MemoStats>& memo_stats() const { return memo_counts; }
+    void report_memo(std::ostream& out) const;
+
   private:
+    bool use_frames;
+    std::size_t memo_size;
+    std::map<std::string, MemoStats> memo_counts;
     std::map<std::string, KomuValue> variables;
-    std::map<std::string, KomuMission> missions;
+    std::map<std::string, std::shared_ptr<KomuMission>> missions;
+    std::shared_ptr<KomuFrame> frame; // the current frame in frame mode
+
+    KomuValue* find_variable(const json& node, const std::string& name);
+    void define_variable(const json& node, const std::string& name, const KomuValue& value);
+    std::optional<KomuValue>& frame_slot(KomuFrame& target, int depth, int slot, int line);
+    void call_with_frame(const std::shared_ptr<KomuMission>& mission, const std::vector<KomuValue>& args);
+    bool recall(KomuMission& mission, const std::vector<KomuValue>& args);
+    void remember(KomuMission& mission, const std::vector<KomuValue>& args);
 
     void execute_statement(const json& stmt);
     void execute_var_declaration(const json& node);
@@ -1,8 +1,155 @@
 #include <stdexcept>
 #include <iostream>
 #include "interpreter.hpp"
+#include <algorithm>
+#include <cstdint>
+#include <cstring>
 #include <variant>
 
+Interpreter::Interpreter(bool use_frames, std::size_t memo_size)
+    : use_frames(use_frames), memo_size(memo_size), frame(std::make_shared<KomuFrame>()) {}
+
+static bool value_less(const KomuValue& left, const KomuValue& right) {
+    if (left.value.index() != right.value.index()) {
+        return left.value.index() < right.value.index();
+    }
+    if (const double* number = std::get_if<double>(&left.value)) {
+        std::uint64_t left_bits, right_bits;
+        std::memcpy(&left_bits, number, sizeof left_bits);
+        std::memcpy(&right_bits, &std::get<double>(right.value), sizeof right_bits);
+        return left_bits < right_bits;
+    }
+    if (const bool* boolean = std::get_if<bool>(&left.value)) {
+        return *boolean < std::get<bool>(right.value);
+    }
+    if (const std::string* text = std::get_if<std::string>(&left.value)) {
+        return *text < std::get<std::string>(right.value);
+    }
+    return false;
+}
+
+bool ArgumentsLess::operator()(const std::vector<KomuValue>& left, const std::vector<KomuValue>& right) const {
+    return std::lexicographical_compare(left.begin(), left.end(), right.begin(), right.end(), value_less);
+}
+
+const KomuValue* MemoTable::find(const std::vector<KomuValue>& args) {
+    auto found = index.find(args);
+    if (found == index.end()) {
+        return nullptr;
+    }
+    entries.splice(entries.begin(), entries, found->second);
+    return &found->second->second;
+}
+
+void MemoTable::insert(const std::vector<KomuValue>& args, const KomuValue& result, std::size_t capacity) {
+    if (capacity == 0 || index.count(args)) {
+        return;
+    }
+    if (entries.size() >= capacity) {
+        index.erase(entries.back().first);
+        entries.pop_back();
+    }
+    entries.emplace_front(args, result);
+    index[args] = entries.begin();
+}
+
+/**
+ * @brief Looks the call of a pure mission up in its memo table.
+ *
+ * On a hit, the remembered result becomes the call's return value and
+ * true is returned; the mission does not run.
+ */
+
+bool Interpreter::recall(KomuMission& mission, const std::vector<KomuValue>& args) {
+    if (!mission.pure || memo_size == 0) {
+        return false;
+    }
+    MemoStats& stats = memo_counts[mission.name];
+    if (const KomuValue* result = mission.memo.find(args)) {
+        stats.hits++;
+        last_return_value = *result;
+        return true;
+    }
+    stats.misses++;
+    return false;
+}
+
+// Remembers the value a pure mission just returned for `args`.
+void Interpreter::remember(KomuMission& mission, const std::vector<KomuValue>& args) {
+    if (mission.pure) {
+        mission.memo.insert(args, last_return_value, memo_size);
+    }
+}
+
+void Interpreter::report_memo(std::ostream& out) const {
+    if (memo_counts.empty()) {
+        out << "Memo: no calls to pure missions." << std::endl;
+        return;
+    }
+    for (const auto& [name, stats] : memo_counts) {
+        out << "Memo: " << name << ": " << stats.hits << " hits, " << stats.misses << " misses" << std::endl;
+    }
+}
+
+/**
+ * @brief Returns the slot at (depth, slot) as seen from `target`.
+ *
+ * Depth 0 is the frame's own variables; deeper variables live in the slots
+ * the frame's mission copied them into when it was called.
+ */
+
+std::optional<KomuValue>& Interpreter::frame_slot(KomuFrame& target, int depth, int slot, int line) {
+    std::size_t index = slot;
+    if (depth > 0) {
+        auto capture = target.mission ? target.mission->capture_slots.find({depth, slot})
+                                      : std::map<std::pair<int, int>, int>::const_iterator();
+        if (!target.mission || capture == target.mission->capture_slots.end()) {
+            throw std::runtime_error("Error: No captured variable at depth " + std::to_string(depth) +
+                                     ", slot " + std::to_string(slot) + " at line: " + std::to_string(line) + ".");
+        }
+        index = capture->second;
+    }
+    // Only the top-level frame grows: its variables are not counted up front.
+    if (index >= target.slots.size()) {
+        target.slots.resize(index + 1);
+    }
+    return target.slots[index];
+}
+
+/**
+ * @brief Returns the variable a node refers to, or nullptr if it is undefined.
+ *
+ * In frame mode the node's "depth" and "slot" address the variable, so the
+ * AST must come from the resolver (not the --arena output).
+ */
+
+KomuValue* Interpreter::find_variable(const json& node, const std::string& name) {
+    if (!use_frames) {
+        auto variable = variables.find(name);
+        return variable == variables.end() ? nullptr : &variable->second;
+    }
+    int line = static_cast<int>(node.at("line"));
+    auto depth = node.find("depth");
+    if (depth == node.end()) {
+        throw std::runtime_error("Error: Variable '" + name + "' has no lexical address at line: " +
+                                 std::to_string(line) + ". Frame mode needs a resolved AST.");
+    }
+    std::optional<KomuValue>& slot = frame_slot(*frame, depth->get<int>(), node.at("slot").get<int>(), line);
+    return slot ? &*slot : nullptr;
+}
+
+void Interpreter::define_variable(const json& node, const std::string& name, const KomuValue& value) {
+    if (!use_frames) {
+        variables[name] = value;
+        return;
+    }
+    if (!node.contains("slot")) {
+        throw std::runtime_error("Error: Variable '" + name + "' has no lexical address at line: " +
+                                 std::to_string(static_cast<int>(node.at("line"))) + ". Frame mode needs a resolved AST.");
+    }
+    frame_slot(*frame, 0, node.at("slot").get<int>(), node.at("line")) = value;
+}
+
 /**
  * @brief Evaluates binary expressions and returns a KomuValue.
  */
@@ -30,14 +177,14 @@ KomuValue Interpreter::evaluate_binary_expression(const json& expr) {
         }
 
         std::string var_name = operand_expr.at("name");
-        if(variables.count(var_name)){
-            KomuValue curr_kv = variables.at(var_name);
-            double origValue = std::get<double>(curr_kv.value);
+        KomuValue* variable = find_variable(operand_expr, var_name);
+        if(variable){
+            double origValue = std::get<double>(variable->value);
             if(op == "++"){
-                variables[var_name] = KomuValue(origValue + 1);
+                *variable = KomuValue(origValue + 1);
                 return KomuValue(origValue + 1);
             } else if(op == "--"){
-                variables[var_name] = KomuValue(origValue - 1);
+                *variable = KomuValue(origValue - 1);
                 return KomuValue(origValue - 1);
             }
 
@@ -50,14 +197,14 @@ KomuValue Interpreter::evaluate_binary_expression(const json& expr) {
         std::string op = expr.at("operator");
         json operand_expr = expr.at("node");
         std::string var_name = operand_expr.at("name");
-        if(variables.count(var_name)){
-            KomuValue curr_kv = variables.at(var_name);
-            double origValue = std::get<double>(curr_kv.value);
+        KomuValue* variable = find_variable(operand_expr, var_name);
+        if(variable){
+            double origValue = std::get<double>(variable->value);
             if(op == "++"){
-                variables[var_name] = KomuValue(origValue + 1);
+                *variable = KomuValue(origValue + 1);
                 return KomuValue(origValue);
             } else if(op == "--"){
-                variables[var_name] = KomuValue(origValue - 1);
+                *variable = KomuValue(origValue - 1);
                 return KomuValue(origValue);
             }
         }
@@ -73,8 +220,8 @@ KomuValue Interpreter::evaluate_binary_expression(const json& expr) {
     }
     else if(type == "Identifier"){
         std::string var_name = expr.at("name");
-        if(variables.count(var_name)) {
-            return variables.at(var_name);
+        if(KomuValue* variable = find_variable(expr, var_name)) {
+            return *variable;
         } else{
             throw std::runtime_error("Error: Undefined variable '" + var_name + "' at line: " + std::to_string(line) + ".");
         }
@@ -161,8 +308,8 @@ KomuValue Interpreter::evaluate_relational_expression(const json& expr){
 
     }else if(type == "Identifier"){
         std::string var_name = expr.at("name");
-        if(variables.count(var_name)) {
-            return variables.at(var_name);
+        if(KomuValue* variable = find_variable(expr, var_name)) {
+            return *variable;
         } 
         else{
             std::cerr << "Error: Undefined variable " << var_name << "at line: " <<  std::to_string(line) << std::endl;
@@ -421,21 +568,35 @@ void Interpreter::print(const json& args){
 void Interpreter::execute_mission(const json& node) {
     std::string mission_name = node.at("identifier");
 
-    KomuMission mission;
-    mission.name = mission_name;
-    mission.body = node.at("body"); 
+    auto mission = std::make_shared<KomuMission>();
+    mission->name = mission_name;
+    mission->body = node.at("body"); 
 
     if (node.contains("parameter")) {
         json param_list = node.at("parameter");
         for (const auto& param_node : param_list) {
             if (param_node.at("type") == "Identifier") {
-                mission.parameters.push_back(param_node.at("name"));
+                mission->parameters.push_back(param_node.at("name"));
             } 
             else {
                 throw std::runtime_error("Error: Function parameters must be identifiers.");
             }
         }
     }
+    if (use_frames) {
+        if (!node.contains("frame_size")) {
+            throw std::runtime_error("Error: Mission '" + mission_name + "' has no frame layout at line: " +
+                                     std::to_string(static_cast<int>(node.at("line"))) + ". Frame mode needs a resolved AST.");
+        }
+        mission->frame_size = node.at("frame_size");
+        for (const auto& capture : node.at("captures")) {
+            std::pair<int, int> address(capture.at("depth"), capture.at("slot"));
+            mission->capture_slots[address] = mission->frame_size + static_cast<int>(mission->captures.size());
+            mission->captures.push_back(address);
+        }
+        mission->definition_frame = frame;
+    }
+    mission->pure = node.value("pure", false);
     missions[mission_name] = mission;
     
     //std::cout << "Defined Mission: " << mission_name << std::endl;
@@ -488,27 +649,40 @@ void Interpreter::execute_mission_call(const json& node) {
     if (missions.count(mission_name) == 0) {
         throw std::runtime_error("Error: Calling undefined mission '" + mission_name + "' at line: " + std::to_string(static_cast<int>(node.at("line"))) + ".");
     }
-    KomuMission mission = missions.at(mission_name);
+    std::shared_ptr<KomuMission> mission = missions.at(mission_name);
     json arg_list;
     if (node.contains("argument")) {
         arg_list = node.at("argument");
     }
 
-    if (arg_list.size() != mission.parameters.size()) {
+    if (arg_list.size() != mission->parameters.size()) {
         throw std::runtime_error("Error: Mission '" + mission_name + "' expected " + 
-                                 std::to_string(mission.parameters.size()) + 
+                                 std::to_string(mission->parameters.size()) + 
                                  " arguments, but got " + std::to_string(arg_list.size()) + ".");
     }
 
+    if (use_frames) {
+        std::vector<KomuValue> args;
+        for (const auto& arg_node : arg_list) {
+            args.push_back(evaluate_logical_or(arg_node));
+        }
+        if (!recall(*mission, args)) {
+            call_with_frame(mission, args);
+        }
+        return;
+    }
+
     std::map<std::string, KomuValue> old_variables = variables;
     //variables.clear(); 
 
     std::map<std::string, KomuValue> evaluated_args;
-    for (size_t i = 0; i < mission.parameters.size(); ++i) {
-        std::string param_name = mission.parameters[i];
+    std::vector<KomuValue> args;
+    for (size_t i = 0; i < mission->parameters.size(); ++i) {
+        std::string param_name = mission->parameters[i];
         json arg_node = arg_list[i];
 
-        evaluated_args[param_name] = evaluate_logical_or(arg_node);
+        args.push_back(evaluate_logical_or(arg_node));
+        evaluated_args[param_name] = args.back();
         
         // std::map<std::string, KomuValue> local_scope_temp = variables;
         // variables = old_variables; 
@@ -518,16 +692,22 @@ void Interpreter::execute_mission_call(const json& node) {
         // variables[param_name] = arg_value;
     }
 
+    if (recall(*mission, args)) {
+        variables = old_variables;
+        return;
+    }
+
     for (const auto& pair : evaluated_args) {
         variables[pair.first] = pair.second;
     }
 
     try {
-        for (const auto& stmt : mission.body) {
+        for (const auto& stmt : mission->body) {
             execute_statement(stmt);
         }
     } catch (const ReturnException& e) {
         last_return_value = e.returnValue;
+        remember(*mission, args);
     } catch (const std::runtime_error& e) {
         variables = old_variables;
         throw e;
@@ -535,6 +715,44 @@ void Interpreter::execute_mission_call(const json& node) {
     variables = old_variables;
 }
 
+/**
+ * @brief Runs a mission call in a new frame (frame mode).
+ *
+ * The frame holds the parameters and locals followed by copies of the
+ * captured outer variables, taken from the frame the mission was defined
+ * in. As with the map of variables, a mission's writes to outer variables
+ * are discarded when it returns.
+ */
+
+void Interpreter::call_with_frame(const std::shared_ptr<KomuMission>& mission, const std::vector<KomuValue>& args) {
+    auto callee = std::make_shared<KomuFrame>();
+    callee->mission = mission;
+    callee->slots.resize(mission->frame_size + mission->captures.size());
+    for (size_t i = 0; i < args.size(); ++i) {
+        callee->slots[i] = args[i];
+    }
+    int line = mission->body.empty() ? 0 : static_cast<int>(mission->body.front().at("line"));
+    for (size_t i = 0; i < mission->captures.size(); ++i) {
+        auto [depth, slot] = mission->captures[i];
+        callee->slots[mission->frame_size + i] = frame_slot(*mission->definition_frame, depth - 1, slot, line);
+    }
+
+    std::shared_ptr<KomuFrame> caller = frame;
+    frame = callee;
+    try {
+        for (const auto& stmt : mission->body) {
+            execute_statement(stmt);
+        }
+    } catch (const ReturnException& e) {
+        last_return_value = e.returnValue;
+        remember(*mission, args);
+    } catch (const std::runtime_error& e) {
+        frame = caller;
+        throw e;
+    }
+    frame = caller;
+}
+
 
 /** 
 * @brief Handles variable declaration and assignment.
@@ -546,7 +764,7 @@ void Interpreter::execute_var_declaration(const json& node){
     std::string value_type = value_node.at("type");
     try{
         KomuValue value = evaluate_logical_or(value_node);
-        variables[var_name] = value;
+        define_variable(node, var_name, value);
     }catch(std::runtime_error& e){
         std::cerr << "Runtime Error during variable declaration: " << e.what() << std::endl;
     }
@@ -557,7 +775,7 @@ void Interpreter::execute_var_declaration(const json& node){
 void Interpreter::execute_assignment(const json& node) {
     std::string identifier = node.at("identifier");
     
-    if (variables.count(identifier) == 0) {
+    if (!find_variable(node, identifier)) {
         throw std::runtime_error("Error: Assignment to undefined variable '" + 
                                  identifier + "' at line: " + 
                                  std::to_string(static_cast<int>(node.at("line"))) + ".");
@@ -565,8 +783,8 @@ void Interpreter::execute_assignment(const json& node) {
 
     KomuValue value = evaluate_logical_or(node.at("value"));
 
-    //updates the variable in map
-    variables[identifier] = value;
+    // Evaluating the value can move the variable, so look it up again
+    *find_variable(node, identifier) = value;
 }
 
 
@@ -1,29 +1,96 @@
 #include "interpreter.hpp"
 #include "json.hpp"
+#include <filesystem>
 #include <iostream>
 #include <fstream>
+#include <iterator>
+#include <string>
+#include <vector>
 
 using json = nlohmann::json;
+namespace fs = std::filesystem;
+
+// The parser writes the AST in one of these formats (see its --format option).
+static const char* AST_FILES[] = {"ast_output.json", "ast_output.cbor", "ast_output.msgpack"};
+
+// Returns the most recently written AST file, or an empty string if there is none.
+static std::string find_ast_file(){
+    std::string newest;
+    fs::file_time_type newest_time;
+    for (const char* path : AST_FILES) {
+        std::error_code error;
+        fs::file_time_type time = fs::last_write_time(path, error);
+        if (!error && (newest.empty() || time > newest_time)) {
+            newest = path;
+            newest_time = time;
+        }
+    }
+    return newest;
+}
+
+// Parses the AST, telling the format apart by its first bytes: CBOR starts
+// with the self-describe tag, JSON with '[' and MessagePack with an array header.
+static json parse_ast(const std::vector<std::uint8_t>& bytes){
+    if (bytes.size() >= 3 && bytes[0] == 0xd9 && bytes[1] == 0xd9 && bytes[2] == 0xf7) {
+        return json::from_cbor(bytes, true, true, json::cbor_tag_handler_t::ignore);
+    }
+    std::size_t first = 0;
+    while (first < bytes.size() && std::isspace(bytes[first])) {
+        first++;
+    }
+    if (first == bytes.size() || bytes[first] == '[') {
+        return json::parse(bytes);
+    }
+    return json::from_msgpack(bytes);
+}
+
+int main(int argc, char** argv){
+    // --frames runs on array-indexed frames using the resolver's lexical addresses.
+    // --memo-size N remembers up to N results per pure mission (0 turns it off),
+    // and --memo-report prints the memo tables' hits and misses at the end.
+    bool use_frames = false;
+    bool memo_report = false;
+    std::size_t memo_size = Interpreter::DEFAULT_MEMO_SIZE;
+    for (int i = 1; i < argc; i++) {
+        std::string arg = argv[i];
+        if (arg == "--frames") {
+            use_frames = true;
+        } else if (arg == "--memo-report") {
+            memo_report = true;
+        } else if (arg == "--memo-size" && i + 1 < argc) {
+            try {
+                memo_size = std::stoul(argv[++i]);
+            } catch (const std::exception&) {
+                std::cerr << "Error: --memo-size takes a number of results, got '" << argv[i] << "'." << std::endl;
+                return 1;
+            }
+        }
+    }
+
 
-int main(){
     std::cout << "Komu Interpreter" << std::endl;
 
-    std::ifstream ast_file("ast_output.json");
-    if (!ast_file.is_open()) {
-        std::cerr << "Error: Could not open ast.json!" << std::endl;
-        return 1; 
+    std::string ast_path = find_ast_file();
+    std::ifstream ast_file(ast_path, std::ios::binary);
+    if (ast_path.empty() || !ast_file.is_open()) {
+        std::cerr << "Error: Could not open ast_output.json, ast_output.cbor or ast_output.msgpack!" << std::endl;
+        return 1;
     }
+    std::vector<std::uint8_t> bytes((std::istreambuf_iterator<char>(ast_file)), std::istreambuf_iterator<char>());
 
     json ast_data;
     try {
-        ast_data = json::parse(ast_file);
+        ast_data = parse_ast(bytes);
     } catch (json::parse_error& e) {
-        std::cerr << "Error: Failed to parse JSON: " << e.what() << std::endl;
-        return 1; 
+        std::cerr << "Error: Failed to parse " << ast_path << ": " << e.what() << std::endl;
+        return 1;
     }
 
-    Interpreter komu_interpreter;
+    Interpreter komu_interpreter(use_frames, memo_size);
     komu_interpreter.interpret(ast_data);
+    if (memo_report) {
+        komu_interpreter.report_memo(std::cerr);
+    }
 
-    return 0; 
+    return 0;
 }
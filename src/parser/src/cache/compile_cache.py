@@ -0,0 +1,138 @@
+import os
+import hashlib
+
+# Cached artifacts are evicted, least recently used first, beyond this size.
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_frontend_stamp = None
+
+def frontend_stamp():
+    """
+    Returns a hash of the front-end's own source files.
+
+    It is part of every cache key, so changing the lexer, parser, resolver
+    or serializers invalidates the artifacts they produced.
+    """
+    global _frontend_stamp
+    if _frontend_stamp is None:
+        digest = hashlib.sha256()
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for directory, subdirectories, files in os.walk(package_root):
+            subdirectories[:] = sorted(name for name in subdirectories if name != '__pycache__')
+            for name in sorted(files):
+                if name.endswith('.py'):
+                    path = os.path.join(directory, name)
+                    digest.update(os.path.relpath(path, package_root).encode('utf-8') + b'\0')
+                    with open(path, 'rb') as source_file:
+                        digest.update(source_file.read())
+        _frontend_stamp = digest.hexdigest()
+    return _frontend_stamp
+
+
+class CompileCache:
+    """
+    A content-addressed on-disk cache of compiled AST artifacts.
+
+    An artifact is stored under the hash of the source bytes, the front-end
+    version stamp and the output options, so an unchanged `.komu` file can
+    skip the Lexer, Parser and Resolver stages. Entries are files in
+    `directory`; their modification time records the last use, and the
+    least recently used ones are removed once the cache exceeds `max_bytes`.
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, source, *options):
+        """Returns the cache key for the `source` bytes compiled with `options`."""
+        digest = hashlib.sha256(frontend_stamp().encode('ascii'))
+        for option in options:
+            digest.update(b'\0' + str(option).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(source)
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def fetch(self, key, output_path):
+        """
+        Places the artifact cached under `key` at `output_path`.
+
+        The artifact is hard-linked, or copied where links are not supported.
+        Returns False on a cache miss.
+        """
+        entry = self.entry_path(key)
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            return False
+        self._place(entry, output_path)
+        return True
+
+    def store(self, key, artifact_path, evict=True):
+        """Caches the file at `artifact_path` under `key`, then evicts old entries unless `evict` is False."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._place(artifact_path, self.entry_path(key))
+        if evict:
+            self.evict()
+
+    def read(self, key):
+        """Returns the bytes cached under `key`, or None on a cache miss."""
+        entry = self.entry_path(key)
+        try:
+            with open(entry, 'rb') as cached:
+                data = cached.read()
+            os.utime(entry)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def write(self, key, data):
+        """Caches the bytes `data` under `key`, then evicts old entries."""
+        os.makedirs(self.directory, exist_ok=True)
+        entry = self.entry_path(key)
+        temporary_path = f"{entry}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as target:
+            target.write(data)
+        os.replace(temporary_path, entry)
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in `max_bytes`."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    # Another process may be evicting the same cache.
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime_ns, entry.path, stat.st_size))
+                    total += stat.st_size
+        entries.sort()
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    @staticmethod
+    def _place(source_path, target_path):
+        # Link or copy next to the target first, so the target is replaced
+        # atomically and never left half-written. Renaming over another link
+        # to the same file would do nothing and leave the temporary behind.
+        if os.path.exists(target_path) and os.path.samefile(source_path, target_path):
+            return
+        temporary_path = f"{target_path}.{os.getpid()}.tmp"
+        try:
+            os.link(source_path, temporary_path)
+        except OSError:
+            with open(source_path, 'rb') as source, open(temporary_path, 'wb') as target:
+                target.write(source.read())
+        os.replace(temporary_path, target_path)
@@ -0,0 +1,129 @@
+"""A thin client of the compile server.
+
+It imports nothing but the standard library, so a build step costs a
+Python start-up and a round trip instead of importing the whole front
+end. The server is started in the background the first time it is needed
+and keeps running for the next build steps:
+
+    python3 -m src.parser.src.client compile examples/test.komu
+    python3 -m src.parser.src.client stats
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+
+# How long to wait for a server started in the background to listen.
+START_TIMEOUT = 10.0
+
+def default_socket_path():
+    return f"{sys.path[0]}/build/komu.sock"
+
+def start_server(socket_path):
+    import subprocess
+    log_path = os.path.join(os.path.dirname(os.path.abspath(socket_path)), "komu-server.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, 'ab') as log:
+        subprocess.Popen([sys.executable, "-m", "src.parser.src.server", "--socket", socket_path],
+                         cwd=sys.path[0], stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True)
+
+def connect(socket_path, start=True):
+    """Returns a socket connected to the server, starting one if `start` is True and none is listening."""
+    deadline = None
+    while True:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(socket_path)
+            return connection
+        except (FileNotFoundError, ConnectionRefusedError):
+            connection.close()
+            if not start:
+                raise
+        if deadline is None:
+            start_server(socket_path)
+            deadline = time.monotonic() + START_TIMEOUT
+        elif time.monotonic() > deadline:
+            raise Exception(f"Error: The compile server did not start; see {os.path.dirname(socket_path)}/komu-server.log.")
+        time.sleep(0.02)
+
+def send(socket_path, request, start=True):
+    """Sends one request and returns the response. A server that is out of date is restarted once."""
+    for attempt in range(2):
+        with connect(socket_path, start) as connection:
+            connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with connection.makefile('rb') as responses:
+                line = responses.readline()
+        if not line:
+            raise Exception("Error: The compile server closed the connection.")
+        response = json.loads(line)
+        if not response.get('restart') or not start:
+            return response
+        # The old server stops after answering; wait for it to let go of the socket.
+        deadline = time.monotonic() + START_TIMEOUT
+        while os.path.exists(socket_path) and time.monotonic() < deadline:
+            time.sleep(0.02)
+    return response
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(prog="python3 -m src.parser.src.client")
+    arg_parser.add_argument("--socket", metavar="PATH", help="the server's socket (default: build/komu.sock)")
+    arg_parser.add_argument("--no-start", action="store_true",
+                            help="fail instead of starting a server when none is listening")
+    operations = arg_parser.add_subparsers(dest="op", required=True)
+    compile_parser = operations.add_parser("compile", help="compile a file, as python3 -m src.parser.src.main does")
+    compile_parser.add_argument("file_path", help="the .komu source file to compile")
+    compile_parser.add_argument("--output", metavar="PATH",
+                                help="where to write the AST (default: build/ast_output.<format>)")
+    compile_parser.add_argument("--format", choices=("json", "cbor", "msgpack"), default="json",
+                                help="the AST output format (default: json)")
+    compile_parser.add_argument("--pretty", action="store_true", help="indent the JSON output")
+    compile_parser.add_argument("-O", type=int, default=1, dest="optimize_level",
+                                help="the optimization level (default: 1)")
+    compile_parser.add_argument("--no-cache", action="store_true",
+                                help="always compile the source instead of reusing a cached AST")
+    check_parser = operations.add_parser("check", help="parse and resolve a file without writing its AST")
+    check_parser.add_argument("file_path", help="the .komu source file to check")
+    operations.add_parser("stats", help="print what the server has done")
+    operations.add_parser("stop", help="stop the server")
+    args = arg_parser.parse_args()
+
+    socket_path = args.socket or default_socket_path()
+    if args.op == "compile":
+        output_path = args.output or f"{sys.path[0]}/build/ast_output.{args.format}"
+        request = {"op": "compile", "path": os.path.abspath(args.file_path), "output": os.path.abspath(output_path),
+                   "format": args.format, "pretty": args.pretty, "optimize": args.optimize_level,
+                   "cache": not args.no_cache}
+    elif args.op == "check":
+        request = {"op": "check", "path": os.path.abspath(args.file_path)}
+    elif args.op == "stats":
+        request = {"op": "stats"}
+    else:
+        request = {"op": "shutdown"}
+
+    try:
+        # Stopping or asking a server that is not running must not start one.
+        response = send(socket_path, request, start=not args.no_start and args.op in ("compile", "check"))
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"Error: No compile server is listening on {socket_path}.")
+        sys.exit(1)
+    except Exception as e:
+        print(e)
+        sys.exit(1)
+
+    if not response["ok"]:
+        print(response["error"])
+        sys.exit(1)
+    if args.op == "compile":
+        if response["cached"]:
+            print(f"AST loaded from cache at {response['output']}")
+        else:
+            print(f"AST successfully generated at {response['output']}")
+    elif args.op == "check":
+        print("Resolver check passed.")
+    elif args.op == "stats":
+        print(json.dumps({key: value for key, value in response.items() if key not in ("id", "ok")}, indent=2))
+    else:
+        print("Compile server stopped.")
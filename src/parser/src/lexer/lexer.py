@@ -1,200 +1,331 @@
+import gc
+import io
+import re
+import sys
+from functools import lru_cache
 from ..tokens import Token, TokenType
-from .lexer_constants import KEYWORDS, ARITHMETIC_OPERATORS, LOGICAL_OPERATORS, SINGLE_CHAR_TOKENS
+from .lexer_constants import WORD_TOKENS, OPERATOR_TOKENS
+from .token_buffer import TokenBuffer
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# How many characters past an edit `relex` reads at first.
+RELEX_WINDOW = 1024
+
+# Master pattern: leading blanks are skipped inside the match and the group
+# holds exactly one lexeme. The alternatives mirror the checks in
+# ReferenceLexer.get_next_token: numbers before words, `//` comments before
+# the `/` operator, two-character operators before one-character ones. Any
+# character no alternative accepts is returned on its own by the final `.`.
+MASTER_TEMPLATE = r'''[ \t]*(
+      [{digit}]+(?:\.[{digit}]*)?|\.[{digit}]+
+    | {word}
+    | \s+
+    | //[^\n]*
+    | "[^"]*"
+    | \+\+|--|[=!<>]=|&&|\|\|
+    | .
+)'''
+
+ASCII_PATTERN = re.compile(MASTER_TEMPLATE.format(digit=r'\d', word=r'\w+'),
+                           re.VERBOSE | re.DOTALL)
+
+
+@lru_cache(maxsize=None)
+def unicode_pattern():
+    """
+    Builds the master pattern for non-ASCII input.
+
+    Python's `\\d` only covers decimal digits and `\\w` accepts numeric
+    characters that `str.isalpha` rejects, so the character classes are
+    adjusted here to agree exactly with the `str.isdigit`, `str.isalpha`
+    and `str.isalnum` tests used by `ReferenceLexer`.
+    """
+    extra_digits = []
+    numeric_only = []
+    for char in map(chr, range(0x80, sys.maxunicode + 1)):
+        if char.isnumeric():
+            if char.isdigit():
+                if not char.isdecimal():
+                    extra_digits.append(char)
+            elif not char.isalpha():
+                numeric_only.append(char)
+
+    digit = r'\d' + re.escape(''.join(extra_digits))
+    word = r'(?![{0}])\w+'.format(re.escape(''.join(numeric_only)))
+    return re.compile(MASTER_TEMPLATE.format(digit=digit, word=word),
+                      re.VERBOSE | re.DOTALL)
+
 
 class Lexer:
-    """ This class is responsible for converting the input source code into tokens. """
+    """
+    This class is responsible for converting the input source code into tokens.
+
+    The input is split into lexemes by a single compiled master pattern and
+    each lexeme is classified with dictionary lookups, instead of walking the
+    input one character at a time. The token stream is identical to the one
+    produced by `ReferenceLexer`.
+
+    `input_text` may be a string or a text file object; `iter_tokens` reads
+    file objects lazily in chunks.
+    """
     def __init__(self, input_text):
         self.input_text = input_text
-        self.position = 0
         self.line = 1
-        if self.position < len(self.input_text):
-            self.current_char = self.input_text[self.position]
-        else:
-            self.current_char = None
-
-    def advance(self):
-        """Advances the 'cursor' to the next character in the input text."""
-        if self.current_char == '\n':
-            self.line += 1
-        self.position += 1
-        if self.position < len(self.input_text):
-            self.current_char = self.input_text[self.position]
-        else:
-            self.current_char = None
-    
-    def skip_whitespace(self):
-        while self.current_char is not None and self.current_char.isspace():
-            self.advance()
-
-    def peek(self):
-        """Peeks at the next character without advancing the current position."""
-        peek_pos = self.position + 1
-        if peek_pos < len(self.input_text):
-            return self.input_text[peek_pos]
-        else:
-            return None
-
-    def get_number(self):
-        """Extracts a number (integer or float) from the input text."""
-        result = ''
-        
-        if self.current_char == '.':
-            result = '0.'
-            self.advance() 
-        else:
-            while self.current_char is not None and self.current_char.isdigit():
-                result += self.current_char
-                self.advance()
-
-            if self.current_char == '.':
-                result += self.current_char 
-                self.advance() 
-        
-        while self.current_char is not None and self.current_char.isdigit():
-            result += self.current_char
-            self.advance()
-            
-        return Token(TokenType.NUMBER, result , self.line)
-
-    def get_string(self):
-        """Extracts a string literal from the input text."""
-        result = ''
-        while self.current_char is not None and self.current_char != '"':
-            result += self.current_char
-            self.advance()
-        if self.current_char is None:
-            raise Exception(f'Unterminated string literal at line {self.line}')
-        self.advance() 
-        return Token(TokenType.STRING, result , self.line)
-    
-    def get_boolean(self, value):
-        """Extracts a boolean literal from the input text."""
-        return Token(TokenType.BOOLEAN, value , self.line)
-    
-    def get_identifier_or_keyword(self):
-        """Extracts an identifier or keyword from the input text."""
-        result = ''
-        while self.current_char is not None and (self.current_char.isalnum() or self.current_char == '_'):
-            result += self.current_char
-            self.advance()
-        if result in KEYWORDS:
-            return Token(TokenType.KEYWORD, result , self.line)
-        return Token(TokenType.IDENTIFIER, result , self.line)
-    
-    def _check_keyword(self, keyword, token_type):
-        """Checks if the current position matches a specific keyword."""
-        keyword_len = len(keyword)
-
-        if self.input_text[self.position : self.position + keyword_len] == keyword:
-            
-            boundary_idx = self.position + keyword_len
-            
-            if boundary_idx >= len(self.input_text):
-                for _ in range(keyword_len): self.advance()
-                return Token(token_type, keyword, self.line)
-
-            boundary_char = self.input_text[boundary_idx]
-            if boundary_char.isalnum() or boundary_char == '_':
-                return self.get_identifier_or_keyword() 
-            
-            for _ in range(keyword_len): self.advance()
-            return Token(token_type, keyword, self.line)
-
-        return self.get_identifier_or_keyword()
-    
-    def get_next_token(self):
-        """Main method to get the next token from the input text."""
-        while self.current_char is not None:
-            if self.current_char.isspace():
-                self.skip_whitespace()
-                continue
+        self.tokens = None
+        self.token_idx = 0
+
+    def _scan_text(self, text, emit, final=True, lexemes=None):
+        """
+        Calls `emit(token_type, value, line)` for every token found in `text`,
+        counting lines from `self.line`, and returns the offset where scanning
+        stopped.
+
+        When `final` is False, `text` must end on a line break and more input
+        may follow: a string literal that is still open at the end is not an
+        error, scanning stops at its opening quote instead.
 
-            if self.current_char == '/' and self.peek() == '/':
-                while self.current_char is not None and self.current_char != '\n':
-                    self.advance()
+        `lexemes` may be given to classify lexemes produced by `_lexemes`
+        instead of splitting the whole of `text`.
+        """
+        if lexemes is None:
+            pattern = ASCII_PATTERN if text.isascii() else unicode_pattern()
+            lexemes = pattern.findall(text)
+        operator_type = OPERATOR_TOKENS.get
+        word_type = WORD_TOKENS.get
+        intern = sys.intern
+        line = self.line
+
+        for lexeme in lexemes:
+            token_type = operator_type(lexeme)
+            if token_type is not None:
+                emit(token_type, lexeme, line)
                 continue
 
-            if (self.current_char.isdigit() or 
-                    (self.current_char == '.' and 
-                    self.peek() is not None and self.peek().isdigit())): 
-                return self.get_number()
-            
-            if self.current_char == '"':
-                self.advance()
-                return self.get_string()
-            
-            if self.current_char == 't':
-                return self._check_keyword('true', TokenType.BOOLEAN)
-            
-            if self.current_char == 'f':
-                return self._check_keyword('false', TokenType.BOOLEAN) 
-            
-            if self.current_char.isalpha() or self.current_char == '_':
-                return self.get_identifier_or_keyword()
-            
-            if self.current_char in {'+', '-'}:
-                char = self.current_char
-                next_char = self.peek()
-                if  next_char == char:
-                    char += next_char
-                    self.advance()
-                    self.advance()
-                    return Token(TokenType.UNARY_OPERATOR, char , self.line)
-
-            if self.current_char in ARITHMETIC_OPERATORS:
-                char = self.current_char
-                self.advance()
-                return Token(TokenType.ARITHMETIC_OPERATOR, char , self.line)
-            
-            if self.current_char in {'=', '!', '<', '>'}:
-                char = self.current_char
-                next_char = self.peek()
-                if next_char == '=':
-                    char += next_char
-                    self.advance()
-                    self.advance()
-                    return Token(TokenType.RELATIONAL_OPERATOR, char , self.line)
-                elif char in {'<', '>'}:
-                    self.advance()
-                    return Token(TokenType.RELATIONAL_OPERATOR, char , self.line)
-                elif char == '!':
-                    self.advance()
-                    return Token(TokenType.LOGICAL_OPERATOR, char , self.line)                
-                else: 
-                    if char == '=':
-                        self.advance()
-                        return Token(TokenType.ASSIGNMENT_OPERATOR, char , self.line)
-            
-            if self.current_char in {'&', '|', '^', '~'}:
-                char = self.current_char
-                next_char = self.peek()
-                if next_char is not None and char + next_char in LOGICAL_OPERATORS:
-                    char += next_char
-                    self.advance()
-                    self.advance()
-                    return Token(TokenType.LOGICAL_OPERATOR, char , self.line)
+            first = lexeme[0]
+            if first.isdigit():
+                emit(TokenType.NUMBER, lexeme, line)
+            elif first.isalpha() or first == '_':
+                token_type = word_type(lexeme)
+                if token_type is None:
+                    emit(TokenType.IDENTIFIER, intern(lexeme), line)
                 else:
-                    self.advance()
-                    return Token(TokenType.BITWISE_OPERATOR, char , self.line)
-            
-            if self.current_char in SINGLE_CHAR_TOKENS:
-                token_type = SINGLE_CHAR_TOKENS[self.current_char]
-                char = self.current_char
-                self.advance()
-                return Token(token_type, char , self.line)
-    
-            raise Exception(f'Unknown character: {self.current_char} at line {self.line}')
-        
-        return Token(TokenType.EOF, None , self.line)
-    
+                    emit(token_type, lexeme, line)
+            elif first.isspace():
+                line += lexeme.count('\n')
+            elif first == '"':
+                if len(lexeme) == 1:
+                    if not final:
+                        self.line = line
+                        return text.rfind('"')
+                    # No closing quote anywhere after this one, so the literal
+                    # runs to the end of the input like in ReferenceLexer.
+                    end_line = line + text.count('\n', text.rfind('"'))
+                    raise Exception(f'Unterminated string literal at line {end_line}')
+                value = lexeme[1:-1]
+                line += value.count('\n')
+                emit(TokenType.STRING, value, line)
+            elif first == '.':
+                emit(TokenType.NUMBER, '0' + lexeme, line)
+            elif first == '/':
+                pass  # `//` comment
+            else:
+                raise Exception(f'Unknown character: {first} at line {line}')
+
+        self.line = line
+        return len(text)
+
+    @staticmethod
+    def _lexemes(text, pos, span, stop=None):
+        """
+        Yields the lexemes of `text` from offset `pos` on, storing the offsets
+        of each one in `span` before it is yielded. Stops early at the first
+        lexeme whose start offset satisfies `stop`.
+        """
+        pattern = ASCII_PATTERN if text.isascii() else unicode_pattern()
+        for match in pattern.finditer(text, pos):
+            span[:] = match.span(1)
+            if stop is not None and stop(span[0]):
+                return
+            yield match.group(1)
+
+    def iter_tokens(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Yields tokens lazily, reading the input `chunk_size` characters at a
+        time. Only complete lines are scanned, so no token is split between
+        two reads; string literals that span several chunks are held back
+        until their closing quote arrives.
+        """
+        source = self.input_text
+        if isinstance(source, str):
+            source = io.StringIO(source)
+
+        pending = ''
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            text = pending + chunk
+            cut = text.rfind('\n') + 1
+            if cut == 0:
+                pending = text
+                continue
+
+            tokens = []
+            stop = self._scan_text(text[:cut], self._collector(tokens), final=False)
+            pending = text[stop:]
+            yield from tokens
+
+        tokens = []
+        self._scan_text(pending, self._collector(tokens))
+        yield from tokens
+        yield Token(TokenType.EOF, None, self.line)
+
+    @staticmethod
+    def _collector(tokens):
+        """Returns an emit callback that appends `Token` objects to `tokens`."""
+        append = tokens.append
+        return lambda token_type, value, line: append(Token(token_type, value, line))
+
+    def _read_all(self):
+        source = self.input_text
+        if not isinstance(source, str):
+            source = source.read()
+        return source
+
+    def scan_token_buffer(self, offsets=False):
+        """
+        Tokenizes the entire input text into a compact `TokenBuffer`.
+
+        With `offsets`, the source offsets of every token are recorded too,
+        so the buffer can later be updated with `relex`.
+        """
+        source = self._read_all()
+        buffer = TokenBuffer(offsets)
+        buffer.source = source
+        if offsets:
+            span = [0, 0]
+            append = buffer.append
+            self._scan_text(source, lambda token_type, value, line: append(token_type, value, line, *span),
+                            lexemes=self._lexemes(source, 0, span))
+        else:
+            self._scan_text(source, buffer.append)
+        buffer.append(TokenType.EOF, None, self.line, len(source), len(source))
+        return buffer
+
     def scanTokens(self):
         """Tokenizes the entire input text into a list of tokens."""
-        tokens = []
-        token = self.get_next_token()
-        while token.type != TokenType.EOF:
-            tokens.append(token)
-            token = self.get_next_token()
-        tokens.append(token)
-        return tokens
-        
-        
\ No newline at end of file
+        if self.tokens is None:
+            source = self._read_all()
+            tokens = []
+            # Tokens never form reference cycles; pausing the collector avoids
+            # repeated generation-0 sweeps while the list is being built.
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                self._scan_text(source, self._collector(tokens))
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+            tokens.append(Token(TokenType.EOF, None, self.line))
+            self.tokens = tokens
+
+        if self.token_idx:
+            return self.tokens[self.token_idx:]
+        return self.tokens
+
+    def get_next_token(self):
+        """Returns the next token from the input text, or EOF once it is exhausted."""
+        if self.tokens is None:
+            self.scanTokens()
+        if self.token_idx < len(self.tokens):
+            token = self.tokens[self.token_idx]
+            self.token_idx += 1
+            return token
+        return Token(TokenType.EOF, None, self.line)
+
+
+def relex(old_tokens, edit_start, edit_end, new_text):
+    """
+    Updates `old_tokens`, a `TokenBuffer` scanned with `offsets=True`, after
+    the source range `[edit_start, edit_end)` is replaced by `new_text`, and
+    returns it.
+
+    Scanning restarts right after the last token that ends before the edit
+    and stops as soon as a new lexeme starts where an old token that follows
+    the edit started, since everything from there on lexes the same way. The
+    tokens after that point are only shifted, and `TokenBuffer.splice` does
+    even that lazily.
+
+    Only that stretch of the edited source is ever built: it is read from
+    the buffer in windows that end on a line break, starting with
+    `RELEX_WINDOW` characters past the edit and doubling while no old token
+    has been reached, so the cost follows the size of the edit rather than
+    the size of the file.
+    """
+    buffer = old_tokens
+    if buffer.starts is None:
+        raise Exception('relex needs a TokenBuffer scanned with offsets=True')
+    source_length = buffer.source_length
+    if not 0 <= edit_start <= edit_end <= source_length:
+        raise Exception(f'Edit range {edit_start}..{edit_end} is outside the source')
+
+    offset_delta = len(new_text) - (edit_end - edit_start)
+    line_delta = new_text.count('\n') - buffer.text(edit_start, edit_end).count('\n')
+
+    lexer = Lexer(new_text)
+    first = buffer.find_end(edit_start)
+    restart = 0
+    if first > 0:
+        restart = buffer.end(first - 1)
+        lexer.line = buffer.line(first - 1)
+
+    resync_from = edit_start + len(new_text)
+    last = buffer.find_start(edit_end)
+    synced = False
+
+    def resynced(start):
+        nonlocal last, synced
+        start += base
+        if start < resync_from:
+            return False
+        while buffer.start(last) + offset_delta < start:
+            last += 1
+        synced = buffer.start(last) + offset_delta == start
+        return synced
+
+    tokens = []
+    span = [0, 0]
+    emit = lambda token_type, value, line: tokens.append((token_type, value, line, base + span[0], base + span[1]))
+
+    # `text` is the edited source from offset `base` on, up to the old
+    # source offset `read_from`.
+    base = restart
+    text = buffer.text(restart, edit_start) + new_text
+    read_from = edit_end
+    window = RELEX_WINDOW
+    while True:
+        if read_from < source_length:
+            text += buffer.text(read_from, read_from + window)
+            read_from = min(read_from + window, source_length)
+            window *= 2
+        final = read_from == source_length
+        cut = len(text) if final else text.rfind('\n') + 1
+        if cut == 0 and not final:
+            continue
+        scanned = text[:cut]
+        stop = lexer._scan_text(scanned, emit, final=final, lexemes=lexer._lexemes(scanned, 0, span, resynced))
+        if synced or final:
+            break
+        text = text[stop:]
+        base += stop
+
+    if not synced:
+        # Scanned to the end of the input: the old EOF token is replaced too.
+        last = len(buffer)
+        new_length = source_length + offset_delta
+        tokens.append((TokenType.EOF, None, lexer.line, new_length, new_length))
+
+    buffer.splice(first, last, tokens, offset_delta, line_delta)
+    buffer.replace_text(edit_start, edit_end, new_text)
+    return buffer
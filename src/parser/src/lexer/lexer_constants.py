@@ -19,3 +19,18 @@ SINGLE_CHAR_TOKENS = {
         ',': TokenType.COMMA,
         '.': TokenType.DOT,
     }
+
+WORD_TOKENS = {
+        **{keyword: TokenType.KEYWORD for keyword in KEYWORDS},
+        **{literal: TokenType.BOOLEAN for literal in BOOLEAN_LITERALS},
+    }
+OPERATOR_TOKENS = {
+        '++': TokenType.UNARY_OPERATOR,
+        '--': TokenType.UNARY_OPERATOR,
+        **{op: TokenType.ARITHMETIC_OPERATOR for op in ARITHMETIC_OPERATORS},
+        **{op: TokenType.RELATIONAL_OPERATOR for op in RELATIONAL_OPERATORS},
+        **{op: TokenType.ASSIGNMENT_OPERATOR for op in ASSIGNMENT_OPERATOR},
+        **{op: TokenType.LOGICAL_OPERATOR for op in LOGICAL_OPERATORS},
+        **{op: TokenType.BITWISE_OPERATOR for op in BITWISE_OPERATORS},
+        **SINGLE_CHAR_TOKENS,
+    }
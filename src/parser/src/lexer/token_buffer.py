@@ -0,0 +1,214 @@
+from array import array
+from bisect import bisect_right
+from ..tokens import Token, TOKEN_TYPES
+
+# The source text is kept in pieces of about this many characters, so an
+# edit only rebuilds the pieces it touches.
+SOURCE_PIECE_SIZE = 16 * 1024
+
+
+class TokenBuffer:
+    """
+    Compact, array-backed storage for a token stream.
+
+    Instead of one `Token` object per token, the kind of each token is stored
+    as its `TokenType` value in a byte array, its value as an index into a
+    table of interned values and its line number in a parallel array.
+    Indexing the buffer returns a lightweight `Token` view, so a `Parser` can
+    run directly on it.
+
+    With `offsets`, the start and end offset of each token's lexeme in
+    `source` are kept as well, which is what `relex` needs to update the
+    buffer after an edit. `relex` shifts the tokens that follow an edit
+    lazily: the offsets and lines stored from index `shift_from` onwards are
+    off by `shift_offset` and `shift_line`, and the accessors below add the
+    difference back.
+
+    `source` is stored as a list of pieces; `text` reads a range of it and
+    `replace_text` edits it without joining the whole source.
+    """
+    def __init__(self, offsets=False):
+        self.kinds = array('B')
+        self.values = array('I')
+        self.lines = array('i')
+        self.starts = array('i') if offsets else None
+        self.ends = array('i') if offsets else None
+        self.value_table = [None]
+        self.value_index = {None: 0}
+        self.pieces = None
+        self.piece_starts = None
+        self.source_length = 0
+        self.shift_from = 0
+        self.shift_offset = 0
+        self.shift_line = 0
+
+    def _intern(self, value):
+        index = self.value_index.get(value)
+        if index is None:
+            index = self.value_index[value] = len(self.value_table)
+            self.value_table.append(value)
+        return index
+
+    def append(self, token_type, value, line, start=0, end=0):
+        """Appends one token to the buffer."""
+        self.kinds.append(token_type._value_)
+        self.values.append(self._intern(value))
+        self.lines.append(line)
+        if self.starts is not None:
+            self.starts.append(start)
+            self.ends.append(end)
+
+    def extend(self, tokens):
+        """Appends `Token` objects to the buffer."""
+        for token in tokens:
+            self.append(token.type, token.value, token.line)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def source(self):
+        """The source text of the tokens, or None if it was not kept."""
+        return None if self.pieces is None else ''.join(self.pieces)
+
+    @source.setter
+    def source(self, text):
+        if text is None:
+            self.pieces = self.piece_starts = None
+            self.source_length = 0
+            return
+        self.pieces = [text[start:start + SOURCE_PIECE_SIZE]
+                       for start in range(0, len(text), SOURCE_PIECE_SIZE)] or ['']
+        self.piece_starts = list(range(0, len(text), SOURCE_PIECE_SIZE)) or [0]
+        self.source_length = len(text)
+
+    def text(self, start, end):
+        """Returns `source[start:end]`, reading only the pieces in that range."""
+        pieces, piece_starts = self.pieces, self.piece_starts
+        index = bisect_right(piece_starts, start) - 1
+        parts = []
+        while start < end and index < len(pieces):
+            piece_start = piece_starts[index]
+            parts.append(pieces[index][start - piece_start:end - piece_start])
+            start = piece_start + len(pieces[index])
+            index += 1
+        return ''.join(parts)
+
+    def replace_text(self, start, end, new_text):
+        """Replaces `source[start:end]` with `new_text`, rebuilding only the pieces it touches."""
+        pieces, piece_starts = self.pieces, self.piece_starts
+        first = bisect_right(piece_starts, start) - 1
+        last = bisect_right(piece_starts, end) - 1
+        text = (pieces[first][:start - piece_starts[first]] + new_text
+                + pieces[last][end - piece_starts[last]:])
+        if len(text) < 2 * SOURCE_PIECE_SIZE:
+            new_pieces = [text]
+        else:
+            new_pieces = [text[offset:offset + SOURCE_PIECE_SIZE]
+                          for offset in range(0, len(text), SOURCE_PIECE_SIZE)]
+        new_starts = []
+        offset = piece_starts[first]
+        for piece in new_pieces:
+            new_starts.append(offset)
+            offset += len(piece)
+
+        delta = len(new_text) - (end - start)
+        pieces[first:last + 1] = new_pieces
+        piece_starts[first:last + 1] = new_starts
+        for index in range(first + len(new_pieces), len(piece_starts)):
+            piece_starts[index] += delta
+        self.source_length += delta
+
+    def __getitem__(self, index):
+        """Returns a `Token` view of the token at `index`."""
+        if index < 0:
+            index += len(self.kinds)
+        return Token(TOKEN_TYPES[self.kinds[index]],
+                     self.value_table[self.values[index]],
+                     self.line(index))
+
+    def line(self, index):
+        """Returns the line number of the token at `index`."""
+        if index >= self.shift_from:
+            return self.lines[index] + self.shift_line
+        return self.lines[index]
+
+    def start(self, index):
+        """Returns the offset in `source` where the token at `index` starts."""
+        if index >= self.shift_from:
+            return self.starts[index] + self.shift_offset
+        return self.starts[index]
+
+    def end(self, index):
+        """Returns the offset in `source` just past the token at `index`."""
+        if index >= self.shift_from:
+            return self.ends[index] + self.shift_offset
+        return self.ends[index]
+
+    def find_end(self, offset):
+        """Returns the index of the first token that ends at or after `offset`."""
+        low, high = 0, len(self.kinds) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.end(middle) < offset:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find_start(self, offset):
+        """Returns the index of the first token that starts at or after `offset`."""
+        low, high = 0, len(self.kinds) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.start(middle) < offset:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def splice(self, first, last, tokens, offset_delta, line_delta):
+        """
+        Replaces the tokens in `[first, last)` with `tokens`, given as
+        `(token_type, value, line, start, end)` tuples, and shifts every
+        token after them by `offset_delta` characters and `line_delta` lines.
+
+        Only the tokens between the pending shift and the spliced range are
+        rewritten, so a run of nearby edits never touches the rest of the
+        buffer.
+        """
+        # Move the pending shift so that it starts right at `last`.
+        if self.shift_from < first:
+            self._add(self.shift_from, first, self.shift_offset, self.shift_line)
+        elif self.shift_from > last:
+            self._add(last, self.shift_from, -self.shift_offset, -self.shift_line)
+
+        kinds, values, lines = array('B'), array('I'), array('i')
+        starts, ends = array('i'), array('i')
+        for token_type, value, line, start, end in tokens:
+            kinds.append(token_type._value_)
+            values.append(self._intern(value))
+            lines.append(line)
+            starts.append(start)
+            ends.append(end)
+
+        self.kinds[first:last] = kinds
+        self.values[first:last] = values
+        self.lines[first:last] = lines
+        self.starts[first:last] = starts
+        self.ends[first:last] = ends
+
+        self.shift_from = first + len(tokens)
+        self.shift_offset += offset_delta
+        self.shift_line += line_delta
+
+    def _add(self, first, last, offset_delta, line_delta):
+        """Adds the deltas to the stored offsets and lines in `[first, last)`."""
+        starts, ends, lines = self.starts, self.ends, self.lines
+        for index in range(first, last):
+            starts[index] += offset_delta
+            ends[index] += offset_delta
+            lines[index] += line_delta
+
+    def __repr__(self):
+        return f'TokenBuffer({len(self)} tokens)'
@@ -1,53 +1,305 @@
+import io
+import os
 import sys
-import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from .lexer.lexer import Lexer
-from .parser.parser import Parser
+from .parser.stream_parser import StreamParser
 from .resolver.resolver import Resolver
+from .resolver.arena_resolver import ArenaResolver
+from .optimizer.optimizer import Optimizer, PASSES, INLINE_THRESHOLD
+from .nodes.arena import ArenaDictEmitter
+from .serializer.json_writer import JsonWriter
+from .serializer.binary_writer import CborWriter, MsgpackWriter
+from .cache.compile_cache import CompileCache
 
-def main(file_path):
+# Output formats: the writer for each one and whether its file is binary.
+OUTPUT_FORMATS = {
+    "json": (JsonWriter, False),
+    "cbor": (CborWriter, True),
+    "msgpack": (MsgpackWriter, True),
+}
+
+def remove_stale_outputs(build_dir, output_format):
+    """
+    Removes the AST files of the other output formats. The interpreter loads
+    whichever AST file exists, so output of earlier runs must not linger.
+    """
+    for other_format in OUTPUT_FORMATS:
+        if other_format != output_format:
+            stale_path = f"{build_dir}/ast_output.{other_format}"
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+
+def serialized_size(output_format, pretty):
+    """Returns a function giving the number of bytes a statement node takes in the output."""
+    writer_class, binary = OUTPUT_FORMATS[output_format]
+    def write(statements):
+        buffer = io.BytesIO() if binary else io.StringIO()
+        writer = writer_class(buffer) if binary else writer_class(buffer, pretty)
+        writer.write_statements(statements)
+        value = buffer.getvalue()
+        return len(value if binary else value.encode('utf-8'))
+    empty = write([])
+    return lambda node: write([node]) - empty
+
+def parse_source(source_file, use_arena):
+    """Streams tokens from `source_file` into the parser and returns the AST, or the arena."""
+    lexer = Lexer(source_file)
+    parser = StreamParser(lexer.iter_tokens())
+    return parser.parse_arena() if use_arena else parser.parse()
+
+def resolve(ast, use_arena):
+    if use_arena:
+        ArenaResolver(ast).resolve()
+    else:
+        Resolver().resolve(ast)
+
+def output_statements(ast, use_arena):
+    """Returns the statements to write: the AST's, or dictionaries built from the arena."""
+    if use_arena:
+        emitter = ArenaDictEmitter(ast)
+        return (emitter.visit(node_id) for node_id in ast.roots)
+    return ast
+
+def write_output(statements, output_path, output_format, pretty):
+    writer_class, binary = OUTPUT_FORMATS[output_format]
+    # Written next to the output and then renamed, so a cached artifact
+    # hard-linked at output_path is never overwritten in place.
+    temporary_path = f"{output_path}.tmp"
+    if binary:
+        with open(temporary_path, 'wb') as f:
+            writer_class(f).write_statements(statements)
+    else:
+        with open(temporary_path, 'w') as f:
+            writer_class(f, pretty).write_statements(statements)
+    os.replace(temporary_path, output_path)
+
+def main(file_path, use_arena=False, pretty=False, output_format="json", use_cache=True, optimize_level=1,
+         report=False, conservative=False, inline_threshold=INLINE_THRESHOLD):
     try:
-        with open(file_path, 'r') as f:
-            source_code = f.read()
+        source_file = open(file_path, 'r')
     except FileNotFoundError:
         print(f"Error: File {file_path} does not exist.")
         sys.exit(1)
 
-    # Lexer -- Read source code and produce tokens
-    lexer = Lexer(source_code)
-    tokens = lexer.scanTokens()
+    project_root = sys.path[0] 
+    build_dir = f"{project_root}/build"
+    output_path = f"{build_dir}/ast_output.{output_format}"
+    # The optimizer works on node objects, not on the arena.
+    if use_arena:
+        optimize_level = 0
+
+    # CACHE -- An unchanged source skips the Lexer, Parser and Resolver,
+    # unless the optimizer has to run for its report
+    if use_cache:
+        cache = CompileCache(f"{build_dir}/.komu-cache")
+        with open(file_path, 'rb') as source_bytes:
+            # The arena path builds its AST with different code, so its artifacts are kept apart.
+            cache_key = cache.key(source_bytes.read(), output_format, pretty, optimize_level, conservative,
+                                  inline_threshold, use_arena)
+        if not report and cache.fetch(cache_key, output_path):
+            source_file.close()
+            remove_stale_outputs(build_dir, output_format)
+            print(f"AST loaded from cache at {output_path}")
+            return
 
-    # Parser -- Check syntax and build AST
-    parser = Parser(tokens)
-    ast_nodes = parser.parse()
+    # Lexer and Parser -- Check syntax and build AST while tokens are produced
+    with source_file:
+        ast = parse_source(source_file, use_arena)
 
     # RESOLVER -- Semantic analysis and variable resolution
     try:
-        resolver = Resolver()
-        resolver.resolve(ast_nodes)
+        resolve(ast, use_arena)
         print("Resolver check passed.")
     except Exception as e:
         print(e) # Print resolver errors
         sys.exit(1)
 
-    # JSON Output
-    ast_json = [node.to_dict() for node in ast_nodes]
+    # OPTIMIZER -- Simplify the resolved AST
+    optimizer = Optimizer(optimize_level, conservative, inline_threshold)
+    optimizer.optimize(ast)
+    if report:
+        print(optimizer.report(serialized_size(output_format, pretty)))
 
-    project_root = sys.path[0] 
-    output_path = f"{project_root}/build/ast_output.json"
-    
+    # AST Output -- Written one statement at a time
     try:
-        with open(output_path, 'w') as f:
-            json.dump(ast_json, f, indent=4)
+        write_output(output_statements(ast, use_arena), output_path, output_format, pretty)
+        remove_stale_outputs(build_dir, output_format)
+        if use_cache:
+            cache.store(cache_key, output_path)
         print(f"AST successfully generated at {output_path}")
     except Exception as e:
-        print(f"Error writing AST to JSON: {e}")
+        print(f"Error writing AST to {output_format.upper()}: {e}")
         sys.exit(1)
 
 
+def find_sources(paths):
+    """
+    Returns the files to compile in batch mode: each path that is a file,
+    and the `.komu` files under each directory, without duplicates.
+    """
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, files in os.walk(path):
+                subdirectories.sort()
+                sources.extend(os.path.join(directory, name) for name in sorted(files) if name.endswith('.komu'))
+        else:
+            sources.append(path)
+    # Compared by absolute path, but kept as given, for the summary.
+    seen = set()
+    unique = []
+    for source in sources:
+        if os.path.abspath(source) not in seen:
+            seen.add(os.path.abspath(source))
+            unique.append(source)
+    return unique
+
+def output_paths(sources, output_dir, output_format):
+    """
+    Returns where each source's artifact goes: its path relative to the
+    directory all the sources share, under `output_dir`, with the format's
+    extension. Distinct sources never share an artifact.
+    """
+    if not sources:
+        return []
+    sources = [os.path.abspath(source) for source in sources]
+    root = os.path.commonpath([os.path.dirname(source) for source in sources])
+    return [os.path.join(output_dir, os.path.splitext(os.path.relpath(source, root))[0] + f".{output_format}")
+            for source in sources]
+
+def compile_one(file_path, output_path, options):
+    """
+    Compiles one file of a batch, in a worker process.
+
+    Returns (error, cached): the error message of a file that failed, or
+    None, and whether the artifact came from the cache. Nothing is
+    printed, so the workers' output does not interleave.
+    """
+    cache_dir = options['cache_dir']
+    try:
+        with open(file_path, 'rb') as source_bytes:
+            source = source_bytes.read()
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if cache_dir is not None:
+            cache = CompileCache(cache_dir)
+            cache_key = cache.key(source, options['output_format'], options['pretty'], options['optimize_level'],
+                                  options['conservative'], options['inline_threshold'], options['use_arena'])
+            if cache.fetch(cache_key, output_path):
+                return None, True
+
+        ast = parse_source(io.StringIO(source.decode('utf-8')), options['use_arena'])
+        resolve(ast, options['use_arena'])
+        Optimizer(options['optimize_level'], options['conservative'], options['inline_threshold']).optimize(ast)
+        write_output(output_statements(ast, options['use_arena']), output_path, options['output_format'],
+                     options['pretty'])
+        if cache_dir is not None:
+            # The batch evicts old entries once at the end, instead of
+            # every worker scanning the cache after every file.
+            cache.store(cache_key, output_path, evict=False)
+        return None, False
+    except Exception as e:
+        return str(e) or type(e).__name__, False
+
+def report_batch(sources, outputs, results):
+    """Prints a line per file as its result arrives; returns the numbers of files that failed and came from the cache."""
+    failed = cached = 0
+    for source, output, (error, from_cache) in zip(sources, outputs, results):
+        if error is None:
+            cached += from_cache
+            print(f"ok      {source} -> {output}{' (cached)' if from_cache else ''}")
+        else:
+            failed += 1
+            print(f"FAILED  {source}: {error}")
+    return failed, cached
+
+def compile_batch(paths, output_dir=None, jobs=None, use_arena=False, pretty=False, output_format="json",
+                  use_cache=True, optimize_level=1, conservative=False, inline_threshold=INLINE_THRESHOLD):
+    """
+    Compiles every file in `paths`, and the `.komu` files under the
+    directories in it, with `jobs` worker processes (default: one per CPU).
+
+    Each artifact is written under `output_dir`, `build/ast` by default, and
+    a line per file and a summary are printed. A file that fails does not
+    stop the others. Returns the number of files that failed.
+    """
+    build_dir = f"{sys.path[0]}/build"
+    output_dir = output_dir if output_dir is not None else f"{build_dir}/ast"
+    cache_dir = f"{build_dir}/.komu-cache" if use_cache else None
+    # The optimizer works on node objects, not on the arena.
+    if use_arena:
+        optimize_level = 0
+    options = {
+        'use_arena': use_arena, 'pretty': pretty, 'output_format': output_format, 'cache_dir': cache_dir,
+        'optimize_level': optimize_level, 'conservative': conservative, 'inline_threshold': inline_threshold,
+    }
+
+    sources = find_sources(paths)
+    outputs = output_paths(sources, output_dir, output_format)
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(sources) or 1))
+    start = time.perf_counter()
+    arguments = (sources, outputs, [options] * len(sources))
+    if jobs == 1:
+        results = map(compile_one, *arguments)
+        failed, cached = report_batch(sources, outputs, results)
+    else:
+        # Files are handed out in chunks, so that thousands of small files
+        # do not each cost a round trip to a worker.
+        with ProcessPoolExecutor(jobs) as executor:
+            results = executor.map(compile_one, *arguments, chunksize=max(1, len(sources) // (jobs * 8)))
+            failed, cached = report_batch(sources, outputs, results)
+    if cache_dir is not None and os.path.isdir(cache_dir):
+        CompileCache(cache_dir).evict()
+
+    print(f"{len(sources) - failed} compiled, {failed} failed ({cached} from cache) "
+          f"in {time.perf_counter() - start:.2f}s with {jobs} worker{'s' if jobs > 1 else ''}.")
+    return failed
+
+
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print("Usage: python3 -m src.parser.src.main <file_path.komu>")
-        sys.exit(1)
-    
-    file_path = sys.argv[1]
-    main(file_path)
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(prog="python3 -m src.parser.src.main")
+    arg_parser.add_argument("file_paths", nargs="+", metavar="file_path",
+                            help="the .komu source file to compile; several files or directories compile them all "
+                                 "in batch mode")
+    arg_parser.add_argument("--output-dir", metavar="DIR",
+                            help="compile in batch mode, writing one AST per source under DIR (default: build/ast)")
+    arg_parser.add_argument("-j", "--jobs", type=int, metavar="N",
+                            help="the number of worker processes in batch mode (default: one per CPU)")
+    arg_parser.add_argument("--arena", action="store_true",
+                            help="build the AST as a flat AstArena instead of node objects")
+    arg_parser.add_argument("--pretty", action="store_true",
+                            help="indent the JSON output instead of writing it compactly")
+    arg_parser.add_argument("--format", choices=OUTPUT_FORMATS, default="json",
+                            help="the AST output format (default: json)")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="always compile the source instead of reusing a cached AST")
+    arg_parser.add_argument("-O", type=int, choices=sorted(PASSES), default=1, dest="optimize_level",
+                            help="the optimization level (default: 1, constant folding, tail calls and dead code; "
+                                 "2 also inlines small missions and hoists loop-invariant expressions)")
+    arg_parser.add_argument("--no-optimize", action="store_const", const=0, dest="optimize_level",
+                            help="write the AST as parsed, the same as -O 0")
+    arg_parser.add_argument("--conservative", action="store_true",
+                            help="never move an evaluation across input or log calls when optimizing")
+    arg_parser.add_argument("--inline-threshold", type=int, default=INLINE_THRESHOLD, metavar="NODES",
+                            help="the size of the largest mission body inlined at -O 2, in nodes "
+                                 f"(default: {INLINE_THRESHOLD})")
+    arg_parser.add_argument("--report", action="store_true",
+                            help="print what the optimizer did, e.g. the unreachable missions it removed")
+    args = arg_parser.parse_args()
+
+    if args.output_dir is not None or len(args.file_paths) > 1 or os.path.isdir(args.file_paths[0]):
+        if args.report:
+            arg_parser.error("--report cannot be used in batch mode")
+        failed = compile_batch(args.file_paths, args.output_dir, args.jobs, use_arena=args.arena, pretty=args.pretty,
+                               output_format=args.format, use_cache=not args.no_cache,
+                               optimize_level=args.optimize_level, conservative=args.conservative,
+                               inline_threshold=args.inline_threshold)
+        sys.exit(1 if failed else 0)
+    if args.jobs is not None:
+        arg_parser.error("--jobs only applies to batch mode")
+
+    main(args.file_paths[0], use_arena=args.arena, pretty=args.pretty, output_format=args.format,
+         use_cache=not args.no_cache, optimize_level=args.optimize_level, report=args.report,
+         conservative=args.conservative, inline_threshold=args.inline_threshold)
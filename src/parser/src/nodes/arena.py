@@ -0,0 +1,486 @@
+"""Flat arena representation of the AST.
+
+Instead of one Python object per node, an `AstArena` keeps every node in a
+set of parallel arrays and refers to nodes by integer id. A node's children
+are a contiguous run of ids in a shared `children` array, and its operator,
+literal value or name is an index into an interned value table.
+
+Children are always added before their parent, so every child id is smaller
+than its parent's id. Walking the ids in increasing order therefore visits
+the tree bottom-up without any recursion.
+"""
+from array import array
+from enum import Enum, auto
+from types import GeneratorType
+
+from ..tokens import Token
+from .literal_nodes import NumberNode, StringNode, BooleanNode, IdentifierNode
+from .expression_nodes import (BinaryOpNode, RelationalOpNode, LogicalOpNode, BitwiseOpNode,
+                               UnaryOpNode, PostfixUnaryOpNode)
+from .statement_nodes import (VarAssignNode, AssignNode, MissionNode, MissionCallNode,
+                              ConditionalNode, WhileNode, ReturnNode)
+
+class NodeKind(Enum):
+    """
+    Kinds of arena nodes. `BLOCK` holds a list of statements (or a mission's
+    parameters) and `ELSE_IF` one `else if` branch of a conditional.
+
+    Children by kind:
+        leaves                      none
+        operators                   left, right
+        UNARY_OP, POSTFIX_UNARY_OP  operand
+        VAR, ASSIGN                 identifier, value
+        MISSION                     identifier, BLOCK of parameters, BLOCK body
+        MISSION_CALL                identifier, arguments...
+        CONDITIONAL                 condition, BLOCK body, ELSE_IF..., [BLOCK else body]
+        ELSE_IF, WHILE              condition, BLOCK body
+        RETURN                      value
+    """
+    NUMBER = auto()
+    STRING = auto()
+    BOOLEAN = auto()
+    IDENTIFIER = auto()
+    BINARY_OP = auto()
+    RELATIONAL_OP = auto()
+    LOGICAL_OP = auto()
+    BITWISE_OP = auto()
+    UNARY_OP = auto()
+    POSTFIX_UNARY_OP = auto()
+    VAR = auto()
+    ASSIGN = auto()
+    MISSION = auto()
+    MISSION_CALL = auto()
+    CONDITIONAL = auto()
+    ELSE_IF = auto()
+    WHILE = auto()
+    RETURN = auto()
+    BLOCK = auto()
+
+# NodeKind members indexed by their small-int value.
+NODE_KINDS = (None,) + tuple(NodeKind)
+
+LEAF_KINDS = {
+    NumberNode: NodeKind.NUMBER,
+    StringNode: NodeKind.STRING,
+    BooleanNode: NodeKind.BOOLEAN,
+    IdentifierNode: NodeKind.IDENTIFIER,
+}
+
+OPERATOR_KINDS = {
+    BinaryOpNode: NodeKind.BINARY_OP,
+    RelationalOpNode: NodeKind.RELATIONAL_OP,
+    LogicalOpNode: NodeKind.LOGICAL_OP,
+    BitwiseOpNode: NodeKind.BITWISE_OP,
+}
+
+
+class AstArena:
+    """
+    Stores AST nodes in parallel arrays addressed by integer ids.
+
+    `add_node` takes the same arguments as the node class constructors, with
+    child node ids in place of child nodes, so it can be handed to a parser
+    as its `build` hook.
+    """
+    def __init__(self):
+        self.kinds = array('B')
+        self.values = array('I')
+        self.lines = array('I')
+        self.child_starts = array('I')
+        self.child_ends = array('I')
+        self.children = array('I')
+        self.value_table = [None]
+        self.value_index = {None: 0}
+        self.roots = array('I')
+        # Set by `ArenaResolver`: the (depth, slot) of identifiers,
+        # declarations and assignments, the (frame size, captures) of
+        # missions, and the ids of tail calls, as on the node objects.
+        self.addresses = {}
+        self.frames = {}
+        self.tail_calls = set()
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, value, line, children=()):
+        """Appends a node and returns its id."""
+        index = self.value_index.get(value)
+        if index is None:
+            index = self.value_index[value] = len(self.value_table)
+            self.value_table.append(value)
+
+        node_id = len(self.kinds)
+        self.kinds.append(kind._value_)
+        self.values.append(index)
+        self.lines.append(line)
+        self.child_starts.append(len(self.children))
+        self.children.extend(children)
+        self.child_ends.append(len(self.children))
+        return node_id
+
+    def add_block(self, statements):
+        return self.add(NodeKind.BLOCK, None, 0, statements)
+
+    def add_node(self, node_class, *args):
+        """Adds the node that `node_class(*args)` would build and returns its id."""
+        kind = LEAF_KINDS.get(node_class)
+        if kind is not None:
+            token, = args
+            return self.add(kind, token.value, token.line)
+
+        kind = OPERATOR_KINDS.get(node_class)
+        if kind is not None:
+            left, operator_token, right = args
+            return self.add(kind, operator_token.value, operator_token.line, (left, right))
+
+        if node_class is UnaryOpNode:
+            operator_token, operand = args
+            return self.add(NodeKind.UNARY_OP, operator_token.value, operator_token.line, (operand,))
+        if node_class is PostfixUnaryOpNode:
+            operand, operator_token = args
+            return self.add(NodeKind.POSTFIX_UNARY_OP, operator_token.value, operator_token.line, (operand,))
+        if node_class is VarAssignNode or node_class is AssignNode:
+            identifier, value = args
+            kind = NodeKind.VAR if node_class is VarAssignNode else NodeKind.ASSIGN
+            return self.add(kind, None, self.lines[identifier], (identifier, value))
+        if node_class is MissionNode:
+            identifier, parameters, body = args
+            return self.add(NodeKind.MISSION, None, self.lines[identifier],
+                            (identifier, self.add_block(parameters or ()), self.add_block(body)))
+        if node_class is MissionCallNode:
+            identifier, arguments = args
+            return self.add(NodeKind.MISSION_CALL, None, self.lines[identifier], (identifier, *arguments))
+        if node_class is ConditionalNode:
+            condition, body, else_ifs, else_body = args
+            children = [condition, self.add_block(body)]
+            for else_if_condition, else_if_body in else_ifs or ():
+                children.append(self.add(NodeKind.ELSE_IF, None, self.lines[else_if_condition],
+                                         (else_if_condition, self.add_block(else_if_body))))
+            if else_body is not None:
+                children.append(self.add_block(else_body))
+            return self.add(NodeKind.CONDITIONAL, None, self.lines[condition], children)
+        if node_class is WhileNode:
+            condition, body = args
+            return self.add(NodeKind.WHILE, None, self.lines[condition], (condition, self.add_block(body)))
+        if node_class is ReturnNode:
+            value, = args
+            return self.add(NodeKind.RETURN, None, self.lines[value], (value,))
+
+        raise Exception(f'Cannot store {node_class.__name__} in an AstArena')
+
+    def kind(self, node_id):
+        return NODE_KINDS[self.kinds[node_id]]
+
+    def value(self, node_id):
+        """Returns the node's operator, literal value or name."""
+        return self.value_table[self.values[node_id]]
+
+    def line(self, node_id):
+        return self.lines[node_id]
+
+    def child_ids(self, node_id):
+        return self.children[self.child_starts[node_id]:self.child_ends[node_id]]
+
+
+def to_arena(ast_nodes):
+    """Converts a list of node objects into an `AstArena`."""
+    arena = AstArena()
+    ids = {}
+    stack = list(reversed(ast_nodes))
+    while stack:
+        node = stack[-1]
+        if id(node) in ids:
+            stack.pop()
+            continue
+
+        missing = []
+        def child_id(child):
+            node_id = ids.get(id(child))
+            if node_id is None:
+                missing.append(child)
+            return node_id
+
+        args = NODE_ARGS[type(node)](node, child_id)
+        if missing:
+            stack.extend(reversed(missing))
+            continue
+        stack.pop()
+        ids[id(node)] = arena.add_node(type(node), *args)
+
+    arena.roots.extend(ids[id(node)] for node in ast_nodes)
+    return arena
+
+
+def from_arena(arena):
+    """Converts an `AstArena` back into a list of node objects."""
+    nodes = []
+    for node_id in range(len(arena)):
+        nodes.append(NODE_BUILDERS[arena.kinds[node_id]](arena, node_id, nodes))
+    return [nodes[node_id] for node_id in arena.roots]
+
+
+def _token(value, line):
+    # Node constructors only read the value and line of their tokens.
+    return Token(None, value, line)
+
+def _statements(ids, convert):
+    return [convert(statement) for statement in ids]
+
+# Constructor arguments of each node class, with children passed through `convert`.
+NODE_ARGS = {
+    **{node_class: lambda node, convert: (_token(node.value, node.line),)
+       for node_class in (NumberNode, StringNode, BooleanNode)},
+    IdentifierNode: lambda node, convert: (_token(node.name, node.line),),
+    **{node_class: lambda node, convert: (convert(node.left_node), _token(node.operator, node.line),
+                                          convert(node.right_node))
+       for node_class in OPERATOR_KINDS},
+    UnaryOpNode: lambda node, convert: (_token(node.operator, node.line), convert(node.node)),
+    PostfixUnaryOpNode: lambda node, convert: (convert(node.node), _token(node.operator, node.line)),
+    VarAssignNode: lambda node, convert: (convert(node.identifier), convert(node.value)),
+    AssignNode: lambda node, convert: (convert(node.identifier), convert(node.value)),
+    MissionNode: lambda node, convert: (convert(node.identifier), _statements(node.parameter or (), convert),
+                                        _statements(node.body, convert)),
+    MissionCallNode: lambda node, convert: (convert(node.identifier), _statements(node.argument, convert)),
+    ConditionalNode: lambda node, convert: (
+        convert(node.if_condition), _statements(node.if_body, convert),
+        [(convert(condition), _statements(body, convert)) for condition, body in node.else_if_condition],
+        None if node.else_body is None else _statements(node.else_body, convert)),
+    WhileNode: lambda node, convert: (convert(node.condition), _statements(node.body, convert)),
+    ReturnNode: lambda node, convert: (convert(node.value),),
+}
+
+
+def _build_conditional(arena, node_id, nodes):
+    condition, body, *rest = arena.child_ids(node_id)
+    else_ifs = []
+    else_body = None
+    for child in rest:
+        if arena.kinds[child] == NodeKind.ELSE_IF._value_:
+            else_ifs.append(nodes[child])
+        else:
+            else_body = nodes[child]
+    return ConditionalNode(nodes[condition], nodes[body], else_ifs, else_body)
+
+def _build_mission(arena, node_id, nodes):
+    identifier, parameters, body = arena.child_ids(node_id)
+    return MissionNode(nodes[identifier], nodes[parameters], nodes[body])
+
+def _build_mission_call(arena, node_id, nodes):
+    identifier, *arguments = arena.child_ids(node_id)
+    return MissionCallNode(nodes[identifier], [nodes[argument] for argument in arguments])
+
+def _leaf_builder(node_class):
+    return lambda arena, node_id, nodes: node_class(_token(arena.value(node_id), arena.lines[node_id]))
+
+def _operator_builder(node_class):
+    def build(arena, node_id, nodes):
+        left, right = arena.child_ids(node_id)
+        return node_class(nodes[left], _token(arena.value(node_id), arena.lines[node_id]), nodes[right])
+    return build
+
+def _children_builder(build):
+    return lambda arena, node_id, nodes: build(*[nodes[child] for child in arena.child_ids(node_id)])
+
+# Builders that turn an arena node into a node object, given the objects
+# already built for all smaller ids, indexed by NodeKind value.
+NODE_BUILDERS = [None] * len(NODE_KINDS)
+for node_class, kind in LEAF_KINDS.items():
+    NODE_BUILDERS[kind._value_] = _leaf_builder(node_class)
+for node_class, kind in OPERATOR_KINDS.items():
+    NODE_BUILDERS[kind._value_] = _operator_builder(node_class)
+NODE_BUILDERS[NodeKind.UNARY_OP._value_] = lambda arena, node_id, nodes: UnaryOpNode(
+    _token(arena.value(node_id), arena.lines[node_id]), nodes[arena.child_ids(node_id)[0]])
+NODE_BUILDERS[NodeKind.POSTFIX_UNARY_OP._value_] = lambda arena, node_id, nodes: PostfixUnaryOpNode(
+    nodes[arena.child_ids(node_id)[0]], _token(arena.value(node_id), arena.lines[node_id]))
+NODE_BUILDERS[NodeKind.VAR._value_] = _children_builder(VarAssignNode)
+NODE_BUILDERS[NodeKind.ASSIGN._value_] = _children_builder(AssignNode)
+NODE_BUILDERS[NodeKind.MISSION._value_] = _build_mission
+NODE_BUILDERS[NodeKind.MISSION_CALL._value_] = _build_mission_call
+NODE_BUILDERS[NodeKind.CONDITIONAL._value_] = _build_conditional
+NODE_BUILDERS[NodeKind.ELSE_IF._value_] = _children_builder(lambda condition, body: (condition, body))
+NODE_BUILDERS[NodeKind.WHILE._value_] = _children_builder(WhileNode)
+NODE_BUILDERS[NodeKind.RETURN._value_] = _children_builder(ReturnNode)
+NODE_BUILDERS[NodeKind.BLOCK._value_] = _children_builder(lambda *statements: list(statements))
+
+
+class ArenaVisitor:
+    """
+    Base class for visitors over an `AstArena`.
+
+    `visit(node_id)` calls the `visit_<KIND>` method named after the node's
+    `NodeKind` (e.g. `visit_WHILE`), or `generic_visit` when there is none.
+    The methods are looked up once per visitor instance and indexed by kind.
+
+    As with `NodeVisitor`, a visit method is either a plain method or a
+    generator that yields the ids of the children it wants visited; each
+    `yield` evaluates to the result of visiting that child. Generators are
+    run from an explicit stack, so deep trees do not hit Python's recursion
+    limit.
+    """
+    def __init__(self, arena):
+        self.arena = arena
+        self.dispatch = [None] + [getattr(self, f'visit_{kind.name}', self.generic_visit)
+                                  for kind in NodeKind]
+
+    def visit(self, node_id):
+        dispatch = self.dispatch
+        kinds = self.arena.kinds
+        # The generators of the visits in progress, innermost last.
+        stack = []
+        result = dispatch[kinds[node_id]](node_id)
+        while True:
+            if type(result) is GeneratorType:
+                stack.append(result)
+                result = None
+            elif not stack:
+                return result
+            # Hand the result to the innermost generator and visit the
+            # child it yields next, or finish its visit.
+            try:
+                node_id = stack[-1].send(result)
+            except StopIteration as stop:
+                stack.pop()
+                result = stop.value
+                continue
+            result = dispatch[kinds[node_id]](node_id)
+
+    def generic_visit(self, node_id):
+        """Visits the node's children in order."""
+        for child in self.arena.child_ids(node_id):
+            yield child
+
+
+class ArenaDictEmitter(ArenaVisitor):
+    """
+    Emits the JSON-ready dictionaries that `to_dict` produces for the
+    equivalent node objects, straight from an `AstArena`, including the
+    addresses an `ArenaResolver` recorded.
+    """
+    def emit(self):
+        """Returns the dictionaries for the arena's top-level statements."""
+        return [self.visit(node_id) for node_id in self.arena.roots]
+
+    def visit_BLOCK(self, node_id):
+        statements = []
+        for child in self.arena.child_ids(node_id):
+            statements.append((yield child))
+        return statements
+
+    def _address(self, node_id, data):
+        address = self.arena.addresses.get(node_id)
+        if address is not None:
+            data["depth"], data["slot"] = address
+        return data
+
+    def visit_NUMBER(self, node_id):
+        value = self.arena.value(node_id)
+        return {"line": self.arena.lines[node_id], "type": "Number",
+                "value": float(value) if '.' in value else int(value)}
+
+    def visit_STRING(self, node_id):
+        return {"line": self.arena.lines[node_id], "type": "String", "value": self.arena.value(node_id)}
+
+    def visit_BOOLEAN(self, node_id):
+        return {"line": self.arena.lines[node_id], "type": "Boolean",
+                "value": True if self.arena.value(node_id) == 'true' else False}
+
+    def visit_IDENTIFIER(self, node_id):
+        return self._address(node_id, {"line": self.arena.lines[node_id], "type": "Identifier",
+                                       "name": self.arena.value(node_id)})
+
+    def _operator(self, node_id, node_type):
+        left, right = self.arena.child_ids(node_id)
+        data = {"line": self.arena.lines[node_id], "type": node_type, "operator": self.arena.value(node_id)}
+        data["left"] = yield left
+        data["right"] = yield right
+        return data
+
+    def visit_BINARY_OP(self, node_id):
+        return self._operator(node_id, "BinaryOp")
+
+    def visit_RELATIONAL_OP(self, node_id):
+        return self._operator(node_id, "RelationalOp")
+
+    def visit_LOGICAL_OP(self, node_id):
+        return self._operator(node_id, "LogicalOp")
+
+    def visit_BITWISE_OP(self, node_id):
+        return self._operator(node_id, "BitwiseOp")
+
+    def _unary(self, node_id, node_type):
+        operand, = self.arena.child_ids(node_id)
+        data = {"line": self.arena.lines[node_id], "type": node_type, "operator": self.arena.value(node_id)}
+        data["node"] = yield operand
+        return data
+
+    def visit_UNARY_OP(self, node_id):
+        return self._unary(node_id, "UnaryOp")
+
+    def visit_POSTFIX_UNARY_OP(self, node_id):
+        return self._unary(node_id, "PostfixUnaryOp")
+
+    def _assignment(self, node_id, node_type):
+        identifier, value = self.arena.child_ids(node_id)
+        data = self._address(node_id, {"line": self.arena.lines[node_id], "type": node_type,
+                                       "identifier": self.arena.value(identifier)})
+        data["value"] = yield value
+        return data
+
+    def visit_VAR(self, node_id):
+        return self._assignment(node_id, "Var")
+
+    def visit_ASSIGN(self, node_id):
+        return self._assignment(node_id, "Assign")
+
+    def visit_MISSION(self, node_id):
+        identifier, parameters, body = self.arena.child_ids(node_id)
+        data = {"line": self.arena.lines[node_id], "type": "Mission", "identifier": self.arena.value(identifier)}
+        if self.arena.child_starts[parameters] != self.arena.child_ends[parameters]:
+            data["parameter"] = yield parameters
+        frame = self.arena.frames.get(node_id)
+        if frame is not None:
+            data["frame_size"], captures = frame
+            data["captures"] = [{"name": name, "depth": depth, "slot": slot} for name, depth, slot in captures]
+        data["body"] = yield body
+        return data
+
+    def visit_MISSION_CALL(self, node_id):
+        identifier, *arguments = self.arena.child_ids(node_id)
+        data = {"line": self.arena.lines[node_id], "type": "MissionCall", "identifier": self.arena.value(identifier)}
+        if arguments:
+            data["argument"] = []
+            for argument in arguments:
+                data["argument"].append((yield argument))
+        if node_id in self.arena.tail_calls:
+            data["tail"] = True
+        return data
+
+    def visit_CONDITIONAL(self, node_id):
+        condition, body, *rest = self.arena.child_ids(node_id)
+        data = {"line": self.arena.lines[node_id], "type": "Conditional"}
+        data["if"] = {"condition": (yield condition), "body": (yield body)}
+        else_ifs = [child for child in rest if self.arena.kinds[child] == NodeKind.ELSE_IF._value_]
+        if else_ifs:
+            data["else_if"] = []
+            for child in else_ifs:
+                data["else_if"].append((yield child))
+        if rest and rest[-1] not in else_ifs:
+            else_body = yield rest[-1]
+            if else_body:
+                data["else"] = else_body
+        return data
+
+    def visit_ELSE_IF(self, node_id):
+        condition, body = self.arena.child_ids(node_id)
+        return {"condition": (yield condition), "body": (yield body)}
+
+    def visit_WHILE(self, node_id):
+        condition, body = self.arena.child_ids(node_id)
+        data = {"line": self.arena.lines[node_id], "type": "While"}
+        data["condition"] = yield condition
+        data["body"] = yield body
+        return data
+
+    def visit_RETURN(self, node_id):
+        value, = self.arena.child_ids(node_id)
+        return {"line": self.arena.lines[node_id], "type": "Return", "value": (yield value)}
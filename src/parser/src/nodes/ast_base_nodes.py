@@ -1,10 +1,17 @@
-"""AST Base Nodes Module"""
-from ..tokens import Token
+"""AST Base Nodes Module
+
+Nodes declare `__slots__` and copy what they need out of their tokens
+instead of keeping the tokens themselves. The parser shares identical
+leaf nodes; the only change made to one afterwards is the resolver's
+address on an identifier, and an identifier that needs a different
+address is copied rather than modified.
+"""
 
 class DataTypeNode:
     """Base class for data type nodes in the AST."""
+    __slots__ = ('value', 'line')
+
     def __init__(self, token):
-        self.token = token
         self.value = token.value
         self.line = token.line
 
@@ -20,20 +27,22 @@ class DataTypeNode:
 
 class OperatorNode:
     """Base class for operator nodes in the AST."""
+    __slots__ = ('left_node', 'operator', 'right_node', 'line')
+
     def __init__(self, left_node, operator_token, right_node):
         self.left_node = left_node
-        self.operator_token = operator_token
+        self.operator = operator_token.value
         self.right_node = right_node
         self.line = operator_token.line
 
     def __repr__(self):
-        return f'{self.__class__.__name__}({self.left_node}, {self.operator_token}, {self.right_node})'
+        return f'{self.__class__.__name__}({self.left_node}, {self.operator}, {self.right_node})'
     
     def to_dict(self):
         return {
             "line": self.line,
             "type": self.__class__.__name__,
-            "operator": self.operator_token.value,
+            "operator": self.operator,
             "left": self.left_node.to_dict(),
             "right": self.right_node.to_dict()
         }
\ No newline at end of file
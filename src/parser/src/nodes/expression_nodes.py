@@ -2,59 +2,71 @@
 from .ast_base_nodes import OperatorNode
 
 class BinaryOpNode(OperatorNode):
+    __slots__ = ()
+
     def to_dict(self):
         data = super().to_dict()
         data["type"] = "BinaryOp"
         return data
     
 class RelationalOpNode(OperatorNode):  
+    __slots__ = ()
+
     def to_dict(self):
         data = super().to_dict()
         data["type"] = "RelationalOp"
         return data
     
 class LogicalOpNode(OperatorNode):    
+    __slots__ = ()
+
     def to_dict(self):
         data = super().to_dict()
         data["type"] = "LogicalOp"
         return data
 
 class BitwiseOpNode(OperatorNode):   
+    __slots__ = ()
+
     def to_dict(self):
         data = super().to_dict()
         data["type"] = "BitwiseOp"
         return data
  
 class UnaryOpNode:
+    __slots__ = ('operator', 'node', 'line')
+
     def __init__(self, operator_token, node):
-        self.operator_token = operator_token
+        self.operator = operator_token.value
         self.node = node
         self.line = operator_token.line
 
     def __repr__(self):
-        return f'UnaryOpNode({self.operator_token}, {self.node})'
+        return f'UnaryOpNode({self.operator}, {self.node})'
     
     def to_dict(self):
         return {
             "line": self.line,
             "type": "UnaryOp",
-            "operator": self.operator_token.value,
+            "operator": self.operator,
             "node": self.node.to_dict()
         }
 
 class PostfixUnaryOpNode:
+    __slots__ = ('node', 'operator', 'line')
+
     def __init__(self, node, operator_token):
         self.node = node
-        self.operator_token = operator_token
+        self.operator = operator_token.value
         self.line = operator_token.line
 
     def __repr__(self):
-        return f'PostFixUnaryOpNode({self.node}, {self.operator_token})'
+        return f'PostFixUnaryOpNode({self.node}, {self.operator})'
     
     def to_dict(self):
         return {
             "line": self.line,
             "type": "PostfixUnaryOp",
-            "operator": self.operator_token.value,
+            "operator": self.operator,
             "node": self.node.to_dict()
         }
\ No newline at end of file
@@ -2,6 +2,8 @@
 from .ast_base_nodes import DataTypeNode
 
 class NumberNode(DataTypeNode):
+    __slots__ = ()
+
     def to_dict(self):
         data = super().to_dict()
         data["type"] = "Number"
@@ -10,12 +12,16 @@ class NumberNode(DataTypeNode):
     
         
 class StringNode(DataTypeNode):
+    __slots__ = ()
+
     def to_dict(self):
         data = super().to_dict()
         data["type"] = "String"
         return data
 
 class BooleanNode(DataTypeNode):
+    __slots__ = ()
+
     def to_dict(self):
         data = super().to_dict()
         data["type"] = "Boolean"
@@ -23,17 +29,23 @@ class BooleanNode(DataTypeNode):
         return data
 
 class IdentifierNode:
+    __slots__ = ('name', 'line', 'address')
+
     def __init__(self, token):
-        self.token = token 
         self.name = token.value
         self.line = token.line
+        # The (depth, slot) the resolver found for this variable, if any.
+        self.address = None
 
     def __repr__(self):
         return f'IdentifierNode({self.name})'
     
     def to_dict(self):
-        return {
+        data = {
             "line": self.line,
             "type": "Identifier",
             "name": self.name
-        }
\ No newline at end of file
+        }
+        if self.address is not None:
+            data["depth"], data["slot"] = self.address
+        return data
\ No newline at end of file
@@ -2,46 +2,69 @@
 from .literal_nodes import IdentifierNode
 
 class VarAssignNode:
+    __slots__ = ('identifier', 'value', 'line', 'address')
+
     def __init__(self, identifier, value):
         self.identifier = identifier
         self.value = value
         self.line = identifier.line
+        # The (depth, slot) the resolver found for the variable, if any.
+        self.address = None
 
     def __repr__(self):
         return f'VarAssignNode({self.identifier}, {self.value})'
     
     def to_dict(self):
-        return{
+        data = {
             "line": self.line,
             "type" : "Var",
-            "identifier": self.identifier.name,
-            "value": self.value.to_dict()
+            "identifier": self.identifier.name
         }
+        if self.address is not None:
+            data["depth"], data["slot"] = self.address
+        data["value"] = self.value.to_dict()
+        return data
     
 class AssignNode:
+    __slots__ = ('identifier', 'value', 'line', 'address')
+
     def __init__(self, identifier, value):
         self.identifier = identifier
         self.value = value
         self.line = identifier.line
+        # The (depth, slot) the resolver found for the variable, if any.
+        self.address = None
     
     def __repr__(self):
         return f'AssignNode({self.identifier}, {self.value})'
     
     def to_dict(self):
-        return {
+        data = {
             "line": self.line,
             "type": "Assign",
-            "identifier": self.identifier.name,
-            "value": self.value.to_dict()
+            "identifier": self.identifier.name
         }
+        if self.address is not None:
+            data["depth"], data["slot"] = self.address
+        data["value"] = self.value.to_dict()
+        return data
     
 class MissionNode:
+    __slots__ = ('identifier', 'value', 'line', 'parameter', 'body', 'frame_size', 'captures', 'pure')
+
     def __init__(self, identifier, parameter = None, body = None):
         self.identifier = identifier
         self.value = identifier.name
         self.line = identifier.line
         self.parameter = parameter
         self.body = body
+        # Set by the resolver: the number of slots in the mission's frame and
+        # the (name, depth, slot) of each outer variable it uses.
+        self.frame_size = None
+        self.captures = None
+        # Set by the optimizer's purity analysis on missions whose result
+        # depends only on their arguments.
+        self.pure = False
 
     def __repr__(self):
         if self.parameter:
@@ -50,30 +73,33 @@ class MissionNode:
             return f'MissionNode({self.identifier})'
     
     def to_dict(self):
+        data = {
+            "line": self.line,
+            "type": "Mission",
+            "identifier": self.identifier.name
+        }
         if self.parameter:
-            return {
-                "line": self.line,
-                "type": "Mission",
-                "identifier": self.identifier.name,
-                "parameter": [param.to_dict() for param in self.parameter],
-                "body": [stmt.to_dict() for stmt in self.body]
-                
-            }
-        else: 
-            return {
-                "line": self.line,
-                "type": "Mission",
-                "identifier": self.identifier.name,
-                "body": [stmt.to_dict() for stmt in self.body]
-            }
+            data["parameter"] = [param.to_dict() for param in self.parameter]
+        if self.frame_size is not None:
+            data["frame_size"] = self.frame_size
+            data["captures"] = [{"name": name, "depth": depth, "slot": slot}
+                                for name, depth, slot in self.captures]
+        if self.pure:
+            data["pure"] = True
+        data["body"] = [stmt.to_dict() for stmt in self.body]
+        return data
 
 
 class MissionCallNode:
+    __slots__ = ('identifier', 'value', 'line', 'argument', 'tail')
+
     def __init__(self, identifier, argument):
         self.identifier = identifier
         self.value = identifier.name
         self.line = identifier.line
         self.argument = argument
+        # Set by the resolver on a mission's calls to itself in tail position.
+        self.tail = False
 
     def __repr__(self):
         if self.argument:
@@ -83,21 +109,26 @@ class MissionCallNode:
     
     def to_dict(self):
         if self.argument:
-            return {
+            data = {
                 "line": self.line,
                 "type": "MissionCall",
                 "identifier": self.value,
                 "argument": [arg.to_dict() for arg in self.argument]
             }
         else: 
-            return {
+            data = {
                 "line": self.line,
                 "type": "MissionCall",
                 "identifier": self.value
             }
+        if self.tail:
+            data["tail"] = True
+        return data
 
 
 class ConditionalNode:
+    __slots__ = ('if_condition', 'if_body', 'else_if_condition', 'else_body')
+
     def __init__(self, if_condition, if_body, else_if_condition = None, else_body = None):
         self.if_condition = if_condition
         self.if_body = if_body
@@ -168,6 +199,8 @@ class ConditionalNode:
             }
         
 class WhileNode:
+    __slots__ = ('condition', 'body', 'line')
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
@@ -185,6 +218,8 @@ class WhileNode:
         }
     
 class ReturnNode:
+    __slots__ = ('value', 'line')
+
     def __init__(self, value):
         self.value = value
         self.line = value.line
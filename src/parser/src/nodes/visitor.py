@@ -0,0 +1,326 @@
+"""Visitor base classes for the AST node objects.
+
+`NodeVisitor` looks up each node class's `visit_<ClassName>` method once
+and keeps them in a dispatch table keyed by class. The top levels of a
+tree are visited by direct calls; below `MAX_RECURSION_DEPTH` levels the
+rest of a subtree is walked with an explicit stack, so the depth of the
+tree is not limited by Python's recursion limit.
+
+A visit method is either a plain method, whose return value is the result
+of the visit, or a generator. A generator yields the children it wants
+visited: a node, a list or tuple of them, or None, which is skipped. Each
+`yield` evaluates to the result of visiting what was yielded, and the
+generator's return value is the result of the visit. For example:
+
+    def visit_WhileNode(self, node):
+        yield node.condition
+        self.scope_stack.push()
+        yield node.body
+        self.scope_stack.pop()
+"""
+from inspect import isgeneratorfunction
+from operator import attrgetter
+from types import GeneratorType
+
+from .literal_nodes import NumberNode, StringNode, BooleanNode, IdentifierNode
+from .expression_nodes import (BinaryOpNode, RelationalOpNode, LogicalOpNode, BitwiseOpNode,
+                               UnaryOpNode, PostfixUnaryOpNode)
+from .statement_nodes import (VarAssignNode, AssignNode, MissionNode, MissionCallNode,
+                              ConditionalNode, WhileNode, ReturnNode)
+
+# The attributes of each node class that hold child nodes, in source order.
+# A field holds a node, a list of nodes, a list of (condition, body) tuples
+# for `else if` branches, or None.
+CHILD_FIELDS = {
+    NumberNode: (),
+    StringNode: (),
+    BooleanNode: (),
+    IdentifierNode: (),
+    BinaryOpNode: ('left_node', 'right_node'),
+    RelationalOpNode: ('left_node', 'right_node'),
+    LogicalOpNode: ('left_node', 'right_node'),
+    BitwiseOpNode: ('left_node', 'right_node'),
+    UnaryOpNode: ('node',),
+    PostfixUnaryOpNode: ('node',),
+    VarAssignNode: ('identifier', 'value'),
+    AssignNode: ('identifier', 'value'),
+    MissionNode: ('identifier', 'parameter', 'body'),
+    MissionCallNode: ('identifier', 'argument'),
+    ConditionalNode: ('if_condition', 'if_body', 'else_if_condition', 'else_body'),
+    WhileNode: ('condition', 'body'),
+    ReturnNode: ('value',),
+}
+
+# How many levels of nodes and lists `visit` descends by direct calls
+# before it walks the rest of a subtree with an explicit stack. Each level
+# takes one or two Python frames.
+MAX_RECURSION_DEPTH = 100
+
+# Marks a frame that has not received a result yet.
+_START = object()
+
+# Marks a frame that runs a generator visit method.
+_GENERATOR = object()
+
+class _TupleResults(list):
+    """Collects the results for the items of a tuple."""
+    __slots__ = ()
+
+class _ChildGetter:
+    """
+    Returns the children of a node whose class has no visit method. With
+    `write_back`, the results for the children are stored back into the
+    node's fields, as `NodeTransformer.generic_visit` does.
+    """
+    __slots__ = ('get', 'fields', 'write_back')
+
+    def __init__(self, fields, write_back=False):
+        get = attrgetter(*fields)
+        self.get = get if len(fields) > 1 else lambda node: (get(node),)
+        self.fields = fields
+        self.write_back = write_back
+
+
+def _no_children(node):
+    return None
+
+def _same_node(node):
+    return node
+
+
+def iter_child_nodes(node):
+    """Yields the direct child nodes of `node`, flattening lists and `else if` branches."""
+    for field in CHILD_FIELDS[type(node)]:
+        value = getattr(node, field)
+        if value is None:
+            continue
+        if type(value) is not list:
+            yield value
+            continue
+        for item in value:
+            if type(item) is tuple:
+                condition, body = item
+                yield condition
+                yield from body
+            else:
+                yield item
+
+
+class NodeVisitor:
+    """
+    Base class for visitors over AST node objects.
+
+    `visit(node)` calls the `visit_<ClassName>` method for the node's class
+    (e.g. `visit_WhileNode`), or `generic_visit` when there is none, and
+    returns its result. Lists and tuples can be visited too; their result is
+    a list or tuple of the results for their items. Subclasses that define
+    `__init__` must call `super().__init__()`.
+    """
+    def __init__(self):
+        self.dispatch = {}
+        # The plain (non-generator) visit methods, which `visit` can call
+        # directly while walking a list or resuming a generator.
+        self.plain_methods = {}
+        for node_class in CHILD_FIELDS:
+            self.add_method(node_class)
+
+    def add_method(self, node_class):
+        """
+        Adds the dispatch table entry for `node_class` and returns it: its
+        bound visit method or, when the class falls back to the default
+        `generic_visit`, the getter for its children, which `visit` walks
+        without calling a method.
+        """
+        method = getattr(self, f'visit_{node_class.__name__}', None)
+        if method is None:
+            generic_visit = type(self).generic_visit
+            if node_class not in CHILD_FIELDS:
+                method = self.generic_visit
+            elif generic_visit is NodeVisitor.generic_visit:
+                fields = CHILD_FIELDS[node_class]
+                method = _ChildGetter(fields) if fields else _no_children
+            elif generic_visit is NodeTransformer.generic_visit:
+                fields = CHILD_FIELDS[node_class]
+                method = _ChildGetter(fields, write_back=True) if fields else _same_node
+            else:
+                method = self.generic_visit
+        if not isinstance(method, _ChildGetter) and not isgeneratorfunction(method):
+            self.plain_methods[node_class] = method
+        self.dispatch[node_class] = method
+        return method
+
+    def generic_visit(self, node):
+        """Visits the node's children in order."""
+        for field in CHILD_FIELDS[type(node)]:
+            yield getattr(node, field)
+
+    def sequence_result(self, results, item, result):
+        """Adds the `result` of visiting `item` of a list to its `results`."""
+        results.append(result)
+
+    def visit(self, node):
+        return self._visit(node, 0)
+
+    def _visit(self, node, depth):
+        """Visits `node`, `depth` levels below the call to `visit`, by direct calls."""
+        if depth >= MAX_RECURSION_DEPTH:
+            return self._walk(node)
+        depth += 1
+        node_type = type(node)
+        method = self.dispatch.get(node_type)
+        if method is None:
+            if node_type is list:
+                results = []
+                if type(self).sequence_result is NodeVisitor.sequence_result:
+                    for item in node:
+                        results.append(self._visit(item, depth))
+                else:
+                    for item in node:
+                        self.sequence_result(results, item, self._visit(item, depth))
+                return results
+            if node_type is tuple:
+                return tuple([self._visit(item, depth) for item in node])
+            if node is None:
+                return None
+            self.add_method(node_type)
+            return self._visit(node, depth - 1)
+
+        if type(method) is _ChildGetter:
+            if method.write_back:
+                for field, child in zip(method.fields, method.get(node)):
+                    setattr(node, field, self._visit(child, depth))
+                return node
+            for child in method.get(node):
+                self._visit(child, depth)
+            return None
+
+        result = method(node)
+        if type(result) is GeneratorType:
+            try:
+                child = result.send(None)
+                while True:
+                    child = result.send(self._visit(child, depth))
+            except StopIteration as stop:
+                return stop.value
+        return result
+
+    def _walk(self, node):
+        """Visits `node` with an explicit stack instead of recursion."""
+        dispatch = self.dispatch
+        plain_methods = self.plain_methods
+        sequence_result = self.sequence_result
+        # Lists keep every result unless a subclass decides otherwise.
+        keep_all = type(self).sequence_result is NodeVisitor.sequence_result
+        # Each frame is [generator, _GENERATOR, None, None] for a visit
+        # method in progress, or [items, results, index, owner] for a list or
+        # tuple whose items are being visited. The results for a tuple are
+        # collected in a _TupleResults list; results of None means they are
+        # discarded. `owner` is the (node, fields) whose children the items
+        # are, when their results are to be written back.
+        stack = []
+        while True:
+            node_type = type(node)
+            method = dispatch.get(node_type)
+            if method is not None:
+                if type(method) is _ChildGetter:
+                    if method.write_back:
+                        stack.append([method.get(node), _TupleResults(), 0, (node, method.fields)])
+                    else:
+                        stack.append([method.get(node), None, 0, None])
+                    result = _START
+                else:
+                    result = method(node)
+                    if type(result) is GeneratorType:
+                        stack.append([result, _GENERATOR, None, None])
+                        result = _START
+            elif node_type is list:
+                stack.append([node, [], 0, None])
+                result = _START
+            elif node_type is tuple:
+                stack.append([node, _TupleResults(), 0, None])
+                result = _START
+            elif node is None:
+                result = None
+            else:
+                self.add_method(node_type)
+                continue
+
+            # Hand the result to the innermost frame until one of them has
+            # something new to visit. Items with plain visit methods are
+            # visited right here.
+            while stack:
+                frame = stack[-1]
+                items, results, index, owner = frame
+                if results is _GENERATOR:
+                    try:
+                        node = items.send(None if result is _START else result)
+                        method = plain_methods.get(type(node))
+                        while method is not None:
+                            node = items.send(method(node))
+                            method = plain_methods.get(type(node))
+                        break
+                    except StopIteration as stop:
+                        stack.pop()
+                        result = stop.value
+                        continue
+
+                if result is not _START and results is not None:
+                    if keep_all or type(results) is not list:
+                        results.append(result)
+                    else:
+                        sequence_result(results, items[index - 1], result)
+                while index < len(items):
+                    node = items[index]
+                    index += 1
+                    method = plain_methods.get(type(node))
+                    if method is None:
+                        frame[2] = index
+                        break
+                    result = method(node)
+                    if results is not None:
+                        if keep_all or type(results) is not list:
+                            results.append(result)
+                        else:
+                            sequence_result(results, node, result)
+                else:
+                    stack.pop()
+                    if owner is not None:
+                        result, fields = owner
+                        for field, value in zip(fields, results):
+                            setattr(result, field, value)
+                    elif results is None:
+                        result = None
+                    elif type(results) is list:
+                        result = results
+                    else:
+                        result = tuple(results)
+                    continue
+                break
+            else:
+                return result
+
+
+class NodeTransformer(NodeVisitor):
+    """
+    A `NodeVisitor` for passes that rewrite the tree.
+
+    The result of visiting a node replaces it. `generic_visit` stores the
+    results for the node's children back into its fields and returns the
+    node itself. In a list of nodes, a result of None removes the node and
+    a list splices its items in its place.
+    """
+    def generic_visit(self, node):
+        """Transforms the node's children in place and returns the node."""
+        for field in CHILD_FIELDS[type(node)]:
+            value = getattr(node, field)
+            if value is not None:
+                setattr(node, field, (yield value))
+        return node
+
+    def sequence_result(self, results, item, result):
+        if result is None:
+            return
+        if type(result) is list and type(item) is not list:
+            results.extend(result)
+        else:
+            results.append(result)
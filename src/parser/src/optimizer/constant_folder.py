@@ -0,0 +1,290 @@
+import math
+from ..nodes.literal_nodes import NumberNode, StringNode, BooleanNode
+from ..nodes.expression_nodes import BinaryOpNode, RelationalOpNode, LogicalOpNode, BitwiseOpNode
+from ..nodes.visitor import NodeTransformer
+
+# The interpreter evaluates expressions through a chain of functions, from
+# evaluate_logical_or down to evaluate_binary_expression. A function at one
+# of these levels handles the nodes of its level and below; a node of a
+# higher level is a runtime error there, e.g. `(1 | 2) & 3`.
+BINARY, RELATIONAL, BITWISE_AND, BITWISE_XOR, BITWISE_OR, LOGICAL_AND, LOGICAL_OR = range(7)
+
+# The level of the operators that are not evaluated by
+# evaluate_binary_expression.
+OPERATOR_LEVELS = {
+    '!': RELATIONAL,
+    '&': BITWISE_AND,
+    '^': BITWISE_XOR,
+    '|': BITWISE_OR,
+    '&&': LOGICAL_AND,
+    '||': LOGICAL_OR,
+}
+
+def node_level(node):
+    """Returns the lowest level of evaluate function that handles `node`."""
+    if type(node) is RelationalOpNode or type(node) is BooleanNode:
+        return RELATIONAL
+    return OPERATOR_LEVELS.get(getattr(node, 'operator', None), BINARY)
+
+def operand_level(node):
+    """Returns the level of the evaluate function that evaluates the operands of `node`."""
+    if type(node) is BinaryOpNode or type(node) is RelationalOpNode:
+        return BINARY
+    return OPERATOR_LEVELS.get(node.operator, BINARY)
+
+INT_MIN = -2**31
+INT_MAX = 2**31 - 1
+
+def _int(value):
+    """Returns `static_cast<int>(value)`, or None where the cast is undefined."""
+    if INT_MIN - 1 < value < INT_MAX + 1:
+        return int(value)
+    return None
+
+def _number(operator, left, right):
+    if operator == '+':
+        return left + right
+    if operator == '-':
+        return left - right
+    if operator == '*':
+        return left * right
+    if operator == '/':
+        return left / right if right != 0 else None
+    if operator == '%':
+        if right == 0:
+            return None
+        left, right = _int(left), _int(right)
+        if left is None or right is None or right == 0 or (left == INT_MIN and right == -1):
+            return None
+        # C++ `%` truncates towards zero, as fmod does, but gives an int,
+        # which has no negative zero.
+        return math.fmod(left, right) + 0.0
+    return None
+
+def _binary(operator, left, right):
+    if type(left) is float and type(right) is float:
+        return _number(operator, left, right)
+    if type(left) is str and type(right) is str and operator == '+':
+        return left + right
+    return None
+
+def _relational(operator, left, right):
+    if type(left) is float and type(right) is float:
+        if operator == '==': return left == right
+        if operator == '!=': return left != right
+        if operator == '<':  return left < right
+        if operator == '<=': return left <= right
+        if operator == '>':  return left > right
+        if operator == '>=': return left >= right
+        return None
+    if type(left) not in (float, str) or type(right) not in (float, str):
+        return None
+    # Strings compare with each other, and a number never equals a string.
+    if operator == '==':
+        return left == right
+    if operator == '!=':
+        return left != right
+    return None
+
+def _bitwise(operator, left, right):
+    if type(left) is not float or type(right) is not float:
+        return None
+    left, right = _int(left), _int(right)
+    if left is None or right is None:
+        return None
+    if operator == '&':
+        return float(left & right)
+    if operator == '^':
+        return float(left ^ right)
+    if operator == '|':
+        return float(left | right)
+    return None
+
+def _logical(operator, left, right):
+    if type(left) is not bool or type(right) is not bool:
+        return None
+    if operator == '&&':
+        return left and right
+    if operator == '||':
+        return left or right
+    return None
+
+FOLDS = {
+    BinaryOpNode: _binary,
+    RelationalOpNode: _relational,
+    BitwiseOpNode: _bitwise,
+    LogicalOpNode: _logical,
+}
+
+def _unary(operator, operand):
+    if operator == '!':
+        return (not operand) if type(operand) is bool else None
+    if type(operand) is not float:
+        return None
+    if operator == '-':
+        return -operand
+    if operator == '+':
+        return operand
+    if operator == '~':
+        operand = _int(operand)
+        return None if operand is None else float(~operand)
+    return None  # ++ and -- need a variable
+
+def _number_text(value):
+    """Returns the literal text for `value`, as NumberNode keeps it."""
+    negative_zero = value == 0 and math.copysign(1.0, value) < 0
+    if value.is_integer() and abs(value) < 2**53 and not negative_zero:
+        return str(int(value))
+    text = repr(value)
+    if '.' not in text:
+        # Exponent forms such as 1e+300 need a '.' to stay floats.
+        mantissa, exponent = text.split('e')
+        text = f"{mantissa}.0e{exponent}"
+    return text
+
+def literal_value(node):
+    """Returns the value of a literal node as the interpreter holds it, or None."""
+    node_type = type(node)
+    if node_type is NumberNode:
+        return float(node.value)
+    if node_type is StringNode:
+        return node.value
+    if node_type is BooleanNode:
+        return node.value == 'true'
+    return None
+
+def make_literal(value, line):
+    """Returns a new literal node holding `value`."""
+    if type(value) is bool:
+        node, text = BooleanNode.__new__(BooleanNode), 'true' if value else 'false'
+    elif type(value) is float:
+        node, text = NumberNode.__new__(NumberNode), _number_text(value)
+    else:
+        node, text = StringNode.__new__(StringNode), value
+    node.value, node.line = text, line
+    return node
+
+
+class ConstantFolder(NodeTransformer):
+    """
+    Folds operations on literals and removes branches that can never run.
+
+    Operators over literal operands are replaced by their result, computed
+    the way `interpreter.cpp` computes it: numbers are doubles, and `%` and
+    the bitwise operators cast their operands to `int`. Anything the
+    interpreter would reject at runtime (division by zero, mixing types, an
+    operand its evaluate function does not handle, a result that is not a
+    finite number) is left as it is, so the error still happens when the
+    program runs.
+
+    `if` and `else if` arms with a constant condition are pruned, and
+    `while (false)` loops are dropped.
+    """
+    def __init__(self):
+        super().__init__()
+        # The level of the evaluate function the node being visited is
+        # evaluated by. Every visit method leaves it as it found it.
+        self.context = LOGICAL_OR
+
+    def optimize(self, statements: list):
+        """Folds `statements` in place."""
+        statements[:] = self.visit(statements)
+
+    # --- Expressions ---
+
+    def visit_operator(self, node):
+        context = self.context
+        self.context = operand_level(node)
+        node.left_node = yield node.left_node
+        node.right_node = yield node.right_node
+        self.context = context
+        if node_level(node) > context:
+            return node
+        left, right = literal_value(node.left_node), literal_value(node.right_node)
+        if left is None or right is None:
+            return node
+        return self.fold(node, FOLDS[type(node)](node.operator, left, right))
+
+    visit_BinaryOpNode = visit_RelationalOpNode = visit_operator
+    visit_BitwiseOpNode = visit_LogicalOpNode = visit_operator
+
+    def visit_UnaryOpNode(self, node):
+        context = self.context
+        self.context = operand_level(node)
+        node.node = yield node.node
+        self.context = context
+        if node_level(node) > context:
+            return node
+        operand = literal_value(node.node)
+        if operand is None:
+            return node
+        return self.fold(node, _unary(node.operator, operand))
+
+    def visit_MissionCallNode(self, node):
+        """Arguments are evaluated as whole expressions."""
+        context = self.context
+        self.context = LOGICAL_OR
+        node.argument = yield node.argument
+        self.context = context
+        return node
+
+    @staticmethod
+    def fold(node, value):
+        """Returns a literal for `value`, or `node` if it could not be folded."""
+        if value is None or (type(value) is float and not math.isfinite(value)):
+            return node
+        return make_literal(value, node.line)
+
+    # --- Dead Branches ---
+
+    def visit_ConditionalNode(self, node):
+        """
+        Prunes arms whose condition is a boolean literal.
+
+        The interpreter only runs the `else` block of a conditional without
+        `else if` arms. Arms are pruned only where that makes no difference.
+        Returns the statements to run in place of the conditional when
+        only one arm can run.
+        """
+        node.if_condition = yield node.if_condition
+        node.if_body = yield node.if_body
+        node.else_if_condition = yield node.else_if_condition
+        node.else_body = yield node.else_body
+
+        live = []
+        for condition, body in [(node.if_condition, node.if_body)] + node.else_if_condition:
+            value = literal_value(condition)
+            if value is False:
+                continue
+            if value is True:
+                if not live:
+                    return body
+                # Nothing after an arm that always runs is reachable.
+                if len(live) == 1:
+                    node.if_condition, node.if_body = live[0]
+                    node.else_if_condition, node.else_body = [], body
+                else:
+                    live.append((condition, body))
+                    node.if_condition, node.if_body = live[0]
+                    node.else_if_condition, node.else_body = live[1:], None
+                return node
+            live.append((condition, body))
+
+        if len(live) == len(node.else_if_condition) + 1:
+            return node
+        if node.else_if_condition and node.else_body and len(live) < 2:
+            # Removing the last `else if` would let the `else` block run.
+            return node
+        if not live:
+            return node.else_body or []
+        node.if_condition, node.if_body = live[0]
+        node.else_if_condition = live[1:]
+        return node
+
+    def visit_WhileNode(self, node):
+        """Drops `while (false)` loops."""
+        node.condition = yield node.condition
+        if literal_value(node.condition) is False:
+            return None
+        node.body = yield node.body
+        return node
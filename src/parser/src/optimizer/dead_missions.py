@@ -0,0 +1,115 @@
+from ..nodes.visitor import NodeVisitor, NodeTransformer
+from ..resolver.scope_stack import NATIVES
+
+# The call graph node for code outside of any mission.
+TOP_LEVEL = None
+
+class CallGraph(NodeVisitor):
+    """
+    Records which missions each mission calls, by name.
+
+    The interpreter keeps missions in one map by name, so a call reaches
+    every mission defined under that name; definitions of the same name
+    share one node of the graph. Calls outside of any mission belong to
+    `TOP_LEVEL`, and calls in a nested mission belong to the nested one,
+    since its body only runs when it is called itself.
+    """
+    def __init__(self):
+        super().__init__()
+        # Mission name (or TOP_LEVEL) -> the set of names it calls.
+        self.calls = {TOP_LEVEL: set()}
+        self.callers = [TOP_LEVEL]
+
+    def build(self, statements: list):
+        self.visit(statements)
+        return self
+
+    def visit_MissionNode(self, node):
+        name = node.identifier.name
+        self.calls.setdefault(name, set())
+        self.callers.append(name)
+        yield node.body
+        self.callers.pop()
+
+    def visit_MissionCallNode(self, node):
+        self.calls[self.callers[-1]].add(node.identifier.name)
+        yield node.argument
+
+    def reaching(self, names):
+        """Returns the missions from which some chain of calls reaches one of `names`."""
+        callers = {}
+        for caller, callees in self.calls.items():
+            for callee in callees:
+                callers.setdefault(callee, []).append(caller)
+        reached = set()
+        pending = list(names)
+        while pending:
+            for caller in callers.get(pending.pop(), ()):
+                if caller is not TOP_LEVEL and caller not in reached:
+                    reached.add(caller)
+                    pending.append(caller)
+        return reached
+
+    def reachable(self):
+        """Returns the names reachable from top-level code, natives included."""
+        reached = set()
+        pending = [TOP_LEVEL]
+        while pending:
+            for callee in self.calls.get(pending.pop(), ()):
+                if callee not in reached:
+                    reached.add(callee)
+                    pending.append(callee)
+        return reached
+
+
+class DeadMissionEliminator(NodeTransformer):
+    """
+    Removes the missions that top-level code can never call.
+
+    The call graph's roots are the calls made by top-level code, natives
+    such as `logln` included; a mission is kept if some chain of calls from
+    there reaches its name. `entry_points` are the missions called from
+    outside the program, e.g. by batch mode, which are roots as well.
+    Removed definitions are kept in `removed` for the report.
+    """
+    options = ('entry_points',)
+
+    def __init__(self, entry_points=()):
+        super().__init__()
+        self.entry_points = entry_points
+        self.reachable = set()
+        self.removed = []
+
+    def optimize(self, statements: list):
+        """Removes unreachable missions from `statements` in place."""
+        graph = CallGraph().build(statements)
+        graph.calls[TOP_LEVEL].update(self.entry_points)
+        self.reachable = graph.reachable()
+        statements[:] = self.visit(statements)
+
+    def visit_MissionNode(self, node):
+        if node.identifier.name not in self.reachable:
+            self.removed.append(node)
+            return None
+        node.body = yield node.body
+        return node
+
+    # Expressions hold no mission definitions.
+    def visit_expression(self, node):
+        return node
+
+    visit_VarAssignNode = visit_AssignNode = visit_ReturnNode = visit_MissionCallNode = visit_expression
+
+    def report(self, size_of):
+        """
+        Returns a summary of the removed missions. `size_of(node)` is the
+        number of bytes the node takes in the output.
+        """
+        if not self.removed:
+            return "Dead mission elimination: every mission is reachable."
+        saved = sum(size_of(node) for node in self.removed)
+        names = ", ".join(f"{node.identifier.name} (line {node.line})" for node in self.removed)
+        natives = sorted(self.reachable.intersection(NATIVES))
+        return (f"Dead mission elimination: removed {len(self.removed)} unreachable "
+                f"mission{'s' if len(self.removed) != 1 else ''}, {saved} bytes saved: {names}. "
+                f"Natives called: {', '.join(natives) or 'none'}.")
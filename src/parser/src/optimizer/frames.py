@@ -0,0 +1,67 @@
+from ..nodes.literal_nodes import IdentifierNode
+from ..nodes.statement_nodes import VarAssignNode
+from ..nodes.visitor import NodeVisitor
+
+def make_identifier(name, line, address):
+    node = IdentifierNode.__new__(IdentifierNode)
+    node.name, node.line, node.address = name, line, address
+    return node
+
+def declaration(name, address, expression):
+    """Returns the declaration `var <name> = <expression>;` of a new variable."""
+    node = VarAssignNode.__new__(VarAssignNode)
+    node.identifier = make_identifier(name, expression.line, address)
+    node.value, node.line, node.address = expression, expression.line, address
+    return node
+
+
+class GlobalFrameSize(NodeVisitor):
+    """Finds the number of top-level slots, or None if the AST has no addresses."""
+    def __init__(self):
+        super().__init__()
+        self.size = 0
+
+    def count(self, statements):
+        self.visit(statements)
+        return self.size
+
+    def visit_MissionNode(self, node):
+        return None
+
+    def visit_VarAssignNode(self, node):
+        if node.address is None:
+            self.size = None
+        elif self.size is not None:
+            self.size = max(self.size, node.address[1] + 1)
+
+
+class FrameAllocator:
+    """
+    Gives the variables a pass adds the next free slots of their frame, so
+    the AST stays valid for the interpreter's frame mode.
+
+    The pass calls `enter(mission)` and `leave()` around each mission body
+    it visits; new variables go in the frame of the innermost one, and its
+    frame_size grows to match.
+    """
+    def __init__(self, statements):
+        # For the top level and each mission being visited: the mission
+        # node (None for the top level) and its next free slot.
+        self.frames = [[None, GlobalFrameSize().count(statements)]]
+
+    def enter(self, mission):
+        self.frames.append([mission, mission.frame_size])
+
+    def leave(self):
+        self.frames.pop()
+
+    def new_variable(self, name):
+        """Returns the name and address of a new variable in the current frame."""
+        frame = self.frames[-1]
+        mission, slot = frame
+        if slot is None:
+            return name, None
+        frame[1] += 1
+        if mission is not None:
+            mission.frame_size = frame[1]
+        return name, (0, slot)
@@ -0,0 +1,381 @@
+import copy
+from ..nodes.literal_nodes import IdentifierNode
+from ..nodes.expression_nodes import UnaryOpNode, PostfixUnaryOpNode
+from ..nodes.statement_nodes import (VarAssignNode, AssignNode, MissionNode, MissionCallNode, ConditionalNode,
+                                     WhileNode, ReturnNode)
+from ..nodes.visitor import CHILD_FIELDS, NodeVisitor, NodeTransformer, iter_child_nodes
+from ..resolver.scope_stack import NATIVES
+from .constant_folder import LOGICAL_OR, node_level, operand_level
+from .dead_missions import CallGraph
+from .frames import FrameAllocator, make_identifier, declaration
+from .loop_invariants import BOOLEAN, expression_type, frame_types
+
+# Prefix of the variables an inlined body gets in place of the mission's
+# parameters and locals: `$inline<n>_<name>` for the n-th inlined call.
+# Source identifiers cannot contain `$`, so these never clash with the
+# program's own names.
+INLINE_PREFIX = "$inline"
+
+# The largest mission body inlined by default, in nodes.
+INLINE_THRESHOLD = 40
+
+# The context of an expression evaluated as a statement of its own. It is
+# evaluated by evaluate_logical_or, like any other whole expression.
+STATEMENT = LOGICAL_OR + 1
+
+def walk(nodes):
+    """Yields every node in the trees in `nodes`."""
+    pending = list(nodes)
+    while pending:
+        node = pending.pop()
+        yield node
+        pending.extend(iter_child_nodes(node))
+
+def is_increment(node):
+    return type(node) in (UnaryOpNode, PostfixUnaryOpNode) and node.operator in ('++', '--')
+
+def cannot_fail(statements, variables):
+    """
+    Returns whether `statements` run without runtime errors, given the
+    frame's `variables` types. The value of a `return` is left out.
+    """
+    pending = list(statements)
+    while pending:
+        statement = pending.pop()
+        statement_type = type(statement)
+        if statement_type in (VarAssignNode, AssignNode):
+            if expression_type(variables, statement.value) is None:
+                return False
+        elif statement_type is ConditionalNode:
+            conditions = [statement.if_condition] + [condition for condition, body in statement.else_if_condition]
+            if any(expression_type(variables, condition) != BOOLEAN for condition in conditions):
+                return False
+            pending.extend(statement.if_body)
+            for condition, body in statement.else_if_condition:
+                pending.extend(body)
+            pending.extend(statement.else_body or ())
+        elif statement_type is WhileNode:
+            if expression_type(variables, statement.condition) != BOOLEAN:
+                return False
+            pending.extend(statement.body)
+        elif statement_type is not ReturnNode and expression_type(variables, statement) is None:
+            return False
+    return True
+
+
+class _Copier(NodeVisitor):
+    """
+    Copies a mission body for a call site, giving the variables named in
+    `renames` their `(name, address)` there and replacing those named in
+    `substitutes` with copies of the given expressions.
+
+    A substitute its evaluate function would reject where the parameter
+    stands sets `failed`, and the copy is not to be used.
+    """
+    def __init__(self, renames=None, substitutes=None):
+        super().__init__()
+        self.renames = renames or {}
+        self.substitutes = substitutes or {}
+        self.context = LOGICAL_OR
+        self.failed = False
+
+    def generic_visit(self, node):
+        node = copy.copy(node)
+        context = self.context
+        self.context = operand_level(node) if hasattr(node, 'operator') else LOGICAL_OR
+        for field in CHILD_FIELDS[type(node)]:
+            value = getattr(node, field)
+            if value is not None:
+                setattr(node, field, (yield value))
+        self.context = context
+        return node
+
+    def visit_IdentifierNode(self, node):
+        substitute = self.substitutes.get(node.name)
+        if substitute is not None:
+            if node_level(substitute) > self.context:
+                self.failed = True
+            return _Copier().visit(substitute)
+        renamed = self.renames.get(node.name)
+        if renamed is None:
+            return node
+        name, address = renamed
+        return make_identifier(name, node.line, address)
+
+    def visit_VarAssignNode(self, node):
+        node = yield from self.generic_visit(node)
+        node.address = node.identifier.address
+        return node
+
+    visit_AssignNode = visit_VarAssignNode
+
+    def visit_MissionCallNode(self, node):
+        """The called mission keeps its name, even if a variable shares it."""
+        node = copy.copy(node)
+        context, self.context = self.context, LOGICAL_OR
+        node.argument = yield node.argument
+        self.context = context
+        return node
+
+
+class MissionInliner(NodeTransformer):
+    """
+    Replaces calls to small missions with the missions' bodies.
+
+    A mission is inlined if its body has at most `inline_threshold` nodes,
+    it cannot call itself, directly or through other missions, it cannot
+    call `input` or `log`, it reads no variables from outside its own
+    frame and it defines no missions of its own. Its name must be defined
+    only once, since the interpreter calls missions by name.
+
+    A body that is a single `return` is substituted into the expression
+    of the call, with the arguments in place of the parameters, as long as
+    that evaluates them the same way: an argument used other than exactly
+    once must make no calls and be unable to fail, and at most one argument
+    may call a mission or fail. Otherwise, calls that make up a whole statement, or
+    a whole `var`, assignment or `return` value, are replaced by statements:
+    the arguments are declared as variables, the body follows, and its
+    final `return` becomes the value. The body may return nowhere else.
+    The arguments and the statements of the body must not be able to fail
+    at runtime, given the caller's variable types, as the loop hoister
+    works them out: the interpreter reports an error in a statement and
+    runs the next, where an error in the call stopped the whole statement
+    that made it. Only the returned value, which stays in that statement,
+    may fail.
+
+    The parameters and locals of an inlined body get new `$inline` names and
+    slots in the caller's frame, so they never clash with the caller's own.
+    A runtime error in an inlined expression is reported from the statement
+    that now holds it.
+    """
+    options = ('inline_threshold',)
+
+    def __init__(self, inline_threshold=INLINE_THRESHOLD):
+        super().__init__()
+        self.inline_threshold = inline_threshold
+        self.context = STATEMENT
+        self.frames = None
+        # The variable types of the top level and each mission being visited.
+        self.variables = []
+        # The number of `if` and `while` bodies around the node being
+        # visited, within the innermost mission.
+        self.blocks = 0
+        # The missions that may call input or log, and the natives themselves.
+        self.io_missions = set()
+        # The names of the missions that can be inlined, once visited.
+        self.inlinable = set()
+        self.missions = {}
+        # Mission name -> the number of calls to it that were inlined.
+        self.inlined = {}
+        self.count = 0
+
+    def optimize(self, statements: list):
+        """Inlines calls to small missions in `statements` in place."""
+        graph = CallGraph().build(statements)
+        self.io_missions = graph.reaching(NATIVES).union(NATIVES)
+        definitions = {}
+        for node in walk(statements):
+            if type(node) is MissionNode:
+                name = node.identifier.name
+                definitions[name] = definitions.get(name, 0) + 1
+        self.inlinable = {name for name, count in definitions.items()
+                          if count == 1 and name not in self.io_missions
+                          and name not in graph.reaching((name,))}
+        self.frames = FrameAllocator(statements)
+        self.variables = [frame_types(statements)]
+        statements[:] = self.visit(statements)
+
+    def candidate(self, call):
+        """Returns the mission `call` can be replaced with, or None."""
+        mission = self.missions.get(call.identifier.name)
+        if mission is None or len(mission.parameter or ()) != len(call.argument or ()):
+            return None
+        # Without frames, the interpreter discards the writes of `++` and
+        # `--` in arguments along with the mission's own.
+        if any(is_increment(child) for child in walk(call.argument or ())):
+            return None
+        return mission
+
+    # --- Statements ---
+
+    def visit_MissionNode(self, node):
+        blocks, self.blocks = self.blocks, 0
+        self.frames.enter(node)
+        self.variables.append(frame_types(node.body, node.parameter or ()))
+        node.body = yield node.body
+        self.variables.pop()
+        self.frames.leave()
+        self.blocks = blocks
+        name = node.identifier.name
+        # A mission defined in a block may not be defined when it is called.
+        if name not in self.inlinable or blocks or node.captures != [] or not node.body:
+            return node
+        size = 0
+        for child in walk(node.body):
+            size += 1
+            if type(child) is MissionNode or (type(child) is ReturnNode and child is not node.body[-1]):
+                return node
+        if size <= self.inline_threshold:
+            self.missions[name] = node
+        return node
+
+    def visit_value(self, node):
+        """Returns the statement, preceded by the body of a call making up its value."""
+        self.context = LOGICAL_OR
+        node.value = yield node.value
+        self.context = STATEMENT
+        if type(node.value) is not MissionCallNode:
+            return node
+        mission = self.candidate(node.value)
+        if mission is None or type(mission.body[-1]) is not ReturnNode or not self.can_split(node.value, mission):
+            return node
+        statements = self.inline_statements(node.value, mission)
+        node.value = statements.pop().value
+        statements.append(node)
+        return statements
+
+    visit_VarAssignNode = visit_AssignNode = visit_ReturnNode = visit_value
+
+    def visit_ConditionalNode(self, node):
+        self.context = LOGICAL_OR
+        node.if_condition = yield node.if_condition
+        self.context = STATEMENT
+        self.blocks += 1
+        node.if_body = yield node.if_body
+        else_ifs = []
+        for condition, body in node.else_if_condition:
+            self.context = LOGICAL_OR
+            condition = yield condition
+            self.context = STATEMENT
+            else_ifs.append((condition, (yield body)))
+        node.else_if_condition = else_ifs
+        node.else_body = yield node.else_body
+        self.blocks -= 1
+        return node
+
+    def visit_WhileNode(self, node):
+        self.context = LOGICAL_OR
+        node.condition = yield node.condition
+        self.context = STATEMENT
+        self.blocks += 1
+        node.body = yield node.body
+        self.blocks -= 1
+        return node
+
+    # --- Expressions ---
+
+    def visit_operator(self, node):
+        context = self.context
+        self.context = operand_level(node)
+        for field in CHILD_FIELDS[type(node)]:
+            setattr(node, field, (yield getattr(node, field)))
+        self.context = context
+        return node
+
+    visit_BinaryOpNode = visit_RelationalOpNode = visit_operator
+    visit_BitwiseOpNode = visit_LogicalOpNode = visit_operator
+    visit_UnaryOpNode = visit_PostfixUnaryOpNode = visit_operator
+
+    def visit_MissionCallNode(self, node):
+        context = self.context
+        self.context = LOGICAL_OR
+        node.argument = yield node.argument
+        self.context = context
+        mission = self.candidate(node)
+        if mission is None:
+            return node
+        expression = self.inline_expression(node, mission, context)
+        if expression is not None:
+            return expression
+        if context is not STATEMENT or not self.can_split(node, mission):
+            return node
+        # The returned value is unused, and cannot fail either.
+        last = mission.body[-1]
+        if type(last) is ReturnNode and expression_type(self.body_types(node, mission), last.value) is None:
+            return node
+        statements = self.inline_statements(node, mission)
+        if type(statements[-1]) is ReturnNode:
+            statements.pop()
+        return statements
+
+    def body_types(self, call, mission):
+        """Returns the variable types of the body of `mission`, run for `call`."""
+        argument_types = [expression_type(self.variables[-1], argument) for argument in call.argument or ()]
+        return frame_types(mission.body, mission.parameter or (), argument_types)
+
+    def can_split(self, call, mission):
+        """Returns whether the arguments of `call` and the statements of the body of `mission` cannot fail."""
+        if any(expression_type(self.variables[-1], argument) is None for argument in call.argument or ()):
+            return False
+        return cannot_fail(mission.body, self.body_types(call, mission))
+
+    def inline_expression(self, call, mission, context):
+        """
+        Returns the expression of a single-`return` body with the arguments
+        of `call` in place of the parameters, or None.
+        """
+        if len(mission.body) != 1 or type(mission.body[0]) is not ReturnNode:
+            return None
+        value = mission.body[0].value
+        if any(is_increment(child) for child in walk([value])):
+            return None
+
+        uses = {}
+        for child in walk([value]):
+            if type(child) is IdentifierNode:
+                uses[child.name] = uses.get(child.name, 0) + 1
+        substitutes = {}
+        calling = 0
+        for parameter, argument in zip(mission.parameter or (), call.argument or ()):
+            called = set()
+            for child in walk([argument]):
+                if type(child) is MissionCallNode:
+                    called.add(child.identifier.name)
+            if not self.io_missions.isdisjoint(called):
+                return None
+            # An argument that calls a mission or can fail must still be
+            # evaluated once, and the only one evaluated out of order.
+            if called or expression_type(self.variables[-1], argument) is None:
+                calling += 1
+                if uses.get(parameter.name, 0) != 1 or calling > 1:
+                    return None
+            substitutes[parameter.name] = argument
+
+        copier = _Copier(substitutes=substitutes)
+        copier.context = context
+        expression = copier.visit(value)
+        if copier.failed or node_level(expression) > context:
+            return None
+        self.record(mission)
+        return expression
+
+    def inline_statements(self, call, mission):
+        """
+        Returns the statements that run the body of `mission` for `call`:
+        the declarations of the parameters, then a copy of the body.
+        """
+        names = [parameter.name for parameter in mission.parameter or ()]
+        for child in walk(mission.body):
+            if type(child) is VarAssignNode and child.identifier.name not in names:
+                names.append(child.identifier.name)
+        renames = {name: self.frames.new_variable(f"{INLINE_PREFIX}{self.count}_{name}") for name in names}
+        statements = [declaration(*renames[parameter.name], argument)
+                      for parameter, argument in zip(mission.parameter or (), call.argument or ())]
+        statements.extend(_Copier(renames=renames).visit(mission.body))
+        self.record(mission)
+        return statements
+
+    def record(self, mission):
+        name = mission.identifier.name
+        self.inlined[name] = self.inlined.get(name, 0) + 1
+        self.count += 1
+
+    def report(self, size_of):
+        """Returns a summary of the inlined calls."""
+        if not self.inlined:
+            return "Inlining: no calls were inlined."
+        calls = sum(self.inlined.values())
+        names = ", ".join(f"{name} ({count} call{'s' if count != 1 else ''})"
+                          for name, count in self.inlined.items())
+        return (f"Inlining: inlined {calls} call{'s' if calls != 1 else ''} to "
+                f"{len(self.inlined)} mission{'s' if len(self.inlined) != 1 else ''}: {names}.")
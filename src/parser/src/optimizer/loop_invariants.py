@@ -0,0 +1,451 @@
+from ..nodes.literal_nodes import NumberNode, StringNode, BooleanNode, IdentifierNode
+from ..nodes.expression_nodes import BinaryOpNode, RelationalOpNode, LogicalOpNode, BitwiseOpNode, UnaryOpNode
+from ..nodes.visitor import NodeVisitor, NodeTransformer
+from ..resolver.scope_stack import NATIVES
+from .constant_folder import LOGICAL_OR, INT_MIN, INT_MAX, node_level, operand_level, literal_value
+from .dead_missions import CallGraph
+from .frames import FrameAllocator, make_identifier, declaration
+
+# Prefix of the temporaries holding hoisted values. Source identifiers
+# cannot contain `$`, so these never clash with the program's own names.
+TEMPORARY_PREFIX = "$invariant"
+
+# Nodes not worth a temporary of their own.
+LEAVES = (NumberNode, StringNode, BooleanNode, IdentifierNode)
+
+# The types of values an expression that cannot fail may have. ANY stands,
+# while variable types are worked out, for a variable not known yet.
+NUMBER, STRING, BOOLEAN, ANY = 'number', 'string', 'boolean', 'any'
+LITERAL_TYPES = {NumberNode: NUMBER, StringNode: STRING, BooleanNode: BOOLEAN}
+
+# The fields holding the operands of each operator node.
+OPERANDS = {
+    BinaryOpNode: ('left_node', 'right_node'),
+    RelationalOpNode: ('left_node', 'right_node'),
+    BitwiseOpNode: ('left_node', 'right_node'),
+    LogicalOpNode: ('left_node', 'right_node'),
+    UnaryOpNode: ('node',),
+}
+
+def operator_type(node, left, right):
+    """
+    Returns the type of the operator `node` if it cannot fail at runtime,
+    given the types of its operands (None for operands that can), or None.
+    """
+    context = operand_level(node)
+    if left is None or right is None or node_level(node.left_node) > context or node_level(node.right_node) > context:
+        return None
+    if left is ANY:
+        left = right
+    if right is ANY:
+        right = left
+    if left != right and node.operator not in ('==', '!='):
+        return None
+    node_type = type(node)
+    if node_type is RelationalOpNode:
+        return BOOLEAN if node.operator in ('==', '!=') or left in (NUMBER, ANY) else None
+    if node_type is LogicalOpNode:
+        return BOOLEAN if left in (BOOLEAN, ANY) else None
+    if node_type is BitwiseOpNode:
+        return NUMBER if left in (NUMBER, ANY) else None
+    if node.operator == '+' and left in (STRING, ANY):
+        return left
+    if left not in (NUMBER, ANY):
+        return None
+    if node.operator in ('+', '-', '*'):
+        return NUMBER
+    # Dividing fails on a zero divisor, so only a literal one is known not to.
+    divisor = literal_value(node.right_node)
+    if type(divisor) is not float:
+        return None
+    if node.operator == '/':
+        return NUMBER if divisor != 0 else None
+    if node.operator == '%' and INT_MIN - 1 < divisor < INT_MAX + 1 and int(divisor) not in (0, -1):
+        return NUMBER
+    return None
+
+def unary_type(node, operand):
+    """Returns the type of the unary operator `node` if it cannot fail, given its operand's type, or None."""
+    if operand is None or node_level(node.node) > operand_level(node):
+        return None
+    if node.operator == '!':
+        return BOOLEAN if operand in (BOOLEAN, ANY) else None
+    if node.operator in ('-', '+', '~'):
+        return NUMBER if operand in (NUMBER, ANY) else None
+    return None
+
+
+class _LoopEffects(NodeVisitor):
+    """
+    Collects the variables a loop writes and the missions it calls.
+
+    Missions defined in the loop are skipped: their bodies run in their own
+    frames. Calls write no variables of the caller, since the interpreter
+    discards a mission's writes when it returns.
+    """
+    def __init__(self):
+        super().__init__()
+        self.written = set()
+        self.called = set()
+
+    def visit_MissionNode(self, node):
+        return None
+
+    def visit_VarAssignNode(self, node):
+        self.written.add(node.identifier.name)
+        yield node.value
+
+    visit_AssignNode = visit_VarAssignNode
+
+    def visit_UnaryOpNode(self, node):
+        if node.operator in ('++', '--') and type(node.node) is IdentifierNode:
+            self.written.add(node.node.name)
+        yield node.node
+
+    visit_PostfixUnaryOpNode = visit_UnaryOpNode
+
+    def visit_MissionCallNode(self, node):
+        self.called.add(node.identifier.name)
+        yield node.argument
+
+
+class _ExpressionType(NodeVisitor):
+    """Returns the type of an expression that cannot fail at runtime, or None, given `variables`."""
+    def __init__(self, variables):
+        super().__init__()
+        self.variables = variables
+
+    def visit_literal(self, node):
+        return LITERAL_TYPES[type(node)]
+
+    visit_NumberNode = visit_StringNode = visit_BooleanNode = visit_literal
+
+    def visit_IdentifierNode(self, node):
+        return variable_type(self.variables, node)
+
+    def visit_operator(self, node):
+        left = yield node.left_node
+        right = yield node.right_node
+        return operator_type(node, left, right)
+
+    visit_BinaryOpNode = visit_RelationalOpNode = visit_operator
+    visit_BitwiseOpNode = visit_LogicalOpNode = visit_operator
+
+    def visit_UnaryOpNode(self, node):
+        return unary_type(node, (yield node.node))
+
+    def visit_PostfixUnaryOpNode(self, node):
+        return None
+
+    visit_MissionCallNode = visit_PostfixUnaryOpNode
+
+
+def expression_type(variables, node):
+    """Returns the type of `node` if it cannot fail at runtime, given the frame's `variables`, or None."""
+    return _ExpressionType(variables).visit(node)
+
+def frame_types(statements, parameters=(), parameter_types=None):
+    """Returns the types of the variables of the frame running `statements`; see `_FrameTypes`."""
+    return _FrameTypes().infer(statements, parameters, parameter_types)
+
+def variable_type(variables, node):
+    """Returns the type the variable read by `node` always has, or None. Outer variables are not known."""
+    if node.address is None or node.address[0] != 0:
+        return None
+    return variables.get((node.name, node.address))
+
+
+class _FrameTypes(NodeVisitor):
+    """
+    Works out which variables of a frame always hold a value of one type.
+
+    A variable has a type if every declaration of and assignment to it in
+    the frame is an expression of that type that cannot fail, so it is
+    never left undefined either. Outer variables have none, and parameters
+    only the types they are given, as when a body is inlined for one call.
+    Missions defined in the frame are skipped, as in `_LoopEffects`.
+    """
+    def __init__(self):
+        super().__init__()
+        # (name, address) -> the expressions, or types, written to it.
+        self.writes = {}
+
+    def infer(self, statements, parameters=(), parameter_types=None):
+        """
+        Returns the types of the variables of the frame running `statements`,
+        by (name, address). `parameter_types` are the types of the values of
+        the `parameters`, None where it is not known.
+        """
+        for index, parameter in enumerate(parameters):
+            self.write(parameter.name, parameter.address, parameter_types[index] if parameter_types else None)
+        self.visit(statements)
+        # Every variable starts as ANY and is narrowed until nothing changes;
+        # variables still ANY then, only ever written from one another, are
+        # not known after all.
+        variables = dict.fromkeys(self.writes, ANY)
+        self.narrow(variables)
+        for key, value in variables.items():
+            if value is ANY:
+                variables[key] = None
+        self.narrow(variables)
+        return variables
+
+    def narrow(self, variables):
+        changed = True
+        while changed:
+            changed = False
+            for key, values in self.writes.items():
+                result = ANY
+                for value in values:
+                    if value is not None and type(value) is not str:
+                        value = expression_type(variables, value)
+                    if value is None or (result is not ANY and value is not ANY and value != result):
+                        result = None
+                        break
+                    if value is not ANY:
+                        result = value
+                if result != variables[key]:
+                    variables[key] = result
+                    changed = True
+
+    def write(self, name, address, value):
+        self.writes.setdefault((name, address), []).append(value)
+
+    def visit_MissionNode(self, node):
+        return None
+
+    def visit_VarAssignNode(self, node):
+        self.write(node.identifier.name, node.address, node.value)
+        yield node.value
+
+    visit_AssignNode = visit_VarAssignNode
+
+    def visit_UnaryOpNode(self, node):
+        if node.operator in ('++', '--') and type(node.node) is IdentifierNode:
+            # A number stays a number; on anything else the operator fails and writes nothing.
+            self.write(node.node.name, node.node.address, NUMBER)
+        yield node.node
+
+    visit_PostfixUnaryOpNode = visit_UnaryOpNode
+
+
+class _LoopHoister(NodeTransformer):
+    """
+    Replaces the invariant sub-expressions of one loop with temporaries.
+
+    An expression is invariant if it only reads variables the loop never
+    writes and makes no calls and no `++`/`--`. The largest invariant
+    expressions that are not a single literal or variable, and that cannot
+    fail at runtime given the frame's `variables` types, are hoisted;
+    equal ones share a temporary. The temporaries' declarations are added
+    to `declarations`; `new_temporary()` returns the `(name, address)` of
+    a new one. The temporary of an inner loop whose value is invariant
+    here moves out as it is.
+    """
+    def __init__(self, written, variables, new_temporary, declarations):
+        super().__init__()
+        self.written = written
+        self.variables = variables
+        self.new_temporary = new_temporary
+        self.declarations = declarations
+        # id(node) -> a key describing the invariant expression, equal for
+        # equal expressions. Nodes that are not invariant have none.
+        self.keys = {}
+        # id(node) -> the type of an invariant expression that cannot fail.
+        self.types = {}
+        self.temporaries = {}
+
+    def hoist(self, node, context):
+        """
+        Returns the temporary to use in place of `node`, evaluated by an
+        evaluate function of level `context`, or `node` itself.
+
+        An invariant expression that can fail, say `10 / d`, stays where it
+        is, so the error happens only if and when the loop gets to it; its
+        operands that cannot fail are hoisted instead.
+        """
+        replacement = self.temporary(node, context)
+        if replacement is not node or id(node) not in self.keys or type(node) in LEAVES or node_level(node) > context:
+            return replacement
+        pending = [node]
+        while pending:
+            parent = pending.pop()
+            context = operand_level(parent)
+            for field in OPERANDS[type(parent)]:
+                operand = getattr(parent, field)
+                replacement = self.temporary(operand, context)
+                setattr(parent, field, replacement)
+                if (replacement is operand and id(operand) in self.keys and type(operand) not in LEAVES
+                        and node_level(operand) <= context):
+                    pending.append(operand)
+        return node
+
+    def temporary(self, node, context):
+        """Returns the temporary holding `node`, if it can be hoisted, or `node` itself."""
+        key = self.keys.get(id(node))
+        # An operand its evaluate function rejects stays, so the error does.
+        if key is None or type(node) in LEAVES or node_level(node) > context or id(node) not in self.types:
+            return node
+        temporary = self.temporaries.get(key)
+        if temporary is None:
+            temporary = self.temporaries[key] = self.new_temporary()
+            self.declarations.append(declaration(*temporary, node))
+        name, address = temporary
+        return make_identifier(name, node.line, address)
+
+    # --- Expressions ---
+
+    def visit_literal(self, node):
+        self.keys[id(node)] = (type(node).__name__, node.value)
+        self.types[id(node)] = LITERAL_TYPES[type(node)]
+        return node
+
+    visit_NumberNode = visit_StringNode = visit_BooleanNode = visit_literal
+
+    def visit_IdentifierNode(self, node):
+        if node.name not in self.written:
+            self.keys[id(node)] = ('Identifier', node.name, node.address)
+            value_type = variable_type(self.variables, node)
+            if value_type is not None:
+                self.types[id(node)] = value_type
+        return node
+
+    def visit_operator(self, node):
+        node.left_node = yield node.left_node
+        node.right_node = yield node.right_node
+        left, right = self.keys.get(id(node.left_node)), self.keys.get(id(node.right_node))
+        if left is not None and right is not None:
+            self.keys[id(node)] = (type(node).__name__, node.operator, left, right)
+            value_type = operator_type(node, self.types.get(id(node.left_node)), self.types.get(id(node.right_node)))
+            if value_type is not None:
+                self.types[id(node)] = value_type
+        else:
+            context = operand_level(node)
+            node.left_node = self.hoist(node.left_node, context)
+            node.right_node = self.hoist(node.right_node, context)
+        return node
+
+    visit_BinaryOpNode = visit_RelationalOpNode = visit_operator
+    visit_BitwiseOpNode = visit_LogicalOpNode = visit_operator
+
+    def visit_UnaryOpNode(self, node):
+        node.node = yield node.node
+        if node.operator in ('++', '--'):
+            # A temporary in place of the operand would make a valid
+            # target of what fails on an expression.
+            return node
+        operand = self.keys.get(id(node.node))
+        if operand is not None:
+            self.keys[id(node)] = ('UnaryOp', node.operator, operand)
+            value_type = unary_type(node, self.types.get(id(node.node)))
+            if value_type is not None:
+                self.types[id(node)] = value_type
+        else:
+            node.node = self.hoist(node.node, operand_level(node))
+        return node
+
+    def visit_PostfixUnaryOpNode(self, node):
+        return node
+
+    def visit_MissionCallNode(self, node):
+        arguments = yield node.argument
+        node.argument = [self.hoist(argument, LOGICAL_OR) for argument in arguments]
+        return node
+
+    # --- Statements ---
+
+    def visit_VarAssignNode(self, node):
+        node.value = yield node.value
+        if node.identifier.name.startswith(TEMPORARY_PREFIX) and id(node.value) in self.types:
+            self.declarations.append(node)
+            return None
+        node.value = self.hoist(node.value, LOGICAL_OR)
+        return node
+
+    def visit_AssignNode(self, node):
+        node.value = self.hoist((yield node.value), LOGICAL_OR)
+        return node
+
+    visit_ReturnNode = visit_AssignNode
+
+    def visit_ConditionalNode(self, node):
+        node.if_condition = self.hoist((yield node.if_condition), LOGICAL_OR)
+        node.if_body = yield node.if_body
+        else_ifs = yield node.else_if_condition
+        node.else_if_condition = [(self.hoist(condition, LOGICAL_OR), body) for condition, body in else_ifs]
+        node.else_body = yield node.else_body
+        return node
+
+    def visit_WhileNode(self, node):
+        node.condition = self.hoist((yield node.condition), LOGICAL_OR)
+        node.body = yield node.body
+        return node
+
+    def visit_MissionNode(self, node):
+        return node
+
+
+class LoopInvariantHoister(NodeTransformer):
+    """
+    Hoists loop-invariant expressions out of `while` loops.
+
+    Each hoisted expression is computed once, into a temporary declared
+    just before the loop, instead of on every iteration; inner loops are
+    done first, so an expression can move out of several loops. Hoisted
+    expressions have no side effects and cannot fail: their operands have
+    known types and divisors are non-zero literals. Computing one before a
+    loop that would not have, because the loop never runs or a guard skips
+    it, therefore changes nothing. With `conservative`, loops that call
+    `input` or `log`, directly or through a mission, are left alone, so no
+    evaluation moves across them.
+
+    Temporaries get the next free slot of their frame, so the AST stays
+    valid for the interpreter's frame mode.
+    """
+    options = ('conservative',)
+
+    def __init__(self, conservative=False):
+        super().__init__()
+        self.conservative = conservative
+        # The missions that may call input or log, and the natives themselves.
+        self.io_missions = set()
+        self.frames = None
+        # The variable types of the top level and each mission being visited.
+        self.variables = []
+        self.count = 0
+
+    def optimize(self, statements: list):
+        """Hoists invariant expressions out of the loops in `statements` in place."""
+        self.io_missions = CallGraph().build(statements).reaching(NATIVES).union(NATIVES)
+        self.frames = FrameAllocator(statements)
+        self.variables = [frame_types(statements)]
+        statements[:] = self.visit(statements)
+
+    def visit_MissionNode(self, node):
+        self.frames.enter(node)
+        self.variables.append(frame_types(node.body, node.parameter or ()))
+        node.body = yield node.body
+        self.variables.pop()
+        self.frames.leave()
+        return node
+
+    def visit_WhileNode(self, node):
+        """Returns the loop, preceded by the declarations of its temporaries."""
+        node.body = yield node.body
+        effects = _LoopEffects()
+        effects.visit(node)
+        if self.conservative and not self.io_missions.isdisjoint(effects.called):
+            return node
+
+        declarations = []
+        _LoopHoister(effects.written, self.variables[-1], self.new_temporary, declarations).visit(node)
+        if not declarations:
+            return node
+        declarations.append(node)
+        return declarations
+
+    def new_temporary(self):
+        """Returns the name and address of a new temporary in the current frame."""
+        name = f"{TEMPORARY_PREFIX}{self.count}"
+        self.count += 1
+        return self.frames.new_variable(name)
@@ -0,0 +1,57 @@
+from .constant_folder import ConstantFolder
+from .dead_missions import DeadMissionEliminator
+from .loop_invariants import LoopInvariantHoister
+from .inliner import MissionInliner, INLINE_THRESHOLD
+from .tail_calls import TailCallEliminator
+from .purity import PurityAnalyzer
+
+# The passes run at each optimization level, in order. Constant folding
+# goes first, so calls in branches it prunes no longer keep missions alive.
+# At level 2 it runs again after inlining, to fold the arguments that were
+# substituted into inlined expressions, and the missions no call is left
+# to are then removed. Tail calls are rewritten before inlining and hoisting,
+# so the loops they become are optimized like any other. Purity is analyzed
+# last, on the missions as they are written out.
+PASSES = {
+    0: (),
+    1: (ConstantFolder, TailCallEliminator, DeadMissionEliminator, PurityAnalyzer),
+    2: (ConstantFolder, TailCallEliminator, MissionInliner, ConstantFolder, DeadMissionEliminator,
+        LoopInvariantHoister, PurityAnalyzer),
+}
+
+class Optimizer:
+    """
+    Runs the optimization passes for an `-O` level over the resolved AST.
+
+    Each pass is a `NodeTransformer` whose `optimize(statements)` rewrites
+    the list of top-level statements in place, or a `NodeVisitor` whose
+    `optimize(statements)` only annotates the nodes. Passes with something to
+    tell about what they did have a `report(size_of)` method, and passes
+    with settings list the Optimizer attributes they take in `options`.
+
+    With `conservative`, no evaluation is moved across `input` or `log`
+    calls. `inline_threshold` is the size, in nodes, of the largest mission
+    body that is inlined. `entry_points` names the missions that are called
+    from outside the program, which are kept even if it never calls them.
+    """
+    def __init__(self, level=1, conservative=False, inline_threshold=INLINE_THRESHOLD, entry_points=()):
+        self.level = level
+        self.conservative = conservative
+        self.inline_threshold = inline_threshold
+        self.entry_points = tuple(entry_points)
+        self.passes = []
+
+    def optimize(self, statements: list):
+        for pass_class in PASSES[self.level]:
+            options = {name: getattr(self, name) for name in getattr(pass_class, "options", ())}
+            optimization_pass = pass_class(**options)
+            optimization_pass.optimize(statements)
+            self.passes.append(optimization_pass)
+
+    def report(self, size_of):
+        """
+        Returns the reports of the passes that ran, one per line.
+        `size_of(node)` is the number of bytes the node takes in the output.
+        """
+        return "\n".join(optimization_pass.report(size_of) for optimization_pass in self.passes
+                         if hasattr(optimization_pass, "report"))
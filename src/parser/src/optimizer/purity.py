@@ -0,0 +1,93 @@
+from ..nodes.statement_nodes import MissionNode, ReturnNode
+from ..nodes.visitor import NodeVisitor
+from ..resolver.scope_stack import NATIVES
+
+
+class _Effects(NodeVisitor):
+    """
+    Collects the missions a mission body calls and whether it defines
+    missions of its own. Nested bodies are skipped: their calls are their own.
+    """
+    def __init__(self):
+        super().__init__()
+        self.called = set()
+        self.defines = False
+
+    def visit_MissionNode(self, node):
+        self.defines = True
+        return None
+
+    def visit_MissionCallNode(self, node):
+        self.called.add(node.identifier.name)
+        yield node.argument
+
+
+class PurityAnalyzer(NodeVisitor):
+    """
+    Marks the missions whose result depends only on their arguments with
+    `pure`, so the interpreter can remember the results of their calls.
+
+    A mission is pure if it calls no natives (`log`, `logln`, `input`),
+    calls only pure missions, uses no variables from outside its frame
+    (the resolver records none as captured), defines no missions of its
+    own and always ends with a `return`; without one, a call's value would
+    be whatever the last call returned. Its name must be defined only once,
+    since calls find missions by name. Missions that call each other are
+    pure together unless one of them breaks a rule.
+
+    The analysis changes nothing else in the tree.
+    """
+    def __init__(self):
+        super().__init__()
+        self.missions = []
+
+    def optimize(self, statements: list):
+        """Marks the pure missions in `statements`."""
+        self.visit(statements)
+        definitions = {}
+        for node, _ in self.missions:
+            name = node.identifier.name
+            definitions[name] = definitions.get(name, 0) + 1
+
+        calls = {}
+        for node, effects in self.missions:
+            name = node.identifier.name
+            body = node.body
+            if (definitions[name] == 1 and node.captures == [] and not effects.defines
+                    and body and type(body[-1]) is ReturnNode and effects.called.isdisjoint(NATIVES)):
+                calls[name] = effects.called
+        # Drop the missions that call one that is not pure, until none is left.
+        changed = True
+        while changed:
+            changed = False
+            for name, called in list(calls.items()):
+                if not called.issubset(calls):
+                    del calls[name]
+                    changed = True
+
+        for node, _ in self.missions:
+            node.pure = node.identifier.name in calls
+
+    def visit_MissionNode(self, node):
+        effects = _Effects()
+        effects.visit(node.body)
+        self.missions.append((node, effects))
+        yield node.body
+
+    # Expressions hold no mission definitions.
+    def visit_expression(self, node):
+        return None
+
+    visit_VarAssignNode = visit_AssignNode = visit_ReturnNode = visit_MissionCallNode = visit_expression
+
+    def pure(self):
+        """Returns the pure missions, in source order."""
+        return [node for node, _ in self.missions if node.pure]
+
+    def report(self, size_of):
+        """Returns the missions marked pure."""
+        pure = self.pure()
+        if not pure:
+            return "Purity: no pure missions."
+        names = ", ".join(f"{node.identifier.name} (line {node.line})" for node in pure)
+        return f"Purity: {len(pure)} pure mission{'s' if len(pure) != 1 else ''}, memoizable: {names}."
@@ -0,0 +1,235 @@
+from ..nodes.literal_nodes import IdentifierNode
+from ..nodes.expression_nodes import UnaryOpNode
+from ..nodes.statement_nodes import (AssignNode, MissionNode, MissionCallNode, ConditionalNode, WhileNode,
+                                     ReturnNode)
+from ..nodes.visitor import NodeVisitor, NodeTransformer
+from .constant_folder import make_literal
+from .dead_missions import CallGraph
+from .frames import FrameAllocator, make_identifier, declaration
+from .inliner import walk, is_increment
+from .loop_invariants import expression_type, frame_types
+
+# Prefix of the variables a rewritten mission gets: `$tail<n>`, which is
+# true while the loop has another call to run, and `$tail<n>_<parameter>`,
+# which holds a new parameter value until all of them are computed.
+TAIL_PREFIX = "$tail"
+
+def assignment(name, address, expression):
+    """Returns the assignment `<name> = <expression>;`."""
+    node = AssignNode.__new__(AssignNode)
+    node.identifier = make_identifier(name, expression.line, address)
+    node.value, node.line, node.address = expression, expression.line, address
+    return node
+
+
+class _Recursion(NodeVisitor):
+    """
+    Collects a mission's calls to itself and whether it writes variables
+    from outside its frame. Nested missions are skipped: their calls and
+    writes are their own.
+    """
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.calls = []
+        self.writes_outer = False
+
+    def visit_MissionNode(self, node):
+        return None
+
+    def visit_AssignNode(self, node):
+        if node.address is None or node.address[0] > 0:
+            self.writes_outer = True
+        yield node.value
+
+    def visit_UnaryOpNode(self, node):
+        operand = node.node
+        if (node.operator in ('++', '--') and type(operand) is IdentifierNode
+                and (operand.address is None or operand.address[0] > 0)):
+            self.writes_outer = True
+        yield operand
+
+    visit_PostfixUnaryOpNode = visit_UnaryOpNode
+
+    def visit_MissionCallNode(self, node):
+        if node.identifier.name == self.name:
+            self.calls.append(node)
+        yield node.argument
+
+
+class TailCallEliminator(NodeTransformer):
+    """
+    Rewrites self-recursive missions whose calls to themselves are all tail
+    calls into loops, and lists the recursive missions it cannot rewrite.
+
+    The body moves into a `while` loop. A marked `return <mission>(...)`
+    becomes assignments of the new values to the parameters, and the loop
+    runs the body again instead of making the call; the statements that
+    would have run after it are skipped. A body that ends without a
+    `return` ends the loop, as it ended the call.
+
+    A recursive mission is left as it is if it also calls itself outside
+    of tail position or through other missions, if its name is defined
+    more than once, if it writes variables from outside its frame (each
+    call discards those writes) or if a recursive call has the wrong number
+    of arguments, `++` or `--` in them, or an argument that can fail: the
+    new values are declared one statement each, and the interpreter would
+    report a failing one and run the loop on without it, where the call
+    stopped the whole statement that made it. `not_rewritten` keeps each
+    one with the reason, for the report.
+    """
+    def __init__(self):
+        super().__init__()
+        self.frames = None
+        self.graph = None
+        self.definitions = {}
+        self.rewritten = []
+        self.not_rewritten = []
+
+    def optimize(self, statements: list):
+        """Rewrites the tail-recursive missions in `statements` in place."""
+        self.graph = CallGraph().build(statements)
+        for node in walk(statements):
+            if type(node) is MissionNode:
+                name = node.identifier.name
+                self.definitions[name] = self.definitions.get(name, 0) + 1
+        self.frames = FrameAllocator(statements)
+        statements[:] = self.visit(statements)
+
+    def visit_MissionNode(self, node):
+        self.frames.enter(node)
+        node.body = yield node.body
+        name = node.identifier.name
+        if name in self.graph.reaching((name,)):
+            reason = self.obstacle(node)
+            if reason is None:
+                self.rewrite(node)
+                self.rewritten.append(node)
+            else:
+                self.not_rewritten.append((node, reason))
+        self.frames.leave()
+        return node
+
+    # Expressions hold no mission definitions.
+    def visit_expression(self, node):
+        return node
+
+    visit_VarAssignNode = visit_AssignNode = visit_ReturnNode = visit_MissionCallNode = visit_expression
+
+    def obstacle(self, node):
+        """Returns why the recursive mission `node` cannot be rewritten, or None."""
+        name = node.identifier.name
+        recursion = _Recursion(name)
+        recursion.visit(node.body)
+        for call in recursion.calls:
+            if not call.tail:
+                return f"calls itself on line {call.line} outside of tail position"
+        through = sorted(callee for callee in self.graph.calls[name]
+                         if callee != name and callee in self.graph.reaching((name,)))
+        if through:
+            return f"calls itself through {', '.join(through)}"
+        if self.definitions[name] > 1:
+            return "is defined more than once"
+        if recursion.writes_outer:
+            return "writes variables from outside its frame"
+        if any(len(call.argument or ()) != len(node.parameter or ()) for call in recursion.calls):
+            return "calls itself with the wrong number of arguments"
+        if any(is_increment(child) for child in walk([argument for call in recursion.calls
+                                                      for argument in call.argument or ()])):
+            return "has ++ or -- in the arguments of a call to itself"
+        parameters = {(parameter.name, parameter.address) for parameter in node.parameter or ()}
+        variables = frame_types(node.body, node.parameter or ())
+        for call in recursion.calls:
+            for argument in call.argument or ():
+                # A parameter is always defined, whatever its type.
+                if type(argument) is IdentifierNode and (argument.name, argument.address) in parameters:
+                    continue
+                if expression_type(variables, argument) is None:
+                    return f"calls itself on line {call.line} with an argument that can fail"
+        return None
+
+    def rewrite(self, node):
+        """Moves the body of the tail-recursive mission `node` into a loop."""
+        count = len(self.rewritten)
+        flag_name, flag_address = self.frames.new_variable(f"{TAIL_PREFIX}{count}")
+        parameters = node.parameter or []
+        # With one parameter, its new value can be assigned right away.
+        temporaries = {}
+        if len(parameters) > 1:
+            for parameter in parameters:
+                temporaries[parameter.name] = self.frames.new_variable(f"{TAIL_PREFIX}{count}_{parameter.name}")
+
+        def flag(line):
+            return make_identifier(flag_name, line, flag_address)
+
+        def rebind(call):
+            """Returns the statements that take the place of `return <call>;`."""
+            declarations, assignments = [], []
+            for parameter, argument in zip(parameters, call.argument or ()):
+                if (type(argument) is IdentifierNode and argument.name == parameter.name
+                        and argument.address == parameter.address):
+                    continue
+                if parameter.name in temporaries:
+                    name, address = temporaries[parameter.name]
+                    declarations.append(declaration(name, address, argument))
+                    argument = make_identifier(name, argument.line, address)
+                assignments.append(assignment(parameter.name, parameter.address, argument))
+            return declarations + assignments + [assignment(flag_name, flag_address, make_literal(True, call.line))]
+
+        def rewrite_list(statements):
+            """
+            Returns `statements` with their tail calls rewritten, and
+            whether there were any.
+            """
+            result = []
+            for index, statement in enumerate(statements):
+                if type(statement) is ReturnNode and type(statement.value) is MissionCallNode and statement.value.tail:
+                    # Nothing after a return runs.
+                    result.extend(rebind(statement.value))
+                    return result, True
+                result.append(statement)
+                if type(statement) is not ConditionalNode:
+                    continue
+                statement.if_body, found = rewrite_list(statement.if_body)
+                else_ifs = []
+                for condition, body in statement.else_if_condition:
+                    body, found_here = rewrite_list(body)
+                    found = found or found_here
+                    else_ifs.append((condition, body))
+                statement.else_if_condition = else_ifs
+                if statement.else_body:
+                    statement.else_body, found_here = rewrite_list(statement.else_body)
+                    found = found or found_here
+                if found:
+                    rest, _ = rewrite_list(statements[index + 1:])
+                    if rest:
+                        result.append(guard(rest))
+                    return result, True
+            return result, False
+
+        def guard(statements):
+            """Returns `if (!<flag>) { <statements> }`."""
+            line = statements[0].line
+            negation = UnaryOpNode.__new__(UnaryOpNode)
+            negation.operator, negation.node, negation.line = '!', flag(line), line
+            return ConditionalNode(negation, statements)
+
+        body, _ = rewrite_list(node.body)
+        loop = WhileNode.__new__(WhileNode)
+        loop.condition, loop.line = flag(node.line), node.line
+        loop.body = [assignment(flag_name, flag_address, make_literal(False, node.line))] + body
+        node.body = [declaration(flag_name, flag_address, make_literal(True, node.line)), loop]
+
+    def report(self, size_of):
+        """Returns the rewritten missions and the recursive ones left as they are."""
+        lines = []
+        if self.rewritten:
+            names = ", ".join(f"{node.identifier.name} (line {node.line})" for node in self.rewritten)
+            many = len(self.rewritten) != 1
+            lines.append(f"Tail calls: rewrote {len(self.rewritten)} "
+                         f"{'missions into loops' if many else 'mission into a loop'}: {names}.")
+        else:
+            lines.append("Tail calls: no missions were rewritten into loops.")
+        for node, reason in self.not_rewritten:
+            lines.append(f"Recursion kept: {node.identifier.name} (line {node.line}) {reason}.")
+        return "\n".join(lines)
@@ -0,0 +1,39 @@
+from .parser import Parser
+
+class BufferParser(Parser):
+    """ Buffer Parser Class
+    Parses a `TokenBuffer` directly. `kind` and `value` are read straight
+    from the buffer's arrays as the parser advances, and a `Token` view is
+    only built when `current_token` is read, i.e. where the parser needs a
+    token's line.
+    """
+    def __init__(self, buffer):
+        self.tokens = buffer
+        self.kinds = buffer.kinds
+        self.values = buffer.values
+        self.value_table = buffer.value_table
+        self.last_idx = len(buffer) - 1
+        self.token_idx = 0
+        self.leaf_nodes = {}
+        self.kind = self.kinds[0]
+        self.value = self.value_table[self.values[0]]
+
+    @property
+    def current_token(self):
+        """A `Token` view of the current token."""
+        return self.tokens[self.token_idx]
+
+    def peek(self):
+        """Peeks at the next token without advancing the current position."""
+        return self.tokens[min(self.token_idx + 1, self.last_idx)]
+
+    def peek_kind(self):
+        """Returns the kind of the next token without advancing."""
+        return self.kinds[min(self.token_idx + 1, self.last_idx)]
+
+    def advance(self):
+        """Advances to the next token in the buffer, staying on the final EOF."""
+        if self.token_idx < self.last_idx:
+            token_idx = self.token_idx = self.token_idx + 1
+            self.kind = self.kinds[token_idx]
+            self.value = self.value_table[self.values[token_idx]]
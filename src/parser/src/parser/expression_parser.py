@@ -1,161 +1,153 @@
-from ..tokens import Token, TokenType
+from ..tokens import (IDENTIFIER, NUMBER, STRING, BOOLEAN, ARITHMETIC_OPERATOR, RELATIONAL_OPERATOR,
+                      LOGICAL_OPERATOR, BITWISE_OPERATOR, UNARY_OPERATOR, LPAREN, RPAREN, COMMA)
 from ..lexer.lexer_constants import RELATIONAL_OPERATORS
 from ..nodes.literal_nodes import (NumberNode, StringNode, BooleanNode, IdentifierNode)
 from ..nodes.expression_nodes import (BinaryOpNode, RelationalOpNode, LogicalOpNode, BitwiseOpNode, 
                                       UnaryOpNode, PostfixUnaryOpNode)
 from ..nodes.statement_nodes import MissionCallNode
 
+# Binary operators, keyed by token kind and value. Each entry holds the
+# operator's left and right binding powers and the node class it builds: an
+# operator only takes a right operand that binds tighter than its right
+# power, so equal powers make it left-associative, and a right power one
+# below the left power would make it right-associative.
+BINARY_OPERATORS = {
+    (LOGICAL_OPERATOR, '||'): (1, 1, LogicalOpNode),
+    (LOGICAL_OPERATOR, '&&'): (2, 2, LogicalOpNode),
+    (BITWISE_OPERATOR, '|'): (3, 3, BitwiseOpNode),
+    (BITWISE_OPERATOR, '^'): (4, 4, BitwiseOpNode),
+    (BITWISE_OPERATOR, '&'): (5, 5, BitwiseOpNode),
+    **{(RELATIONAL_OPERATOR, op): (6, 6, RelationalOpNode) for op in RELATIONAL_OPERATORS},
+    (ARITHMETIC_OPERATOR, '+'): (7, 7, BinaryOpNode),
+    (ARITHMETIC_OPERATOR, '-'): (7, 7, BinaryOpNode),
+    (ARITHMETIC_OPERATOR, '*'): (8, 8, BinaryOpNode),
+    (ARITHMETIC_OPERATOR, '/'): (8, 8, BinaryOpNode),
+    (ARITHMETIC_OPERATOR, '%'): (8, 8, BinaryOpNode),
+}
+
+# Prefix operators; each one applies to the primary expression after it.
+PREFIX_OPERATORS = {
+    (ARITHMETIC_OPERATOR, '-'),
+    (LOGICAL_OPERATOR, '!'),
+    (BITWISE_OPERATOR, '~'),
+    (ARITHMETIC_OPERATOR, '+'),
+    (UNARY_OPERATOR, '++'),
+    (UNARY_OPERATOR, '--'),
+}
+
+LITERAL_NODES = {
+    NUMBER: NumberNode,
+    STRING: StringNode,
+    BOOLEAN: BooleanNode,
+}
+
+# Kinds of unfinished work kept on the expression stack.
+UNARY, BINARY, GROUP, CALL = range(4)
+
 class ExpressionParser:
     """
-    Handles parsing all expressions using a precedence ladder.
+    Handles parsing all expressions by precedence climbing over the
+    `BINARY_OPERATORS` table.
+    Prefix operators, parentheses, call arguments and right operands that
+    are still open are kept on an explicit stack rather than the Python
+    call stack, so nesting depth is only limited by memory.
     This class is intended to be inherited by the main Parser.
     """
     def parse_expression(self):
         """Parses an expression based on operator precedence."""
-        return self.parse_logical_or()
-    
-    def parse_logical_or(self):
-        left_node = self.parse_logical_and()
-        while (self.current_token.type == TokenType.LOGICAL_OPERATOR and
-                                          self.current_token.value == '||'):
-            operator_token = self.current_token            
-            self.advance()
-            right_node = self.parse_logical_and()
-            new_logicalOp = LogicalOpNode(left_node, operator_token, right_node)
-            left_node = new_logicalOp
-        return left_node 
+        stack = []
+        operators = BINARY_OPERATORS
+        while True:
+            node = self.parse_primary(stack)
+            if node is None:
+                continue
 
-    def parse_logical_and(self):
-        left_node = self.parse_bitwise_or()
-        while (self.current_token.type == TokenType.LOGICAL_OPERATOR and
-                                            self.current_token.value == '&&'):
-                operator_token = self.current_token            
-                self.advance()
-                right_node = self.parse_bitwise_or()
-                new_logicalOp = LogicalOpNode(left_node, operator_token, right_node)
-                left_node = new_logicalOp
-        return left_node 
+            while True:
+                kind = stack[-1][0] if stack else None
+                if kind == UNARY:
+                    node = self.build(UnaryOpNode, stack.pop()[1], node)
+                    continue
 
-    def parse_bitwise_or(self):
-        left_node = self.parse_bitwise_xor()
-        while (self.current_token.type == TokenType.BITWISE_OPERATOR and
-                                          self.current_token.value  == '|'):
-            operator_token = self.current_token            
-            self.advance()
-            right_node = self.parse_bitwise_xor()
-            new_bitwiseOp = BitwiseOpNode(left_node, operator_token, right_node)
-            left_node = new_bitwiseOp
-        return left_node 
+                operator = operators.get((self.kind, self.value))
+                min_power = stack[-1][3][1] if kind == BINARY else 0
+                if operator is not None and operator[0] > min_power:
+                    stack.append((BINARY, node, self.current_token, operator))
+                    self.advance()
+                    break
+
+                if kind == BINARY:
+                    _, left_node, operator_token, operator = stack.pop()
+                    node = self.build(operator[2], left_node, operator_token, node)
+                elif kind == GROUP:
+                    self.expect(RPAREN)
+                    stack.pop()
+                elif kind == CALL:
+                    stack[-1][2].append(node)
+                    if self.kind == COMMA:
+                        self.advance()
+                        break
+                    self.expect(RPAREN)
+                    _, identifier_token, args = stack.pop()
+                    node = self.build(MissionCallNode, self.leaf_node(IdentifierNode, identifier_token), args)
+                else:
+                    return node
+
+    def build(self, node_class, *args):
+        """
+        Builds an AST node. Every node the parser creates goes through here,
+        so `parse_arena` can store nodes in an `AstArena` instead.
+        """
+        return node_class(*args)
 
-    def parse_bitwise_xor(self):
-        left_node = self.parse_bitwise_and()
-        while (self.current_token.type == TokenType.BITWISE_OPERATOR and
-                                            self.current_token.value == '^'):
-                operator_token = self.current_token            
+    def leaf_node(self, node_class, token):
+        """
+        Returns a `node_class` node for `token`, sharing one node between all
+        tokens with the same value on the same line. The resolver copies a
+        shared identifier rather than give it a second address, so the
+        sharing is not observable. `parse_arena` builds every leaf anew.
+        """
+        key = (node_class, token.value, token.line)
+        node = self.leaf_nodes.get(key)
+        if node is None:
+            node = self.leaf_nodes[key] = self.build(node_class, token)
+        return node
+
+    def parse_primary(self, stack):
+        """
+        Parses a literal, identifier, postfix operation or argument-less
+        mission call and returns its node. A prefix operator, an opening
+        parenthesis or the start of a call's arguments is pushed onto
+        `stack` instead, and None is returned.
+        """
+        kind = self.kind
+        if (kind, self.value) in PREFIX_OPERATORS:
+            stack.append((UNARY, self.current_token))
+            self.advance()
+            return None
+        elif kind in LITERAL_NODES:
+            token = self.current_token
+            self.advance()
+            return self.leaf_node(LITERAL_NODES[kind], token)
+        elif kind == IDENTIFIER:
+            token = self.current_token
+            self.advance()
+            if self.kind == LPAREN:
                 self.advance()
-                right_node = self.parse_bitwise_and()
-                new_bitwiseOp = BitwiseOpNode(left_node, operator_token, right_node)
-                left_node = new_bitwiseOp
-        return left_node 
-    
-    def parse_bitwise_and(self):
-        left_node = self.parse_comparison()
-        while (self.current_token.type == TokenType.BITWISE_OPERATOR and 
-                                          self.current_token.value == '&'):
-            operator_token = self.current_token            
-            self.advance()
-            right_node = self.parse_comparison()
-            new_bitwiseOp = BitwiseOpNode(left_node, operator_token, right_node)
-            left_node = new_bitwiseOp
-        return left_node 
-     
-    def parse_comparison(self):
-        left_node = self.parse_term()
-        while (self.current_token.type == TokenType.RELATIONAL_OPERATOR and 
-                                          self.current_token.value in RELATIONAL_OPERATORS):
-            operator_token = self.current_token            
-            self.advance()
-            right_node = self.parse_term()
-            new_relationalOp = RelationalOpNode(left_node, operator_token, right_node)
-            left_node = new_relationalOp
-        return left_node
-    
-    def parse_term(self):
-        left_node = self.parse_factor()
-        while (self.current_token.type == TokenType.ARITHMETIC_OPERATOR and 
-                                          self.current_token.value in {'+', '-'}):
-            operator_token = self.current_token            
-            self.advance()
-            right_node = self.parse_factor()
-            new_binaryOp = BinaryOpNode(left_node, operator_token, right_node)
-            left_node = new_binaryOp
-        return left_node
-    
-    def parse_factor(self):
-        left_node = self.parse_primary()
-        while (self.current_token.type == TokenType.ARITHMETIC_OPERATOR and 
-                                          self.current_token.value in {'*', '/', '%'}):
-            operator_token = self.current_token            
-            self.advance()
-            right_node = self.parse_primary()
-            new_binaryOp = BinaryOpNode(left_node, operator_token, right_node)
-            left_node = new_binaryOp
-        return left_node
-    
-    def parse_primary(self):
-        token = self.current_token
-        if token.type == TokenType.ARITHMETIC_OPERATOR and token.value == '-':
-            self.advance()
-            negation_node = self.parse_primary()
-            return UnaryOpNode(token, negation_node)
-        elif token.type == TokenType.LOGICAL_OPERATOR and token.value == '!':
-            self.advance()
-            not_node = self.parse_primary()
-            return UnaryOpNode(token, not_node)
-        elif token.type == TokenType.BITWISE_OPERATOR and token.value == '~':
-            self.advance()
-            bitwise_not_node = self.parse_primary()
-            return UnaryOpNode(token, bitwise_not_node)
-        elif token.type == TokenType.ARITHMETIC_OPERATOR and token.value == '+':
-            self.advance()
-            plus_node = self.parse_primary()
-            return UnaryOpNode(token, plus_node)
-        elif token.type == TokenType.UNARY_OPERATOR and token.value == '++':  
-            self.advance()
-            increment_node = self.parse_primary()
-            return UnaryOpNode(token, increment_node)
-        elif token.type == TokenType.UNARY_OPERATOR and token.value == '--':
-            self.advance()
-            decrement_node = self.parse_primary()
-            return UnaryOpNode(token, decrement_node)
-        elif token.type == TokenType.NUMBER:
-            self.advance()
-            return NumberNode(token)
-        elif token.type == TokenType.STRING:
-            self.advance()
-            return StringNode(token)
-        elif token.type == TokenType.BOOLEAN:
-            self.advance()
-            return BooleanNode(token)
-        elif token.type == TokenType.IDENTIFIER:
-            next_token = self.peek()
-            self.advance()
-            if next_token.type == TokenType.LPAREN:                
-                identifier_token = token
-                args = self.parameters() 
-                return MissionCallNode(IdentifierNode(identifier_token), args)
-            if(next_token.type == TokenType.UNARY_OPERATOR and 
-               next_token.value in {'++', '--'}):
-                identifier_token = token
-                operator_token = next_token
+                if self.kind == RPAREN:
+                    self.advance()
+                    return self.build(MissionCallNode, self.leaf_node(IdentifierNode, token), [])
+                stack.append((CALL, token, []))
+                return None
+            if self.kind == UNARY_OPERATOR and self.value in {'++', '--'}:
+                operator_token = self.current_token
                 self.advance()
-                return PostfixUnaryOpNode(IdentifierNode(identifier_token), operator_token)
+                return self.build(PostfixUnaryOpNode, self.leaf_node(IdentifierNode, token), operator_token)
             else: 
-                return IdentifierNode(token)
-        elif token.type == TokenType.LPAREN:
+                return self.leaf_node(IdentifierNode, token)
+        elif kind == LPAREN:
             self.advance()
-            expr_node = self.parse_expression()
-            self.expect(TokenType.RPAREN)
-            return expr_node
+            stack.append((GROUP,))
+            return None
         else:
-            raise Exception(f"Syntax Error: Unexpected token {token.type}", token.line)
\ No newline at end of file
+            token = self.current_token
+            raise Exception(f"Syntax Error: Unexpected token {token.type}", token.line)
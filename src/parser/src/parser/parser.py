@@ -1,4 +1,5 @@
-from ..tokens import Token, TokenType
+from ..tokens import Token, TokenType, TOKEN_TYPES, EOF
+from ..nodes.arena import AstArena
 from .expression_parser import ExpressionParser
 from .statement_parser import StatementParser
 
@@ -6,15 +7,22 @@ class Parser(ExpressionParser, StatementParser):
     """ Main Parser Class
     Combines expression and statement parsing to build the AST.
     Uses recursive descent parsing techniques.
+
+    `kind` and `value` hold the small-int kind (see `tokens.py`) and the
+    value of the current token; the parsing methods test those and only
+    take `current_token` where they need the token itself.
     """
     def __init__(self, tokens):
         self.tokens = tokens
         self.token_idx = 0
+        self.leaf_nodes = {}
 
         if self.token_idx < len(self.tokens):
             self.current_token = self.tokens[self.token_idx]
         else:
             self.current_token = Token(TokenType.EOF, None)
+        self.kind = self.current_token.type._value_
+        self.value = self.current_token.value
 
     def peek(self):
         """Peeks at the next token without advancing the current position."""
@@ -23,6 +31,13 @@ class Parser(ExpressionParser, StatementParser):
             return self.tokens[peek_idx]
         else:
             return Token(TokenType.EOF, None)    
+
+    def peek_kind(self):
+        """Returns the kind of the next token without advancing."""
+        peek_idx = self.token_idx + 1
+        if peek_idx < len(self.tokens):
+            return self.tokens[peek_idx].type._value_
+        return EOF
     
     def advance(self):
         """Advances to the next token in the token list."""
@@ -31,23 +46,32 @@ class Parser(ExpressionParser, StatementParser):
             self.current_token = self.tokens[self.token_idx]
         else:
             self.current_token = Token(TokenType.EOF, None)
+        self.kind = self.current_token.type._value_
+        self.value = self.current_token.value
     
-    def expect(self, token_type):
-        """expects the current token to be of a specific type and advances."""
-        if self.current_token.type == token_type:
-            token = self.current_token
+    def expect(self, kind):
+        """expects the current token to be of a specific kind and advances."""
+        if self.kind == kind:
             self.advance()
-            return token
-        
         else:
-            raise Exception(f'Expected token type {token_type}, got {self.current_token.type} at line {self.current_token.line}')
+            raise Exception(f'Expected token type {TOKEN_TYPES[kind]}, got {self.current_token.type} at line {self.current_token.line}')
     
     def parse(self):
         """Parses the entire token list into an AST."""
         statements = []
 
-        while self.current_token.type != TokenType.EOF:
+        while self.kind != EOF:
             statement = self.parse_statement()
             statements.append(statement)
 
         return statements
+
+    def parse_arena(self):
+        """Parses the entire token list into an `AstArena` instead of node objects."""
+        arena = AstArena()
+        self.build = arena.add_node
+        # The resolver stores addresses by node id, so every identifier
+        # needs an id of its own.
+        self.leaf_node = arena.add_node
+        arena.roots.extend(self.parse())
+        return arena
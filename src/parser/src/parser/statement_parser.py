@@ -1,5 +1,6 @@
 # This file needs the statement and literal nodes
-from ..tokens import TokenType
+from ..tokens import (IDENTIFIER, ASSIGNMENT_OPERATOR, UNARY_OPERATOR, KEYWORD, SEMICOLON, LPAREN, RPAREN,
+                      LBRACE, RBRACE, COMMA)
 from ..nodes.literal_nodes import IdentifierNode
 from ..nodes.statement_nodes import (VarAssignNode, MissionNode, ConditionalNode,
                                      WhileNode, ReturnNode, AssignNode)
@@ -7,30 +8,55 @@ from ..nodes.statement_nodes import (VarAssignNode, MissionNode, ConditionalNode
 class StatementParser:
     """
     Handles parsing all statements.
+    Blocks are parsed with an explicit stack of open blocks rather than by
+    recursion: each entry holds the statements read so far and a callback
+    that builds the enclosing statement once the block's `}` is reached.
     This class is intended to be inherited by the main Parser.
     """
     def parse_statement(self):
-        """Parses a single statement based on the current token."""
-        if self.current_token.type == TokenType.KEYWORD:
-            if self.current_token.value == 'var':
+        """Parses a single statement, including any blocks nested in it."""
+        blocks = []
+        node = self.parse_statement_head(blocks)
+        while blocks:
+            body, finish = blocks[-1]
+            if self.kind != RBRACE:
+                statement = self.parse_statement_head(blocks)
+                if statement is not None:
+                    body.append(statement)
+                continue
+
+            self.advance()
+            blocks.pop()
+            node = finish(body)
+            if node is not None and blocks:
+                blocks[-1][0].append(node)
+        return node
+
+    def parse_statement_head(self, blocks):
+        """
+        Parses a statement without blocks and returns its node. For a
+        statement with a block, parses everything up to the block's `{`,
+        opens the block on `blocks` and returns None.
+        """
+        if self.kind == KEYWORD:
+            if self.value == 'var':
                 return self.parse_var_declaration()
-            elif self.current_token.value == 'mission':
-                return self.parse_mission_statement()
-            elif self.current_token.value == 'if':
-                return self.parse_conditional()
-            elif self.current_token.value == 'while':
-                return self.parse_while_loop()
-            elif self.current_token.value == 'return':
+            elif self.value == 'mission':
+                return self.parse_mission_statement(blocks)
+            elif self.value == 'if':
+                return self.parse_conditional(blocks)
+            elif self.value == 'while':
+                return self.parse_while_loop(blocks)
+            elif self.value == 'return':
                 return self.parse_return_statement()
 
             
-        elif self.current_token.type == TokenType.IDENTIFIER:
-            next_token = self.peek()
-            if next_token.type == TokenType.ASSIGNMENT_OPERATOR:
+        elif self.kind == IDENTIFIER:
+            if self.peek_kind() == ASSIGNMENT_OPERATOR:
                 return self.parse_var_reassignment()
             else:
                 return self.parse_expression_statement()
-        elif self.current_token.type == TokenType.UNARY_OPERATOR:
+        elif self.kind == UNARY_OPERATOR:
             return self.parse_expression_statement()
             
         raise Exception(f"Syntax Error: Unexpected Keyword {self.current_token}")
@@ -38,112 +64,117 @@ class StatementParser:
     def parse_expression_statement(self):
         """Parses an expression followed by a semicolon as a statement."""
         expr_node = self.parse_expression()
-        self.expect(TokenType.SEMICOLON)
+        self.expect(SEMICOLON)
         return expr_node
 
-    def parse_mission_statement(self):
-        """Parses a mission (function) declaration statement."""
-        self.expect(TokenType.KEYWORD)   
-        identifier = self.expect(TokenType.IDENTIFIER) 
-        if self.current_token.type == TokenType.LPAREN:
+    def parse_mission_statement(self, blocks):
+        """Parses a mission (function) declaration up to its body."""
+        self.expect(KEYWORD)   
+        identifier = self.current_token
+        self.expect(IDENTIFIER) 
+        if self.kind == LPAREN:
             params = self.parameters()
         else:
             params = [] 
         
-        body = self.parse_block()
-
-        return MissionNode(IdentifierNode(identifier), params, body)
+        self.open_block(blocks, lambda body: self.build(MissionNode, self.leaf_node(IdentifierNode, identifier), params, body))
 
     def parse_var_declaration(self):
         """Parses a variable declaration statement."""
-        if self.current_token.type == TokenType.KEYWORD and self.current_token.value == 'var':
-            self.expect(TokenType.KEYWORD) 
-        identifier = self.expect(TokenType.IDENTIFIER)  
-        self.expect(TokenType.ASSIGNMENT_OPERATOR)
+        if self.kind == KEYWORD and self.value == 'var':
+            self.expect(KEYWORD) 
+        identifier = self.current_token
+        self.expect(IDENTIFIER)  
+        self.expect(ASSIGNMENT_OPERATOR)
         token_node = self.parse_expression()
-        self.expect(TokenType.SEMICOLON)
+        self.expect(SEMICOLON)
 
-        return VarAssignNode(IdentifierNode(identifier), token_node)
+        return self.build(VarAssignNode, self.leaf_node(IdentifierNode, identifier), token_node)
     
     def parameters(self):
         """Parses a list of parameters for missions (functions)."""
         params = []
-        self.expect(TokenType.LPAREN)
+        self.expect(LPAREN)
         
-        if self.current_token.type == TokenType.RPAREN:
+        if self.kind == RPAREN:
             self.advance()
             return params
         
         params.append(self.parse_expression())
 
-        while self.current_token.type == TokenType.COMMA:
+        while self.kind == COMMA:
             self.advance()  
             params.append(self.parse_expression())
 
-        self.expect(TokenType.RPAREN)
+        self.expect(RPAREN)
         return params
     
-    def parse_block(self):
-        """Parses a block of statements enclosed in braces."""
-        statements = []
-        self.expect(TokenType.LBRACE)
-
-        while self.current_token.type != TokenType.RBRACE:
-            statement = self.parse_statement()
-            statements.append(statement)
-
-        self.expect(TokenType.RBRACE)
-        return statements
-
-    def parse_conditional(self):
-        """Parses an if-else conditional statement."""
-        self.expect(TokenType.KEYWORD)  
-        self.expect(TokenType.LPAREN)    
+    def open_block(self, blocks, finish):
+        """
+        Opens a block enclosed in braces. `finish` is called with the block's
+        statements once it is closed and returns the finished statement, or
+        None if it opened a further block.
+        """
+        self.expect(LBRACE)
+        blocks.append(([], finish))
+
+    def parse_conditional(self, blocks):
+        """Parses an if-else conditional statement up to its first body."""
+        self.expect(KEYWORD)  
+        self.expect(LPAREN)    
         if_condition = self.parse_expression()  
-        self.expect(TokenType.RPAREN)    
-        if_body = self.parse_block()
+        self.expect(RPAREN)    
 
         else_if_nodes = []   
-        else_body = None
-
-        while self.current_token.type == TokenType.KEYWORD and self.current_token.value == 'else':
+        self.open_block(blocks, lambda if_body: self.parse_else(blocks, if_condition, if_body, else_if_nodes))
+
+    def parse_else(self, blocks, if_condition, if_body, else_if_nodes):
+        """
+        Parses the next `else if` or `else` branch of a conditional after one
+        of its bodies has been closed, or finishes the conditional when there
+        is none.
+        """
+        if self.kind == KEYWORD and self.value == 'else':
             self.advance()
-            if self.current_token.type == TokenType.KEYWORD and self.current_token.value == 'if':
+            if self.kind == KEYWORD and self.value == 'if':
                 self.advance()  
-                self.expect(TokenType.LPAREN)  
+                self.expect(LPAREN)  
                 else_if_condition = self.parse_expression()  
-                self.expect(TokenType.RPAREN)  
-                else_if_body = self.parse_block()  
-                else_if_nodes.append((else_if_condition, else_if_body))
+                self.expect(RPAREN)  
+
+                def finish_else_if(else_if_body):
+                    else_if_nodes.append((else_if_condition, else_if_body))
+                    return self.parse_else(blocks, if_condition, if_body, else_if_nodes)
+                self.open_block(blocks, finish_else_if)
             else: 
-                else_body = self.parse_block()
-                break    
+                self.open_block(blocks, lambda else_body: self.build(ConditionalNode, if_condition, if_body, else_if_nodes, else_body))
+            return None
 
-        return ConditionalNode(if_condition, if_body, else_if_nodes, else_body)
+        return self.build(ConditionalNode, if_condition, if_body, else_if_nodes, None)
     
-    def parse_while_loop(self):
-        """Parses a while loop statement."""
-        self.expect(TokenType.KEYWORD)
-        self.expect(TokenType.LPAREN)
+    def parse_while_loop(self, blocks):
+        """Parses a while loop statement up to its body."""
+        self.expect(KEYWORD)
+        self.expect(LPAREN)
         loop_condition = self.parse_expression()
-        self.expect(TokenType.RPAREN)
-        loop_body = self.parse_block()
+        self.expect(RPAREN)
 
-        return WhileNode(loop_condition, loop_body)
+        self.open_block(blocks, lambda loop_body: self.build(WhileNode, loop_condition, loop_body))
     
     def parse_var_reassignment(self):
         """Parses a variable reassignment statement."""
-        identifier = self.expect(TokenType.IDENTIFIER)
-        self.expect(TokenType.ASSIGNMENT_OPERATOR)
+        identifier = self.current_token
+        self.expect(IDENTIFIER)
+        self.expect(ASSIGNMENT_OPERATOR)
         value = self.parse_expression_statement()
 
 
-        return AssignNode(IdentifierNode(identifier), value)
+        return self.build(AssignNode, self.leaf_node(IdentifierNode, identifier), value)
     
     def parse_return_statement(self):
         """Parses a return statement."""
-        self.expect(TokenType.KEYWORD)  
+        self.expect(KEYWORD)  
         return_value = self.parse_expression()
-        self.expect(TokenType.SEMICOLON)
+        self.expect(SEMICOLON)
 
-        return ReturnNode(return_value)
\ No newline at end of file
+        return self.build(ReturnNode, return_value)
\ No newline at end of file
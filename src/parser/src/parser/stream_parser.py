@@ -0,0 +1,40 @@
+from ..tokens import Token, TokenType
+from .parser import Parser
+
+class StreamParser(Parser):
+    """ Streaming Parser Class
+    Parses tokens pulled lazily from an iterator (e.g. `Lexer.iter_tokens()`)
+    instead of a fully built token list. Only the current token and one
+    token of lookahead are held at any time.
+    """
+    def __init__(self, tokens):
+        self.token_stream = iter(tokens)
+        self.leaf_nodes = {}
+        self.current_token = self._pull(None)
+        self.next_token = self._pull(self.current_token)
+        self.kind = self.current_token.type._value_
+        self.value = self.current_token.value
+
+    def _pull(self, previous):
+        """Returns the token after `previous`, repeating EOF once the stream is exhausted."""
+        if previous is not None and previous.type == TokenType.EOF:
+            return previous
+        token = next(self.token_stream, None)
+        if token is None:
+            return Token(TokenType.EOF, None, previous.line if previous is not None else 1)
+        return token
+
+    def peek(self):
+        """Peeks at the next token without advancing the current position."""
+        return self.next_token
+
+    def peek_kind(self):
+        """Returns the kind of the next token without advancing."""
+        return self.next_token.type._value_
+
+    def advance(self):
+        """Advances to the next token in the stream."""
+        token = self.current_token = self.next_token
+        self.kind = token.type._value_
+        self.value = token.value
+        self.next_token = self._pull(token)
@@ -0,0 +1,121 @@
+from ..nodes.arena import ArenaVisitor, NodeKind
+from .scope_stack import ScopeStack
+
+class ArenaResolver(ArenaVisitor):
+    """
+    Performs the same static analysis as `Resolver`, directly on an
+    `AstArena`.
+
+    Like `Resolver`, it computes lexical addresses, frame sizes, captures
+    and tail calls; they are stored in the arena's `addresses`, `frames`
+    and `tail_calls`, which `ArenaDictEmitter` writes out.
+
+    Nodes without a `visit_<KIND>` method (operators, unary operations,
+    conditionals and mission calls) fall back to `generic_visit`, which
+    resolves their children in order.
+    """
+    def __init__(self, arena):
+        """Initializes the ArenaResolver and its associated ScopeStack."""
+        super().__init__(arena)
+        self.scope_stack = ScopeStack()
+        # See `Resolver.__init__`; missions are kept by id.
+        self.captures = []
+        self.missions = []
+        self.loops = 0
+
+    def resolve(self, node_ids=None):
+        """
+        The main entry point for the resolver.
+
+        Args:
+            node_ids: The statement ids to resolve, by default the arena's
+                top-level statements.
+        """
+        for node_id in self.arena.roots if node_ids is None else node_ids:
+            self.visit(node_id)
+
+    def address(self, name):
+        """Returns the `(depth, slot)` of `name`; see `Resolver.address`."""
+        address = self.scope_stack.address(name)
+        if address is not None and address[0] > 0:
+            depth, slot = address
+            for captures in reversed(self.captures):
+                captures.setdefault((depth, slot), name)
+                depth -= 1
+                if depth == 0:
+                    break
+        return address
+
+    def visit_MISSION(self, node_id):
+        """Resolves a mission definition; see `Resolver.visit_MissionNode`."""
+        arena = self.arena
+        identifier, parameters, body = arena.child_ids(node_id)
+        self.scope_stack.declare(arena.value(identifier))
+        self.scope_stack.define(arena.value(identifier))
+
+        self.scope_stack.push()
+        for param in arena.child_ids(parameters):
+            self.scope_stack.declare(arena.value(param))
+            self.scope_stack.define(arena.value(param))
+            arena.addresses[param] = (0, self.scope_stack.allocate(arena.value(param)))
+
+        self.captures.append({})
+        self.missions.append(node_id)
+        loops, self.loops = self.loops, 0
+        yield body
+        self.loops = loops
+        self.missions.pop()
+
+        arena.frames[node_id] = (self.scope_stack.frame_size(),
+                                 [(name, depth, slot) for (depth, slot), name in self.captures.pop().items()])
+        self.scope_stack.pop()
+
+    def visit_WHILE(self, node_id):
+        """Resolves a while loop. A `return` in its body is not in tail position."""
+        condition, body = self.arena.child_ids(node_id)
+        yield condition
+        self.loops += 1
+        yield body
+        self.loops -= 1
+
+    def visit_RETURN(self, node_id):
+        """Resolves a return statement; see `Resolver.visit_ReturnNode`."""
+        arena = self.arena
+        call, = arena.child_ids(node_id)
+        yield call
+        if arena.kinds[call] == NodeKind.MISSION_CALL._value_ and self.missions and not self.loops:
+            name = arena.value(arena.child_ids(call)[0])
+            mission_name = arena.value(arena.child_ids(self.missions[-1])[0])
+            entries = self.scope_stack.index.get(name)
+            if (name == mission_name and entries
+                    and entries[-1][0] == len(self.scope_stack.scopes) - 2):
+                arena.tail_calls.add(call)
+
+    def visit_VAR(self, node_id):
+        """Resolves a variable declaration after its initializer."""
+        identifier, value = self.arena.child_ids(node_id)
+        yield value
+        self.scope_stack.declare(self.arena.value(identifier))
+        self.scope_stack.define(self.arena.value(identifier))
+        self.arena.addresses[node_id] = (0, self.scope_stack.allocate(self.arena.value(identifier)))
+
+    def visit_ASSIGN(self, node_id):
+        """Resolves an assignment and checks that its target exists."""
+        identifier, value = self.arena.child_ids(node_id)
+        yield value
+        self.scope_stack.is_defined(self.arena.value(identifier))
+        address = self.address(self.arena.value(identifier))
+        if address is not None:
+            self.arena.addresses[node_id] = address
+
+    def visit_IDENTIFIER(self, node_id):
+        """Resolves a variable read."""
+        self.scope_stack.is_defined(self.arena.value(node_id))
+        address = self.address(self.arena.value(node_id))
+        if address is not None:
+            self.arena.addresses[node_id] = address
+
+    def visit_NUMBER(self, node_id):
+        pass
+
+    visit_STRING = visit_BOOLEAN = visit_NUMBER
@@ -1,12 +1,11 @@
 # Komu/src/parser/src/resolver.py
-from ..nodes.statement_nodes import (
-    MissionNode, VarAssignNode, AssignNode, ReturnNode, WhileNode, ConditionalNode, MissionCallNode
-)
+from ..nodes.statement_nodes import (MissionNode, VarAssignNode, AssignNode, ConditionalNode, WhileNode,
+                                     ReturnNode, MissionCallNode)
 from ..nodes.literal_nodes import IdentifierNode
-from ..nodes.expression_nodes import * 
+from ..nodes.visitor import NodeTransformer
 from .scope_stack import ScopeStack  
 
-class Resolver:
+class Resolver(NodeTransformer):
     """
     Performs static analysis on the AST to resolve all variables.
     
@@ -15,10 +14,35 @@ class Resolver:
     variable declarations, assignments, and usages are valid according to
     the language's scoping rules. It relies on a `ScopeStack` instance
     to manage the environment state.
+
+    It also records where each variable lives: identifiers, declarations,
+    assignments and parameters get the `(depth, slot)` address of their
+    variable, and missions get their frame size and the outer variables
+    they capture. The parser shares identical identifier nodes, so an
+    identifier whose address differs from the one already stored on it is
+    replaced by a copy; that is why the Resolver is a `NodeTransformer`
+    and every visit method returns its node.
+
+    A mission's calls to itself in tail position, the whole value of a
+    `return` that is not inside a `while` loop, are marked with `tail`.
+
+    Visit methods that resolve children are generators: each `yield` hands
+    a node or a list of statements to `NodeVisitor.visit`, which resolves it
+    before the method resumes. Nodes without a method of their own
+    (operators, unary operations and mission calls) fall back to
+    `generic_visit`, which resolves their children in order.
     """
     def __init__(self):
         """Initializes the Resolver and its associated ScopeStack."""
+        super().__init__()
         self.scope_stack = ScopeStack()
+        # For each mission being resolved, its captured variables:
+        # (depth, slot) -> name, in the order they are first used.
+        self.captures = []
+        # The missions being resolved, innermost last, and the number of
+        # `while` loops around the current node within the innermost one.
+        self.missions = []
+        self.loops = 0
 
     def resolve(self, statements: list):
         """
@@ -27,31 +51,33 @@ class Resolver:
         Args:
             statements: A list of top-level AST statement nodes.
         """
-        for statement in statements:
-            self.visit(statement)
-
-    def visit(self, node):
-        """
-        Generic visitor dispatch method.
-        
-        It dynamically constructs the name of the appropriate visitor method
-        based on the node's class name (e.g., `VarAssignNode` becomes
-        `visit_VarAssignNode`) and calls it. If no specific visitor method
-        is found, it falls back to `generic_visit`.
-        
-        Args:
-            node: The AST node to visit.
-        """
-        method_name = f'visit_{type(node).__name__}'
-        method = getattr(self, method_name, self.generic_visit)
-        method(node)
+        statements[:] = self.visit(statements)
 
-    def generic_visit(self, node):
+    def address(self, name: str):
         """
-        Fallback visitor method for AST nodes that do not require
-        specific resolution logic.
+        Returns the `(depth, slot)` of the variable `name`, or None for
+        missions and natives, and records it as a capture of every mission
+        it is declared outside of.
         """
-        pass # Silently ignore nodes we don't care about
+        address = self.scope_stack.address(name)
+        if address is not None and address[0] > 0:
+            depth, slot = address
+            for captures in reversed(self.captures):
+                captures.setdefault((depth, slot), name)
+                depth -= 1
+                if depth == 0:
+                    break
+        return address
+
+    @staticmethod
+    def annotate(node: IdentifierNode, address):
+        """Returns `node` with `address`, copying it if it already has another one."""
+        if node.address is None or node.address == address:
+            node.address = address
+            return node
+        copy = IdentifierNode.__new__(IdentifierNode)
+        copy.name, copy.line, copy.address = node.name, node.line, address
+        return copy
 
     # --- Scope-Modifying Statements ---
 
@@ -74,35 +100,60 @@ class Resolver:
         # 2. Create a NEW scope for the mission's body
         self.scope_stack.push()
 
-        # 3. Add parameters to the new scope
+        # 3. Add parameters to the new scope; they take the first slots
         if node.parameter:
-            for param in node.parameter:
+            for index, param in enumerate(node.parameter):
                 self.scope_stack.declare(param.name)
                 self.scope_stack.define(param.name)
+                node.parameter[index] = self.annotate(param, (0, self.scope_stack.allocate(param.name)))
         
         # 4. Resolve the mission's body in that new scope
-        self.resolve(node.body)
-
-        # 5. Exit the mission's scope
+        self.captures.append({})
+        self.missions.append(node)
+        loops, self.loops = self.loops, 0
+        node.body = yield node.body
+        self.loops = loops
+        self.missions.pop()
+
+        # 5. Record the frame layout and exit the mission's scope
+        node.frame_size = self.scope_stack.frame_size()
+        node.captures = [(name, depth, slot) for (depth, slot), name in self.captures.pop().items()]
         self.scope_stack.pop()
-
-    def visit_WhileNode(self, node: WhileNode):
-        """Resolves a while loop statement."""
-        self.visit(node.condition)
-        self.resolve(node.body) # body is a list of statements
+        return node
 
     def visit_ConditionalNode(self, node: ConditionalNode):
-        """Resolves an if-else conditional statement."""
-        self.visit(node.if_condition)
-        self.resolve(node.if_body)
+        """Resolves an if-else conditional statement, including its `else if` branches."""
+        node.if_condition = yield node.if_condition
+        node.if_body = yield node.if_body
+        node.else_if_condition = yield node.else_if_condition
         if node.else_body:
-            self.resolve(node.else_body)
-        # Note: A full implementation would also iterate over else_if blocks.
+            node.else_body = yield node.else_body
+        return node
+
+    def visit_WhileNode(self, node: WhileNode):
+        """Resolves a while loop. A `return` in its body is not in tail position."""
+        node.condition = yield node.condition
+        self.loops += 1
+        node.body = yield node.body
+        self.loops -= 1
+        return node
 
     def visit_ReturnNode(self, node: ReturnNode):
-        """Resolves a return statement."""
-        if node.value:
-            self.visit(node.value)
+        """
+        Resolves a return statement, marking its value as a tail call if it
+        is a call of the mission being resolved to itself.
+        """
+        node.value = yield node.value
+        call = node.value
+        if type(call) is MissionCallNode and self.missions and not self.loops:
+            name = call.identifier.name
+            # The name must still refer to the mission: the scope it was
+            # declared in is the one around the mission's own scope.
+            entries = self.scope_stack.index.get(name)
+            if (name == self.missions[-1].identifier.name and entries
+                    and entries[-1][0] == len(self.scope_stack.scopes) - 2):
+                call.tail = True
+        return node
 
     # --- Variable and Assignment Statements ---
 
@@ -115,11 +166,13 @@ class Resolver:
         ensures that a variable is not available in its own initializer.
         """
         # 1. Resolve the value it's being assigned to
-        self.visit(node.value)
+        node.value = yield node.value
 
-        # 2. Add the new variable to the current scope
+        # 2. Add the new variable to the current scope and give it a slot
         self.scope_stack.declare(node.identifier.name)
         self.scope_stack.define(node.identifier.name)
+        node.address = (0, self.scope_stack.allocate(node.identifier.name))
+        return node
 
     def visit_AssignNode(self, node: AssignNode):
         """
@@ -130,9 +183,11 @@ class Resolver:
         accessible scope.
         """
         # 1. Resolve the new value
-        self.visit(node.value)
+        node.value = yield node.value
         # 2. Check that the variable being assigned to exists
         self.scope_stack.is_defined(node.identifier.name)
+        node.address = self.address(node.identifier.name)
+        return node
 
 
     def visit_IdentifierNode(self, node: IdentifierNode):
@@ -143,43 +198,13 @@ class Resolver:
         to ensure the variable is defined and accessible from this point.
         """
         self.scope_stack.is_defined(node.name)
+        address = self.address(node.name)
+        return node if address is None else self.annotate(node, address)
 
-    def visit_MissionCallNode(self, node: MissionCallNode):
-        """Resolves a mission (function) call."""
-        # Resolve the function name itself (e.g., 'log', 'test')
-        self.visit(node.identifier) 
-        
-        # Resolve all argument expressions
-        if node.argument:
-            for arg in node.argument:
-                self.visit(arg)
+    # --- Literal Nodes ---
 
-    # --- Expression Nodes ---
-    
-    def visit_BinaryOpNode(self, node: BinaryOpNode):
-        """Resolves both sides of a binary operation."""
-        self.visit(node.left_node)
-        self.visit(node.right_node)
-
-    def visit_RelationalOpNode(self, node: RelationalOpNode):
-        """Resolves both sides of a relational operation."""
-        self.visit(node.left_node)
-        self.visit(node.right_node)
-
-    def visit_LogicalOpNode(self, node: LogicalOpNode):
-        """Resolves both sides of a logical operation."""
-        self.visit(node.left_node)
-        self.visit(node.right_node)
-        
-    def visit_BitwiseOpNode(self, node: BitwiseOpNode):
-        """Resolves both sides of a bitwise operation."""
-        self.visit(node.left_node)
-        self.visit(node.right_node)
-
-    def visit_UnaryOpNode(self, node: UnaryOpNode):
-        """Resolves the operand of a unary operation."""
-        self.visit(node.node)
-        
-    def visit_PostfixUnaryOpNode(self, node: PostfixUnaryOpNode):
-        """Resolves the operand of a postfix unary operation."""
-        self.visit(node.node)
\ No newline at end of file
+    def visit_NumberNode(self, node):
+        """Literals have nothing to resolve."""
+        return node
+
+    visit_StringNode = visit_BooleanNode = visit_NumberNode
@@ -1,16 +1,32 @@
+# The resolution states of a variable.
+DECLARED = 0
+DEFINED = 1
+
+# The missions implemented by the C++ interpreter itself.
+NATIVES = ("log", "logln", "input")
+
 class ScopeStack:
     """
     Manages a stack of scopes to enable lexical scoping for the resolver.
-    
+
     This class encapsulates the environment logic, abstracting the
-    implementation (a list of dictionaries) from the Resolver. Each scope
-    in the stack is a dictionary mapping variable names (str) to their
-    current resolution status (str, e.g., 'declared' or 'defined').
+    implementation from the Resolver. Each scope in the stack is a
+    dictionary mapping the variable names declared in it to their entries.
+    An entry is a `[level, state, slot]` list: the index of the scope in
+    the stack, the resolution status (`DECLARED` or `DEFINED`) and the
+    frame slot, or None for names without one (missions and natives).
+
+    `index` maps each name to the stack of its entries, innermost last, so
+    looking a name up does not depend on how deeply scopes are nested.
     """
     def __init__(self):
         """Initializes the ScopeStack and creates the global scope."""
         # The stack of scopes. Each item is a dictionary.
         self.scopes = []
+        # The entries of every declared name, from the outermost scope in.
+        self.index = {}
+        # The number of slots allocated in each scope.
+        self.frame_sizes = []
         # Create the global scope
         self.push()
         self.define_natives()
@@ -19,37 +35,71 @@ class ScopeStack:
         """
         Populates the global (outermost) scope with native functions
         that are implemented in the C++ interpreter.
-        
+
         This prevents the resolver from raising 'undefined variable'
         errors for built-in functions like 'log' or 'input'.
         """
-        self.declare("log")
-        self.define("log")
-        self.declare("logln")
-        self.define("logln")
-        self.declare("input")
-        self.define("input")
+        for name in NATIVES:
+            self.declare(name)
+            self.define(name)
 
     def push(self):
         """Pushes a new, empty scope onto the stack."""
         self.scopes.append({})
+        self.frame_sizes.append(0)
 
     def pop(self):
         """Pops the current scope off the stack."""
         if self.scopes:
-            self.scopes.pop()
+            index = self.index
+            for name in self.scopes.pop():
+                entries = index[name]
+                entries.pop()
+                if not entries:
+                    del index[name]
+            self.frame_sizes.pop()
+
+    def allocate(self, name: str) -> int:
+        """
+        Gives the variable `name`, declared in the current scope, the next
+        free slot of the scope's frame and returns it.
+        """
+        slot = self.scopes[-1][name][2] = self.frame_sizes[-1]
+        self.frame_sizes[-1] += 1
+        return slot
+
+    def frame_size(self) -> int:
+        """Returns the number of slots allocated in the current scope."""
+        return self.frame_sizes[-1]
+
+    def address(self, name: str):
+        """
+        Returns the lexical address of the variable `name` as a
+        `(depth, slot)` pair, where `depth` counts the scopes between the
+        current one and the one declaring the variable. Returns None for
+        names without a slot and for undeclared names.
+        """
+        entries = self.index.get(name)
+        if not entries:
+            return None
+        level, _, slot = entries[-1]
+        return None if slot is None else (len(self.scopes) - 1 - level, slot)
+
+    def _add(self, scope, name: str, state: int):
+        entry = scope[name] = [len(self.scopes) - 1, state, None]
+        self.index.setdefault(name, []).append(entry)
 
     def declare(self, name: str):
         """
         Declares a variable in the *current* (innermost) scope.
-        
+
         This method is responsible for detecting re-declaration errors
-        within the same local scope. Variables are marked as 'declared'
-        but not yet 'defined'.
-        
+        within the same local scope. Variables are marked as `DECLARED`
+        but not yet `DEFINED`.
+
         Args:
             name: The string name of the variable to declare.
-        
+
         Raises:
             Exception: If the variable is already declared in this scope.
         """
@@ -59,54 +109,58 @@ class ScopeStack:
         scope = self.scopes[-1]
         if name in scope:
             raise Exception(f"ResolverError: Variable '{name}' already defined in this scope.")
-        scope[name] = "declared"
+        self._add(scope, name, DECLARED)
 
     def define(self, name: str):
         """
-        Marks a variable as fully 'defined' in the current scope.
-        
+        Marks a variable as fully `DEFINED` in the current scope.
+
         This signifies that the variable's initializer (if any) has been
         processed and it is now available for use in subsequent statements.
-        
+
         Args:
             name: The string name of the variable to define.
         """
         if not self.scopes:
             return # Global scope
-            
-        self.scopes[-1][name] = "defined"
+
+        scope = self.scopes[-1]
+        entry = scope.get(name)
+        if entry is None:
+            self._add(scope, name, DEFINED)
+        else:
+            entry[1] = DEFINED
 
     def is_defined(self, name: str) -> bool:
         """
-        Checks if a variable is defined by traversing the scope stack backwards.
-        
-        This method implements the core logic of lexical scoping. It searches
-        from the innermost scope to the outermost (global) scope. It also
-        specifically raises an error if a variable is being accessed
-        during its own declaration (i.e., its status is 'declared' but
-        not yet 'defined').
-        
+        Checks if a variable is defined in the current or an enclosing scope.
+
+        This method implements the core logic of lexical scoping: the
+        innermost entry for the name in `index` is the declaration in
+        scope. It also specifically raises an error if a variable is being
+        accessed during its own declaration (i.e., its status is `DECLARED`
+        but not yet `DEFINED`).
+
         Args:
             name: The string name of the variable to look up.
-            
+
         Returns:
             True if the variable is found and defined.
-            
+
         Raises:
             Exception: If the variable is read in its own initializer.
             Exception: If the variable is not defined in any accessible scope.
         """
         if not self.scopes:
             return False
-            
-        # Check if the variable is being read in its own initializer
-        if name in self.scopes[-1] and self.scopes[-1][name] == 'declared':
-             raise Exception(f"ResolverError: Cannot read local variable '{name}' in its own initializer.")
-
-        # Loop from the innermost scope outwards
-        for scope in reversed(self.scopes):
-            if name in scope:
-                return True  # Found it!
-
-        # If we finished the loop and found nothing, it's an error.
-        raise Exception(f"ResolverError: Variable '{name}' is not defined.")
\ No newline at end of file
+
+        entries = self.index.get(name)
+        if entries:
+            level, state, _ = entries[-1]
+            # Check if the variable is being read in its own initializer
+            if state == DECLARED and level == len(self.scopes) - 1:
+                raise Exception(f"ResolverError: Cannot read local variable '{name}' in its own initializer.")
+            return True  # Found it!
+
+        # If no scope declares it, it's an error.
+        raise Exception(f"ResolverError: Variable '{name}' is not defined.")
@@ -0,0 +1,97 @@
+"""Field layout of AST nodes for the serializers.
+
+`node_fields(node)` returns the `(key, value)` pairs that the node's
+`to_dict` would produce, in the same order, but leaves child nodes as they
+are instead of converting them. A value is a scalar, a child node, a list of
+values or a tuple of `(key, value)` pairs for a nested plain object, so a
+serializer can walk the tree without building the dictionaries.
+"""
+from ..nodes.literal_nodes import NumberNode, StringNode, BooleanNode, IdentifierNode
+from ..nodes.expression_nodes import (BinaryOpNode, RelationalOpNode, LogicalOpNode, BitwiseOpNode,
+                                      UnaryOpNode, PostfixUnaryOpNode)
+from ..nodes.statement_nodes import (VarAssignNode, AssignNode, MissionNode, MissionCallNode,
+                                     ConditionalNode, WhileNode, ReturnNode)
+
+def _number(node):
+    value = float(node.value) if '.' in node.value else int(node.value)
+    return (("line", node.line), ("type", "Number"), ("value", value))
+
+def _operator(node_type):
+    return lambda node: (("line", node.line), ("type", node_type), ("operator", node.operator),
+                         ("left", node.left_node), ("right", node.right_node))
+
+def _unary(node_type):
+    return lambda node: (("line", node.line), ("type", node_type), ("operator", node.operator),
+                         ("node", node.node))
+
+def _identifier(node):
+    if node.address is None:
+        return (("line", node.line), ("type", "Identifier"), ("name", node.name))
+    depth, slot = node.address
+    return (("line", node.line), ("type", "Identifier"), ("name", node.name), ("depth", depth), ("slot", slot))
+
+def _assignment(node_type):
+    def fields(node):
+        if node.address is None:
+            return (("line", node.line), ("type", node_type), ("identifier", node.identifier.name),
+                    ("value", node.value))
+        depth, slot = node.address
+        return (("line", node.line), ("type", node_type), ("identifier", node.identifier.name),
+                ("depth", depth), ("slot", slot), ("value", node.value))
+    return fields
+
+def _mission(node):
+    fields = [("line", node.line), ("type", "Mission"), ("identifier", node.identifier.name)]
+    if node.parameter:
+        fields.append(("parameter", node.parameter))
+    if node.frame_size is not None:
+        fields.append(("frame_size", node.frame_size))
+        fields.append(("captures", [(("name", name), ("depth", depth), ("slot", slot))
+                                    for name, depth, slot in node.captures]))
+    if node.pure:
+        fields.append(("pure", True))
+    fields.append(("body", node.body))
+    return tuple(fields)
+
+def _mission_call(node):
+    fields = [("line", node.line), ("type", "MissionCall"), ("identifier", node.value)]
+    if node.argument:
+        fields.append(("argument", node.argument))
+    if node.tail:
+        fields.append(("tail", True))
+    return tuple(fields)
+
+def _conditional(node):
+    fields = [("line", node.if_condition.line), ("type", "Conditional"),
+              ("if", (("condition", node.if_condition), ("body", node.if_body)))]
+    if node.else_if_condition:
+        fields.append(("else_if", [(("condition", condition), ("body", body))
+                                   for condition, body in node.else_if_condition]))
+    if node.else_body:
+        fields.append(("else", node.else_body))
+    return tuple(fields)
+
+NODE_FIELDS = {
+    NumberNode: _number,
+    StringNode: lambda node: (("line", node.line), ("type", "String"), ("value", node.value)),
+    BooleanNode: lambda node: (("line", node.line), ("type", "Boolean"), ("value", node.value == 'true')),
+    IdentifierNode: _identifier,
+    BinaryOpNode: _operator("BinaryOp"),
+    RelationalOpNode: _operator("RelationalOp"),
+    LogicalOpNode: _operator("LogicalOp"),
+    BitwiseOpNode: _operator("BitwiseOp"),
+    UnaryOpNode: _unary("UnaryOp"),
+    PostfixUnaryOpNode: _unary("PostfixUnaryOp"),
+    VarAssignNode: _assignment("Var"),
+    AssignNode: _assignment("Assign"),
+    MissionNode: _mission,
+    MissionCallNode: _mission_call,
+    ConditionalNode: _conditional,
+    WhileNode: lambda node: (("line", node.line), ("type", "While"), ("condition", node.condition),
+                             ("body", node.body)),
+    ReturnNode: lambda node: (("line", node.line), ("type", "Return"), ("value", node.value)),
+}
+
+def node_fields(node):
+    """Returns the `(key, value)` pairs of `node`, in `to_dict` order."""
+    return NODE_FIELDS[type(node)](node)
@@ -0,0 +1,208 @@
+import struct
+from abc import ABC, abstractmethod
+from .ast_fields import node_fields
+
+# CBOR self-describe tag (55799). It marks the file as CBOR so the
+# interpreter can tell it apart from MessagePack by its first bytes.
+CBOR_MAGIC = b'\xd9\xd9\xf7'
+
+_pack_double = struct.Struct('>d').pack
+
+
+class BinaryWriter(ABC):
+    """
+    Base class for the binary AST writers.
+
+    Like `JsonWriter`, it walks the AST iteratively and writes one top-level
+    statement at a time. Subclasses supply the encoding of scalars and of
+    array and map headers; containers always have a known length here, so
+    each one is written as its header followed by its items. The top-level
+    array is the exception, since statements are streamed: subclasses write
+    its start and end in `start_statements` and `end_statements`.
+    """
+    def __init__(self, file):
+        self.file = file
+
+    def write_statements(self, statements):
+        """Writes `statements` as an array."""
+        write = self.file.write
+        self.start_statements()
+        count = 0
+        for statement in statements:
+            out = bytearray()
+            self.encode(statement, out)
+            write(out)
+            count += 1
+        self.end_statements(count)
+
+    @abstractmethod
+    def start_statements(self):
+        """Writes the start of the top-level array, before its length is known."""
+
+    @abstractmethod
+    def end_statements(self, count):
+        """Finishes the top-level array once its `count` statements are written."""
+
+    @abstractmethod
+    def constant(self, value):
+        """Returns the encoding of None, True or False."""
+
+    @abstractmethod
+    def header(self, kind, length, out):
+        """Appends the header of an `ARRAY` or `MAP` of `length` items to `out`."""
+
+    @abstractmethod
+    def integer(self, value, out):
+        """Appends the encoding of an int to `out`."""
+
+    @abstractmethod
+    def string(self, value, out):
+        """Appends the encoding of a str to `out`."""
+
+    def encode(self, value, out):
+        """Appends the encoding of `value` to the bytearray `out`."""
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if value is None or value is True or value is False:
+                out += self.constant(value)
+            elif isinstance(value, str):
+                self.string(value, out)
+            elif isinstance(value, int):
+                self.integer(value, out)
+            elif isinstance(value, float):
+                out += self.float_prefix + _pack_double(value)
+            elif isinstance(value, list):
+                self.header(self.ARRAY, len(value), out)
+                stack.extend(reversed(value))
+            else:
+                if isinstance(value, dict):
+                    pairs = tuple(value.items())
+                elif isinstance(value, tuple):
+                    pairs = value
+                else:
+                    pairs = node_fields(value)
+                self.header(self.MAP, len(pairs), out)
+                for key, item in reversed(pairs):
+                    stack.append(item)
+                    stack.append(key)
+
+
+class CborWriter(BinaryWriter):
+    """Writes the AST as CBOR (RFC 8949), prefixed with the self-describe tag."""
+    ARRAY = 4
+    MAP = 5
+    float_prefix = b'\xfb'
+
+    @staticmethod
+    def constant(value):
+        return b'\xf6' if value is None else b'\xf5' if value else b'\xf4'
+
+    @staticmethod
+    def header(major, length, out):
+        major <<= 5
+        if length < 24:
+            out.append(major | length)
+        elif length < 0x100:
+            out.append(major | 24)
+            out.append(length)
+        elif length < 0x10000:
+            out.append(major | 25)
+            out += length.to_bytes(2, 'big')
+        elif length < 0x100000000:
+            out.append(major | 26)
+            out += length.to_bytes(4, 'big')
+        else:
+            out.append(major | 27)
+            out += length.to_bytes(8, 'big')
+
+    def integer(self, value, out):
+        if 0 <= value < 0x10000000000000000:
+            self.header(0, value, out)
+        elif -0x10000000000000000 <= value < 0:
+            self.header(1, -1 - value, out)
+        else:
+            # Like the JSON reader, fall back to a double for huge numbers.
+            out += self.float_prefix + _pack_double(float(value))
+
+    def string(self, value, out):
+        data = value.encode('utf-8')
+        self.header(3, len(data), out)
+        out += data
+
+    def start_statements(self):
+        # An indefinite-length array, so statements can be streamed.
+        self.file.write(CBOR_MAGIC + b'\x9f')
+
+    def end_statements(self, count):
+        self.file.write(b'\xff')
+
+
+class MsgpackWriter(BinaryWriter):
+    """Writes the AST as MessagePack."""
+    ARRAY = 0
+    MAP = 1
+    float_prefix = b'\xcb'
+
+    # (fixed-size limit, fixed-size tag, 16-bit tag, 32-bit tag) by container kind.
+    HEADERS = ((16, 0x90, b'\xdc', b'\xdd'), (16, 0x80, b'\xde', b'\xdf'))
+
+    @staticmethod
+    def constant(value):
+        return b'\xc0' if value is None else b'\xc3' if value else b'\xc2'
+
+    def header(self, kind, length, out):
+        limit, fixed, tag16, tag32 = self.HEADERS[kind]
+        if length < limit:
+            out.append(fixed | length)
+        elif length < 0x10000:
+            out += tag16 + length.to_bytes(2, 'big')
+        else:
+            out += tag32 + length.to_bytes(4, 'big')
+
+    def integer(self, value, out):
+        if 0 <= value < 0x80:
+            out.append(value)
+        elif -32 <= value < 0:
+            out.append(value & 0xff)
+        elif 0 <= value < 0x10000000000000000:
+            for tag, size in ((0xcc, 1), (0xcd, 2), (0xce, 4), (0xcf, 8)):
+                if value < 1 << (8 * size):
+                    out.append(tag)
+                    out += value.to_bytes(size, 'big')
+                    return
+        elif -0x8000000000000000 <= value < 0:
+            for tag, size in ((0xd0, 1), (0xd1, 2), (0xd2, 4), (0xd3, 8)):
+                if value >= -(1 << (8 * size - 1)):
+                    out.append(tag)
+                    out += value.to_bytes(size, 'big', signed=True)
+                    return
+        else:
+            # Like the JSON reader, fall back to a double for huge numbers.
+            out += self.float_prefix + _pack_double(float(value))
+
+    def string(self, value, out):
+        data = value.encode('utf-8')
+        length = len(data)
+        if length < 32:
+            out.append(0xa0 | length)
+        elif length < 0x100:
+            out += b'\xd9' + bytes((length,))
+        elif length < 0x10000:
+            out += b'\xda' + length.to_bytes(2, 'big')
+        else:
+            out += b'\xdb' + length.to_bytes(4, 'big')
+        out += data
+
+    def start_statements(self):
+        # The statement count is not known up front: reserve a 32-bit array
+        # header and fill in the count once every statement is written.
+        self.header_position = self.file.tell()
+        self.file.write(b'\xdd\x00\x00\x00\x00')
+
+    def end_statements(self, count):
+        file = self.file
+        end_position = file.tell()
+        file.seek(self.header_position + 1)
+        file.write(count.to_bytes(4, 'big'))
+        file.seek(end_position)
@@ -0,0 +1,114 @@
+from json.encoder import encode_basestring_ascii
+from .ast_fields import node_fields
+
+# Marks the end of a container's items.
+_END = object()
+
+def _float(value):
+    # Matches the float formatting of the json module.
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return 'Infinity'
+    if value == -float('inf'):
+        return '-Infinity'
+    return float.__repr__(value)
+
+
+class JsonWriter:
+    """
+    Writes the AST as JSON to a text file, one top-level statement at a time.
+
+    The tree is walked iteratively with an explicit stack and no dictionaries
+    are built for node objects, so memory only holds the output of the
+    statement being written. Statements may be node objects or the
+    dictionaries produced by `to_dict` or `ArenaDictEmitter`.
+
+    The default output is compact. With `pretty`, it is byte-for-byte what
+    `json.dump(..., indent=4)` writes for the same data.
+    """
+    def __init__(self, file, pretty=False):
+        self.file = file
+        self.pretty = pretty
+        self.key_separator = ': ' if pretty else ':'
+
+    def write_statements(self, statements):
+        """Writes `statements` as a JSON array."""
+        write = self.file.write
+        count = 0
+        for statement in statements:
+            parts = ['[' if count == 0 else ',']
+            if self.pretty:
+                parts.append('\n    ')
+            self.encode(statement, parts, 1)
+            write(''.join(parts))
+            count += 1
+
+        if count == 0:
+            write('[]')
+        else:
+            write('\n]' if self.pretty else ']')
+
+    def encode(self, value, parts, level=0):
+        """Appends the JSON text of `value` to `parts`, starting at indent `level`."""
+        pretty = self.pretty
+        key_separator = self.key_separator
+        # Each frame holds an iterator over a container's items, the closing
+        # bracket and whether the items are (key, value) pairs.
+        stack = []
+        while True:
+            if value is None:
+                parts.append('null')
+            elif value is True:
+                parts.append('true')
+            elif value is False:
+                parts.append('false')
+            elif isinstance(value, str):
+                parts.append(encode_basestring_ascii(value))
+            elif isinstance(value, int):
+                parts.append(int.__repr__(value))
+            elif isinstance(value, float):
+                parts.append(_float(value))
+            else:
+                if isinstance(value, list):
+                    items, opener, closer, is_object = iter(value), '[', ']', False
+                elif isinstance(value, dict):
+                    items, opener, closer, is_object = iter(value.items()), '{', '}', True
+                elif isinstance(value, tuple):
+                    items, opener, closer, is_object = iter(value), '{', '}', True
+                else:
+                    items, opener, closer, is_object = iter(node_fields(value)), '{', '}', True
+
+                item = next(items, _END)
+                if item is _END:
+                    parts.append(opener + closer)
+                else:
+                    level += 1
+                    parts.append(opener + '\n' + '    ' * level if pretty else opener)
+                    stack.append((items, closer, is_object))
+                    if is_object:
+                        key, value = item
+                        parts.append(encode_basestring_ascii(key) + key_separator)
+                    else:
+                        value = item
+                    continue
+
+            # The value is complete: move on to the next item of the
+            # innermost open container, closing containers as they run out.
+            while stack:
+                items, closer, is_object = stack[-1]
+                item = next(items, _END)
+                if item is not _END:
+                    break
+                stack.pop()
+                level -= 1
+                parts.append('\n' + '    ' * level + closer if pretty else closer)
+            else:
+                return
+
+            parts.append(',\n' + '    ' * level if pretty else ',')
+            if is_object:
+                key, value = item
+                parts.append(encode_basestring_ascii(key) + key_separator)
+            else:
+                value = item
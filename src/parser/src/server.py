@@ -0,0 +1,349 @@
+"""A resident compile server.
+
+Every `python3 -m src.parser.src.main` pays for starting Python and
+importing the front end before it compiles anything. The server pays
+once: it listens on a Unix domain socket, or on stdin and stdout, and
+answers requests, one JSON object per line, from a pool of worker
+processes whose modules and caches stay warm.
+
+    {"id": 1, "op": "compile", "path": "/abs/file.komu", "output": "/abs/build/ast_output.json"}
+    {"id": 2, "op": "compile", "source": "logln(1);", "optimize": 2}
+    {"id": 3, "op": "check", "path": "/abs/file.komu"}
+    {"id": 4, "op": "stats"}
+
+Each response is one line with the request's `id`, `ok`, and on failure
+the diagnostic under `error`. `compile` writes the AST to `output`, or
+returns it under `ast` when no output is given (JSON only). It takes the
+options of main.py: `format`, `pretty`, `optimize`, `conservative`,
+`inline_threshold`, `arena` and `cache`. `check` runs the parser and the
+resolver only. `shutdown` stops the server.
+"""
+import io
+import os
+import sys
+import json
+import time
+import fcntl
+import socket
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .main import OUTPUT_FORMATS, parse_source, resolve, output_statements, write_output, remove_stale_outputs
+from .optimizer.optimizer import Optimizer, PASSES, INLINE_THRESHOLD
+from .serializer.json_writer import JsonWriter
+from .cache.compile_cache import CompileCache
+
+# The JSON ASTs a worker keeps for compile requests without an output file.
+MEMORY_CACHE_SIZE = 256
+
+PACKAGE_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# The state of a worker process.
+_cache_dir = None
+_asts = OrderedDict()
+
+def start_worker(cache_dir):
+    global _cache_dir
+    _cache_dir = cache_dir
+
+def source_stamp():
+    """Returns the time the front end's source last changed, so a server can tell it is out of date."""
+    newest = 0
+    for directory, subdirectories, files in os.walk(PACKAGE_ROOT):
+        subdirectories[:] = [name for name in subdirectories if name != '__pycache__']
+        for name in files:
+            if name.endswith('.py'):
+                newest = max(newest, os.stat(os.path.join(directory, name)).st_mtime_ns)
+    return newest
+
+def read_source(request):
+    if 'source' in request:
+        return request['source'].encode('utf-8')
+    if 'path' not in request:
+        raise Exception("Error: The request has neither a 'path' nor a 'source'.")
+    with open(request['path'], 'rb') as source_bytes:
+        return source_bytes.read()
+
+def front_end(source, use_arena):
+    ast = parse_source(io.StringIO(source.decode('utf-8')), use_arena)
+    resolve(ast, use_arena)
+    return ast
+
+def compile_request(request):
+    """Compiles the request's source; returns the response and the JSON AST to send with it, or None."""
+    output_format = request.get('format', 'json')
+    if output_format not in OUTPUT_FORMATS:
+        raise Exception(f"Error: Unknown output format '{output_format}'.")
+    use_arena = bool(request.get('arena', False))
+    output_path = request.get('output')
+    pretty = bool(request.get('pretty', False)) and output_path is not None
+    # The optimizer works on node objects, not on the arena.
+    optimize_level = 0 if use_arena else request.get('optimize', 1)
+    if optimize_level not in PASSES:
+        raise Exception(f"Error: Unknown optimization level {optimize_level}.")
+    conservative = bool(request.get('conservative', False))
+    inline_threshold = request.get('inline_threshold', INLINE_THRESHOLD)
+    if output_path is None and output_format != 'json':
+        raise Exception(f"Error: A {output_format.upper()} AST can only be written to an output file.")
+
+    source = read_source(request)
+    # The same key as main(), so the server and main.py share cached artifacts.
+    cache = CompileCache(_cache_dir)
+    cache_key = cache.key(source, output_format, pretty, optimize_level, conservative, inline_threshold, use_arena)
+    use_cache = _cache_dir is not None and request.get('cache', True)
+
+    if output_path is None:
+        if use_cache and cache_key in _asts:
+            _asts.move_to_end(cache_key, last=False)
+            return {'ok': True, 'cached': True}, _asts[cache_key]
+        ast = front_end(source, use_arena)
+        Optimizer(optimize_level, conservative, inline_threshold).optimize(ast)
+        buffer = io.StringIO()
+        JsonWriter(buffer, False).write_statements(output_statements(ast, use_arena))
+        if use_cache:
+            if len(_asts) >= MEMORY_CACHE_SIZE:
+                _asts.popitem()
+            _asts[cache_key] = buffer.getvalue()
+            _asts.move_to_end(cache_key, last=False)
+        return {'ok': True, 'cached': False}, buffer.getvalue()
+
+    cached = use_cache and cache.fetch(cache_key, output_path)
+    if not cached:
+        ast = front_end(source, use_arena)
+        Optimizer(optimize_level, conservative, inline_threshold).optimize(ast)
+        write_output(output_statements(ast, use_arena), output_path, output_format, pretty)
+        if use_cache:
+            cache.store(cache_key, output_path)
+    # As main() does for the interpreter's input, which is whichever AST file exists.
+    if os.path.basename(output_path) == f"ast_output.{output_format}":
+        remove_stale_outputs(os.path.dirname(output_path), output_format)
+    return {'ok': True, 'output': output_path, 'cached': cached}, None
+
+def serve(request):
+    """Answers a compile or check request, in a worker process. Errors become the response's diagnostics."""
+    try:
+        if request['op'] == 'check':
+            front_end(read_source(request), False)
+            return {'ok': True}, None
+        return compile_request(request)
+    except Exception as e:
+        return {'ok': False, 'error': str(e) or type(e).__name__}, None
+
+def encode(request_id, response, ast=None):
+    """Returns the response line. The AST is compact JSON already, so it is inserted as it is."""
+    line = json.dumps(dict(id=request_id, **response))
+    if ast is None:
+        return line
+    return f'{line[:-1]}, "ast": {ast}}}'
+
+
+class CompileServer:
+    """
+    Answers request lines with `jobs` worker processes (default: one per
+    CPU), and counts what it did for `stats`. `submit` returns a future of
+    the response line, so the transports can wait for it or not.
+
+    Once the front end's source changes, compile and check requests are
+    refused with `restart` set and the server stops, so that it never
+    answers with an outdated compiler.
+
+    A worker that dies, killed or crashed, breaks the whole pool; it is
+    replaced by a new one. The requests that were running fail, and the
+    next ones are answered as usual.
+    """
+    def __init__(self, jobs=None, cache_dir=None):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.executor = self.new_executor()
+        self.stamp = source_stamp()
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'compiled': 0, 'cached': 0, 'failed': 0, 'clients': 0, 'restarts': 0}
+        self.stopped = False
+
+    def new_executor(self):
+        return ProcessPoolExecutor(self.jobs, initializer=start_worker, initargs=(self.cache_dir,))
+
+    def replace_executor(self, broken):
+        """Starts new workers in place of the pool `broken`, unless another request already did."""
+        with self.lock:
+            if self.executor is not broken:
+                return
+            self.executor = self.new_executor()
+            self.counts['restarts'] += 1
+        broken.shutdown(wait=False)
+
+    def run(self, request):
+        """Returns the future of `serve(request)` in a worker."""
+        executor = self.executor
+        try:
+            work = executor.submit(serve, request)
+        except BrokenProcessPool:
+            self.replace_executor(executor)
+            executor = self.executor
+            work = executor.submit(serve, request)
+        return executor, work
+
+    def count(self, *names):
+        with self.lock:
+            for name in names:
+                self.counts[name] += 1
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        return dict(ok=True, workers=self.jobs, uptime=round(time.monotonic() - self.started, 3), **counts)
+
+    def submit(self, line):
+        self.count('requests')
+        future = Future()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            self.count('failed')
+            future.set_result(encode(None, {'ok': False, 'error': f"Error: Invalid request: {e}"}))
+            return future
+        request_id = request.get('id')
+        op = request.get('op')
+
+        if op in ('compile', 'check'):
+            if source_stamp() != self.stamp:
+                self.stopped = True
+                future.set_result(encode(request_id, {
+                    'ok': False, 'restart': True,
+                    'error': "Error: The front end changed since the compile server started; restart it."}))
+                return future
+
+            def answered(work):
+                try:
+                    response, ast = work.result()
+                except Exception as e:
+                    # A worker that died takes its request with it; it is not
+                    # retried, since the request may be what killed it.
+                    if isinstance(e, BrokenProcessPool):
+                        self.replace_executor(executor)
+                    response, ast = {'ok': False, 'error': f"Error: The compile server failed: {e}"}, None
+                self.count(('cached' if response.get('cached') else 'compiled') if response['ok'] else 'failed')
+                future.set_result(encode(request_id, response, ast))
+            executor, work = self.run(request)
+            work.add_done_callback(answered)
+            return future
+
+        if op == 'stats':
+            response = self.stats()
+        elif op == 'shutdown':
+            self.stopped = True
+            response = {'ok': True}
+        else:
+            self.count('failed')
+            response = {'ok': False, 'error': f"Error: Unknown operation '{op}'."}
+        future.set_result(encode(request_id, response))
+        return future
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def serve_stdio(server, input, output):
+    """
+    Answers the request lines read from `input` on `output`. Requests run
+    concurrently, so responses come in the order they finish; their `id`
+    tells them apart.
+    """
+    write_lock = threading.Lock()
+
+    def reply(future):
+        with write_lock:
+            output.write(future.result() + '\n')
+            output.flush()
+
+    for line in input:
+        if line.strip():
+            server.submit(line).add_done_callback(reply)
+            if server.stopped:
+                break
+    server.close()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Answers the requests of one client, in order, each line as it arrives."""
+    def handle(self):
+        compile_server = self.server.compile_server
+        compile_server.count('clients')
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            self.wfile.write(compile_server.submit(line).result().encode('utf-8') + b'\n')
+            if compile_server.stopped:
+                # shutdown() waits for serve_forever, so it cannot run on the thread that serves.
+                threading.Thread(target=self.server.shutdown).start()
+                break
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_socket(server, socket_path):
+    """Serves clients on the Unix domain socket `socket_path`, each on its own thread, until shut down."""
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+    # Servers started at once by several clients take turns, so that none
+    # removes the socket another has just bound.
+    with open(f"{socket_path}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                os.remove(socket_path)  # Left behind by a server that died.
+            else:
+                server.close()
+                raise Exception(f"Error: A compile server is already listening on {socket_path}.")
+            finally:
+                probe.close()
+        unix_server = UnixServer(socket_path, RequestHandler)
+    unix_server.compile_server = server
+    try:
+        unix_server.serve_forever()
+    finally:
+        unix_server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server.close()
+
+
+def default_socket_path():
+    return f"{sys.path[0]}/build/komu.sock"
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(prog="python3 -m src.parser.src.server")
+    transport = arg_parser.add_mutually_exclusive_group()
+    transport.add_argument("--socket", metavar="PATH",
+                           help="the Unix domain socket to listen on (default: build/komu.sock)")
+    transport.add_argument("--stdio", action="store_true",
+                           help="read requests from stdin and write the responses to stdout instead")
+    arg_parser.add_argument("-j", "--jobs", type=int, metavar="N",
+                            help="the number of worker processes (default: one per CPU)")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="always compile instead of reusing cached ASTs")
+    args = arg_parser.parse_args()
+
+    cache_dir = None if args.no_cache else f"{sys.path[0]}/build/.komu-cache"
+    compile_server = CompileServer(args.jobs, cache_dir)
+    try:
+        if args.stdio:
+            serve_stdio(compile_server, sys.stdin, sys.stdout)
+        else:
+            serve_socket(compile_server, args.socket or default_socket_path())
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
@@ -29,7 +29,18 @@ class TokenType(Enum):
     def __str__(self):
         return super().__str__()
 
+# TokenType members indexed by their small-int value.
+TOKEN_TYPES = (None,) + tuple(TokenType)
+
+# The small-int value of each token type. Parsers compare these instead of
+# TokenType members, and a TokenBuffer stores them as they are.
+(IDENTIFIER, NUMBER, STRING, ARITHMETIC_OPERATOR, RELATIONAL_OPERATOR, ASSIGNMENT_OPERATOR, LOGICAL_OPERATOR,
+ BITWISE_OPERATOR, UNARY_OPERATOR, KEYWORD, WHITESPACE, COMMENT, SEMICOLON, LPAREN, RPAREN, LBRACE, RBRACE,
+ COMMA, BOOLEAN, DOT, EOF) = (token_type._value_ for token_type in TokenType)
+
 class Token:
+    __slots__ = ('type', 'value', 'line')
+
     def __init__(self, type, value, line):
         self.type = type
         self.value = value
@@ -0,0 +1,567 @@
+"""Batch mode: runs one mission over columns of arguments with NumPy.
+
+A mission made of arithmetic, comparisons and conditionals is evaluated
+once over whole arrays instead of once per row: each expression becomes
+an array operation and each conditional a mask selecting the rows that
+take a branch. `BatchChecker` decides whether a mission qualifies and
+says why when it does not. Rows where the interpreter would raise an
+error, e.g. a division by zero, are marked while the arrays are computed
+and run again one by one on the Python back end, so every row gets
+exactly the result, or the errors, of a scalar call.
+
+NumPy is only imported when a batch runs.
+"""
+import csv
+import io
+import sys
+import argparse
+from ..nodes.expression_nodes import BinaryOpNode, RelationalOpNode, LogicalOpNode
+from ..nodes.statement_nodes import (VarAssignNode, AssignNode, MissionNode, MissionCallNode, ConditionalNode,
+                                     WhileNode, ReturnNode)
+from ..nodes.visitor import NodeVisitor
+from ..optimizer.constant_folder import BINARY, RELATIONAL, LOGICAL_OR, node_level, operand_level
+from ..optimizer.optimizer import PASSES
+from ..resolver.scope_stack import NATIVES
+from .machine import DEFAULT_MEMO_SIZE, INT_MIN, INT_MAX, KomuRuntimeError, FatalError, format_value
+from .runtime import Runtime
+from .transpiler import compile_statements
+
+NUMBER = "number"
+BOOLEAN = "boolean"
+
+# The statements a vectorised mission may contain.
+BATCH_STATEMENTS = (VarAssignNode, AssignNode, ConditionalNode, ReturnNode)
+
+ARITHMETIC_OPERATORS = ('+', '-', '*', '/', '%', '**')
+
+
+class NotVectorizable(Exception):
+    """A mission batch mode cannot evaluate over arrays; the message says why."""
+
+
+def numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise Exception("Batch mode needs NumPy; install it with `pip install numpy`.") from None
+    return numpy
+
+def top_level_missions(statements):
+    """Returns the missions defined at the top level of a program, by name; the last definition wins."""
+    return {statement.identifier.name: statement for statement in statements or ()
+            if type(statement) is MissionNode}
+
+def always_returns(body):
+    """Returns whether running `body` always ends with a `return`."""
+    for statement in body or ():
+        if type(statement) is ReturnNode:
+            return True
+        # The interpreter ignores the `else` of a conditional with `else if`
+        # arms, so only a plain if/else returns on both sides.
+        if type(statement) is ConditionalNode and not statement.else_if_condition and \
+                always_returns(statement.if_body) and always_returns(statement.else_body):
+            return True
+    return False
+
+
+class BatchChecker(NodeVisitor):
+    """
+    Checks that a mission can be evaluated over arrays, and infers the type
+    of its result.
+
+    It qualifies when its statements are variable declarations,
+    assignments, conditionals and returns, it returns a value on every
+    path, and its expressions only combine numbers and booleans the way
+    the interpreter accepts for every row: arithmetic, comparisons,
+    bitwise and logical operators, and calls of other missions that
+    qualify. Loops, printing, input, strings, `++`/`--`, outer variables and
+    recursion are rejected with the reason.
+    """
+    def __init__(self, missions, calling=(), used=None):
+        super().__init__()
+        self.missions = missions
+        # The missions being checked further up the call chain, and all those checked so far.
+        self.calling = calling
+        self.used = used if used is not None else []
+        self.name = None
+        self.types = {}
+        self.result = None
+        self.level = LOGICAL_OR
+
+    def check(self, name, parameter_types):
+        """Returns the type of the result of mission `name` called with arguments of `parameter_types`."""
+        mission = self.missions.get(name)
+        if mission is None:
+            raise NotVectorizable(f"there is no top-level mission '{name}'")
+        if name in self.calling:
+            raise NotVectorizable(f"mission '{name}' is recursive")
+        parameters = mission.parameter or []
+        if len(parameters) != len(parameter_types):
+            raise NotVectorizable(f"mission '{name}' takes {len(parameters)} arguments, "
+                                  f"not {len(parameter_types)}")
+        if mission.frame_size is None:
+            raise Exception(f"Mission '{name}' has no frame layout at line {mission.line}. "
+                            "Batch mode needs a resolved AST.")
+        if mission.captures:
+            raise NotVectorizable(f"mission '{name}' reads the outer variable '{mission.captures[0][0]}'")
+        if not always_returns(mission.body):
+            raise NotVectorizable(f"mission '{name}' can end without returning a value")
+        self.name, self.calling = name, self.calling + (name,)
+        self.types = dict(enumerate(parameter_types))
+        if name not in self.used:
+            self.used.append(name)
+        self.visit(self.block(mission.body))
+        return self.result
+
+    def reject(self, reason, line):
+        raise NotVectorizable(f"mission '{self.name}' {reason} at line {line}")
+
+    def block(self, statements):
+        for statement in statements or ():
+            if type(statement) is WhileNode:
+                self.reject("has a loop", statement.line)
+            if type(statement) is MissionNode:
+                self.reject("defines a mission", statement.line)
+            if type(statement) is MissionCallNode and statement.identifier.name in NATIVES:
+                self.reject(f"calls '{statement.identifier.name}'", statement.line)
+            if type(statement) not in BATCH_STATEMENTS:
+                self.reject("evaluates an expression for its effects", statement.line)
+        return statements
+
+    # --- Statements ---
+
+    def visit_VarAssignNode(self, node):
+        self.level = LOGICAL_OR
+        value_type = yield node.value
+        # A declaration starts a new variable, which may reuse the slot of another type.
+        self.types[node.address[1]] = value_type
+
+    def visit_AssignNode(self, node):
+        self.level = LOGICAL_OR
+        value_type = yield node.value
+        slot = node.address[1]
+        if self.types.get(slot, value_type) != value_type:
+            self.reject(f"assigns a {value_type} to the {self.types[slot]} '{node.identifier.name}'", node.line)
+        self.types[slot] = value_type
+
+    def visit_ConditionalNode(self, node):
+        arms = [(node.if_condition, node.if_body)] + list(node.else_if_condition or [])
+        for condition, body in arms:
+            self.level = LOGICAL_OR
+            if (yield condition) != BOOLEAN:
+                self.reject("has a condition that is not a boolean", condition.line)
+            yield self.block(body)
+        if not node.else_if_condition:
+            yield self.block(node.else_body)
+
+    def visit_ReturnNode(self, node):
+        self.level = LOGICAL_OR
+        value_type = yield node.value
+        if self.result not in (None, value_type):
+            self.reject(f"returns both a {self.result} and a {value_type}", node.line)
+        self.result = value_type
+
+    # --- Expressions ---
+
+    def unhandled(self, node):
+        kind = type(node).__name__[:-len("Node")]
+        self.reject(f"has a {kind} expression the interpreter cannot evaluate there", node.line)
+
+    def visit_NumberNode(self, node):
+        return NUMBER
+
+    def visit_StringNode(self, node):
+        self.reject("uses strings", node.line)
+
+    def visit_BooleanNode(self, node):
+        if self.level < RELATIONAL:
+            self.unhandled(node)
+        return BOOLEAN
+
+    def visit_IdentifierNode(self, node):
+        if node.address is None or node.address[0] != 0 or node.address[1] not in self.types:
+            self.reject(f"reads the outer variable '{node.name}'", node.line)
+        return self.types[node.address[1]]
+
+    def visit_operator(self, node):
+        if node_level(node) > self.level:
+            self.unhandled(node)
+        level = operand_level(node)
+        self.level = level
+        left = yield node.left_node
+        self.level = level
+        right = yield node.right_node
+        operator = node.operator
+        if type(node) is LogicalOpNode:
+            if left != BOOLEAN or right != BOOLEAN:
+                self.reject(f"applies '{operator}' to a number", node.line)
+            return BOOLEAN
+        if type(node) is RelationalOpNode:
+            if left != right:
+                self.reject(f"compares a {left} with a {right}", node.line)
+            if left == BOOLEAN and operator not in ('==', '!='):
+                self.reject(f"applies '{operator}' to booleans", node.line)
+            return BOOLEAN
+        if left != NUMBER or right != NUMBER:
+            self.reject(f"applies '{operator}' to a boolean", node.line)
+        if type(node) is BinaryOpNode and operator not in ARITHMETIC_OPERATORS:
+            self.reject(f"uses the operator '{operator}'", node.line)
+        return NUMBER
+
+    visit_BinaryOpNode = visit_RelationalOpNode = visit_LogicalOpNode = visit_BitwiseOpNode = visit_operator
+
+    def visit_UnaryOpNode(self, node):
+        operator = node.operator
+        if operator == '!' and self.level >= RELATIONAL:
+            self.level = RELATIONAL
+            if (yield node.node) != BOOLEAN:
+                self.reject("applies '!' to a number", node.line)
+            return BOOLEAN
+        if operator not in ('-', '+', '~'):
+            self.reject(f"uses the prefix operator '{operator}'", node.line)
+        self.level = BINARY
+        if (yield node.node) != NUMBER:
+            self.reject(f"applies '{operator}' to a boolean", node.line)
+        return NUMBER
+
+    def visit_PostfixUnaryOpNode(self, node):
+        self.reject(f"uses the postfix operator '{node.operator}'", node.line)
+
+    def visit_MissionCallNode(self, node):
+        name = node.identifier.name
+        if name in NATIVES:
+            self.reject(f"calls '{name}'", node.line)
+        argument_types = []
+        for argument in node.argument or []:
+            self.level = LOGICAL_OR
+            argument_types.append((yield argument))
+        return BatchChecker(self.missions, self.calling, self.used).check(name, argument_types)
+
+
+class BatchEvaluator(NodeVisitor):
+    """
+    Evaluates a mission that `BatchChecker` accepted over arrays of
+    arguments, one element per row.
+
+    Every expression is computed for all rows, and statements only change
+    the rows in `active`, those that reach them and have not returned yet.
+    Rows for which an operation would raise an error in the interpreter, or
+    give a result NumPy may compute differently from the C library, are
+    marked `irregular`; their results are not to be used.
+    """
+    def __init__(self, np, missions, rows):
+        super().__init__()
+        self.np = np
+        self.missions = missions
+        self.rows = rows
+        self.slots = {}
+        self.active = None
+        self.returned = None
+        self.result = None
+        self.irregular = np.zeros(rows, dtype=bool)
+
+    def call(self, name, arguments, active):
+        """Returns the results of mission `name` for the rows in `active`, and the irregular rows."""
+        mission = self.missions[name]
+        self.slots = dict(enumerate(arguments))
+        self.active = active.copy()
+        self.returned = ~active
+        self.visit(mission.body)
+        return self.result, self.irregular
+
+    def mark(self, rows):
+        """Marks the active rows among `rows` as irregular."""
+        self.irregular |= self.active & rows
+
+    def to_int(self, values):
+        """Returns `static_cast<int>` of each value, as `machine.to_int` does."""
+        np = self.np
+        in_range = (values > INT_MIN - 1) & (values < INT_MAX + 1)
+        return np.where(in_range, np.trunc(np.where(in_range, values, 0)), INT_MIN).astype(np.int64)
+
+    def store(self, slot, value):
+        old = self.slots.get(slot)
+        if old is None or old.dtype != value.dtype:
+            self.slots[slot] = value
+        else:
+            self.slots[slot] = self.np.where(self.active, value, old)
+
+    # --- Statements ---
+
+    def visit_VarAssignNode(self, node):
+        self.store(node.address[1], (yield node.value))
+
+    def visit_AssignNode(self, node):
+        self.store(node.address[1], (yield node.value))
+
+    def visit_ConditionalNode(self, node):
+        reaching = self.active
+        condition = yield node.if_condition
+        self.active = reaching & condition
+        yield node.if_body
+        rest = reaching & ~condition
+        if node.else_if_condition:
+            for condition, body in node.else_if_condition:
+                self.active = rest & ~self.returned
+                condition = yield condition
+                self.active = rest & condition & ~self.returned
+                yield body
+                rest = rest & ~condition
+        elif node.else_body:
+            self.active = rest & ~self.returned
+            yield node.else_body
+        self.active = reaching & ~self.returned
+
+    def visit_ReturnNode(self, node):
+        value = yield node.value
+        self.result = value if self.result is None else self.np.where(self.active, value, self.result)
+        self.returned |= self.active
+        self.active = self.np.zeros(self.rows, dtype=bool)
+
+    # --- Expressions ---
+
+    def visit_NumberNode(self, node):
+        return self.np.full(self.rows, float(node.value))
+
+    def visit_BooleanNode(self, node):
+        return self.np.full(self.rows, node.value == 'true')
+
+    def visit_IdentifierNode(self, node):
+        return self.slots[node.address[1]]
+
+    def visit_BinaryOpNode(self, node):
+        np = self.np
+        left = yield node.left_node
+        right = yield node.right_node
+        operator = node.operator
+        if operator == '+':
+            return left + right
+        if operator == '-':
+            return left - right
+        if operator == '*':
+            return left * right
+        if operator == '/':
+            self.mark(right == 0)
+            return left / right
+        if operator == '%':
+            left, right = self.to_int(left), self.to_int(right)
+            self.mark((right == 0) | ((left == INT_MIN) & (right == -1)))
+            # As the VM's arithmetic: fmod of the two ints, with a zero
+            # remainder always +0, as an int remainder is.
+            return np.fmod(left.astype(np.float64), np.where(right == 0, 1, right).astype(np.float64)) + 0.0
+        # The C library's pow handles the edge cases: leave those rows to it.
+        values = np.power(left, right)
+        self.mark(~np.isfinite(values) & np.isfinite(left) & np.isfinite(right))
+        return values
+
+    def visit_RelationalOpNode(self, node):
+        left = yield node.left_node
+        right = yield node.right_node
+        operator = node.operator
+        if operator == '==':
+            return left == right
+        if operator == '!=':
+            return left != right
+        if operator == '<':
+            return left < right
+        if operator == '<=':
+            return left <= right
+        if operator == '>':
+            return left > right
+        return left >= right
+
+    def visit_BitwiseOpNode(self, node):
+        left = self.to_int((yield node.left_node))
+        right = self.to_int((yield node.right_node))
+        if node.operator == '&':
+            return (left & right).astype(self.np.float64)
+        if node.operator == '^':
+            return (left ^ right).astype(self.np.float64)
+        return (left | right).astype(self.np.float64)
+
+    def visit_LogicalOpNode(self, node):
+        # Both sides are evaluated, as in the interpreter.
+        left = yield node.left_node
+        right = yield node.right_node
+        return left & right if node.operator == '&&' else left | right
+
+    def visit_UnaryOpNode(self, node):
+        value = yield node.node
+        if node.operator == '!':
+            return ~value
+        if node.operator == '-':
+            return -value
+        if node.operator == '~':
+            return (~self.to_int(value)).astype(self.np.float64)
+        return value
+
+    def visit_MissionCallNode(self, node):
+        arguments = []
+        for argument in node.argument or []:
+            arguments.append((yield argument))
+        callee = BatchEvaluator(self.np, self.missions, self.rows)
+        values, irregular = callee.call(node.identifier.name, arguments, self.active)
+        self.mark(irregular)
+        return values
+
+
+class BatchResult:
+    """
+    The results of a batch: `values` holds the result of each row, and
+    `errors` maps the rows for which the interpreter writes errors to what
+    it writes. `valid` is False for the rows whose call fails or returns
+    something other than the mission's type; they hold NaN or False in
+    `values`. `fallbacks` is the number of rows that were run one by one.
+    """
+    def __init__(self, values, valid, errors, fallbacks):
+        self.values = values
+        self.valid = valid
+        self.errors = errors
+        self.fallbacks = fallbacks
+
+    def formatted(self):
+        """Returns the result of each row as the interpreter prints it, nil for the rows without one."""
+        return [format_value(value.item()) if valid else "nil" for value, valid in zip(self.values, self.valid)]
+
+
+def run_batch(statements, name, arguments, memo_size=DEFAULT_MEMO_SIZE):
+    """
+    Runs the top-level mission `name` of the resolved program `statements`
+    once per row of `arguments`, a sequence with one array per parameter,
+    and returns a `BatchResult`. Raises NotVectorizable if the mission
+    cannot be evaluated over arrays.
+    """
+    np = numpy()
+    missions = top_level_missions(statements)
+    columns = [np.asarray(argument) for argument in arguments]
+    columns = [column if column.dtype == bool else column.astype(np.float64) for column in columns]
+    rows = len(columns[0]) if columns else 1
+    if any(column.ndim != 1 or len(column) != rows for column in columns):
+        raise Exception("The arguments of a batch must be columns of the same length.")
+    checker = BatchChecker(missions)
+    result_type = checker.check(name, [BOOLEAN if column.dtype == bool else NUMBER for column in columns])
+
+    with np.errstate(all='ignore'):
+        values, irregular = BatchEvaluator(np, missions, rows).call(name, columns, np.ones(rows, dtype=bool))
+    values = np.array(values, dtype=bool if result_type == BOOLEAN else np.float64)
+    valid = np.ones(rows, dtype=bool)
+    fallback_rows = np.flatnonzero(irregular)
+    errors = {}
+    if len(fallback_rows):
+        # The missions the batch calls are defined on their own, without the rest of the program.
+        program = compile_statements([missions[used] for used in checker.used])
+        runtime = Runtime(output=io.StringIO(), input=io.StringIO(), errors=io.StringIO(), memo_size=memo_size)
+        runtime.run(program)
+        function = runtime.missions[(name, len(columns))]
+        expected = bool if result_type == BOOLEAN else float
+        for row in fallback_rows:
+            runtime.errors = io.StringIO()
+            value = None
+            try:
+                value = function(*(column[row].item() for column in columns))
+            except KomuRuntimeError as error:
+                runtime.errors.write(f"Runtime Error: {error}\n")
+            except FatalError as error:
+                runtime.errors.write(f"Fatal Error: {error}\n")
+            if type(value) is expected:
+                values[row] = value
+            else:
+                values[row] = False if expected is bool else np.nan
+                valid[row] = False
+            if runtime.errors.getvalue():
+                errors[int(row)] = runtime.errors.getvalue()
+    return BatchResult(values, valid, errors, len(fallback_rows))
+
+
+def read_columns(paths, parameters):
+    """
+    Returns the argument columns of a batch read from `paths`: a CSV file
+    with a header, whose columns are matched to the `parameters` by name or
+    else taken in order; an `.npz` archive of arrays named after the
+    parameters; or one `.npy` file per parameter.
+    """
+    np = numpy()
+    if len(paths) == 1 and paths[0].endswith('.csv'):
+        with open(paths[0], newline='') as csv_file:
+            rows = list(csv.reader(csv_file))
+        if not rows:
+            raise Exception(f"The file {paths[0]} is empty.")
+        header, rows = rows[0], rows[1:]
+        indices = [header.index(name) for name in parameters] if set(parameters) <= set(header) \
+            else list(range(len(parameters)))
+        if len(header) < len(parameters):
+            raise Exception(f"The file {paths[0]} has {len(header)} columns for {len(parameters)} parameters.")
+        columns = []
+        for index in indices:
+            texts = [row[index].strip() for row in rows]
+            if texts and all(text in ('true', 'false') for text in texts):
+                columns.append(np.array([text == 'true' for text in texts]))
+            else:
+                columns.append(np.array([float(text) for text in texts]))
+        return columns
+    if len(paths) == 1 and paths[0].endswith('.npz'):
+        with np.load(paths[0]) as archive:
+            missing = [name for name in parameters if name not in archive]
+            if missing:
+                raise Exception(f"The file {paths[0]} has no array for the parameter '{missing[0]}'.")
+            return [archive[name] for name in parameters]
+    if len(paths) != len(parameters):
+        raise Exception(f"Expected one .npy file per parameter ({len(parameters)}), got {len(paths)}.")
+    return [np.load(path) for path in paths]
+
+def main(file_path, name, input_paths, optimize_level=1, memo_size=DEFAULT_MEMO_SIZE, output_path=None):
+    from .run import front_end
+    try:
+        source_file = open(file_path, 'r')
+    except FileNotFoundError:
+        print(f"Error: File {file_path} does not exist.")
+        sys.exit(1)
+
+    with source_file:
+        try:
+            statements = front_end(source_file, optimize_level, entry_points=(name,))
+            mission = top_level_missions(statements).get(name)
+            parameters = [parameter.name for parameter in mission.parameter or []] if mission else []
+            result = run_batch(statements, name, read_columns(input_paths, parameters), memo_size)
+        except NotVectorizable as e:
+            print(f"Error: The mission cannot run as a batch: {e}.")
+            sys.exit(1)
+        except Exception as e:
+            print(e)
+            sys.exit(1)
+
+    for row, message in sorted(result.errors.items()):
+        for line in message.splitlines():
+            print(f"Row {row}: {line}", file=sys.stderr)
+    if output_path is None:
+        sys.stdout.write("".join(f"{text}\n" for text in result.formatted()))
+    elif output_path.endswith('.npy'):
+        numpy().save(output_path, result.values)
+    else:
+        with open(output_path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow([name])
+            writer.writerows([text] for text in result.formatted())
+    print(f"{len(result.values)} rows, {result.fallbacks} run one by one, {len(result.errors)} with errors",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(prog="python3 -m src.parser.src.vm.batch",
+                                         description="Run a mission over columns of arguments with NumPy.")
+    arg_parser.add_argument("file_path", help="the .komu source file defining the mission")
+    arg_parser.add_argument("mission", help="the top-level mission to run")
+    arg_parser.add_argument("inputs", nargs="+",
+                            help="a .csv file with a header, an .npz archive of arrays named after the "
+                                 "parameters, or one .npy file per parameter")
+    arg_parser.add_argument("-O", type=int, choices=sorted(PASSES), default=1, dest="optimize_level",
+                            help="the optimization level (default: 1)")
+    arg_parser.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE, metavar="N",
+                            help=f"the memo size of pure missions for rows run one by one "
+                                 f"(default: {DEFAULT_MEMO_SIZE})")
+    arg_parser.add_argument("--output", metavar="FILE",
+                            help="write the results to a .npy or .csv file instead of printing them")
+    args = arg_parser.parse_args()
+
+    main(args.file_path, args.mission, args.inputs, optimize_level=args.optimize_level,
+         memo_size=args.memo_size, output_path=args.output)
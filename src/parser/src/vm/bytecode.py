@@ -0,0 +1,129 @@
+"""Instructions and code objects of the Komu bytecode VM.
+
+A program compiles to one `Code` for its top level and one for each
+mission definition. Instructions are `(opcode, argument, line)` tuples
+run by a stack machine: operands are pushed on the frame's stack,
+variables live in numbered slots of the frame, and jumps go to the index
+of an instruction in the same `Code`.
+"""
+
+# --- Values and variables ---
+CONST = 0           # Push constants[argument].
+LOAD = 1            # Push slot (index, name); an empty slot is a runtime error.
+LOAD_OR_NIL = 2     # Push slot (index, name); an empty slot warns and pushes nil.
+STORE = 3           # Pop a value into slot index.
+CHECK_DEFINED = 4   # Fail if slot (index, name) is empty, as an assignment does.
+POP = 5             # Drop the top of the stack.
+
+# --- Operators ---
+ADD = 10
+SUBTRACT = 11
+MULTIPLY = 12
+DIVIDE = 13
+MODULO = 14
+ARITHMETIC = 15     # Any other arithmetic operator, by name.
+COMPARE = 16        # A relational operator, by name.
+BITWISE = 17        # `&`, `^` or `|`.
+LOGICAL = 18        # `&&` or `||`, both operands evaluated.
+NOT = 19
+NEGATE = 20
+PREFIX = 21         # Any other prefix operator: (operator, index of its variable or None).
+POSTFIX = 22        # (index, name, operator) of `x++` or `x--`.
+
+# --- Control flow ---
+JUMP = 30           # Go to argument.
+JUMP_IF_FALSE = 31  # Pop a condition and go to argument if it is false.
+CATCH = 32          # Report runtime errors with (target, prefix) until UNCATCH.
+UNCATCH = 33
+RAISE = 34          # Raise a runtime error with the message argument.
+FATAL = 35          # Stop the program, as the interpreter crashes there.
+
+# --- Missions ---
+DEFINE = 40         # Define the mission compiled to the Code argument.
+MISSION = 41        # Push the mission (name, number of arguments) to call.
+CALL = 42           # Pop argument values and the mission, and run it.
+RESULT = 43         # Push the value the last mission returned.
+RETURN = 44         # Pop the returned value and leave the mission.
+END = 45            # Leave the mission without a value, or end the program.
+
+# --- Natives ---
+PRINT = 50          # Pop a value and write it, for `log` and `logln`.
+NEWLINE = 51
+INPUT = 52          # Read a line, as the value of the call.
+
+OPCODE_NAMES = {value: name for name, value in globals().items()
+                if name.isupper() and type(value) is int}
+
+
+class Code:
+    """
+    The instructions of a mission body or a program's top level.
+
+    `size` is the number of slots its frame needs. A mission's first slots
+    are its parameters, and its captured variables follow its own: each of
+    its `captures` is copied at call time from a slot of the frame the
+    mission was defined in. A capture that frame does not hold has no index
+    there; calling the mission is then a runtime error, with the message
+    kept alongside.
+    """
+    __slots__ = ('name', 'line', 'instructions', 'constants', 'constant_index', 'size',
+                 'parameters', 'captures', 'pure')
+
+    def __init__(self, name, line, parameters=0):
+        self.name = name
+        self.line = line
+        self.instructions = []
+        self.constants = []
+        self.constant_index = {}
+        self.size = 0
+        self.parameters = parameters
+        # (slot, index in the defining frame, error message) for each capture.
+        self.captures = []
+        self.pure = False
+
+    def __repr__(self):
+        return f'Code({self.name}, {len(self.instructions)} instructions)'
+
+    def emit(self, opcode, argument=None, line=0):
+        """Appends an instruction and returns its index."""
+        self.instructions.append((opcode, argument, line))
+        return len(self.instructions) - 1
+
+    def patch(self, index, argument):
+        """Sets the argument of the instruction at `index`, e.g. a jump target."""
+        opcode, _, line = self.instructions[index]
+        self.instructions[index] = (opcode, argument, line)
+
+    def constant(self, value):
+        """Returns the index of `value` in the constant pool, adding it if needed."""
+        # repr keeps true apart from 1 and -0 apart from 0.
+        key = (type(value), repr(value))
+        index = self.constant_index.get(key)
+        if index is None:
+            index = self.constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def reserve(self, index):
+        """Makes the frame big enough for slot `index`."""
+        if index >= self.size:
+            self.size = index + 1
+
+
+def disassemble(code):
+    """Returns a listing of `code` and of the missions defined in it."""
+    lines = [f"{code.name} (line {code.line}, {code.size} slots):"]
+    nested = []
+    for index, (opcode, argument, line) in enumerate(code.instructions):
+        if opcode == CONST:
+            shown = f"{argument} ({code.constants[argument]!r})"
+        elif opcode == DEFINE:
+            shown = argument.name
+            nested.append(argument)
+        else:
+            shown = "" if argument is None else repr(argument)
+        lines.append(f"{index:6}  {OPCODE_NAMES[opcode]:<14}{shown}".rstrip())
+    for mission in nested:
+        lines.append("")
+        lines.append(disassemble(mission))
+    return "\n".join(lines)
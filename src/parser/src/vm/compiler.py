@@ -0,0 +1,313 @@
+from ..nodes.literal_nodes import IdentifierNode
+from ..nodes.expression_nodes import BinaryOpNode, RelationalOpNode, BitwiseOpNode
+from ..nodes.statement_nodes import (VarAssignNode, AssignNode, MissionNode, MissionCallNode, ConditionalNode,
+                                     WhileNode, ReturnNode)
+from ..nodes.visitor import NodeVisitor
+from ..optimizer.constant_folder import BINARY, RELATIONAL, LOGICAL_OR, node_level, operand_level
+from ..optimizer.inliner import STATEMENT
+from .bytecode import (Code, CONST, LOAD, LOAD_OR_NIL, STORE, CHECK_DEFINED, POP, ADD, SUBTRACT, MULTIPLY,
+                       DIVIDE, MODULO, ARITHMETIC, COMPARE, BITWISE, LOGICAL, NOT, NEGATE, PREFIX, POSTFIX, JUMP,
+                       JUMP_IF_FALSE, CATCH, UNCATCH, RAISE, FATAL, DEFINE, MISSION, CALL, RESULT, RETURN, END,
+                       PRINT, NEWLINE, INPUT)
+
+# What the interpreter writes before a runtime error it recovers from, by
+# the kind of code that catches it.
+VAR_ERROR = "Runtime Error during variable declaration: "
+STATEMENT_ERROR = "Runtime Error during statement execution: "
+PRINT_ERROR = "Runtime Error during print: "
+
+# The statements execute_statement runs as such. Anything else in a body
+# is an expression evaluated for its effects, with its errors caught.
+STATEMENTS = (VarAssignNode, AssignNode, MissionNode, ConditionalNode, WhileNode, ReturnNode)
+
+ARITHMETIC_OPCODES = {'+': ADD, '-': SUBTRACT, '*': MULTIPLY, '/': DIVIDE, '%': MODULO}
+
+def statement_line(node):
+    """Returns the line the interpreter gives a statement."""
+    if type(node) is ConditionalNode:
+        return node.if_condition.line
+    return node.line
+
+
+class _Statement:
+    """An expression or mission call making up a whole statement."""
+    __slots__ = ('expression',)
+
+    def __init__(self, expression):
+        self.expression = expression
+
+
+class Compiler(NodeVisitor):
+    """
+    Compiles a resolved AST to bytecode for the `Machine`.
+
+    The code runs the program the way `interpreter.cpp` does in frame mode
+    (`--frames`): variables are found by the addresses the resolver gave
+    them, and a mission copies the outer variables it uses when it is
+    called, so its writes to them are discarded when it returns. Each
+    expression is compiled for the evaluate function that would see it,
+    so that it fails, warns or crashes where the interpreter does, e.g.
+    `(1 | 2) & 3` is a runtime error and an undefined variable read by
+    evaluate_relational_expression is nil.
+
+    The AST must come from the `Resolver`; a variable without an address
+    is an error here rather than when the program runs.
+    """
+    def __init__(self):
+        super().__init__()
+        # The code being emitted and the mission it belongs to, or None at the top level.
+        self.code = None
+        self.mission = None
+        # The evaluate level of the expression about to be visited.
+        self.level = STATEMENT
+
+    def compile(self, statements: list):
+        """Returns the `Code` for the top level of the program `statements`."""
+        self.code, self.mission = Code("<program>", 1), None
+        self.visit(self.block(statements))
+        self.code.emit(END)
+        return self.code
+
+    def block(self, statements):
+        return [statement if type(statement) in STATEMENTS else _Statement(statement)
+                for statement in statements or ()]
+
+    def emit(self, opcode, argument=None, line=0):
+        return self.code.emit(opcode, argument, line)
+
+    def here(self):
+        return len(self.code.instructions)
+
+    def find(self, depth, slot):
+        """Returns the index of the variable at (depth, slot) in the current frame, or None."""
+        if depth == 0:
+            self.code.reserve(slot)
+            return slot
+        index = None
+        if self.mission is not None:
+            for position, (_, captured_depth, captured_slot) in enumerate(self.mission.captures):
+                if (captured_depth, captured_slot) == (depth, slot):
+                    index = self.mission.frame_size + position
+        return index
+
+    def slot(self, name, address, line):
+        """
+        Returns the index of a variable in the current frame, or emits the
+        runtime error of reading it and returns None.
+        """
+        if address is None:
+            raise Exception(f"Variable '{name}' has no lexical address at line {line}. "
+                            "The VM needs a resolved AST.")
+        depth, slot = address
+        index = self.find(depth, slot)
+        if index is None:
+            self.emit(RAISE, f"Error: No captured variable at depth {depth}, slot {slot} at line: {line}.", line)
+        return index
+
+    def caught(self, catch, prefix):
+        """Ends the code from `catch` on, whose runtime errors are written after `prefix` and skipped."""
+        self.emit(UNCATCH)
+        self.code.patch(catch, (self.here(), prefix))
+
+    # --- Statements ---
+
+    def visit__Statement(self, node):
+        expression = node.expression
+        if type(expression) is MissionCallNode:
+            # A call runs as a statement; its errors are not caught there.
+            self.level = STATEMENT
+            yield expression
+            return
+        catch = self.emit(CATCH)
+        self.level = LOGICAL_OR
+        yield expression
+        self.emit(POP)
+        self.caught(catch, STATEMENT_ERROR)
+
+    def visit_VarAssignNode(self, node):
+        if node.address is None:
+            raise Exception(f"Variable '{node.identifier.name}' has no lexical address at line {node.line}. "
+                            "The VM needs a resolved AST.")
+        catch = self.emit(CATCH)
+        self.level = LOGICAL_OR
+        yield node.value
+        # The variable goes in the current frame, whatever its depth.
+        slot = node.address[1]
+        self.code.reserve(slot)
+        self.emit(STORE, slot, node.line)
+        self.caught(catch, VAR_ERROR)
+
+    def visit_AssignNode(self, node):
+        name = node.identifier.name
+        index = self.slot(name, node.address, node.line)
+        if index is None:
+            return
+        self.emit(CHECK_DEFINED, (index, name), node.line)
+        self.level = LOGICAL_OR
+        yield node.value
+        self.emit(STORE, index, node.line)
+
+    def visit_MissionNode(self, node):
+        name = node.identifier.name
+        if node.frame_size is None:
+            raise Exception(f"Mission '{name}' has no frame layout at line {node.line}. "
+                            "The VM needs a resolved AST.")
+        code = Code(name, node.line, len(node.parameter or ()))
+        code.pure = node.pure
+        code.size = node.frame_size + len(node.captures)
+        # The captures come from the frame running the definition: this one.
+        line = statement_line(node.body[0]) if node.body else 0
+        for position, (_, depth, slot) in enumerate(node.captures, node.frame_size):
+            index = self.find(depth - 1, slot)
+            message = None
+            if index is None:
+                message = f"Error: No captured variable at depth {depth - 1}, slot {slot} at line: {line}."
+            code.captures.append((position, index, message))
+        self.emit(DEFINE, code, node.line)
+
+        outer = self.code, self.mission
+        self.code, self.mission = code, node
+        yield self.block(node.body)
+        self.emit(END)
+        self.code, self.mission = outer
+
+    def visit_ConditionalNode(self, node):
+        line = node.if_condition.line
+        self.level = LOGICAL_OR
+        yield node.if_condition
+        skip = self.emit(JUMP_IF_FALSE, None, line)
+        yield self.block(node.if_body)
+        ends = [self.emit(JUMP)]
+        self.code.patch(skip, self.here())
+        if node.else_if_condition:
+            for condition, body in node.else_if_condition:
+                self.level = LOGICAL_OR
+                yield condition
+                skip = self.emit(JUMP_IF_FALSE, None, condition.line)
+                yield self.block(body)
+                ends.append(self.emit(JUMP))
+                self.code.patch(skip, self.here())
+        elif node.else_body:
+            # The interpreter ignores the `else` of a conditional with `else if` arms.
+            yield self.block(node.else_body)
+        for end in ends:
+            self.code.patch(end, self.here())
+
+    def visit_WhileNode(self, node):
+        start = self.here()
+        self.level = LOGICAL_OR
+        yield node.condition
+        leave = self.emit(JUMP_IF_FALSE, None, node.line)
+        yield self.block(node.body)
+        self.emit(JUMP, start)
+        self.code.patch(leave, self.here())
+
+    def visit_ReturnNode(self, node):
+        self.level = LOGICAL_OR
+        yield node.value
+        self.emit(RETURN, None, node.line)
+
+    # --- Expressions ---
+
+    def unhandled(self, node):
+        """Emits the error of evaluating `node` below the level that handles it."""
+        kind = type(node).__name__[:-len("Node")]
+        self.emit(RAISE, f"Error: Cannot evaluate unhandled expression type '{kind}' at line: {node.line}.",
+                  node.line)
+
+    def visit_NumberNode(self, node):
+        self.emit(CONST, self.code.constant(float(node.value)), node.line)
+
+    def visit_StringNode(self, node):
+        self.emit(CONST, self.code.constant(node.value), node.line)
+
+    def visit_BooleanNode(self, node):
+        if self.level < RELATIONAL:
+            return self.unhandled(node)
+        self.emit(CONST, self.code.constant(node.value == 'true'), node.line)
+
+    def visit_IdentifierNode(self, node):
+        level = self.level
+        index = self.slot(node.name, node.address, node.line)
+        if index is not None:
+            self.emit(LOAD_OR_NIL if level >= RELATIONAL else LOAD, (index, node.name), node.line)
+
+    def visit_operator(self, node):
+        if node_level(node) > self.level:
+            return self.unhandled(node)
+        level = operand_level(node)
+        self.level = level
+        yield node.left_node
+        self.level = level
+        yield node.right_node
+        operator = node.operator
+        node_type = type(node)
+        if node_type is BinaryOpNode:
+            opcode = ARITHMETIC_OPCODES.get(operator)
+            if opcode is None:
+                self.emit(ARITHMETIC, operator, node.line)
+            else:
+                self.emit(opcode, None, node.line)
+        elif node_type is RelationalOpNode:
+            self.emit(COMPARE, operator, node.line)
+        elif node_type is BitwiseOpNode:
+            self.emit(BITWISE, operator, node.line)
+        else:
+            self.emit(LOGICAL, operator, node.line)
+
+    visit_BinaryOpNode = visit_RelationalOpNode = visit_LogicalOpNode = visit_BitwiseOpNode = visit_operator
+
+    def visit_UnaryOpNode(self, node):
+        operator, operand = node.operator, node.node
+        if operator == '!' and self.level >= RELATIONAL:
+            self.level = RELATIONAL
+            yield operand
+            self.emit(NOT, None, node.line)
+            return
+        self.level = BINARY
+        yield operand
+        if operator == '-':
+            self.emit(NEGATE, None, node.line)
+            return
+        index = None
+        if type(operand) is IdentifierNode:
+            # Reading the operand already failed if there is no such slot.
+            index = self.find(*operand.address)
+        self.emit(PREFIX, (operator, index), node.line)
+
+    def visit_PostfixUnaryOpNode(self, node):
+        operand = node.node
+        if type(operand) is not IdentifierNode:
+            self.emit(FATAL, f"Error: The operand of '{node.operator}' is not a variable at line: {node.line}.",
+                      node.line)
+            return
+        index = self.slot(operand.name, operand.address, node.line)
+        if index is not None:
+            self.emit(POSTFIX, (index, operand.name, node.operator), node.line)
+
+    def visit_MissionCallNode(self, node):
+        statement = self.level == STATEMENT
+        name, line = node.identifier.name, node.line
+        arguments = node.argument or []
+        if name == 'log' or name == 'logln':
+            for argument in arguments:
+                catch = self.emit(CATCH)
+                self.level = LOGICAL_OR
+                yield argument
+                self.emit(PRINT, None, line)
+                self.caught(catch, PRINT_ERROR)
+            if name == 'logln':
+                self.emit(NEWLINE, None, line)
+        elif name == 'input':
+            # Its arguments are never evaluated.
+            self.emit(INPUT, None, line)
+        else:
+            # The mission is looked up before its arguments are evaluated.
+            self.emit(MISSION, (name, len(arguments)), line)
+            for argument in arguments:
+                self.level = LOGICAL_OR
+                yield argument
+            self.emit(CALL, len(arguments), line)
+        # The value of a call is whatever the last mission returned.
+        if not statement:
+            self.emit(RESULT, None, line)
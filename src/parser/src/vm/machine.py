@@ -0,0 +1,458 @@
+import math
+import operator
+import re
+import struct
+import sys
+from collections import OrderedDict
+from .bytecode import (CONST, LOAD, LOAD_OR_NIL, STORE, CHECK_DEFINED, POP, ADD, SUBTRACT, MULTIPLY, DIVIDE,
+                       MODULO, ARITHMETIC, COMPARE, BITWISE, LOGICAL, NOT, NEGATE, PREFIX, POSTFIX, JUMP,
+                       JUMP_IF_FALSE, CATCH, UNCATCH, RAISE, FATAL, DEFINE, MISSION, CALL, RESULT, RETURN, END,
+                       PRINT, NEWLINE, INPUT)
+
+# The number of results remembered per pure mission, as in the interpreter.
+DEFAULT_MEMO_SIZE = 1024
+
+# Marks a slot that holds no variable yet. Nil is None.
+EMPTY = object()
+
+INT_MIN = -2**31
+INT_MAX = 2**31 - 1
+
+COMPARISONS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+BITWISE_OPERATORS = {'&': operator.and_, '^': operator.xor, '|': operator.or_}
+
+_DOUBLE = struct.Struct('<d')
+
+_ESCAPE = re.compile(r'\\([nt])')
+
+# The longest prefix of a line std::stod reads as a number.
+_NUMBER = re.compile(r'\s*([+-]?)(0x(?=\.?[0-9a-f])[0-9a-f]*(?:\.[0-9a-f]*)?(?:p[+-]?\d+)?'
+                     r'|(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?|inf(?:inity)?|nan(?:\(\w*\))?)', re.IGNORECASE)
+
+
+class KomuRuntimeError(Exception):
+    """A runtime error of the program, which the interpreter reports and may recover from."""
+
+
+class FatalError(Exception):
+    """An error the interpreter crashes on, e.g. a condition that is not a boolean."""
+
+
+def expected(kind, line):
+    return FatalError(f"Error: Expected a {kind} at line: {line}.")
+
+def to_int(value):
+    """Returns `static_cast<int>(value)` as x86 computes it, INT_MIN where C++ leaves it undefined."""
+    if INT_MIN - 1 < value < INT_MAX + 1:
+        return int(value)
+    return INT_MIN
+
+def arguments_key(arguments):
+    """
+    Returns the memo key of a pure mission's arguments. Numbers compare by
+    their bits, as in the interpreter, so -0 and 0 stay apart, and so do NaNs
+    of either sign.
+    """
+    return tuple((type(value), _DOUBLE.pack(value) if type(value) is float else value) for value in arguments)
+
+def power(left, right):
+    """Returns `pow(left, right)` as the C library computes it."""
+    try:
+        return math.pow(left, right)
+    except ValueError:
+        # A negative number to a fraction, or zero to a negative power.
+        if left != 0:
+            return math.nan
+        return math.copysign(math.inf, left) if right.is_integer() and right % 2 == 1 else math.inf
+    except OverflowError:
+        return -math.inf if left < 0 and right.is_integer() and right % 2 == 1 else math.inf
+
+def arithmetic(operator, left, right, line):
+    """Returns the value of a binary operator, or raises the interpreter's error for it."""
+    if type(left) is float and type(right) is float:
+        if operator == '+':
+            return left + right
+        if operator == '-':
+            return left - right
+        if operator == '*':
+            return left * right
+        if operator == '/':
+            if right == 0:
+                raise KomuRuntimeError(f"Error: Division by zero, at line: {line}.")
+            return left / right
+        if operator == '%':
+            if right == 0:
+                raise KomuRuntimeError(f"Error: Modulo by zero, at line: {line}.")
+            left, right = to_int(left), to_int(right)
+            if right == 0 or (left == INT_MIN and right == -1):
+                raise FatalError(f"Error: Integer division by zero at line: {line}.")
+            # C++ `%` truncates towards zero, as fmod does, but gives an
+            # int, which has no negative zero.
+            return math.fmod(left, right) + 0.0
+        if operator == '**':
+            return power(left, right)
+        raise KomuRuntimeError(f"Error: Unknown binary operator '{operator}' for numbers at line: {line}.")
+    if type(left) is str and type(right) is str:
+        if operator == '+':
+            return left + right
+        raise KomuRuntimeError(f"Error: Operator '{operator}' cannot be applied to strings at line: {line}.")
+    raise KomuRuntimeError(f"Error: Type mismatch for operator '{operator}' "
+                           f"Cannot mix numbers, strings, or booleans at line: {line}.")
+
+def compare(operator, left, right, line):
+    """Returns the value of a relational operator, or raises the interpreter's error for it."""
+    if type(left) is float and type(right) is float:
+        return COMPARISONS[operator](left, right)
+    for kind, name in ((str, "strings"), (bool, "booleans")):
+        if type(left) is kind and type(right) is kind:
+            if operator == '==':
+                return left == right
+            if operator == '!=':
+                return left != right
+            raise KomuRuntimeError(f"Error: Operator '{operator}' cannot be applied to {name} at line: {line}.")
+    if operator == '==':
+        return False
+    if operator == '!=':
+        return True
+    raise KomuRuntimeError(f"Error: Type mismatch for relational operator '{operator}' at line: {line}.")
+
+def format_value(value):
+    """Returns `value` as print_value writes it."""
+    if type(value) is float:
+        if math.isnan(value) and math.copysign(1.0, value) < 0:
+            return "-nan"
+        # std::cout writes doubles with 6 significant digits.
+        return '%g' % value
+    if type(value) is str:
+        if '\\' not in value:
+            return value
+        return _ESCAPE.sub(lambda match: '\n' if match.group(1) == 'n' else '\t', value)
+    if type(value) is bool:
+        return "true" if value else "false"
+    return "nil"
+
+def input_value(text):
+    """Returns the value of a line of input: the number std::stod reads from it, or the line itself."""
+    match = _NUMBER.match(text)
+    if match is None:
+        return text
+    sign, digits = match.groups()
+    lowered = digits.lower()
+    if lowered.startswith('0x'):
+        value = float.fromhex(digits)
+    elif lowered.startswith('nan'):
+        value = math.nan
+    else:
+        value = float(digits)
+        mantissa = lowered.partition('e')[0]
+        if math.isinf(value) and not lowered.startswith('inf') or value == 0 and mantissa.strip('0.'):
+            raise FatalError(f"Error: The input {text!r} is out of range for a number.")
+    return -value if sign == '-' else value
+
+
+class Mission:
+    """A defined mission: its code, the slots of the frame it was defined in, and its results if pure."""
+    __slots__ = ('code', 'definition', 'memo')
+
+    def __init__(self, code, definition, memo):
+        self.code = code
+        self.definition = definition
+        self.memo = memo
+
+
+class Frame:
+    """
+    The state of a running mission, or of the top level: its slots, its
+    operand stack, the next instruction, and the (target, stack depth,
+    prefix) of each runtime error handler in effect.
+    """
+    __slots__ = ('code', 'slots', 'stack', 'handlers', 'pc', 'mission', 'key')
+
+    def __init__(self, code, slots, mission=None, key=None):
+        self.code = code
+        self.slots = slots
+        self.stack = []
+        self.handlers = []
+        self.pc = 0
+        self.mission = mission
+        # The arguments to remember the result under, for a pure mission.
+        self.key = key
+
+
+class Machine:
+    """
+    Runs compiled Komu programs with the semantics of `interpreter.cpp` in
+    frame mode.
+
+    `log` and `logln` write to `output`, `input` reads lines from `input`,
+    and the errors the interpreter writes to std::cerr go to `errors`. A
+    runtime error outside of a `var` declaration, an expression statement
+    or a `log` argument ends the program with "Runtime Error: ..." written
+    to `errors`, as the interpreter does. Where the interpreter crashes,
+    e.g. on a condition that is not a boolean, `run` raises `FatalError`.
+
+    As in the interpreter, up to `memo_size` results of each mission marked
+    pure are remembered, by argument values.
+    """
+    def __init__(self, output=None, input=None, errors=None, memo_size=DEFAULT_MEMO_SIZE):
+        self.output = output if output is not None else sys.stdout
+        self.input = input if input is not None else sys.stdin
+        self.errors = errors if errors is not None else sys.stderr
+        self.memo_size = memo_size
+        self.missions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def run(self, program):
+        """Runs the `Code` of a program's top level."""
+        write = self.output.write
+        missions = self.missions
+        callers = []
+        frame = Frame(program, [EMPTY] * program.size)
+        # The value of the last mission that returned one.
+        result = None
+
+        while True:
+            instructions = frame.code.instructions
+            constants = frame.code.constants
+            slots, stack, handlers = frame.slots, frame.stack, frame.handlers
+            push, pop = stack.append, stack.pop
+            pc = frame.pc
+            try:
+                while True:
+                    opcode, argument, line = instructions[pc]
+                    pc += 1
+                    if opcode == LOAD:
+                        value = slots[argument[0]]
+                        if value is EMPTY:
+                            raise KomuRuntimeError(f"Error: Undefined variable '{argument[1]}' at line: {line}.")
+                        push(value)
+                    elif opcode == LOAD_OR_NIL:
+                        value = slots[argument[0]]
+                        if value is EMPTY:
+                            self.errors.write(f"Error: Undefined variable {argument[1]}at line: {line}\n")
+                            value = None
+                        push(value)
+                    elif opcode == CONST:
+                        push(constants[argument])
+                    elif opcode == STORE:
+                        slots[argument] = pop()
+                    elif opcode == JUMP_IF_FALSE:
+                        condition = pop()
+                        if condition is False:
+                            pc = argument
+                        elif condition is not True:
+                            raise expected("boolean", line)
+                    elif opcode == JUMP:
+                        pc = argument
+                    elif opcode == COMPARE:
+                        right = pop()
+                        left = stack[-1]
+                        if type(left) is float and type(right) is float:
+                            stack[-1] = COMPARISONS[argument](left, right)
+                        else:
+                            stack[-1] = compare(argument, left, right, line)
+                    elif opcode == ADD:
+                        right = pop()
+                        left = stack[-1]
+                        if type(left) is float and type(right) is float:
+                            stack[-1] = left + right
+                        else:
+                            stack[-1] = arithmetic('+', left, right, line)
+                    elif opcode == SUBTRACT:
+                        right = pop()
+                        left = stack[-1]
+                        if type(left) is float and type(right) is float:
+                            stack[-1] = left - right
+                        else:
+                            stack[-1] = arithmetic('-', left, right, line)
+                    elif opcode == MULTIPLY:
+                        right = pop()
+                        left = stack[-1]
+                        if type(left) is float and type(right) is float:
+                            stack[-1] = left * right
+                        else:
+                            stack[-1] = arithmetic('*', left, right, line)
+                    elif opcode == DIVIDE:
+                        right = pop()
+                        left = stack[-1]
+                        if type(left) is float and type(right) is float and right != 0:
+                            stack[-1] = left / right
+                        else:
+                            stack[-1] = arithmetic('/', left, right, line)
+                    elif opcode == MODULO:
+                        right = pop()
+                        stack[-1] = arithmetic('%', stack[-1], right, line)
+                    elif opcode == POSTFIX:
+                        index, name, operator = argument
+                        value = slots[index]
+                        if value is EMPTY:
+                            raise KomuRuntimeError(f"Error: Unknown postfix unary operator '{operator}'"
+                                                   f"at line: {line}.")
+                        if type(value) is not float:
+                            raise expected("number", line)
+                        if operator == '++':
+                            slots[index] = value + 1
+                        elif operator == '--':
+                            slots[index] = value - 1
+                        else:
+                            value = None
+                        push(value)
+                    elif opcode == CATCH:
+                        target, prefix = argument
+                        handlers.append((target, len(stack), prefix))
+                    elif opcode == UNCATCH:
+                        handlers.pop()
+                    elif opcode == POP:
+                        pop()
+                    elif opcode == MISSION:
+                        name, count = argument
+                        mission = missions.get(name)
+                        if mission is None:
+                            raise KomuRuntimeError(f"Error: Calling undefined mission '{name}' at line: {line}.")
+                        if mission.code.parameters != count:
+                            raise KomuRuntimeError(f"Error: Mission '{name}' expected {mission.code.parameters} "
+                                                   f"arguments, but got {count}.")
+                        push(mission)
+                    elif opcode == CALL:
+                        if argument:
+                            arguments = stack[-argument:]
+                            del stack[-argument:]
+                        else:
+                            arguments = []
+                        mission = pop()
+                        code = mission.code
+                        key = None
+                        if mission.memo is not None:
+                            key = arguments_key(arguments)
+                            remembered = mission.memo.get(key, EMPTY)
+                            if remembered is not EMPTY:
+                                mission.memo.move_to_end(key, last=False)
+                                self.hits += 1
+                                result = remembered
+                                continue
+                            self.misses += 1
+                        arguments.extend([EMPTY] * (code.size - argument))
+                        definition = mission.definition
+                        for position, index, message in code.captures:
+                            if index is None:
+                                raise KomuRuntimeError(message)
+                            arguments[position] = definition[index]
+                        frame.pc = pc
+                        callers.append(frame)
+                        frame = Frame(code, arguments, mission, key)
+                        break
+                    elif opcode == RESULT:
+                        push(result)
+                    elif opcode == RETURN:
+                        result = pop()
+                        if frame.mission is None:
+                            raise FatalError(f"Error: Return outside of a mission at line: {line}.")
+                        if frame.key is not None:
+                            self.remember(frame.mission.memo, frame.key, result)
+                        frame = callers.pop()
+                        break
+                    elif opcode == END:
+                        if frame.mission is None:
+                            return
+                        frame = callers.pop()
+                        break
+                    elif opcode == PRINT:
+                        write(format_value(pop()))
+                    elif opcode == NEWLINE:
+                        write("\n")
+                    elif opcode == LOGICAL:
+                        right = pop()
+                        left = stack[-1]
+                        if type(left) is not bool or type(right) is not bool:
+                            raise expected("boolean", line)
+                        stack[-1] = (left or right) if argument == '||' else (left and right)
+                    elif opcode == NOT:
+                        value = stack[-1]
+                        if type(value) is not bool:
+                            raise expected("boolean", line)
+                        stack[-1] = not value
+                    elif opcode == NEGATE:
+                        value = stack[-1]
+                        if type(value) is not float:
+                            raise expected("number", line)
+                        stack[-1] = -value
+                    elif opcode == BITWISE:
+                        right = pop()
+                        left = stack[-1]
+                        if type(left) is not float or type(right) is not float:
+                            raise expected("number", line)
+                        stack[-1] = float(BITWISE_OPERATORS[argument](to_int(left), to_int(right)))
+                    elif opcode == ARITHMETIC:
+                        right = pop()
+                        stack[-1] = arithmetic(argument, stack[-1], right, line)
+                    elif opcode == PREFIX:
+                        push(self.prefix(argument, pop(), slots, line))
+                    elif opcode == CHECK_DEFINED:
+                        if slots[argument[0]] is EMPTY:
+                            raise KomuRuntimeError(f"Error: Assignment to undefined variable '{argument[1]}' "
+                                                   f"at line: {line}.")
+                    elif opcode == DEFINE:
+                        memo = OrderedDict() if argument.pure and self.memo_size > 0 else None
+                        missions[argument.name] = Mission(argument, slots, memo)
+                    elif opcode == INPUT:
+                        self.output.flush()
+                        text = self.input.readline()
+                        result = input_value(text[:-1] if text.endswith('\n') else text)
+                    elif opcode == RAISE:
+                        raise KomuRuntimeError(argument)
+                    elif opcode == FATAL:
+                        raise FatalError(argument)
+                    else:
+                        raise FatalError(f"Error: Unknown opcode {opcode} at line: {line}.")
+            except KomuRuntimeError as error:
+                # Missions do not catch errors; the innermost handler of a caller does.
+                while not frame.handlers:
+                    if not callers:
+                        self.errors.write(f"Runtime Error: {error}\n")
+                        return
+                    frame = callers.pop()
+                target, depth, prefix = frame.handlers.pop()
+                del frame.stack[depth:]
+                frame.pc = target
+                self.errors.write(f"{prefix}{error}\n")
+
+    def prefix(self, argument, value, slots, line):
+        """Returns the value of a prefix operator other than `!` and `-`, applied to `value`."""
+        operator, index = argument
+        if type(value) is not float:
+            raise expected("number", line)
+        if operator == '+':
+            return value
+        if operator == '~':
+            return float(~to_int(value))
+        if index is None:
+            raise KomuRuntimeError(f"Error: Unary operator '{operator}' can only be applied to variables "
+                                   f"at line: {line}.")
+        variable = slots[index]
+        if type(variable) is not float:
+            raise expected("number", line)
+        if operator == '++':
+            slots[index] = variable + 1
+            return variable + 1
+        if operator == '--':
+            slots[index] = variable - 1
+            return variable - 1
+        return None
+
+    def remember(self, memo, key, result):
+        """Adds a pure mission's result to its memo, evicting the least recently used."""
+        if key in memo:
+            return
+        if len(memo) >= self.memo_size:
+            memo.popitem()
+        memo[key] = result
+        memo.move_to_end(key, last=False)
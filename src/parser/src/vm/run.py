@@ -0,0 +1,96 @@
+import sys
+import argparse
+from ..lexer.lexer import Lexer
+from ..parser.stream_parser import StreamParser
+from ..resolver.resolver import Resolver
+from ..optimizer.optimizer import Optimizer, PASSES
+from ..cache.compile_cache import CompileCache
+from .bytecode import disassemble
+from .compiler import Compiler
+from .machine import Machine, FatalError, DEFAULT_MEMO_SIZE
+from .transpiler import PythonTranspiler, load_program
+from .runtime import Runtime
+
+def front_end(source_file, optimize_level=1, entry_points=()):
+    """
+    Returns the resolved and optimized statements of the program read from
+    `source_file`. `entry_points` are missions to keep though it never calls them.
+    """
+    statements = StreamParser(Lexer(source_file).iter_tokens()).parse()
+    Resolver().resolve(statements)
+    Optimizer(optimize_level, entry_points=entry_points).optimize(statements)
+    return statements
+
+def compile_file(source_file, optimize_level=1):
+    """Returns the bytecode of the program read from `source_file`."""
+    return Compiler().compile(front_end(source_file, optimize_level))
+
+def transpile_file(source_file, optimize_level=1, cache=None):
+    """
+    Returns the Python code object of the program read from `source_file`,
+    reusing the one compiled for the same source in this process or in
+    `cache`, a `CompileCache`.
+    """
+    source = source_file.read().encode('utf-8')
+    return load_program(source, lambda source, level: front_end(source.decode('utf-8'), level), optimize_level,
+                        cache, name=getattr(source_file, 'name', "<komu>"))
+
+def main(file_path, optimize_level=1, memo_size=DEFAULT_MEMO_SIZE, show_bytecode=False, python=False,
+         show_python=False, use_cache=True):
+    try:
+        source_file = open(file_path, 'r')
+    except FileNotFoundError:
+        print(f"Error: File {file_path} does not exist.")
+        sys.exit(1)
+
+    with source_file:
+        try:
+            if show_python:
+                print(PythonTranspiler().transpile(front_end(source_file, optimize_level)), end="")
+                return
+            if python:
+                cache = CompileCache(f"{sys.path[0]}/build/.komu-cache") if use_cache else None
+                program = transpile_file(source_file, optimize_level, cache)
+            else:
+                program = compile_file(source_file, optimize_level)
+        except Exception as e:
+            print(e)
+            sys.exit(1)
+
+    if show_bytecode:
+        print(disassemble(program))
+        return
+
+    try:
+        if python:
+            Runtime(memo_size=memo_size).run(program)
+        else:
+            Machine(memo_size=memo_size).run(program)
+    except FatalError as e:
+        sys.stdout.flush()
+        print(f"Fatal Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(prog="python3 -m src.parser.src.vm.run",
+                                         description="Run a .komu program in-process on the bytecode VM or as Python.")
+    arg_parser.add_argument("file_path", help="the .komu source file to run")
+    arg_parser.add_argument("-O", type=int, choices=sorted(PASSES), default=1, dest="optimize_level",
+                            help="the optimization level (default: 1)")
+    arg_parser.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE, metavar="N",
+                            help="the number of results remembered per pure mission, 0 to remember none "
+                                 f"(default: {DEFAULT_MEMO_SIZE})")
+    arg_parser.add_argument("--bytecode", action="store_true",
+                            help="print the compiled bytecode instead of running it")
+    arg_parser.add_argument("--python", action="store_true",
+                            help="transpile the program to Python and run that instead of the bytecode")
+    arg_parser.add_argument("--python-source", action="store_true",
+                            help="print the Python the program transpiles to instead of running it")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="always transpile the source instead of reusing cached Python code")
+    args = arg_parser.parse_args()
+
+    main(args.file_path, optimize_level=args.optimize_level, memo_size=args.memo_size,
+         show_bytecode=args.bytecode and not args.python, python=args.python, show_python=args.python_source,
+         use_cache=not args.no_cache)
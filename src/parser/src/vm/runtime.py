@@ -0,0 +1,248 @@
+"""Run-time support of the Python back end.
+
+Programs transpiled by `PythonTranspiler` call these functions for every
+operator, so that values keep Komu's types: numbers are floats, and
+Python's own `+` would add booleans and its `%` would not truncate. Each
+one tries the common case first and falls back on the `Machine` helpers,
+which raise the interpreter's errors.
+"""
+import sys
+from collections import OrderedDict
+from .machine import (EMPTY, DEFAULT_MEMO_SIZE, KomuRuntimeError, FatalError, expected, to_int, arithmetic,
+                      compare, format_value, input_value, arguments_key)
+
+# The Python recursion limit while a program runs. Python-to-Python calls
+# do not use the C stack, so missions can recurse deeply.
+RECURSION_LIMIT = 200000
+
+def add(left, right, line):
+    if type(left) is float and type(right) is float:
+        return left + right
+    return arithmetic('+', left, right, line)
+
+def subtract(left, right, line):
+    if type(left) is float and type(right) is float:
+        return left - right
+    return arithmetic('-', left, right, line)
+
+def multiply(left, right, line):
+    if type(left) is float and type(right) is float:
+        return left * right
+    return arithmetic('*', left, right, line)
+
+def divide(left, right, line):
+    if type(left) is float and type(right) is float and right != 0:
+        return left / right
+    return arithmetic('/', left, right, line)
+
+def modulo(left, right, line):
+    return arithmetic('%', left, right, line)
+
+def equal(left, right, line):
+    if type(left) is float and type(right) is float:
+        return left == right
+    return compare('==', left, right, line)
+
+def not_equal(left, right, line):
+    if type(left) is float and type(right) is float:
+        return left != right
+    return compare('!=', left, right, line)
+
+def less(left, right, line):
+    if type(left) is float and type(right) is float:
+        return left < right
+    return compare('<', left, right, line)
+
+def less_equal(left, right, line):
+    if type(left) is float and type(right) is float:
+        return left <= right
+    return compare('<=', left, right, line)
+
+def greater(left, right, line):
+    if type(left) is float and type(right) is float:
+        return left > right
+    return compare('>', left, right, line)
+
+def greater_equal(left, right, line):
+    if type(left) is float and type(right) is float:
+        return left >= right
+    return compare('>=', left, right, line)
+
+def bitwise_and(left, right, line):
+    if type(left) is not float or type(right) is not float:
+        raise expected("number", line)
+    return float(to_int(left) & to_int(right))
+
+def bitwise_xor(left, right, line):
+    if type(left) is not float or type(right) is not float:
+        raise expected("number", line)
+    return float(to_int(left) ^ to_int(right))
+
+def bitwise_or(left, right, line):
+    if type(left) is not float or type(right) is not float:
+        raise expected("number", line)
+    return float(to_int(left) | to_int(right))
+
+def logical_and(left, right, line):
+    if type(left) is not bool or type(right) is not bool:
+        raise expected("boolean", line)
+    return left and right
+
+def logical_or(left, right, line):
+    if type(left) is not bool or type(right) is not bool:
+        raise expected("boolean", line)
+    return left or right
+
+def truth(value, line):
+    """Returns a condition, which must be a boolean."""
+    if type(value) is not bool:
+        raise expected("boolean", line)
+    return value
+
+def negation(value, line):
+    if type(value) is not bool:
+        raise expected("boolean", line)
+    return not value
+
+def number(value, line):
+    """Returns the operand of a prefix operator, which must be a number."""
+    if type(value) is not float:
+        raise expected("number", line)
+    return value
+
+def negative(value, line):
+    return -number(value, line)
+
+def inverted(value, line):
+    return float(~to_int(number(value, line)))
+
+def not_a_variable(value, operator, line):
+    number(value, line)
+    raise KomuRuntimeError(f"Error: Unary operator '{operator}' can only be applied to variables at line: {line}.")
+
+def postfix(value, name, operator, line):
+    """Returns the variable `name` holding `value` after `++` or `--`."""
+    if value is EMPTY:
+        raise KomuRuntimeError(f"Error: Unknown postfix unary operator '{operator}'at line: {line}.")
+    if type(value) is not float:
+        raise expected("number", line)
+    return value + 1 if operator == '++' else value - 1
+
+def postfix_value(value, name, operator, line):
+    """Returns the value of `name++` or `name--`, the variable's value before it changes."""
+    postfix(value, name, operator, line)
+    return value
+
+def undefined(name, line):
+    raise KomuRuntimeError(f"Error: Undefined variable '{name}' at line: {line}.")
+
+def unassigned(name, line):
+    raise KomuRuntimeError(f"Error: Assignment to undefined variable '{name}' at line: {line}.")
+
+def fail(message):
+    raise KomuRuntimeError(message)
+
+def fatal(message):
+    raise FatalError(message)
+
+def memo_key(*arguments):
+    return arguments_key(arguments)
+
+# The helpers a transpiled program uses, by the name it gives them.
+HELPERS = {function.__name__: function for function in (
+    add, subtract, multiply, divide, modulo, arithmetic, equal, not_equal, less, less_equal, greater, greater_equal,
+    compare, bitwise_and, bitwise_xor, bitwise_or, logical_and, logical_or, truth, negation, number, negative,
+    inverted, not_a_variable, postfix, postfix_value, undefined, unassigned, fail, fatal, memo_key)}
+
+
+class Runtime:
+    """
+    The state of a transpiled program while it runs: its I/O, the missions
+    defined so far, by name and number of parameters, and `result`, a
+    one-item list holding the value the last mission returned.
+
+    `run` takes the code object `PythonTranspiler` compiled and behaves as
+    `Machine.run`: runtime errors nothing catches end the program with
+    "Runtime Error: ...", and crashes of the interpreter raise
+    `FatalError`, as does recursion too deep for Python.
+    """
+    def __init__(self, output=None, input=None, errors=None, memo_size=DEFAULT_MEMO_SIZE):
+        self.output = output if output is not None else sys.stdout
+        self.input = input if input is not None else sys.stdin
+        self.errors = errors if errors is not None else sys.stderr
+        self.memo_size = memo_size
+        self.missions = {}
+        self.arities = {}
+        self.result = [None]
+        self.hits = 0
+        self.misses = 0
+
+    def run(self, code):
+        namespace = dict(HELPERS, EMPTY=EMPTY, KomuRuntimeError=KomuRuntimeError)
+        exec(code, namespace)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, RECURSION_LIMIT))
+        try:
+            namespace['program'](self)
+        except KomuRuntimeError as error:
+            self.errors.write(f"Runtime Error: {error}\n")
+        except RecursionError:
+            raise FatalError("Error: Missions called each other too deeply.") from None
+        finally:
+            sys.setrecursionlimit(limit)
+
+    def define(self, name, count, function):
+        """Makes `function` the mission `name`, replacing any other definition."""
+        self.missions.pop((name, self.arities.get(name)), None)
+        self.missions[(name, count)] = function
+        self.arities[name] = count
+
+    def lookup(self, name, count, line):
+        """Raises the error of calling the mission `name` with `count` arguments, which is not defined."""
+        if name not in self.arities:
+            raise KomuRuntimeError(f"Error: Calling undefined mission '{name}' at line: {line}.")
+        raise KomuRuntimeError(f"Error: Mission '{name}' expected {self.arities[name]} arguments, "
+                               f"but got {count}.")
+
+    def write(self, value):
+        self.output.write(format_value(value))
+
+    def newline(self):
+        self.output.write("\n")
+
+    def read(self):
+        """Reads a line of input, as the value of the `input` call."""
+        self.output.flush()
+        text = self.input.readline()
+        value = self.result[0] = input_value(text[:-1] if text.endswith('\n') else text)
+        return value
+
+    def caught(self, prefix, error):
+        self.errors.write(f"{prefix}{error}\n")
+
+    def nil(self, name, line):
+        """Returns the value of an undefined variable read by evaluate_relational_expression."""
+        self.errors.write(f"Error: Undefined variable {name}at line: {line}\n")
+        return None
+
+    def memo(self):
+        return OrderedDict()
+
+    def recall(self, memo, key):
+        """Returns the result remembered for `key`, or EMPTY."""
+        value = memo.get(key, EMPTY)
+        if value is EMPTY:
+            self.misses += 1
+            return EMPTY
+        memo.move_to_end(key, last=False)
+        self.hits += 1
+        self.result[0] = value
+        return value
+
+    def remember(self, memo, key, value):
+        if self.memo_size <= 0 or key in memo:
+            return
+        if len(memo) >= self.memo_size:
+            memo.popitem()
+        memo[key] = value
+        memo.move_to_end(key, last=False)
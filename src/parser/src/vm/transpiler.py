@@ -0,0 +1,514 @@
+import math
+import marshal
+import re
+import sys
+from ..cache.compile_cache import CompileCache
+from ..nodes.literal_nodes import NumberNode, StringNode, BooleanNode, IdentifierNode
+from ..nodes.expression_nodes import (BinaryOpNode, RelationalOpNode, LogicalOpNode, BitwiseOpNode, UnaryOpNode,
+                                      PostfixUnaryOpNode)
+from ..nodes.statement_nodes import VarAssignNode, MissionCallNode, ConditionalNode, WhileNode, ReturnNode
+from ..nodes.visitor import NodeVisitor
+from ..optimizer.constant_folder import BINARY, RELATIONAL, LOGICAL_OR, node_level, operand_level
+from ..optimizer.inliner import STATEMENT
+from .compiler import VAR_ERROR, STATEMENT_ERROR, PRINT_ERROR, STATEMENTS, statement_line
+
+# The runtime helper called for each operator.
+OPERATOR_HELPERS = {
+    BinaryOpNode: {'+': 'add', '-': 'subtract', '*': 'multiply', '/': 'divide', '%': 'modulo'},
+    RelationalOpNode: {'==': 'equal', '!=': 'not_equal', '<': 'less', '<=': 'less_equal', '>': 'greater',
+                       '>=': 'greater_equal'},
+    BitwiseOpNode: {'&': 'bitwise_and', '^': 'bitwise_xor', '|': 'bitwise_or'},
+    LogicalOpNode: {'&&': 'logical_and', '||': 'logical_or'},
+}
+
+# The methods of the `Runtime` a program binds to locals when it starts.
+RUNTIME_METHODS = ('define', 'lookup', 'write', 'newline', 'read', 'caught', 'nil', 'memo', 'recall', 'remember')
+
+_NOT_IDENTIFIER = re.compile(r'\W')
+
+# Code objects compiled in this process, by cache key.
+_compiled = {}
+
+
+class _Statement:
+    """An expression or mission call making up a whole statement."""
+    __slots__ = ('expression',)
+
+    def __init__(self, expression):
+        self.expression = expression
+
+
+class _Function:
+    """The Python function being generated: the program, or a mission at `depth` missions deep."""
+    __slots__ = ('mission', 'depth', 'memo', 'assigned', 'safe')
+
+    def __init__(self, mission, depth, safe, memo=None):
+        self.mission = mission
+        self.depth = depth
+        # The name of a pure mission's memo.
+        self.memo = memo
+        # The indices of the locals the function gives a value, and those
+        # that always hold one when they are read.
+        self.assigned = set()
+        self.safe = safe
+
+
+def is_literal(node):
+    return type(node) in (NumberNode, StringNode, BooleanNode)
+
+def always_defined(parameters, body):
+    """
+    Returns the slots of a function that hold a value whenever they are
+    read: its parameters, and the variables whose every declaration is a
+    literal, so it cannot fail and leave them undefined.
+    """
+    declared, failing = set(), set()
+    pending = list(body or ())
+    while pending:
+        node = pending.pop()
+        node_type = type(node)
+        if node_type is VarAssignNode and node.address is not None:
+            (declared if is_literal(node.value) else failing).add(node.address[1])
+        elif node_type is ConditionalNode:
+            pending.extend(node.if_body or ())
+            for _, body in node.else_if_condition or ():
+                pending.extend(body or ())
+            pending.extend(node.else_body or ())
+        elif node_type is WhileNode:
+            pending.extend(node.body or ())
+    return set(range(parameters)) | (declared - failing)
+
+
+class PythonTranspiler(NodeVisitor):
+    """
+    Translates a resolved AST to the source of a Python function,
+    `program(runtime)`, that runs it the way the `Compiler`'s bytecode runs
+    on the `Machine`, in frame mode.
+
+    Komu variables become locals of the function, named by the frame index
+    the `Compiler` would give them, so that variables sharing a slot share
+    a local. Missions become nested functions: a mission's parameters are
+    its arguments, and it copies the outer variables it uses into locals
+    when it is called, so its writes to them are discarded when it returns.
+    `while` and `if` become Python statements, and the interpreter's catch
+    points become `try` statements. Operators call the helpers in
+    `runtime`, which keep Komu's types and errors. Calls go through the
+    runtime's table of missions, keyed by name and number of arguments, so
+    a mission is still looked up before its arguments are evaluated.
+    """
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.indent = 0
+        # Definitions an expression needs, written before its statement.
+        self.prelude = []
+        # The locals assigned inside the expression being generated.
+        self.writes = set()
+        self.function = None
+        self.level = STATEMENT
+        self.functions = 0
+
+    def transpile(self, statements: list):
+        """Returns the Python source of the program `statements`."""
+        self.lines, self.indent = [], 0
+        self.emit("def program(runtime):")
+        self.indent = 1
+        for name in RUNTIME_METHODS:
+            self.emit(f"{name} = runtime.{name}")
+        self.emit("result = runtime.result")
+        self.emit("missions = runtime.missions.get")
+        self.function = _Function(None, 0, always_defined(0, statements))
+        start = len(self.lines)
+        self.visit(self.block(statements))
+        self.close(start, ())
+        return "\n".join(self.lines) + "\n"
+
+    def block(self, statements):
+        return [statement if type(statement) in STATEMENTS else _Statement(statement)
+                for statement in statements or ()]
+
+    def emit(self, text):
+        self.lines.append("    " * self.indent + text)
+
+    def flush(self):
+        """Writes the prelude of the expressions generated since the last statement."""
+        for line in self.prelude:
+            self.emit(line)
+        self.prelude = []
+
+    def guarded(self, text, prefix):
+        """Writes the statement `text`, whose runtime errors are written after `prefix` and skipped."""
+        self.emit("try:")
+        self.indent += 1
+        self.emit(text)
+        self.indent -= 1
+        self.emit("except KomuRuntimeError as error:")
+        self.emit(f"    caught({prefix!r}, error)")
+
+    def local(self, index, function=None):
+        function = function or self.function
+        return f"v{function.depth}_{index}"
+
+    def find(self, depth, slot):
+        """Returns the index of the variable at (depth, slot) in the current function, or None."""
+        function = self.function
+        if depth == 0:
+            function.assigned.add(slot)
+            return slot
+        if function.mission is not None:
+            for position, (_, captured_depth, captured_slot) in enumerate(function.mission.captures):
+                if (captured_depth, captured_slot) == (depth, slot):
+                    return function.mission.frame_size + position
+        return None
+
+    def variable(self, name, address, line):
+        """
+        Returns the local of a variable, or None with the expression raising
+        the runtime error of reading it.
+        """
+        if address is None:
+            raise Exception(f"Variable '{name}' has no lexical address at line {line}. "
+                            "The Python back end needs a resolved AST.")
+        depth, slot = address
+        index = self.find(depth, slot)
+        if index is None:
+            return None, f"fail({f'Error: No captured variable at depth {depth}, slot {slot} at line: {line}.'!r})"
+        return index, self.local(index)
+
+    def close(self, start, defined):
+        """
+        Ends the function whose body starts at line `start`, setting the
+        locals other than `defined`, which are set on entry, to EMPTY.
+        """
+        function = self.function
+        body = function.mission.body if function.mission is not None else None
+        if body is not None and not (body and type(body[-1]) is ReturnNode):
+            self.emit("return result[0]")
+        elif len(self.lines) == start:
+            self.emit("pass")
+        undefined = sorted(function.assigned - set(defined))
+        if undefined:
+            names = " = ".join(self.local(index) for index in undefined)
+            self.lines.insert(start, "    " * self.indent + f"{names} = EMPTY")
+
+    # --- Statements ---
+
+    def visit__Statement(self, node):
+        expression = node.expression
+        if type(expression) is MissionCallNode:
+            # A call runs as a statement; its errors are not caught there.
+            self.level = STATEMENT
+            text = yield expression
+            if text is not None:
+                self.flush()
+                self.emit(text)
+            return
+        if type(expression) in (UnaryOpNode, PostfixUnaryOpNode) and expression.operator in ('++', '--') \
+                and type(expression.node) is IdentifierNode:
+            # `i++;` and `++i;` store the new value without making the old one.
+            operand = expression.node
+            index, target = self.variable(operand.name, operand.address, expression.line)
+            if index is not None:
+                self.level = BINARY
+                value = yield operand
+                if type(expression) is PostfixUnaryOpNode:
+                    value = f"postfix({target}, {operand.name!r}, {expression.operator!r}, {expression.line})"
+                else:
+                    value = f"number({value}, {expression.line}) {expression.operator[0]} 1.0"
+                self.guarded(f"{target} = {value}", STATEMENT_ERROR)
+                return
+        self.level = LOGICAL_OR
+        text = yield expression
+        self.flush()
+        self.guarded(text, STATEMENT_ERROR)
+
+    def visit_VarAssignNode(self, node):
+        if node.address is None:
+            raise Exception(f"Variable '{node.identifier.name}' has no lexical address at line {node.line}. "
+                            "The Python back end needs a resolved AST.")
+        self.level = LOGICAL_OR
+        value = yield node.value
+        # The variable goes in the current frame, whatever its depth.
+        slot = node.address[1]
+        self.function.assigned.add(slot)
+        self.flush()
+        if is_literal(node.value):
+            self.emit(f"{self.local(slot)} = {value}")
+        else:
+            self.guarded(f"{self.local(slot)} = {value}", VAR_ERROR)
+
+    def visit_AssignNode(self, node):
+        name = node.identifier.name
+        index, target = self.variable(name, node.address, node.line)
+        if index is None:
+            self.emit(target)
+            return
+        self.level = LOGICAL_OR
+        value = yield node.value
+        self.flush()
+        if index not in self.function.safe:
+            self.emit(f"if {target} is EMPTY: unassigned({name!r}, {node.line})")
+        self.emit(f"{target} = {value}")
+
+    def visit_MissionNode(self, node):
+        name = node.identifier.name
+        if node.frame_size is None:
+            raise Exception(f"Mission '{name}' has no frame layout at line {node.line}. "
+                            "The Python back end needs a resolved AST.")
+        parameters = len(node.parameter or ())
+        self.functions += 1
+        python_name = f"{_NOT_IDENTIFIER.sub('_', name)}_{self.functions}"
+        memo = f"memo_{self.functions}"
+        function = _Function(node, self.function.depth + 1, always_defined(parameters, node.body), memo)
+        if node.pure:
+            self.emit(f"{memo} = memo()")
+
+        arguments = ", ".join(self.local(index, function) for index in range(parameters))
+        self.emit(f"def {python_name}({arguments}):")
+        self.indent += 1
+        # The captures come from the frame running the definition: this one.
+        line = statement_line(node.body[0]) if node.body else 0
+        captures = []
+        for position, (_, depth, slot) in enumerate(node.captures, node.frame_size):
+            index = self.find(depth - 1, slot)
+            if index is None:
+                message = f"Error: No captured variable at depth {depth - 1}, slot {slot} at line: {line}."
+                captures.append(f"fail({message!r})")
+                break
+            captures.append(f"{self.local(position, function)} = {self.local(index)}")
+        if node.pure:
+            self.emit(f"key = memo_key({arguments})")
+            self.emit(f"if recall({memo}, key) is not EMPTY:")
+            self.emit("    return result[0]")
+        for capture in captures:
+            self.emit(capture)
+
+        outer, self.function = self.function, function
+        start = len(self.lines)
+        yield self.block(node.body)
+        self.close(start, list(range(parameters)) + list(range(node.frame_size, node.frame_size + len(captures))))
+        self.function = outer
+        self.indent -= 1
+        self.emit(f"define({name!r}, {parameters}, {python_name})")
+
+    def condition(self, text, node, line):
+        """Returns the test of a condition, which must be a boolean."""
+        if type(node) in (RelationalOpNode, LogicalOpNode, BooleanNode) or \
+                (type(node) is UnaryOpNode and node.operator == '!'):
+            return text
+        return f"truth({text}, {line})"
+
+    def body(self, statements):
+        self.indent += 1
+        start = len(self.lines)
+        yield self.block(statements)
+        if len(self.lines) == start:
+            self.emit("pass")
+        self.indent -= 1
+
+    def visit_ConditionalNode(self, node):
+        self.level = LOGICAL_OR
+        test = yield node.if_condition
+        self.flush()
+        self.emit(f"if {self.condition(test, node.if_condition, node.if_condition.line)}:")
+        yield from self.body(node.if_body)
+        nested = 0
+        if node.else_if_condition:
+            for condition, body in node.else_if_condition:
+                self.level = LOGICAL_OR
+                test = yield condition
+                test = self.condition(test, condition, condition.line)
+                if self.prelude:
+                    # The definitions the condition needs go in an `else` before it.
+                    self.emit("else:")
+                    self.indent += 1
+                    nested += 1
+                    self.flush()
+                    self.emit(f"if {test}:")
+                else:
+                    self.emit(f"elif {test}:")
+                yield from self.body(body)
+        elif node.else_body:
+            # The interpreter ignores the `else` of a conditional with `else if` arms.
+            self.emit("else:")
+            yield from self.body(node.else_body)
+        self.indent -= nested
+
+    def visit_WhileNode(self, node):
+        self.level = LOGICAL_OR
+        test = yield node.condition
+        self.flush()
+        self.emit(f"while {self.condition(test, node.condition, node.line)}:")
+        yield from self.body(node.body)
+
+    def visit_ReturnNode(self, node):
+        self.level = LOGICAL_OR
+        value = yield node.value
+        self.flush()
+        self.emit(f"result[0] = {value}")
+        mission = self.function.mission
+        if mission is None:
+            self.emit(f"fatal({f'Error: Return outside of a mission at line: {node.line}.'!r})")
+            return
+        if mission.pure:
+            self.emit(f"remember({self.function.memo}, key, result[0])")
+        self.emit("return result[0]")
+
+    # --- Expressions ---
+
+    def unhandled(self, node):
+        """Returns the error of evaluating `node` below the level that handles it."""
+        kind = type(node).__name__[:-len("Node")]
+        return f"fail({f'Error: Cannot evaluate unhandled expression type {kind!r} at line: {node.line}.'!r})"
+
+    def visit_NumberNode(self, node):
+        value = float(node.value)
+        if math.isfinite(value):
+            return repr(value)
+        return f"float({str(value)!r})"
+
+    def visit_StringNode(self, node):
+        return repr(node.value)
+
+    def visit_BooleanNode(self, node):
+        if self.level < RELATIONAL:
+            return self.unhandled(node)
+        return "True" if node.value == 'true' else "False"
+
+    def visit_IdentifierNode(self, node):
+        index, text = self.variable(node.name, node.address, node.line)
+        if index is None or index in self.function.safe:
+            return text
+        if self.level >= RELATIONAL:
+            return f"({text} if {text} is not EMPTY else nil({node.name!r}, {node.line}))"
+        return f"({text} if {text} is not EMPTY else undefined({node.name!r}, {node.line}))"
+
+    def visit_operator(self, node):
+        if node_level(node) > self.level:
+            return self.unhandled(node)
+        level = operand_level(node)
+        self.level = level
+        left = yield node.left_node
+        self.level = level
+        right = yield node.right_node
+        helper = OPERATOR_HELPERS[type(node)].get(node.operator)
+        if helper is None:
+            return f"arithmetic({node.operator!r}, {left}, {right}, {node.line})"
+        return f"{helper}({left}, {right}, {node.line})"
+
+    visit_BinaryOpNode = visit_RelationalOpNode = visit_LogicalOpNode = visit_BitwiseOpNode = visit_operator
+
+    def visit_UnaryOpNode(self, node):
+        operator, operand, line = node.operator, node.node, node.line
+        if operator == '!' and self.level >= RELATIONAL:
+            self.level = RELATIONAL
+            value = yield operand
+            return f"negation({value}, {line})"
+        self.level = BINARY
+        value = yield operand
+        if operator == '-':
+            return f"negative({value}, {line})"
+        if operator == '+':
+            return f"number({value}, {line})"
+        if operator == '~':
+            return f"inverted({value}, {line})"
+        if type(operand) is not IdentifierNode:
+            return f"not_a_variable({value}, {operator!r}, {line})"
+        index, target = self.variable(operand.name, operand.address, line)
+        if index is None:
+            # Reading the operand already failed.
+            return value
+        if operator in ('++', '--'):
+            self.writes.add(target)
+            return f"({target} := number({value}, {line}) {operator[0]} 1.0)"
+        return f"(number({value}, {line}), None)[1]"
+
+    def visit_PostfixUnaryOpNode(self, node):
+        operand, operator, line = node.node, node.operator, node.line
+        if type(operand) is not IdentifierNode:
+            return f"fatal({f'Error: The operand of {operator!r} is not a variable at line: {line}.'!r})"
+        index, target = self.variable(operand.name, operand.address, line)
+        if index is None:
+            return target
+        self.writes.add(target)
+        return (f"((old := postfix_value({target}, {operand.name!r}, {operator!r}, {line})), "
+                f"({target} := old {operator[0]} 1.0))[0]")
+
+    def visit_MissionCallNode(self, node):
+        statement = self.level == STATEMENT
+        name, line = node.identifier.name, node.line
+        arguments = node.argument or []
+        if name == 'log' or name == 'logln':
+            if statement:
+                yield from self.prints(arguments, name == 'logln')
+                return None
+            # Printing needs statements: it goes in a function of its own.
+            return (yield from self.print_function(arguments, name == 'logln'))
+        if name == 'input':
+            # Its arguments are never evaluated.
+            return "read()"
+        # The mission is looked up before its arguments are evaluated.
+        values = []
+        for argument in arguments:
+            self.level = LOGICAL_OR
+            values.append((yield argument))
+        key = (name, len(arguments))
+        return f"(missions({key!r}) or lookup({name!r}, {len(arguments)}, {line}))({', '.join(values)})"
+
+    def prints(self, arguments, newline):
+        for argument in arguments:
+            self.level = LOGICAL_OR
+            value = yield argument
+            self.flush()
+            self.guarded(f"write({value})", PRINT_ERROR)
+        if newline:
+            self.emit("newline()")
+
+    def print_function(self, arguments, newline):
+        self.functions += 1
+        python_name = f"log_{self.functions}"
+        outer = self.lines, self.indent, self.prelude, self.writes
+        self.lines, self.indent, self.prelude, self.writes = [], 1, [], set()
+        yield from self.prints(arguments, newline)
+        self.emit("return result[0]")
+        lines, writes = self.lines, self.writes
+        self.lines, self.indent, self.prelude, self.writes = outer
+        self.prelude.append(f"def {python_name}():")
+        if writes:
+            self.prelude.append(f"    nonlocal {', '.join(sorted(writes))}")
+        self.prelude.extend(lines)
+        self.writes |= writes
+        return f"{python_name}()"
+
+
+def compile_statements(statements, name="<komu>"):
+    """Returns the Python code object of the resolved program `statements`."""
+    source = PythonTranspiler().transpile(statements)
+    try:
+        return compile(source, name, 'exec')
+    except (SyntaxError, RecursionError, MemoryError) as e:
+        raise Exception(f"The program is nested too deeply for the Python back end: {e}")
+
+def load_program(source, front_end, optimize_level=1, cache=None, name="<komu>"):
+    """
+    Returns the Python code object of the program in the `source` bytes.
+
+    `front_end(source, optimize_level)` returns its resolved and optimized
+    statements; it only runs when the code is not cached. Code objects are
+    kept in memory for the life of the process, and in `cache`, a
+    `CompileCache`, as marshal data, under the hash of the source, the
+    optimization level and the Python version that compiled them.
+    """
+    key = (cache or CompileCache(None)).key(source, "python", optimize_level, sys.implementation.cache_tag)
+    code = _compiled.get(key)
+    if code is not None:
+        return code
+    data = cache.read(key) if cache is not None else None
+    if data is not None:
+        code = marshal.loads(data)
+    else:
+        code = compile_statements(front_end(source, optimize_level), name)
+        if cache is not None:
+            cache.write(key, marshal.dumps(code))
+    _compiled[key] = code
+    return code
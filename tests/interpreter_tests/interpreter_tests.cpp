@@ -68,3 +68,78 @@ TEST_F(InterpreterTest, HandlesConditionalIf)
 {
     // ...
 }
+
+TEST(InterpreterFramesTest, RunsMissionsOnLexicalFrames)
+{
+    // var g = 2;
+    // mission f(a) { var b = a + g; g = 100; return b; }
+    // logln(f(3), g);
+    json ast = R"(
+    [
+        {"line":1,"type":"Var","identifier":"g","depth":0,"slot":0,"value":{"line":1,"type":"Number","value":2}},
+        {"line":2,"type":"Mission","identifier":"f",
+         "parameter":[{"line":2,"type":"Identifier","name":"a","depth":0,"slot":0}],
+         "frame_size":2,"captures":[{"name":"g","depth":1,"slot":0}],
+         "body":[
+            {"line":2,"type":"Var","identifier":"b","depth":0,"slot":1,"value":{"line":2,"type":"BinaryOp","operator":"+",
+                "left":{"line":2,"type":"Identifier","name":"a","depth":0,"slot":0},
+                "right":{"line":2,"type":"Identifier","name":"g","depth":1,"slot":0}}},
+            {"line":2,"type":"Assign","identifier":"g","depth":1,"slot":0,"value":{"line":2,"type":"Number","value":100}},
+            {"line":2,"type":"Return","value":{"line":2,"type":"Identifier","name":"b","depth":0,"slot":1}}]},
+        {"line":3,"type":"MissionCall","identifier":"logln","argument":[
+            {"line":3,"type":"MissionCall","identifier":"f","argument":[{"line":3,"type":"Number","value":3}]},
+            {"line":3,"type":"Identifier","name":"g","depth":0,"slot":0}]}
+    ]
+    )"_json;
+
+    // Both modes agree, and the mission's write to g does not leak out.
+    for (bool use_frames : {false, true}) {
+        Interpreter interpreter(use_frames);
+        testing::internal::CaptureStdout();
+        interpreter.interpret(ast);
+        EXPECT_EQ(testing::internal::GetCapturedStdout(), "Starting AST Interpreter...\n52\n");
+    }
+}
+
+TEST(InterpreterMemoTest, RemembersPureMissionResults)
+{
+    // mission sq(x) { return x * x; }   (marked pure)
+    // logln(sq(3), sq(4), sq(3));
+    json ast = R"(
+    [
+        {"line":1,"type":"Mission","identifier":"sq",
+         "parameter":[{"line":1,"type":"Identifier","name":"x","depth":0,"slot":0}],
+         "frame_size":1,"captures":[],"pure":true,
+         "body":[{"line":1,"type":"Return","value":{"line":1,"type":"BinaryOp","operator":"*",
+            "left":{"line":1,"type":"Identifier","name":"x","depth":0,"slot":0},
+            "right":{"line":1,"type":"Identifier","name":"x","depth":0,"slot":0}}}]},
+        {"line":2,"type":"MissionCall","identifier":"logln","argument":[
+            {"line":2,"type":"MissionCall","identifier":"sq","argument":[{"line":2,"type":"Number","value":3}]},
+            {"line":2,"type":"MissionCall","identifier":"sq","argument":[{"line":2,"type":"Number","value":4}]},
+            {"line":2,"type":"MissionCall","identifier":"sq","argument":[{"line":2,"type":"Number","value":3}]}]}
+    ]
+    )"_json;
+
+    for (bool use_frames : {false, true}) {
+        Interpreter interpreter(use_frames);
+        testing::internal::CaptureStdout();
+        interpreter.interpret(ast);
+        EXPECT_EQ(testing::internal::GetCapturedStdout(), "Starting AST Interpreter...\n9169\n");
+        EXPECT_EQ(interpreter.memo_stats().at("sq").hits, 1u);
+        EXPECT_EQ(interpreter.memo_stats().at("sq").misses, 2u);
+    }
+
+    // A table of one result evicts sq(3) before it is called again.
+    Interpreter small(false, 1);
+    testing::internal::CaptureStdout();
+    small.interpret(ast);
+    EXPECT_EQ(testing::internal::GetCapturedStdout(), "Starting AST Interpreter...\n9169\n");
+    EXPECT_EQ(small.memo_stats().at("sq").hits, 0u);
+    EXPECT_EQ(small.memo_stats().at("sq").misses, 3u);
+
+    Interpreter off(false, 0);
+    testing::internal::CaptureStdout();
+    off.interpret(ast);
+    testing::internal::GetCapturedStdout();
+    EXPECT_TRUE(off.memo_stats().empty());
+}
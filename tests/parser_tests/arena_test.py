@@ -0,0 +1,131 @@
+import sys
+import os
+import glob
+import json
+import tracemalloc
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src import main as komu_main
+from src.parser.src.lexer.lexer import Lexer
+from src.parser.src.parser.parser import Parser
+from src.parser.src.nodes.arena import ArenaDictEmitter, to_arena, from_arena
+from src.parser.src.resolver.resolver import Resolver
+from src.parser.src.resolver.arena_resolver import ArenaResolver
+
+SAMPLE = """
+mission add(x, y) { return x + y * -2; }
+mission noop { logln("nothing"); }
+var total = add(1, 2.5) & 3;
+if (total >= 0 && !false) { logln(total); } else if (total < -1) { total = 1; } else if (true) { } else { total--; }
+if (total) { } else { }
+while (total < 10 || ~total == 2) { total++; input(); }
+"""
+
+PROGRAMS = [SAMPLE] + [open(path).read() for path in sorted(glob.glob(os.path.join(project_root, "examples", "*.komu")))
+                       if not path.endswith("loop.komu")]
+
+
+def parse(code):
+    return Parser(Lexer(code).scanTokens()).parse()
+
+
+def parse_arena(code):
+    return Parser(Lexer(code).scanTokens()).parse_arena()
+
+
+def resolver_error(resolve):
+    try:
+        resolve()
+    except Exception as e:
+        return str(e)
+    return None
+
+
+@pytest.mark.parametrize("code", PROGRAMS)
+def test_arena_emits_the_same_json_as_node_objects(code):
+    assert ArenaDictEmitter(parse_arena(code)).emit() == [node.to_dict() for node in parse(code)]
+
+
+@pytest.mark.parametrize("code", PROGRAMS)
+def test_arena_converts_to_and_from_node_objects(code):
+    ast_nodes = parse(code)
+
+    assert repr(from_arena(parse_arena(code))) == repr(ast_nodes)
+    assert repr(from_arena(to_arena(ast_nodes))) == repr(ast_nodes)
+
+
+@pytest.mark.parametrize("code", PROGRAMS + [
+    "var a = a;",
+    "var a = 1; var a = 2;",
+    "mission m(p) { var q = p; } logln(q);",
+    "x = 5;",
+    "if (true) { var z = 1; } else { logln(y); }",
+])
+def test_arena_resolver_matches_resolver(code):
+    assert resolver_error(lambda: ArenaResolver(parse_arena(code)).resolve()) == \
+        resolver_error(lambda: Resolver().resolve(parse(code)))
+
+
+def test_arena_uses_less_memory_than_node_objects():
+    tokens = Lexer(SAMPLE * 500).scanTokens()
+
+    tracemalloc.start()
+    ast_nodes = Parser(tokens).parse()
+    objects_size = tracemalloc.get_traced_memory()[0]
+    del ast_nodes
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    arena = Parser(tokens).parse_arena()
+    arena_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert arena_size * 2 < objects_size
+
+
+@pytest.mark.parametrize("code", PROGRAMS + [
+    "var g = 1; mission f(n) { var t = n; mission h() { return g + t; } if (n > 0) { return f(n - 1); } return h(); }",
+    "mission f(n) { while (n > 0) { return f(n - 1); } return f(n); }",
+    "var x = 1; mission f(a, x) { return x + a; } logln(f(2, 3), x);",
+])
+def test_resolved_arena_emits_the_same_addresses_as_node_objects(code):
+    arena = parse_arena(code)
+    ast_nodes = parse(code)
+    if resolver_error(lambda: Resolver().resolve(ast_nodes)) is not None:
+        pytest.skip("the program does not resolve")
+    ArenaResolver(arena).resolve()
+    assert ArenaDictEmitter(arena).emit() == [node.to_dict() for node in ast_nodes]
+
+
+def test_arena_walks_deep_expressions_without_recursion(tmp_path, monkeypatch):
+    # main() writes build/ast_output.json under sys.path[0]
+    (tmp_path / "build").mkdir()
+    (tmp_path / "deep.komu").write_text("var x = " + " + ".join(["1"] * 5000) + ";\nlogln(x);\n")
+    monkeypatch.setattr(sys, "path", [str(tmp_path)] + sys.path)
+    komu_main.main(str(tmp_path / "deep.komu"), use_arena=True, use_cache=False)
+
+    # Too deep for json.loads as well, so the output is checked as text.
+    output = (tmp_path / "build" / "ast_output.json").read_text()
+    assert output.count('"BinaryOp"') == 4999
+    assert output.endswith('"argument":[{"line":2,"type":"Identifier","name":"x","depth":0,"slot":0}]}]')
+
+
+def test_arena_gives_each_identifier_on_a_line_its_own_address(tmp_path, monkeypatch):
+    # The parameter x shadows the outer x on the same line; the frame
+    # interpreter reads the slots written here.
+    (tmp_path / "build").mkdir()
+    (tmp_path / "shadow.komu").write_text("var x = 1; mission f(a, x) { return x + a; } logln(f(2, 3), x);\n")
+    monkeypatch.setattr(sys, "path", [str(tmp_path)] + sys.path)
+    outputs = []
+    for use_arena in (False, True):
+        komu_main.main(str(tmp_path / "shadow.komu"), use_arena=use_arena, use_cache=False, optimize_level=0)
+        outputs.append(json.loads((tmp_path / "build" / "ast_output.json").read_text()))
+    assert outputs[1] == outputs[0]
+    mission = outputs[1][1]
+    assert [(parameter["name"], parameter["slot"]) for parameter in mission["parameter"]] == [("a", 0), ("x", 1)]
+    assert mission["body"][0]["value"]["left"]["slot"] == 1
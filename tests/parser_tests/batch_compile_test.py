@@ -0,0 +1,56 @@
+import sys
+import os
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src import main as komu_main
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    # compile_batch() writes build/ast and the cache under sys.path[0]/build
+    (tmp_path / "build").mkdir()
+    monkeypatch.setattr(sys, "path", [str(tmp_path)] + sys.path)
+    sources = tmp_path / "scripts"
+    (sources / "nested").mkdir(parents=True)
+    (sources / "one.komu").write_text('var x = 1 + 2;\nlogln(x);\n')
+    (sources / "nested" / "two.komu").write_text('mission f(a) { return a * 2; }\nlogln(f(4));\n')
+    (sources / "nested" / "broken.komu").write_text('logln(y);\n')
+    (sources / "notes.txt").write_text('not a script\n')
+    return tmp_path, sources
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_compiles_a_directory(project, capsys, jobs):
+    root, sources = project
+    failed = komu_main.compile_batch([str(sources)], str(root / "out"), jobs=jobs, use_cache=False)
+
+    assert failed == 1
+    assert sorted(os.listdir(root / "out")) == ["nested", "one.json"]
+    assert os.listdir(root / "out" / "nested") == ["two.json"]
+    output = capsys.readouterr().out
+    assert f"FAILED  {sources / 'nested' / 'broken.komu'}: ResolverError: Variable 'y' is not defined." in output
+    assert "2 compiled, 1 failed (0 from cache)" in output
+
+    # The same artifact as compiling the file on its own.
+    komu_main.main(str(sources / "nested" / "two.komu"), use_cache=False)
+    assert (root / "out" / "nested" / "two.json").read_bytes() == (root / "build" / "ast_output.json").read_bytes()
+
+
+def test_unchanged_files_come_from_the_cache(project, monkeypatch, capsys):
+    root, sources = project
+    komu_main.compile_batch([str(sources / "one.komu"), str(sources / "nested")], jobs=1)
+    capsys.readouterr()
+
+    def fail_to_parse(tokens):
+        raise AssertionError("the parser should not run on a cache hit")
+
+    monkeypatch.setattr(komu_main, "StreamParser", fail_to_parse)
+    (root / "build" / "ast" / "one.json").unlink()
+    assert komu_main.compile_batch([str(sources / "one.komu"), str(sources / "nested")], jobs=1) == 1
+    assert "2 compiled, 1 failed (2 from cache)" in capsys.readouterr().out
+    assert (root / "build" / "ast" / "one.json").exists()
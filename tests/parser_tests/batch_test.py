@@ -0,0 +1,142 @@
+import sys
+import os
+import io
+import math
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src.lexer.lexer import Lexer
+from src.parser.src.parser.parser import Parser
+from src.parser.src.resolver.resolver import Resolver
+from src.parser.src.optimizer.optimizer import Optimizer
+from src.parser.src.vm.batch import (BatchChecker, NotVectorizable, NUMBER, BOOLEAN, top_level_missions,
+                                     run_batch)
+from src.parser.src.vm.machine import KomuRuntimeError
+from src.parser.src.vm.runtime import Runtime
+from src.parser.src.vm.transpiler import compile_statements
+
+
+PROGRAM = """
+    mission add(x, y) {
+        return x + y;
+    }
+    mission sum_three(a, b, c) {
+        return add(add(a, b), c);
+    }
+    mission grade(score, total) {
+        var ratio = score / total;
+        if (ratio >= 0.9) {
+            return 4;
+        } else {
+            if (ratio >= 0.5 && !(score % 7 == 0)) {
+                return ~score - ratio;
+            }
+        }
+        return -ratio;
+    }
+    mission positive(x) {
+        return x > 0 || x == 0 && 1 / x > 0;
+    }
+    mission fact(n) {
+        if (n <= 1) {
+            return 1;
+        }
+        return n * fact(n - 1);
+    }
+    mission loud(x) { logln(x); return x; }
+    mission count(n) { var i = 0; while (i < n) { i = i + 1; } return i; }
+    mission maybe(x) { if (x > 1) { return x; } }
+    mission text(x) { return "a"; }
+    mission nested(x) { return x + (x > 1); }
+    mission bump(x) { var y = x; return y++; }
+    var offset = 1;
+    mission shifted(x) { return x + offset; }
+    mission remainder(x, y) { return x % y; }
+"""
+
+
+def front_end(code, level=1, entry_points=()):
+    statements = Parser(Lexer(code).scanTokens()).parse()
+    Resolver().resolve(statements)
+    Optimizer(level, entry_points=entry_points).optimize(statements)
+    return statements
+
+
+@pytest.mark.parametrize("level", [0, 1, 2])
+def test_arithmetic_missions_are_accepted(level):
+    missions = top_level_missions(front_end(PROGRAM, level, ("sum_three", "grade", "positive")))
+    assert BatchChecker(missions).check("sum_three", [NUMBER] * 3) == NUMBER
+    assert BatchChecker(missions).check("grade", [NUMBER] * 2) == NUMBER
+    assert BatchChecker(missions).check("positive", [NUMBER]) == BOOLEAN
+
+
+@pytest.mark.parametrize("name, reason", [
+    ("fact", "mission 'fact' is recursive"),
+    ("loud", "mission 'loud' calls 'logln' at line 28"),
+    ("count", "mission 'count' has a loop at line 29"),
+    ("maybe", "mission 'maybe' can end without returning a value"),
+    ("text", "mission 'text' uses strings at line 31"),
+    ("nested", "mission 'nested' has a RelationalOp expression the interpreter cannot evaluate there at line 32"),
+    ("bump", "mission 'bump' uses the postfix operator '++' at line 33"),
+    ("shifted", "mission 'shifted' reads the outer variable 'offset'"),
+])
+def test_missions_that_cannot_be_vectorized_are_rejected(name, reason):
+    missions = top_level_missions(front_end(PROGRAM, level=0))
+    with pytest.raises(NotVectorizable) as error:
+        BatchChecker(missions).check(name, [NUMBER])
+    assert str(error.value) == reason
+
+
+def scalar_results(statements, name, columns):
+    """Returns what calling the mission once per row prints, and its errors, as in BatchResult."""
+    runtime = Runtime(output=io.StringIO(), errors=io.StringIO(), memo_size=0)
+    runtime.run(compile_statements(statements))
+    function = runtime.missions[(name, len(columns))]
+    results, errors = [], {}
+    for row, arguments in enumerate(zip(*columns)):
+        runtime.errors = io.StringIO()
+        try:
+            results.append(function(*(float(argument) for argument in arguments)))
+        except KomuRuntimeError as e:
+            runtime.errors.write(f"Runtime Error: {e}\n")
+            results.append(None)
+        if runtime.errors.getvalue():
+            errors[row] = runtime.errors.getvalue()
+    return results, errors
+
+
+@pytest.mark.parametrize("level", [0, 1, 2])
+def test_batch_matches_scalar_calls(level):
+    np = pytest.importorskip("numpy")
+    edges = [0.0, -0.0, 1.0, -1.0, 0.5, 7.0, 14.0, 3e9, -3e9, math.nan, math.inf, -math.inf, 2.0 ** 31]
+    score = np.array([left for left in edges for _ in edges])
+    total = np.array([right for _ in edges for right in edges])
+    # Divisors that stay non-zero as ints; a zero remainder is always +0.
+    dividend = np.array([left for left in (-90.0, -14.0, -7.5, -0.0, 0.0, 3.0, 14.0) for _ in range(4)])
+    divisor = np.array([-7.0, 5.0, 7.0, 2.5] * 7)
+    for name, columns in (("sum_three", [score, total, score]), ("grade", [score, total]),
+                          ("positive", [score]), ("remainder", [dividend, divisor])):
+        statements = front_end(PROGRAM, level, (name,))
+        result = run_batch(statements, name, columns)
+        expected, errors = scalar_results(front_end(PROGRAM, level, (name,)), name, columns)
+        assert result.errors == errors
+        for value, valid, scalar in zip(result.values.tolist(), result.valid, expected):
+            assert valid == (scalar is not None)
+            if valid:
+                # The same bits: -0 stays -0.
+                assert type(value) is type(scalar) and (value == scalar or value != value and scalar != scalar)
+                assert type(value) is bool or math.copysign(1, value) == math.copysign(1, scalar)
+
+
+def test_failing_rows_run_one_by_one():
+    np = pytest.importorskip("numpy")
+    statements = front_end(PROGRAM, entry_points=("grade",))
+    result = run_batch(statements, "grade", [np.array([9.0, 1.0, 5.0]), np.array([10.0, 0.0, 10.0])])
+    assert result.fallbacks == 1
+    assert result.formatted() == ["4", "nil", "-6.5"]
+    assert result.errors == {1: "Runtime Error during variable declaration: Error: Division by zero, at line: 9.\n"
+                                "Runtime Error: Error: Undefined variable 'ratio' at line: 10.\n"}
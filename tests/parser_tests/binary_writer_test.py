@@ -0,0 +1,175 @@
+import sys
+import os
+import io
+import json
+import glob
+import struct
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src.lexer.lexer import Lexer
+from src.parser.src.parser.parser import Parser
+from src.parser.src.nodes.arena import ArenaDictEmitter
+from src.parser.src.serializer.binary_writer import CborWriter, MsgpackWriter, CBOR_MAGIC
+
+SAMPLE = """
+mission add(x, y) { return x + y * -2.50; }
+mission noop { logln("a string that is longer than thirty-one bytes, é"); }
+var total = add(1, 2.5) & 300 + 70000 + 5000000000 + 99999999999999999999;
+if (total >= 0 && !false) { logln(total); } else if (total < -1) { total = 1; } else { total--; }
+while (total < 10 || ~total == 2) { total++; input(); }
+"""
+
+PROGRAMS = [SAMPLE, ""] + [open(path).read() for path in sorted(glob.glob(os.path.join(project_root, "examples", "*.komu")))
+                           if not path.endswith("loop.komu")]
+
+
+def parse(code):
+    return Parser(Lexer(code).scanTokens()).parse()
+
+
+def decode_cbor(data):
+    """A minimal CBOR decoder for the subset the writer produces."""
+    assert data.startswith(CBOR_MAGIC)
+    pos = len(CBOR_MAGIC)
+
+    def argument(info):
+        nonlocal pos
+        if info < 24:
+            return info
+        size = 1 << (info - 24)
+        pos += size
+        return int.from_bytes(data[pos - size:pos], 'big')
+
+    def item():
+        nonlocal pos
+        initial = data[pos]
+        pos += 1
+        major, info = initial >> 5, initial & 0x1f
+        if initial == 0x9f:
+            items = []
+            while data[pos] != 0xff:
+                items.append(item())
+            pos += 1
+            return items
+        if major == 7:
+            if info == 27:
+                pos += 8
+                return struct.unpack('>d', data[pos - 8:pos])[0]
+            return {20: False, 21: True, 22: None}[info]
+        length = argument(info)
+        if major == 0:
+            return length
+        if major == 1:
+            return -1 - length
+        if major == 3:
+            pos += length
+            return data[pos - length:pos].decode('utf-8')
+        if major == 4:
+            return [item() for _ in range(length)]
+        return {item(): item() for _ in range(length)}
+
+    value = item()
+    assert pos == len(data)
+    return value
+
+
+def decode_msgpack(data):
+    """A minimal MessagePack decoder for the subset the writer produces."""
+    pos = 0
+
+    def take(size):
+        nonlocal pos
+        pos += size
+        return data[pos - size:pos]
+
+    def item():
+        tag = take(1)[0]
+        if tag < 0x80:
+            return tag
+        if tag >= 0xe0:
+            return tag - 0x100
+        if tag & 0xe0 == 0xa0:
+            return take(tag & 0x1f).decode('utf-8')
+        if tag & 0xf0 == 0x90:
+            return [item() for _ in range(tag & 0x0f)]
+        if tag & 0xf0 == 0x80:
+            return {item(): item() for _ in range(tag & 0x0f)}
+        if tag in (0xc0, 0xc2, 0xc3):
+            return {0xc0: None, 0xc2: False, 0xc3: True}[tag]
+        if tag == 0xcb:
+            return struct.unpack('>d', take(8))[0]
+        if 0xcc <= tag <= 0xcf:
+            return int.from_bytes(take(1 << (tag - 0xcc)), 'big')
+        if 0xd0 <= tag <= 0xd3:
+            return int.from_bytes(take(1 << (tag - 0xd0)), 'big', signed=True)
+        if 0xd9 <= tag <= 0xdb:
+            return take(int.from_bytes(take(1 << (tag - 0xd9)), 'big')).decode('utf-8')
+        size = 2 if tag in (0xdc, 0xde) else 4
+        length = int.from_bytes(take(size), 'big')
+        if tag in (0xdc, 0xdd):
+            return [item() for _ in range(length)]
+        return {item(): item() for _ in range(length)}
+
+    value = item()
+    assert pos == len(data)
+    return value
+
+
+def to_dicts(ast):
+    # Numbers too large for 64 bits are written as doubles, like nlohmann::json reads them from JSON.
+    def fix(value):
+        if isinstance(value, dict):
+            return {key: fix(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [fix(item) for item in value]
+        if isinstance(value, int) and not isinstance(value, bool) and value >= 1 << 64:
+            return float(value)
+        return value
+    return fix([node.to_dict() for node in ast])
+
+
+WRITERS = [(CborWriter, decode_cbor), (MsgpackWriter, decode_msgpack)]
+
+
+@pytest.mark.parametrize("writer_class, decode", WRITERS)
+@pytest.mark.parametrize("code", PROGRAMS)
+def test_binary_output_decodes_to_the_json_data(writer_class, decode, code):
+    ast = parse(code)
+    out = io.BytesIO()
+    writer_class(out).write_statements(ast)
+    assert decode(out.getvalue()) == to_dicts(ast)
+
+
+@pytest.mark.parametrize("writer_class, decode", WRITERS)
+def test_writes_arena_statements_from_a_generator(writer_class, decode):
+    arena = Parser(Lexer(SAMPLE).scanTokens()).parse_arena()
+    emitter = ArenaDictEmitter(arena)
+    out = io.BytesIO()
+    writer_class(out).write_statements(emitter.visit(node_id) for node_id in arena.roots)
+    assert decode(out.getvalue()) == to_dicts(parse(SAMPLE))
+
+
+@pytest.mark.parametrize("writer_class", [CborWriter, MsgpackWriter])
+def test_writes_deeply_nested_ast(writer_class):
+    depth = 100_000
+    ast_nodes = parse("var v = " + "- " * depth + "1;")
+    out = io.BytesIO()
+    writer_class(out).write_statements(ast_nodes)
+
+    assert out.getvalue().count(b"UnaryOp") == depth
+
+
+def test_binary_output_is_smaller_than_json():
+    ast = parse(SAMPLE * 20)
+    sizes = {}
+    for writer_class, _ in WRITERS:
+        out = io.BytesIO()
+        writer_class(out).write_statements(ast)
+        sizes[writer_class] = len(out.getvalue())
+    json_size = len(json.dumps([node.to_dict() for node in ast], separators=(',', ':')))
+    assert max(sizes.values()) < json_size
@@ -0,0 +1,107 @@
+import sys
+import os
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src import main as komu_main
+from src.parser.src.cache.compile_cache import CompileCache
+
+SOURCE = 'var x = 1 + 2;\nlogln(x);\n'
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    # main() writes its output under sys.path[0]/build
+    (tmp_path / "build").mkdir()
+    monkeypatch.setattr(sys, "path", [str(tmp_path)] + sys.path)
+    source_path = tmp_path / "program.komu"
+    source_path.write_text(SOURCE)
+    return tmp_path, source_path
+
+
+def fail_to_parse(tokens):
+    raise AssertionError("the parser should not run on a cache hit")
+
+
+def test_cache_hit_skips_the_front_end(project, monkeypatch, capsys):
+    root, source_path = project
+    komu_main.main(str(source_path))
+    output = (root / "build" / "ast_output.json").read_bytes()
+
+    monkeypatch.setattr(komu_main, "StreamParser", fail_to_parse)
+    (root / "build" / "ast_output.json").unlink()
+    komu_main.main(str(source_path))
+
+    assert (root / "build" / "ast_output.json").read_bytes() == output
+    assert "loaded from cache" in capsys.readouterr().out
+
+    # A hit over an output that is already linked to the entry leaves nothing behind.
+    komu_main.main(str(source_path))
+    assert sorted(path.name for path in (root / "build").iterdir()) == [".komu-cache", "ast_output.json"]
+
+
+def test_changed_source_or_options_miss_the_cache(project, monkeypatch):
+    root, source_path = project
+    komu_main.main(str(source_path))
+    compact = (root / "build" / "ast_output.json").read_text()
+
+    komu_main.main(str(source_path), pretty=True)
+    assert (root / "build" / "ast_output.json").read_text() != compact
+
+    source_path.write_text(SOURCE + 'logln(x + 1);\n')
+    komu_main.main(str(source_path))
+    assert (root / "build" / "ast_output.json").read_text().count('"MissionCall"') == 2
+    assert len(os.listdir(root / "build" / ".komu-cache")) == 3
+
+
+def test_arena_and_object_outputs_are_cached_apart(project):
+    root, source_path = project
+    source_path.write_text('mission f(a) { return a; }\nlogln(f(1));\n')
+    komu_main.main(str(source_path), use_arena=True, optimize_level=0)
+    komu_main.main(str(source_path), optimize_level=0)
+    # Only the object path gives missions their frame layout.
+    assert '"frame_size"' in (root / "build" / "ast_output.json").read_text()
+
+
+def test_no_cache_always_compiles(project, monkeypatch):
+    root, source_path = project
+    komu_main.main(str(source_path))
+
+    monkeypatch.setattr(komu_main, "StreamParser", fail_to_parse)
+    with pytest.raises(AssertionError):
+        komu_main.main(str(source_path), use_cache=False)
+
+
+def test_recompiling_does_not_overwrite_the_cached_artifact(project):
+    root, source_path = project
+    komu_main.main(str(source_path), output_format="msgpack")
+    (cached_entry,) = (root / "build" / ".komu-cache").iterdir()
+    cached = cached_entry.read_bytes()
+
+    komu_main.main(str(source_path), output_format="msgpack", use_cache=False)
+    source_path.write_text("var y = 2;\n")
+    komu_main.main(str(source_path), output_format="msgpack", use_cache=False)
+
+    assert cached_entry.read_bytes() == cached
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    cache = CompileCache(str(tmp_path / "cache"), max_bytes=300)
+    artifact = tmp_path / "artifact"
+    for index, key in enumerate(["a", "b", "c"]):
+        artifact.write_bytes(b"x" * 100)
+        cache.store(key, str(artifact))
+        os.utime(cache.entry_path(key), ns=(index * 10**9, index * 10**9))
+        artifact.unlink()
+
+    # Using "a" makes "b" the least recently used entry.
+    assert cache.fetch("a", str(tmp_path / "out"))
+    cache.max_bytes = 250
+    cache.evict()
+
+    assert sorted(os.listdir(tmp_path / "cache")) == ["a", "c"]
+    assert not cache.fetch("b", str(tmp_path / "out"))
@@ -0,0 +1,217 @@
+import sys
+import os
+import io
+import glob
+import tracemalloc
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src.lexer import lexer as lexer_module
+from src.parser.src.lexer import token_buffer
+from src.parser.src.lexer.lexer import Lexer, relex
+from src.parser.src.lexer.token_buffer import TokenBuffer
+from src.parser.src.lexer.reference_lexer import ReferenceLexer
+
+
+def token_stream(lexer_class, code):
+    """Returns the (type, value, line) triples, or the error message."""
+    try:
+        return [(t.type, t.value, t.line) for t in lexer_class(code).scanTokens()]
+    except Exception as e:
+        return str(e)
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(project_root, "examples", "*.komu"))))
+def test_matches_reference_on_examples(path):
+    with open(path, 'r') as f:
+        code = f.read()
+
+    assert token_stream(Lexer, code) == token_stream(ReferenceLexer, code)
+
+
+@pytest.mark.parametrize("code", [
+    "",
+    "   \n\t  ",
+    "var x = .5 + 5. + 1.25;",
+    "5..2 .x 3.4.5",
+    "true false truex _false falsey",
+    "a+++b---c",
+    "a===b !== c <=> d",
+    "x &&& y ||| z & | ^ ~",
+    "// only a comment",
+    "a / b // trailing comment\n/c",
+    'logln("multi\nline\nstring", x);\ny',
+    '"unterminated\n\n',
+    "var a = 1; @",
+    "var é² = ٣; x½",
+    " var\x1cx =\x1d1;",
+])
+def test_matches_reference_on_edge_cases(code):
+    assert token_stream(Lexer, code) == token_stream(ReferenceLexer, code)
+
+
+def test_identifiers_are_interned():
+    tokens = Lexer("var abcdef = abcdef;").scanTokens()
+
+    assert tokens[1].value is tokens[3].value
+
+
+def test_get_next_token_continues_with_scan_tokens():
+    lexer = Lexer("var x = 5;")
+    first = lexer.get_next_token()
+    rest = lexer.scanTokens()
+
+    assert first.value == 'var'
+    assert [t.value for t in rest] == ['x', '=', '5', ';', None]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_iter_tokens_matches_scan_tokens_for_any_chunk_size(chunk_size):
+    code = 'var s = "split\nacross\nchunks";\n// comment\nvar t = 1.25 >= .5;\nlogln(s, t);'
+    expected = token_stream(Lexer, code)
+
+    streamed = [(t.type, t.value, t.line) for t in Lexer(io.StringIO(code)).iter_tokens(chunk_size)]
+
+    assert streamed == expected
+
+
+def test_iter_tokens_reports_unterminated_string():
+    code = 'var a = 1;\nvar s = "open\n\n'
+
+    with pytest.raises(Exception) as excinfo:
+        list(Lexer(io.StringIO(code)).iter_tokens(4))
+
+    assert str(excinfo.value) == token_stream(ReferenceLexer, code)
+
+
+def peak_streaming_memory(path):
+    tracemalloc.start()
+    with open(path, 'r') as f:
+        for _ in Lexer(f).iter_tokens():
+            pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def test_iter_tokens_memory_does_not_grow_with_input_size(tmp_path):
+    line = 'var value_1 = (alpha + 42) * beta; logln("value", value_1);\n'
+    small = tmp_path / "small.komu"
+    large = tmp_path / "large.komu"
+    small.write_text(line * 2000)
+    large.write_text(line * 16000)
+
+    assert peak_streaming_memory(large) < 1.5 * peak_streaming_memory(small)
+
+
+def test_token_buffer_matches_scan_tokens():
+    code = 'var s = "two\nlines";\nvar t = .5 >= x && !done; // note\nlogln(s, t);'
+    buffer = Lexer(code).scan_token_buffer()
+
+    assert [(t.type, t.value, t.line) for t in buffer] == token_stream(Lexer, code)
+
+
+def bytes_per_token(scan):
+    code = 'var value_1 = (alpha + 42) * beta; logln("value", value_1);\n' * 2000
+    tracemalloc.start()
+    tokens = scan(Lexer(code))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(tokens)
+
+
+def test_token_buffer_uses_less_memory_than_token_list():
+    assert bytes_per_token(Lexer.scan_token_buffer) * 4 < bytes_per_token(Lexer.scanTokens)
+
+
+def buffer_stream(buffer):
+    """Returns the (type, value, line, start, end) tuples of a TokenBuffer."""
+    return [(t.type, t.value, t.line, buffer.start(i), buffer.end(i)) for i, t in enumerate(buffer)]
+
+
+def test_token_buffer_offsets_cover_lexemes():
+    code = 'var s = "two\nlines";\nvar t = .5;'
+    buffer = Lexer(code).scan_token_buffer(offsets=True)
+
+    assert [(t.type, t.value, t.line) for t in buffer] == token_stream(Lexer, code)
+    assert [code[buffer.start(i):buffer.end(i)] for i in range(len(buffer))] == \
+        ['var', 's', '=', '"two\nlines"', ';', 'var', 't', '=', '.5', ';', '']
+
+
+@pytest.mark.parametrize("edits", [
+    [(4, 5, "xy")],
+    [(0, 0, "// ")],
+    [(11, 11, "\n\n")],
+    [(8, 9, '"q\n"')],
+    [(8, 9, '"1;\nvar z = "'), (8, 21, "1")],
+    [(22, 22, "/"), (23, 23, "/ c")],
+    [(3, 4, ""), (0, 3, "")],
+    [(5, 5, "+"), (6, 6, "+"), (40, 40, "}")],
+    [(11, 43, ""), (0, 11, "")],
+])
+@pytest.mark.parametrize("window, piece_size", [(1024, 16 * 1024), (1, 4)])
+def test_relex_matches_full_scan(edits, window, piece_size, monkeypatch):
+    # Tiny windows and pieces make relex read the source in many steps.
+    monkeypatch.setattr(lexer_module, "RELEX_WINDOW", window)
+    monkeypatch.setattr(token_buffer, "SOURCE_PIECE_SIZE", piece_size)
+    code = 'var x = 1;\nvar y = x / 2;\nlogln("a b", y);\n'
+    buffer = Lexer(code).scan_token_buffer(offsets=True)
+
+    for start, end, text in edits:
+        code = code[:start] + text + code[end:]
+        relex(buffer, start, end, text)
+        assert buffer_stream(buffer) == buffer_stream(Lexer(code).scan_token_buffer(offsets=True))
+        assert buffer.source == code
+
+
+def test_relex_only_rescans_near_the_edit(monkeypatch):
+    line = 'var value_1 = (alpha + 42) * beta; logln("value", value_1);\n'
+    code = line * 20000
+    buffer = Lexer(code).scan_token_buffer(offsets=True)
+
+    scanned = []
+    lexemes = Lexer._lexemes
+    def counting_lexemes(*args):
+        for lexeme in lexemes(*args):
+            scanned.append(lexeme)
+            yield lexeme
+    monkeypatch.setattr(Lexer, '_lexemes', staticmethod(counting_lexemes))
+
+    middle = len(code) // 2 + 6
+    for offset in range(middle, middle + 5):
+        relex(buffer, offset, offset, 'x')
+    code = code[:middle] + 'xxxxx' + code[middle:]
+
+    assert len(scanned) < 20
+    assert buffer_stream(buffer)[-40:] == buffer_stream(Lexer(code).scan_token_buffer(offsets=True))[-40:]
+
+
+def test_relex_reads_only_the_source_near_the_edit(monkeypatch):
+    code = 'var value_1 = (alpha + 42) * beta; logln("value", value_1);\n' * 20000
+    buffer = Lexer(code).scan_token_buffer(offsets=True)
+
+    read = []
+    text = TokenBuffer.text
+    monkeypatch.setattr(TokenBuffer, "text", lambda self, start, end: read.append(end - start) or text(self, start, end))
+    middle = len(code) // 2 + 6
+    relex(buffer, middle, middle + 1, 'xyz')
+
+    assert sum(read) < 2 * lexer_module.RELEX_WINDOW
+    assert buffer.text(middle - 6, middle + 8) == 'var vaxyzue_1 '
+
+
+def test_relex_error_leaves_buffer_unchanged():
+    code = 'var x = 1;\nvar y = 2;'
+    buffer = Lexer(code).scan_token_buffer(offsets=True)
+    before = buffer_stream(buffer)
+
+    with pytest.raises(Exception) as excinfo:
+        relex(buffer, 8, 8, '@')
+
+    assert str(excinfo.value) == 'Unknown character: @ at line 1'
+    assert buffer_stream(buffer) == before
+    assert buffer.source == code
@@ -0,0 +1,398 @@
+import sys
+import os
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src.lexer.lexer import Lexer
+from src.parser.src.parser.parser import Parser
+from src.parser.src.resolver.resolver import Resolver
+from src.parser.src.optimizer.optimizer import Optimizer
+
+
+def optimize(code, level=1):
+    statements = Parser(Lexer(code).scanTokens()).parse()
+    Resolver().resolve(statements)
+    Optimizer(level).optimize(statements)
+    return [statement.to_dict() for statement in statements]
+
+
+def folded(expression):
+    (statement,) = optimize(f"var v = {expression};")
+    return statement["value"]
+
+
+@pytest.mark.parametrize("expression, value", [
+    ("2 * 60 * 60", 7200),
+    ("1 / 4", 0.25),
+    ("-7 % 3", -1),
+    ("7.9 % -2.5", 1),
+    ("(10 - 100) % 5", 0),
+    ("(6 & 3) | 8 ^ 1", 11),
+    ("~5", -6),
+    ("-(1 + 2)", -3),
+])
+def test_folds_numbers_like_the_interpreter(expression, value):
+    assert folded(expression) == {"line": 1, "type": "Number", "value": value}
+    # -0.0 == 0, but the interpreter prints it as -0.
+    assert str(folded(expression)["value"]) == str(value)
+
+
+def test_folds_strings_and_booleans():
+    assert folded('"a" + "b"')["value"] == "ab"
+    assert folded('1 == "1"')["value"] is False
+    assert folded('!(1 < 2) || "x" != "y" && 2 >= 2')["value"] is True
+
+
+@pytest.mark.parametrize("expression", [
+    "1 / 0",           # division by zero
+    "5 % 0.5",         # the int cast makes this a modulo by zero
+    "1 + true",        # type mismatch
+    '"a" < "b"',       # strings only compare for equality
+    "(1 | 2) & 3",     # evaluate_bitwise_and does not handle `|`
+    "(1 < 2) == true", # relational operands are evaluated as arithmetic
+    "4294967296 & 1",  # out of int range
+    "x + 1",
+])
+def test_leaves_runtime_errors_and_variables_alone(expression):
+    (statement,) = optimize(f"var x = 1; var v = {expression};")[1:]
+    assert statement["value"]["type"] not in ("Number", "Boolean", "String")
+
+
+def test_prunes_constant_branches():
+    statements = optimize("""
+    var n = 1;
+    if (true) { logln(1); } else { logln(2); }
+    if (1 > 2) { logln(3); }
+    while (false) { logln(4); }
+    if (n > 0) { logln(5); } else if (false) { logln(6); } else if (true) { logln(7); } else { logln(8); }
+    """)
+    assert [statement["type"] for statement in statements] == ["Var", "MissionCall", "Conditional"]
+    conditional = statements[2]
+    assert "else_if" not in conditional
+    assert conditional["else"][0]["argument"][0]["value"] == 7
+
+
+def test_keeps_else_blocks_the_interpreter_would_skip():
+    # The interpreter never runs `else` when a conditional has `else if`
+    # arms, so removing the last one would change what runs.
+    (statement,) = optimize("if (false) { logln(1); } else if (false) { logln(2); } else { logln(3); }")
+    assert statement["type"] == "Conditional" and "else_if" in statement
+
+
+def test_level_zero_leaves_the_tree_alone():
+    (statement,) = optimize("var v = 1 + 2;", level=0)
+    assert statement["value"]["type"] == "BinaryOp"
+
+
+LIBRARY = """
+mission square(x) { return x * x; }
+mission cube(x) { return x * square(x); }
+mission unused(a) { return cube(a) + 1; }
+mission debug(a) { logln(a); }
+mission outer(n) {
+    mission helper(k) { return k + 1; }
+    mission never(k) { return k; }
+    return helper(n);
+}
+if (false) { debug(1); }
+logln(cube(3), outer(1));
+"""
+
+
+def mission_names(statements):
+    names = []
+    for statement in statements:
+        if statement["type"] == "Mission":
+            names.append(statement["identifier"])
+            names.extend(mission_names(statement["body"]))
+    return names
+
+
+def test_removes_missions_unreachable_from_top_level_code():
+    assert mission_names(optimize(LIBRARY)) == ["square", "cube", "outer", "helper"]
+    assert mission_names(optimize(LIBRARY, level=0)) == [
+        "square", "cube", "unused", "debug", "outer", "helper", "never"]
+
+
+def test_reports_removed_missions_and_bytes_saved():
+    statements = Parser(Lexer(LIBRARY).scanTokens()).parse()
+    Resolver().resolve(statements)
+    optimizer = Optimizer()
+    optimizer.optimize(statements)
+    report = optimizer.report(lambda node: 10)
+    assert "removed 3 unreachable missions, 30 bytes saved" in report
+    assert "unused (line 4), debug (line 5), never (line 8)" in report
+    assert "Natives called: logln" in report
+
+
+def declared(statements):
+    return [(statement["identifier"], statement.get("slot")) for statement in statements if statement["type"] == "Var"]
+
+
+def test_hoists_loop_invariant_expressions_into_temporaries():
+    statements = optimize("""
+    var n = 3; var k = 4; var i = 0; var t = 0;
+    while (i < n * k) { t = t + n * k - i; i++; }
+    """, level=2)
+    assert declared(statements)[-1] == ("$invariant0", 4)
+    assert statements[4]["value"]["operator"] == "*"
+    loop = statements[5]
+    assert loop["condition"]["right"] == {"line": 3, "type": "Identifier", "name": "$invariant0", "depth": 0, "slot": 4}
+    # `t + n * k` reads t, which the loop writes, so only `n * k` moves.
+    assert loop["body"][0]["value"]["left"]["right"]["name"] == "$invariant0"
+
+
+def test_hoists_out_of_nested_loops_and_missions():
+    (mission, call) = optimize("""
+    mission m(a) {
+        var n = 2; var k = 3; var i = 0; var r = 0;
+        while (i < a) { var j = 0; while (j < n * k) { r = r + 1; j++; } i++; }
+        return r;
+    }
+    logln(m(2));
+    """, level=2)
+    # The inner loop's temporary moves out of the outer loop as well.
+    assert declared(mission["body"]) == [("n", 1), ("k", 2), ("i", 3), ("r", 4), ("$invariant0", 6)]
+    assert mission["frame_size"] == 7
+
+
+def test_never_hoists_expressions_that_can_fail():
+    (mission, *statements) = optimize("""
+    mission m(a, b) {
+        var i = 0; var r = 0;
+        while (i < 3) { r = r + a * b; i++; }
+        return r;
+    }
+    var d = 0; var n = 3; var s = "x"; var i = 0;
+    while (i < 3) {
+        if (d != 0) { logln(10 / d, n * 2 / d, n % 2, s + "y"); }
+        logln(i);
+        i++;
+    }
+    logln(m(2, 3));
+    """, level=2)
+    # Parameters may hold anything, so `a * b` may fail and stays.
+    assert declared(mission["body"]) == [("i", 2), ("r", 3)]
+    assert [name for name, slot in declared(statements)] == [
+        "d", "n", "s", "i", "$invariant0", "$invariant1", "$invariant2", "$invariant3"]
+    # A division by d fails when d is 0, and the guard keeps the loop from
+    # getting to it, so it stays; `n * 2`, `n % 2` and `s + "y"` cannot fail.
+    first, second, third, fourth = statements[8]["body"][0]["if"]["body"][0]["argument"]
+    assert (first["operator"], first["right"]["name"]) == ("/", "d")
+    assert (second["operator"], second["left"]["name"], second["right"]["name"]) == ("/", "$invariant1", "d")
+    assert (third["name"], fourth["name"]) == ("$invariant2", "$invariant3")
+
+
+def test_never_hoists_the_operand_of_increments():
+    # `--(a * a)` fails on every iteration; `--$invariant0` would not.
+    statements = optimize("""
+    var a = 3; var i = 0;
+    while (i < 2) { logln(--(a * a)); i = i + 1; }
+    """, level=2)
+    assert declared(statements) == [("a", 0), ("i", 1)]
+    operand = statements[2]["body"][0]["argument"][0]["node"]
+    assert operand["operator"] == "*" and operand["left"]["name"] == "a"
+
+
+def test_leaves_loops_that_change_or_depend_on_calls():
+    statements = optimize("""
+    var n = 3; var i = 0; var t = 0;
+    while (i < n) { t = t + input() * 2; n--; i++; }
+    """, level=2)
+    assert declared(statements) == [("n", 0), ("i", 1), ("t", 2)]
+
+
+def test_conservative_mode_never_hoists_across_input_or_log():
+    code = """
+    var n = 3; var i = 0;
+    mission show(v) { logln(v); }
+    while (i < n * 2) { show(i); i++; }
+    """
+    assert len(declared(optimize(code, level=2))) == 3
+    statements = Parser(Lexer(code).scanTokens()).parse()
+    Resolver().resolve(statements)
+    Optimizer(2, conservative=True).optimize(statements)
+    assert [statement.to_dict()["type"] for statement in statements] == ["Var", "Var", "Mission", "While"]
+
+
+def test_rewrites_tail_recursive_missions_into_loops():
+    (mission, call) = optimize("""
+    mission order(a, b) {
+        if (a > b) { return order(b, a); }
+        return a;
+    }
+    logln(order(10, 0));
+    """)
+    flag, loop = mission["body"]
+    assert flag["identifier"] == "$tail0" and flag["value"]["value"] is True
+    assert loop["type"] == "While" and loop["condition"]["name"] == "$tail0"
+    reset, conditional, guard = loop["body"]
+    assert reset["value"]["value"] is False
+    # The new values are computed before any parameter changes.
+    assert [(statement["type"], statement["identifier"]) for statement in conditional["if"]["body"]] == [
+        ("Var", "$tail0_a"), ("Var", "$tail0_b"), ("Assign", "a"), ("Assign", "b"), ("Assign", "$tail0")]
+    # The rest of the body only runs when no call was made.
+    assert guard["if"]["condition"]["operator"] == "!"
+    assert guard["if"]["body"][0]["type"] == "Return"
+    assert mission["frame_size"] == 5
+
+
+def test_reports_recursion_that_is_not_in_tail_position():
+    code = """
+    mission fact(n) { if (n <= 1) { return 1; } return n * fact(n - 1); }
+    mission order(a, b) { if (a > b) { return order(b, a); } return a; }
+    logln(fact(5), order(12, 8));
+    """
+    statements = Parser(Lexer(code).scanTokens()).parse()
+    Resolver().resolve(statements)
+    optimizer = Optimizer()
+    optimizer.optimize(statements)
+    report = optimizer.report(lambda node: 10)
+    assert "rewrote 1 mission into a loop: order (line 3)" in report
+    assert "Recursion kept: fact (line 2) calls itself on line 2 outside of tail position" in report
+    assert statements[0].to_dict()["body"][-1]["type"] == "Return"
+
+
+def test_keeps_tail_calls_whose_arguments_can_fail():
+    # Rewritten, a failing `10 / d` would only stop the declaration of its
+    # new value, and the loop would run on without it.
+    code = """
+    mission f(n, d) { if (n <= 0) { return d; } return f(n - 1, 10 / d); }
+    mission gcd(a, b) { if (b == 0) { return a; } return gcd(b, a % b); }
+    logln("r", f(2, 0), gcd(12, 18));
+    """
+    statements = Parser(Lexer(code).scanTokens()).parse()
+    Resolver().resolve(statements)
+    optimizer = Optimizer()
+    optimizer.optimize(statements)
+    report = optimizer.report(lambda node: 10)
+    assert "Recursion kept: f (line 2) calls itself on line 2 with an argument that can fail" in report
+    assert "Recursion kept: gcd (line 3) calls itself on line 3 with an argument that can fail" in report
+    assert [statement.to_dict()["body"][-1]["type"] for statement in statements[:2]] == ["Return", "Return"]
+
+
+def test_marks_pure_missions():
+    statements = optimize("""
+    var g = 1;
+    mission fib(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+    mission show(x) { logln(x); return x; }
+    mission shown(x) { return show(x) + fib(x); }
+    mission reads(x) { return x + g; }
+    mission maybe(x) { if (x > 0) { return x; } }
+    mission outer(x) { mission inner(y) { return y; } return inner(x); }
+    logln(fib(5), shown(1), reads(2), maybe(3), outer(4));
+    """)
+    pure = {statement["identifier"]: statement.get("pure", False)
+            for statement in iter_dicts(statements) if statement.get("type") == "Mission"}
+    assert pure == {"fib": True, "show": False, "shown": False, "reads": False, "maybe": False,
+                    "outer": False, "inner": True}
+    assert "pure" not in optimize("mission f(x) { return x; } logln(f(1));", level=0)[0]
+
+
+def iter_dicts(value):
+    """Yields every dictionary in a JSON-like value."""
+    if isinstance(value, dict):
+        yield value
+        value = list(value.values())
+    if isinstance(value, list):
+        for item in value:
+            yield from iter_dicts(item)
+
+
+def test_inlines_single_return_missions_into_expressions():
+    statements = optimize("""
+    mission add(a, b) { return a + b; }
+    mission square(x) { return x * x; }
+    var y = 4;
+    logln(add(1, 2), square(y - 1));
+    """, level=2)
+    # Both missions are removed once no call to them is left.
+    assert [statement["type"] for statement in statements] == ["Var", "MissionCall"]
+    folded, squared = statements[1]["argument"]
+    assert folded == {"line": 2, "type": "Number", "value": 3}
+    assert squared["operator"] == "*" and squared["left"]["operator"] == "-"
+
+
+def test_inlines_statement_bodies_with_renamed_locals():
+    statements = optimize("""
+    mission clamp(v, hi) { var r = v; if (v > hi) { r = hi; } return r; }
+    var r = 50;
+    var c = clamp(r * 2, 90);
+    logln(c, r);
+    """, level=2)
+    assert declared(statements) == [("r", 0), ("$inline0_v", 2), ("$inline0_hi", 3), ("$inline0_r", 4), ("c", 1)]
+    assert statements[-2]["value"] == {"line": 2, "type": "Identifier", "name": "$inline0_r", "depth": 0, "slot": 4}
+    conditional = statements[4]
+    assert conditional["if"]["body"][0]["identifier"] == "$inline0_r"
+
+
+def test_leaves_recursive_and_side_effecting_missions_alone():
+    statements = optimize("""
+    mission fib(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+    mission show(v) { logln(v); return v; }
+    mission big(v) { return v + v + v + v + v + v + v + v + v + v + v + v + v + v + v + v + v + v + v + v + v; }
+    var g = 1;
+    mission outer(v) { return v + g; }
+    var a = fib(10) + show(2) + big(1) + outer(3);
+    """, level=2)
+    calls = [node for node in iter_dicts(statements) if node.get("type") == "MissionCall"]
+    assert sorted(call["identifier"] for call in calls) == ["big", "fib", "fib", "fib", "logln", "outer", "show"]
+
+
+def test_does_not_inline_when_arguments_would_change():
+    statements = optimize("""
+    mission twice(v) { return v + v; }
+    mission positive(v) { if (v < 0) { return 0; } return v; }
+    var i = 0;
+    var a = twice(positive(i)) + twice(i--);
+    var b = twice(positive(i));
+    """, level=2)
+    # The substituted body would call positive twice, and the write of
+    # `i--` would no longer be discarded along with the call.
+    value = statements[3]["value"]
+    assert value["left"]["type"] == value["right"]["type"] == "MissionCall"
+    # As a whole value, the call would become statements, but the call to
+    # positive in its argument can fail.
+    assert statements[-1]["value"]["type"] == "MissionCall"
+
+
+def test_only_inlines_statements_that_cannot_fail():
+    statements = optimize("""
+    mission g(a) { var b = a + 1; return b * 2; }
+    mission h(a) { var b = a * 2; if (b) { b = 1; } return b; }
+    var d = 0; var n = 4;
+    var r = g(10 / d);
+    var s = h(n);
+    var t = g(n);
+    """, level=2)
+    # A failing `10 / d` stops the whole `var r`; declared on its own, it
+    # would leave `$inline0_a` undefined for the statements after it. The
+    # condition `b` of h is a number, which fails as well.
+    assert [statement["value"]["type"] for statement in statements[4:6]] == ["MissionCall", "MissionCall"]
+    assert declared(statements)[-3:] == [("$inline0_a", 5), ("$inline0_b", 6), ("t", 4)]
+    assert statements[-1]["value"]["left"]["name"] == "$inline0_b"
+
+
+def test_does_not_drop_arguments_that_can_fail():
+    statements = optimize("""
+    mission second(p, q) { return q + 1; }
+    var d = 0;
+    var v = second(10 / d, 2);
+    var w = second(1, 10 / d);
+    """, level=2)
+    # Substituted, the unused `10 / d` would never be evaluated; used once,
+    # it fails where the call would have.
+    assert statements[-2]["value"]["type"] == "MissionCall"
+    assert statements[-1]["value"]["left"]["operator"] == "/"
+
+
+def test_inline_threshold_option():
+    code = "mission add(a, b) { return a + b; } var v = add(1, 2);"
+    statements = Parser(Lexer(code).scanTokens()).parse()
+    Resolver().resolve(statements)
+    Optimizer(2, inline_threshold=2).optimize(statements)
+    assert statements[-1].to_dict()["value"]["type"] == "MissionCall"
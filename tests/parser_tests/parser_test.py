@@ -1,5 +1,6 @@
 import sys
 import os
+import tracemalloc
 
 test_file_path = os.path.abspath(__file__)
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
@@ -7,6 +8,10 @@ sys.path.insert(0, project_root)
 
 from src.parser.src.lexer.lexer import Lexer
 from src.parser.src.parser.parser import Parser
+from src.parser.src.parser.stream_parser import StreamParser
+from src.parser.src.parser.buffer_parser import BufferParser
+from src.parser.src.parser import expression_parser
+from src.parser.src.tokens import BITWISE_OPERATOR
 
 
 def test_simple_variable_declaration():
@@ -28,4 +33,163 @@ def test_simple_variable_declaration():
     
     var_node = ast_nodes[0]
     assert var_node.identifier.name == "x"
-    assert var_node.value.value == '5'
\ No newline at end of file
+    assert var_node.value.value == '5'
+
+
+def test_stream_parser_matches_list_parser():
+    """
+    Tests that parsing a lazy token stream builds the same AST as parsing
+    the full token list.
+    """
+    code = """
+    mission add(x, y) { return x + y; }
+    var total = add(1, 2) * -3;
+    if (total >= 0 && !false) { logln(total); } else { total = total - 1; }
+    while (total < 10) { total++; }
+    """
+
+    list_ast = Parser(Lexer(code).scanTokens()).parse()
+    stream_ast = StreamParser(Lexer(code).iter_tokens(chunk_size=8)).parse()
+
+    assert repr(stream_ast) == repr(list_ast)
+
+
+
+def test_buffer_parser_matches_list_parser():
+    """
+    Tests that parsing a TokenBuffer builds the same AST as parsing the
+    full token list, and reports errors with the offending token's line.
+    """
+    code = """
+    mission add(x, y) { return x + y; }
+    var total = add(1, 2) * -3;
+    if (total >= 0 && !false) { logln(total); } else { total = total - 1; }
+    while (total < 10) { total++; }
+    """
+
+    list_ast = Parser(Lexer(code).scanTokens()).parse()
+    buffer_ast = BufferParser(Lexer(code).scan_token_buffer()).parse()
+
+    assert repr(buffer_ast) == repr(list_ast)
+
+    try:
+        BufferParser(Lexer("var x = 5\nvar y = 6;").scan_token_buffer()).parse()
+        assert False, "Expected a parse error"
+    except Exception as e:
+        assert "at line 2" in str(e)
+
+
+
+def shape(node):
+    """Renders an expression tree as a fully parenthesised string."""
+    if hasattr(node, 'left_node'):
+        return f'({shape(node.left_node)} {node.operator} {shape(node.right_node)})'
+    if hasattr(node, 'operator'):
+        return f'{node.operator}{shape(node.node)}'
+    return str(getattr(node, 'name', getattr(node, 'value', None)))
+
+
+def parse_value(code):
+    return Parser(Lexer(f"var v = {code};").scanTokens()).parse()[0].value
+
+
+def test_expression_precedence_and_associativity():
+    """
+    Tests that binary operators group by precedence and associate to the left.
+    """
+    assert shape(parse_value("a || b && c | d ^ e & f == g < h + i * j")) == \
+        "(a || (b && (c | (d ^ (e & ((f == g) < (h + (i * j))))))))"
+    assert shape(parse_value("a - b - c * d / e % f")) == "((a - b) - (((c * d) / e) % f))"
+    assert shape(parse_value("-a * (b + c) < d != !e")) == "(((-a * (b + c)) < d) != !e)"
+    assert type(parse_value("a < b && c")).__name__ == "LogicalOpNode"
+
+
+def test_new_operator_only_needs_a_table_entry(monkeypatch):
+    """
+    Tests that an operator added to BINARY_OPERATORS is parsed, here as a
+    right-associative operator that binds tighter than '*'.
+    """
+    operators = dict(expression_parser.BINARY_OPERATORS)
+    operators[(BITWISE_OPERATOR, '^')] = (9, 8, expression_parser.BinaryOpNode)
+    monkeypatch.setattr(expression_parser, 'BINARY_OPERATORS', operators)
+
+    assert shape(parse_value("a * b ^ c ^ d + e")) == "((a * (b ^ (c ^ d))) + e)"
+
+
+DEPTH = 100_000
+
+
+def nesting_depth(node, child):
+    """Follows `child` from `node` without recursion and counts the steps."""
+    depth = 0
+    while node is not None:
+        node = child(node)
+        depth += 1
+    return depth
+
+
+def test_deeply_nested_blocks_parse_without_recursion():
+    """
+    Tests 100k nested if/while blocks, which used to overflow the Python stack.
+    """
+    code = "if (x) { while (y) { " * (DEPTH // 2) + "x = 1;" + " } }" * (DEPTH // 2)
+
+    ast_nodes = Parser(Lexer(code).scanTokens()).parse()
+
+    def child(node):
+        body = getattr(node, 'if_body', None) or getattr(node, 'body', None)
+        return body[0] if body else None
+
+    assert nesting_depth(ast_nodes[0], child) == DEPTH + 1
+
+
+def test_deeply_nested_expressions_parse_without_recursion():
+    """
+    Tests 100k nested parentheses, prefix operators and mission calls.
+    """
+    parens = Parser(Lexer("var v = " + "(" * DEPTH + "1" + ")" * DEPTH + ";").scanTokens()).parse()
+    unary = Parser(Lexer("var v = " + "-!" * (DEPTH // 2) + "1;").scanTokens()).parse()
+    calls = Parser(Lexer("var v = " + "f(1, " * DEPTH + "2" + ")" * DEPTH + ";").scanTokens()).parse()
+
+    assert parens[0].value.value == '1'
+    assert nesting_depth(unary[0].value, lambda node: getattr(node, 'node', None)) == DEPTH + 1
+    assert nesting_depth(calls[0].value, lambda node: node.argument[1] if hasattr(node, 'argument') else None) == DEPTH + 1
+
+
+def count_node_references(ast_nodes):
+    """Counts every place a node appears in the tree, shared nodes included."""
+    count = 0
+    stack = list(ast_nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (list, tuple)):
+            stack.extend(node)
+            continue
+        count += 1
+        for name in ('identifier', 'value', 'left_node', 'right_node', 'node', 'parameter', 'argument',
+                     'body', 'condition', 'if_condition', 'if_body', 'else_if_condition', 'else_body'):
+            child = getattr(node, name, None)
+            if child is not None and not isinstance(child, str):
+                stack.append(child)
+    return count
+
+
+def test_bytes_per_node_for_large_program():
+    """
+    Pins the memory used per AST node so that node classes keep their
+    __slots__ and identical leaves stay shared.
+    """
+    code = "".join(f"""
+    mission m{i}(a, b) {{
+        var x{i} = (a + {i}) * b - "s{i}";
+        while (x{i} < 100 && !done) {{ x{i} = x{i} + 1; logln(x{i}, a, b); }}
+        if (x{i} == 3) {{ return a; }} else if (b) {{ return b ^ 2; }} else {{ return -x{i}; }}
+    }}""" for i in range(2000))
+    tokens = Lexer(code).scanTokens()
+
+    tracemalloc.start()
+    ast_nodes = Parser(tokens).parse()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert size / count_node_references(ast_nodes) < 75
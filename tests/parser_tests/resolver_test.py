@@ -0,0 +1,132 @@
+import sys
+import os
+import json
+import io
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src.lexer.lexer import Lexer
+from src.parser.src.parser.parser import Parser
+from src.parser.src.resolver.resolver import Resolver
+from src.parser.src.resolver.scope_stack import ScopeStack, DECLARED, DEFINED
+from src.parser.src.serializer.json_writer import JsonWriter
+
+NESTED = """
+var g = 10; var h = 1;
+mission outer(a) {
+    var b = a + g;
+    mission inner(c) { var d = c + b + g; h = d; return d; }
+    return inner(b);
+}
+logln(outer(1), " ", h);
+"""
+
+
+def resolve(code):
+    statements = Parser(Lexer(code).scanTokens()).parse()
+    Resolver().resolve(statements)
+    return statements
+
+
+def test_declarations_get_slots_in_their_frame():
+    g, h, outer, call = resolve(NESTED)
+    assert g.address == (0, 0) and h.address == (0, 1)
+    assert outer.parameter[0].address == (0, 0)
+    assert outer.body[0].address == (0, 1)
+    assert outer.frame_size == 2
+    inner = outer.body[1]
+    assert inner.parameter[0].address == (0, 0)
+    assert inner.frame_size == 2
+
+
+def test_missions_capture_outer_variables_transitively():
+    _, _, outer, call = resolve(NESTED)
+    inner = outer.body[1]
+    assert inner.captures == [("b", 1, 1), ("g", 2, 0), ("h", 2, 1)]
+    # outer does not use g or h itself, but inner reaches them through it.
+    assert outer.captures == [("g", 1, 0), ("h", 1, 1)]
+    assert inner.body[1].address == (2, 1)
+    # Globals read at the top level are at depth 0.
+    assert call.argument[2].address == (0, 1)
+
+
+def test_shared_identifiers_are_copied_when_addresses_differ():
+    # Both `x` on line 2 are one shared node, but they are different variables.
+    statements = resolve("var w = 1; var x = 2;\nmission f(x) { return x; } logln(x);")
+    mission, call = statements[2], statements[3]
+    assert mission.parameter[0].address == (0, 0)
+    assert mission.body[0].value.address == (0, 0)
+    assert call.argument[0].address == (0, 1)
+    assert call.argument[0] is not mission.parameter[0]
+    statements = resolve("var x = 1;\nmission f(y) { var z = 2; return x; }")
+    assert statements[1].body[1].value.address == (1, 0)
+
+
+def test_else_if_branches_are_resolved():
+    with pytest.raises(Exception, match="not defined"):
+        resolve("var t = 1; if (t < 0) { logln(t); } else if (t > 0) { logln(missing); }")
+
+
+def test_json_output_carries_addresses():
+    statements = resolve(NESTED)
+    out = io.StringIO()
+    JsonWriter(out).write_statements(statements)
+    data = json.loads(out.getvalue())
+    assert data == [statement.to_dict() for statement in statements]
+    inner = data[2]["body"][1]
+    assert inner["frame_size"] == 2
+    assert inner["captures"][0] == {"name": "b", "depth": 1, "slot": 1}
+    assert data[2]["body"][0]["depth"] == 0 and data[2]["body"][0]["slot"] == 1
+
+
+def test_self_calls_in_tail_position_are_marked():
+    (mission,) = resolve("""
+    mission walk(n, acc) {
+        if (n == 0) { return acc; } else if (n > 100) { return walk(n - 1, acc) + 1; }
+        while (n > 50) { return walk(n - 1, acc); }
+        mission walk(k) { return k; }
+        return walk(n);
+    }
+    """)
+    conditional, loop, _, last = mission.body
+    assert conditional.else_if_condition[0][1][0].value.left_node.tail is False
+    assert loop.body[0].value.tail is False
+    # The name now refers to the nested mission.
+    assert last.value.tail is False
+
+    (mission,) = resolve("mission down(n) { if (n > 0) { return down(n - 1); } return n; }")
+    call = mission.body[0].if_body[0].value
+    assert call.tail is True and call.to_dict()["tail"] is True
+
+
+def test_scope_stack_index_follows_push_and_pop():
+    scopes = ScopeStack()
+    scopes.declare("x")
+    scopes.define("x")
+    scopes.allocate("x")
+    scopes.push()
+    scopes.declare("x")
+    assert scopes.index["x"][-1][1] == DECLARED
+    with pytest.raises(Exception, match="Cannot read local variable 'x' in its own initializer"):
+        scopes.is_defined("x")
+    scopes.define("x")
+    assert scopes.index["x"][-1][1] == DEFINED
+    assert scopes.allocate("x") == 0
+    assert scopes.address("x") == (0, 0)
+    scopes.push()
+    assert scopes.address("x") == (1, 0)
+    scopes.pop()
+    scopes.pop()
+    assert scopes.address("x") == (0, 0)
+    scopes.push()
+    scopes.declare("y")
+    scopes.pop()
+    assert "y" not in scopes.index
+    with pytest.raises(Exception, match="Variable 'y' is not defined"):
+        scopes.is_defined("y")
+    with pytest.raises(Exception, match="already defined in this scope"):
+        scopes.declare("x")
@@ -0,0 +1,87 @@
+import sys
+import os
+import io
+import json
+import glob
+import tracemalloc
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src.lexer.lexer import Lexer
+from src.parser.src.parser.parser import Parser
+from src.parser.src.nodes.arena import ArenaDictEmitter
+from src.parser.src.serializer.json_writer import JsonWriter
+
+SAMPLE = """
+mission add(x, y) { return x + y * -2.50; }
+mission noop { logln("tab\\there é"); }
+var total = add(1, 2.5) & 3;
+if (total >= 0 && !false) { logln(total); } else if (total < -1) { total = 1; } else { total--; }
+while (total < 10 || ~total == 2) { total++; input(); }
+"""
+
+PROGRAMS = [SAMPLE, ""] + [open(path).read() for path in sorted(glob.glob(os.path.join(project_root, "examples", "*.komu")))
+                           if not path.endswith("loop.komu")]
+
+
+def parse(code):
+    return Parser(Lexer(code).scanTokens()).parse()
+
+
+def write(statements, pretty=False):
+    out = io.StringIO()
+    JsonWriter(out, pretty).write_statements(statements)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("code", PROGRAMS)
+def test_pretty_output_matches_json_dump(code):
+    ast_nodes = parse(code)
+    expected = io.StringIO()
+    json.dump([node.to_dict() for node in ast_nodes], expected, indent=4)
+
+    assert write(ast_nodes, pretty=True) == expected.getvalue()
+
+
+@pytest.mark.parametrize("code", PROGRAMS)
+def test_compact_output_is_the_same_json(code):
+    ast_nodes = parse(code)
+    expected = [node.to_dict() for node in ast_nodes]
+
+    assert write(ast_nodes) == json.dumps(expected, separators=(',', ':'))
+    assert json.loads(write(ast_nodes)) == expected
+
+
+def test_writes_arena_statements():
+    arena = Parser(Lexer(SAMPLE).scanTokens()).parse_arena()
+    emitter = ArenaDictEmitter(arena)
+
+    assert write(emitter.visit(node_id) for node_id in arena.roots) == write(parse(SAMPLE))
+
+
+def test_writes_deeply_nested_ast():
+    depth = 100_000
+    ast_nodes = parse("var v = " + "- " * depth + "1;")
+
+    assert write(ast_nodes).count('"UnaryOp"') == depth
+
+
+def test_peak_memory_stays_below_dict_tree(tmp_path):
+    ast_nodes = parse(SAMPLE * 1000)
+
+    tracemalloc.start()
+    with open(tmp_path / "ast.json", 'w') as f:
+        JsonWriter(f).write_statements(ast_nodes)
+    writer_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    ast_json = [node.to_dict() for node in ast_nodes]
+    dict_tree = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert writer_peak * 10 < dict_tree
@@ -0,0 +1,111 @@
+import sys
+import os
+import io
+import json
+import threading
+import multiprocessing
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src import main as komu_main
+from src.parser.src import server as komu_server
+from src.parser.src.client import send
+from src.parser.src.server import CompileServer, serve_stdio, serve_socket
+
+SOURCE = 'mission f(a) { return a * 2; }\nlogln(f(4));\n'
+
+
+def responses(*requests, cache_dir=None):
+    """Returns the server's responses to the request lines, by id."""
+    output = io.StringIO()
+    serve_stdio(CompileServer(1, cache_dir), io.StringIO("".join(line + "\n" for line in requests)), output)
+    return {response["id"]: response for response in map(json.loads, output.getvalue().splitlines())}
+
+
+def test_answers_requests_on_stdio(tmp_path, monkeypatch):
+    answers = responses(
+        json.dumps({"id": 1, "op": "compile", "source": SOURCE, "optimize": 0}),
+        json.dumps({"id": 2, "op": "check", "source": "logln(y);"}),
+        json.dumps({"id": 3, "op": "compile", "source": SOURCE, "format": "cbor"}),
+        json.dumps({"id": 4, "op": "launch"}),
+        "not json",
+    )
+
+    # The same AST as main.py writes.
+    (tmp_path / "build").mkdir()
+    (tmp_path / "program.komu").write_text(SOURCE)
+    monkeypatch.setattr(sys, "path", [str(tmp_path)] + sys.path)
+    komu_main.main(str(tmp_path / "program.komu"), use_cache=False, optimize_level=0)
+    assert answers[1]["ast"] == json.loads((tmp_path / "build" / "ast_output.json").read_text())
+
+    assert answers[2] == {"id": 2, "ok": False, "error": "ResolverError: Variable 'y' is not defined."}
+    assert answers[3]["error"] == "Error: A CBOR AST can only be written to an output file."
+    assert answers[4]["error"] == "Error: Unknown operation 'launch'."
+    assert answers[None]["error"].startswith("Error: Invalid request:")
+
+
+def test_compiles_to_files_and_reuses_the_cache(tmp_path):
+    (tmp_path / "program.komu").write_text(SOURCE)
+    request = {"op": "compile", "path": str(tmp_path / "program.komu"), "output": str(tmp_path / "ast_output.json")}
+    (tmp_path / "ast_output.msgpack").write_bytes(b"stale")
+    answers = responses(json.dumps(dict(request, id=1)), json.dumps({"id": 2, "op": "stats"}),
+                        cache_dir=str(tmp_path / "cache"))
+    assert answers[1] == {"id": 1, "ok": True, "output": str(tmp_path / "ast_output.json"), "cached": False}
+    assert not (tmp_path / "ast_output.msgpack").exists()
+
+    answers = responses(json.dumps(dict(request, id=1)), cache_dir=str(tmp_path / "cache"))
+    assert answers[1]["cached"]
+
+
+def test_serves_clients_on_a_socket(tmp_path):
+    socket_path = str(tmp_path / "komu.sock")
+    server = CompileServer(2)
+    thread = threading.Thread(target=serve_socket, args=(server, socket_path))
+    thread.start()
+    try:
+        while not os.path.exists(socket_path):
+            thread.join(0.01)
+        results = []
+
+        def client(number):
+            response = send(socket_path, {"op": "compile", "source": f"var x = {number} + 1;"}, start=False)
+            results.append(response["ast"][0]["value"]["value"] == number + 1)
+
+        clients = [threading.Thread(target=client, args=(number,)) for number in range(8)]
+        for client_thread in clients:
+            client_thread.start()
+        for client_thread in clients:
+            client_thread.join()
+        assert results == [True] * 8
+        stats = send(socket_path, {"op": "stats"}, start=False)
+        assert (stats["compiled"], stats["clients"], stats["workers"]) == (8, 9, 2)
+    finally:
+        send(socket_path, {"op": "shutdown"}, start=False)
+        thread.join()
+    assert not os.path.exists(socket_path)
+
+
+def test_stops_once_the_front_end_changes(monkeypatch):
+    server = CompileServer(1)
+    monkeypatch.setattr(komu_server, "source_stamp", lambda: server.stamp + 1)
+    response = json.loads(server.submit(json.dumps({"op": "check", "source": SOURCE})).result())
+    assert response["restart"] and server.stopped
+    server.close()
+
+
+def test_replaces_workers_that_die():
+    server = CompileServer(1)
+    request = json.dumps({"op": "check", "source": SOURCE})
+    assert json.loads(server.submit(request).result())["ok"]
+    for worker in multiprocessing.active_children():
+        worker.kill()
+        worker.join()
+    # A request the dead worker took fails; the ones after it are answered.
+    json.loads(server.submit(request).result(timeout=60))
+    assert json.loads(server.submit(request).result(timeout=60))["ok"]
+    assert server.stats()["restarts"] == 1
+    server.close()
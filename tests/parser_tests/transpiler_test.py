@@ -0,0 +1,147 @@
+import sys
+import os
+import io
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src.lexer.lexer import Lexer
+from src.parser.src.parser.parser import Parser
+from src.parser.src.resolver.resolver import Resolver
+from src.parser.src.optimizer.optimizer import Optimizer
+from src.parser.src.cache.compile_cache import CompileCache
+from src.parser.src.vm import transpiler
+from src.parser.src.vm.compiler import Compiler
+from src.parser.src.vm.machine import Machine, FatalError
+from src.parser.src.vm.transpiler import PythonTranspiler, compile_statements, load_program
+from src.parser.src.vm.runtime import Runtime
+
+
+def front_end(code, level=1):
+    statements = Parser(Lexer(code).scanTokens()).parse()
+    Resolver().resolve(statements)
+    Optimizer(level).optimize(statements)
+    return statements
+
+
+def run(code, level=1, stdin=""):
+    """Returns what the transpiled program writes to stdout and to stderr."""
+    output, errors = io.StringIO(), io.StringIO()
+    Runtime(output, io.StringIO(stdin), errors).run(compile_statements(front_end(code, level)))
+    return output.getvalue(), errors.getvalue()
+
+
+def run_on_machine(code, level=1, stdin=""):
+    output, errors = io.StringIO(), io.StringIO()
+    Machine(output, io.StringIO(stdin), errors).run(Compiler().compile(front_end(code, level)))
+    return output.getvalue(), errors.getvalue()
+
+
+PROGRAM = """
+    var x = 5;
+    mission outer(n) {
+        var k = n * 2;
+        mission inner(m) {
+            return m + k + x;
+        }
+        return inner(1);
+    }
+    mission bump() {
+        x = x + 1;
+        return x;
+    }
+    mission fib(n) {
+        if (n < 2) {
+            return n;
+        }
+        return fib(n - 1) + fib(n - 2);
+    }
+    logln(outer(3), " ", bump(), " ", x, " ", fib(20));
+    var y = 1 + "a";
+    logln(y, " ", -7 % 3, " ", 6 ^ 3, " ", 1 / 3);
+    logln("sum", 1 + true);
+    var i = 0;
+    while (i < 3) {
+        if (i == 0) { var a = "zero"; logln(a); } else if (i == 1) { logln("one"); } else { logln("skipped"); }
+        i++;
+    }
+    var name = input();
+    var n = input();
+    logln(name, " ", n + 1);
+    i + "x";
+    fib(1, 2);
+    logln("unreached");
+"""
+
+
+@pytest.mark.parametrize("level", [0, 1, 2])
+def test_runs_like_the_vm(level):
+    assert run(PROGRAM, level, "Bob\n 42abc\n") == run_on_machine(PROGRAM, level, "Bob\n 42abc\n")
+
+
+def test_prints_and_increments_inside_expressions():
+    code = """
+        mission two() { return 2; }
+        two();
+        var i = 0;
+        var a = logln("x", i++, ++i);
+        var b = log(i--, logln(i, "in"));
+        logln(a, " ", b, " ", i);
+    """
+    assert run(code) == run_on_machine(code) == ("x02\n21in\n22 2 1\n", "")
+
+
+@pytest.mark.parametrize("level", [0, 1])
+def test_modulo_follows_komu(level):
+    code = 'var a = 0 - 90; var b = 0 - 7; logln(a % 5, " ", b % 3, " ", 7.9 % -2.5);'
+    assert run(code, level) == run_on_machine(code, level) == ("0 -1 1\n", "")
+
+
+def test_condition_that_is_not_a_boolean_is_fatal():
+    with pytest.raises(FatalError):
+        run('var x = 1; while (x) { x = 0; }')
+
+
+def test_deep_recursion():
+    code = """
+        mission depth(n) {
+            if (n == 0) {
+                return 0;
+            }
+            var rest = depth(n - 1);
+            return rest + 1;
+        }
+        logln(depth(20000));
+    """
+    assert run(code) == ("20000\n", "")
+
+
+def test_variables_become_python_locals():
+    source = PythonTranspiler().transpile(front_end("var a = 1; while (a < 3) { a = a + 1; }"))
+    assert "while less(v0_0, 3.0, 1):" in source
+    assert "v0_0 = add(v0_0, 1.0, 1)" in source
+
+
+def test_code_objects_are_cached_by_source(tmp_path):
+    calls = []
+
+    def counting_front_end(source, level):
+        calls.append(level)
+        return front_end(source.decode('utf-8'), level)
+
+    cache = CompileCache(str(tmp_path))
+    source = b'logln("cached");'
+    transpiler._compiled.clear()
+    first = load_program(source, counting_front_end, cache=cache)
+    assert load_program(source, counting_front_end, cache=cache) is first
+    transpiler._compiled.clear()
+    load_program(source, counting_front_end, cache=cache)
+    load_program(source, counting_front_end, optimize_level=2, cache=cache)
+    assert calls == [1, 2]
+
+    output = io.StringIO()
+    Runtime(output=output).run(load_program(source, counting_front_end, cache=cache))
+    assert output.getvalue() == "cached\n"
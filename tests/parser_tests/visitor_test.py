@@ -0,0 +1,116 @@
+import sys
+import os
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src.lexer.lexer import Lexer
+from src.parser.src.parser.parser import Parser
+from src.parser.src.resolver.resolver import Resolver
+from src.parser.src.nodes.literal_nodes import NumberNode, IdentifierNode
+from src.parser.src.nodes.statement_nodes import MissionCallNode
+from src.parser.src.nodes import visitor as visitor_module
+from src.parser.src.nodes.visitor import NodeVisitor, NodeTransformer, iter_child_nodes
+
+SAMPLE = """
+mission add(x, y) { return x + y * -2; }
+var total = add(1, 2) & 3;
+if (total >= 0) { logln(total); } else if (total < -1) { total = 1; } else { total--; }
+while (total < 10) { total++; }
+"""
+
+
+def parse(code):
+    return Parser(Lexer(code).scanTokens()).parse()
+
+
+@pytest.fixture(params=[visitor_module.MAX_RECURSION_DEPTH, 2, 0], ids=["calls", "mixed", "stack"])
+def max_depth(request, monkeypatch):
+    # The results must not depend on where visit switches to its explicit stack.
+    monkeypatch.setattr(visitor_module, "MAX_RECURSION_DEPTH", request.param)
+
+
+class NameCollector(NodeVisitor):
+    def __init__(self):
+        super().__init__()
+        self.names = []
+
+    def visit_IdentifierNode(self, node):
+        self.names.append(node.name)
+
+
+def test_generic_visit_walks_children_in_source_order(max_depth):
+    collector = NameCollector()
+    collector.visit(parse(SAMPLE))
+
+    assert collector.names == ["add", "x", "y", "x", "y", "total", "add", "total", "logln", "total",
+                               "total", "total", "total", "total", "total"]
+
+
+def test_visit_methods_are_looked_up_once(monkeypatch):
+    collector = NameCollector()
+    lookups = []
+    original = NodeVisitor.add_method
+    monkeypatch.setattr(NodeVisitor, "add_method", lambda self, node_class: lookups.append(node_class)
+                        or original(self, node_class))
+    collector.visit(parse(SAMPLE * 3))
+
+    assert lookups == []
+    assert collector.dispatch[IdentifierNode] == collector.visit_IdentifierNode
+
+
+def test_yield_returns_the_result_of_the_visit(max_depth):
+    class Evaluator(NodeVisitor):
+        def visit_NumberNode(self, node):
+            return int(node.value)
+
+        def visit_BinaryOpNode(self, node):
+            left = yield node.left_node
+            right = yield node.right_node
+            return left + right if node.operator == '+' else left * right
+
+    (statement,) = parse("var v = 1 + 2 * (3 + 4);")
+    assert Evaluator().visit(statement.value) == 15
+    assert Evaluator().visit([statement.value, (statement.value, statement.value)]) == [15, (15, 15)]
+    (statement,) = parse("var v = " + "1 + (" * 5000 + "1" + ")" * 5000 + ";")
+    assert Evaluator().visit(statement.value) == 5001
+
+
+def test_transformer_replaces_removes_and_splices_nodes(max_depth):
+    class Rewriter(NodeTransformer):
+        def visit_NumberNode(self, node):
+            return IdentifierNode(type("Token", (), {"value": "n" + node.value, "line": node.line}))
+
+        def visit_MissionCallNode(self, node):
+            if node.value == "input":
+                return None
+            if node.value == "log":
+                return [node, node]
+            return (yield from self.generic_visit(node))
+
+    ast = Rewriter().visit(parse("logln(1); input(); log(2); if (3) { input(); } else if (4) { log(5); }"))
+
+    assert [type(node) for node in ast[:3]] == [MissionCallNode, MissionCallNode, MissionCallNode]
+    assert [node.value for node in ast[:3]] == ["logln", "log", "log"]
+    assert ast[0].argument[0].name == "n1"
+    conditional = ast[3]
+    assert conditional.if_condition.name == "n3"
+    assert conditional.if_body == []
+    ((condition, body),) = conditional.else_if_condition
+    assert condition.name == "n4" and len(body) == 2
+
+
+def test_iter_child_nodes_flattens_else_if_branches():
+    (conditional,) = parse("if (a) { b; } else if (c) { d; } else { e; }")
+    assert [node.name for node in iter_child_nodes(conditional)] == ["a", "b", "c", "d", "e"]
+
+
+def test_resolver_handles_deep_nesting_without_recursion():
+    depth = 100_000
+    Resolver().resolve(parse("var v = " + "- " * depth + "1;" + "logln(" + "(" * depth + "v" + ")" * depth + ");"))
+
+    with pytest.raises(Exception, match="not defined|Undefined|undefined"):
+        Resolver().resolve(parse("var v = " + "- " * depth + "w;"))
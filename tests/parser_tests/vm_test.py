@@ -0,0 +1,176 @@
+import sys
+import os
+import io
+
+import pytest
+
+test_file_path = os.path.abspath(__file__)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(test_file_path)))
+sys.path.insert(0, project_root)
+
+from src.parser.src.lexer.lexer import Lexer
+from src.parser.src.parser.parser import Parser
+from src.parser.src.resolver.resolver import Resolver
+from src.parser.src.optimizer.optimizer import Optimizer
+from src.parser.src.vm.bytecode import CONST, disassemble
+from src.parser.src.vm.compiler import Compiler
+from src.parser.src.vm.machine import Machine, FatalError, input_value, arguments_key
+
+
+def compile_code(code, level=1):
+    statements = Parser(Lexer(code).scanTokens()).parse()
+    Resolver().resolve(statements)
+    Optimizer(level).optimize(statements)
+    return Compiler().compile(statements)
+
+
+def run(code, level=1, stdin=""):
+    """Returns what the program writes to stdout and to stderr."""
+    output, errors = io.StringIO(), io.StringIO()
+    Machine(output, io.StringIO(stdin), errors).run(compile_code(code, level))
+    return output.getvalue(), errors.getvalue()
+
+
+@pytest.mark.parametrize("level", [0, 1, 2])
+def test_missions_recursion_and_captures(level):
+    code = """
+        var x = 5;
+        mission outer(n) {
+            var k = n * 2;
+            mission inner(m) {
+                return m + k + x;
+            }
+            return inner(1);
+        }
+        mission fact(n) {
+            if (n <= 1) {
+                return 1;
+            }
+            return n * fact(n - 1);
+        }
+        mission bump() {
+            x = x + 1;
+            return x;
+        }
+        logln(outer(3), " ", fact(10), " ", bump(), " ", x);
+    """
+    # A mission's writes to outer variables are discarded when it returns.
+    assert run(code, level) == ("12 3.6288e+06 6 5\n", "")
+
+
+@pytest.mark.parametrize("level", [1, 2])
+def test_guarded_errors_stay_in_loops(level):
+    code = """
+        var d = 0;
+        var i = 0;
+        while (i < 3) {
+            if (d != 0) {
+                logln(10 / d);
+            }
+            logln(i);
+            i++;
+        }
+    """
+    assert run(code, level) == run(code, 0) == ("0\n1\n2\n", "")
+
+
+def test_number_and_string_printing():
+    output, _ = run('logln(1 / 3, " ", 100000000 * 100000000, " ", -7 % 3, " ", 6 ^ 3, " ", "a\\tb");')
+    assert output == "0.333333 1e+16 -1 5 a\tb\n"
+
+
+@pytest.mark.parametrize("level", [0, 1])
+def test_a_zero_remainder_is_never_negative(level):
+    # The interpreter's `%` works on ints, which have no -0.
+    assert run("var a = 0 - 90; logln(a % 5, (0 - 90) % 5);", level) == ("00\n", "")
+
+
+def test_errors_are_reported_where_the_interpreter_catches_them():
+    code = """
+        var y = 1 + "a";
+        logln(y);
+        logln("sum", 1 + true);
+        var n = 1;
+        n + "x";
+        logln("end");
+    """
+    output, errors = run(code, level=0)
+    assert output == "nil\nsum\nend\n"
+    assert errors.splitlines() == [
+        "Runtime Error during variable declaration: Error: Type mismatch for operator '+' "
+        "Cannot mix numbers, strings, or booleans at line: 2.",
+        "Error: Undefined variable yat line: 3",
+        "Runtime Error during print: Error: Cannot evaluate unhandled expression type 'Boolean' at line: 4.",
+        "Runtime Error during statement execution: Error: Type mismatch for operator '+' "
+        "Cannot mix numbers, strings, or booleans at line: 6.",
+    ]
+
+
+def test_uncaught_runtime_error_ends_the_program():
+    code = """
+        mission f(a, b) { return a - b; }
+        f(1);
+        logln("unreached");
+    """
+    assert run(code) == ("", "Runtime Error: Error: Mission 'f' expected 2 arguments, but got 1.\n")
+
+
+def test_else_is_skipped_with_else_if_arms():
+    code = """
+        var x = 1;
+        if (x > 5) { logln("a"); } else if (x > 3) { logln("b"); } else { logln("c"); }
+        if (x > 5) { logln("a"); } else { logln("c"); }
+    """
+    assert run(code) == ("c\n", "")
+
+
+def test_call_value_is_the_last_returned_value():
+    code = """
+        mission two() { return 2; }
+        mission nothing() { var q = 1; }
+        logln(two(), " ", nothing());
+    """
+    assert run(code) == ("2 2\n", "")
+
+
+def test_input_reads_numbers_like_stod():
+    code = """
+        var name = input();
+        var n = input();
+        logln(name, " ", n + 1);
+    """
+    assert run(code, stdin="Bob\n 42abc\n") == ("Bob 43\n", "")
+    assert input_value("0x1A") == 26.0
+    assert input_value("-inf") == float("-inf")
+    assert input_value("abc") == "abc"
+
+
+def test_condition_that_is_not_a_boolean_is_fatal():
+    with pytest.raises(FatalError):
+        run('var x = 1; while (x) { x = 0; }')
+
+
+def test_pure_missions_are_memoized():
+    code = """
+        mission fib(n) {
+            if (n < 2) {
+                return n;
+            }
+            return fib(n - 1) + fib(n - 2);
+        }
+        logln(fib(25));
+    """
+    machine = Machine(io.StringIO(), io.StringIO(), io.StringIO())
+    machine.run(compile_code(code))
+    assert machine.output.getvalue() == "75025\n"
+    assert machine.hits > 0
+    # As in the interpreter, remembered arguments compare by their bits.
+    assert arguments_key([0.0]) != arguments_key([-0.0])
+    assert arguments_key([float("nan")]) != arguments_key([-float("nan")])
+
+
+def test_constants_are_pooled():
+    program = compile_code('var a = 7; var b = 7; var c = "7";', level=0)
+    assert program.constants == [7.0, "7"]
+    assert sum(opcode == CONST for opcode, _, _ in program.instructions) == 3
+    assert "CONST" in disassemble(program)